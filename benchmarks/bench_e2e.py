@@ -0,0 +1,110 @@
+"""
+端到端吞吐量测试
+
+启动本地 LiblibAI 模拟服务器，用真实的 LiblibAIAPI、poll_task、download_image 和
+ImageWriter 走完提交、轮询、下载、保存整条链路，报告不同并发数下从提交到保存完成的
+吞吐量和 p50/p95/p99 延迟
+
+运行: python benchmarks/bench_e2e.py --jobs 50 --concurrency 1,4,16
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from scripts.lh_lib.api import LiblibAIAPI
+from scripts.lh_lib.auth import LiblibAIAuth
+from scripts.lh_lib.output import ImageWriter, format_infotext
+from scripts.lh_lib.scheduler import percentile
+from benchmarks.stub_server import StubLiblibAIServer
+from scripts.lh_lib.tasks import CancelToken, call_with_token, poll_task, download_image
+
+ACCESS_KEY = "stub_access_key"
+SECRET_KEY = "stub_secret_key"
+
+def run_job(api, writer, index, poll_interval, timeout):
+    """提交一个文生图任务并等待图片保存完成，返回耗时（秒）"""
+    started = time.perf_counter()
+    token = CancelToken(timeout=timeout)
+    prompt = f"benchmark job {index}"
+    response = call_with_token(api, token, api.text_to_image, "stub-sd15", prompt, "", 512, 512, steps=20)
+    progress = None
+    for progress in poll_task(api, response["task_id"], poll_interval, timeout, token):
+        pass
+    content = download_image(progress["image_url"], 60, token)
+    writer.save(content, format_infotext(prompt, Steps=20, Size="512x512"), metadata={"task_id": response["task_id"]})
+    return time.perf_counter() - started
+
+def run_level(server, concurrency, jobs, poll_interval, timeout, save_path):
+    """在给定并发数下运行 jobs 个任务，返回统计结果"""
+    api = LiblibAIAPI(LiblibAIAuth(ACCESS_KEY, SECRET_KEY))
+    api.base_url = server.base_url
+    # 连接池大小与并发数一致，避免线程等待连接
+    import requests
+    adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=max(10, concurrency))
+    api.session.mount("http://", adapter)
+    writer = ImageWriter(save_path, thumbnail_size=0)
+
+    latencies, errors = [], 0
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = [executor.submit(run_job, api, writer, i, poll_interval, timeout) for i in range(jobs)]
+        for future in futures:
+            try:
+                latencies.append(future.result())
+            except Exception:
+                errors += 1
+    elapsed = time.perf_counter() - started
+    writer.shutdown()
+
+    return {
+        "concurrency": concurrency,
+        "completed": len(latencies),
+        "errors": errors,
+        "throughput": len(latencies) / elapsed if elapsed else 0.0,
+        "p50": percentile(latencies, 50),
+        "p95": percentile(latencies, 95),
+        "p99": percentile(latencies, 99),
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="端到端吞吐量测试")
+    parser.add_argument("--jobs", type=int, default=40, help="每个并发级别的任务数")
+    parser.add_argument("--concurrency", default="1,4,16", help="并发级别，逗号分隔")
+    parser.add_argument("--task-duration", type=float, default=0.5, help="模拟任务耗时（秒）")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="返回 500 的请求比例")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="返回 429 的请求比例")
+    parser.add_argument("--payload-size", type=int, default=256 * 1024, help="图片大约字节数")
+    parser.add_argument("--poll-interval", type=float, default=0.1, help="轮询间隔（秒）")
+    parser.add_argument("--timeout", type=float, default=120, help="单个任务的截止时间（秒）")
+    args = parser.parse_args(argv)
+
+    save_path = tempfile.mkdtemp(prefix="liblibai-bench-")
+    server = StubLiblibAIServer(
+        keys={ACCESS_KEY: SECRET_KEY},
+        task_duration=args.task_duration,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        payload_size=args.payload_size,
+        seed=0,
+    ).start()
+    try:
+        print(f"任务耗时 {args.task_duration}s，图片约 {len(server.payload) / 1024:.0f} KB，每级 {args.jobs} 个任务")
+        print(f"{'并发':>6} {'完成':>6} {'失败':>6} {'吞吐(任务/s)':>14} {'p50(s)':>8} {'p95(s)':>8} {'p99(s)':>8}")
+        for level in [int(c) for c in args.concurrency.split(",") if c.strip()]:
+            result = run_level(server, level, args.jobs, args.poll_interval, args.timeout, os.path.join(save_path, str(level)))
+            print(
+                f"{result['concurrency']:>6} {result['completed']:>6} {result['errors']:>6} "
+                f"{result['throughput']:>14.2f} {result['p50']:>8.3f} {result['p95']:>8.3f} {result['p99']:>8.3f}"
+            )
+        print(f"服务器统计: {server.stats}")
+    finally:
+        server.stop()
+        shutil.rmtree(save_path, ignore_errors=True)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,171 @@
+"""
+客户端热点路径回归测试
+
+测量签名、文生图请求构建、图生图 base64 编码、模型列表筛选、JSON 响应解析和
+大配置合并的耗时，与 benchmarks/baselines.json 中的基准比较，超过阈值时以非零状态退出。
+
+耗时以同一进程内一段固定的纯 Python 校准代码为单位记录，基准可以在不同机器之间复用。
+全部在本地运行，不访问网络，几秒内完成
+
+运行: python benchmarks/bench_hotpaths.py
+更新基准: python benchmarks/bench_hotpaths.py --update
+"""
+import os
+import sys
+import json
+import atexit
+import random
+import shutil
+import timeit
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from scripts.lh_lib.api import LiblibAIAPI
+from scripts.lh_lib.auth import LiblibAIAuth
+from scripts.lh_lib.catalog import filter_models
+from scripts.lh_lib.settings import update_nested_dict
+
+BASELINES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines.json")
+
+# 默认允许比基准慢 50%
+DEFAULT_THRESHOLD = 1.5
+
+def calibrate():
+    """固定的纯 Python 负载，作为耗时单位"""
+    total = 0
+    data = {}
+    for i in range(20000):
+        data[i & 255] = total
+        total += i * 3 % 7
+    return total
+
+def make_api():
+    """创建请求不发送到网络的 API 实例，_request 直接返回请求数据"""
+    api = LiblibAIAPI(LiblibAIAuth("benchmark_access_key", "benchmark_secret_key_0123456789"))
+    api._request = lambda method, endpoint, params=None, json_data=None, files=None, auth=None: json_data
+    return api
+
+def make_models(count=5000):
+    """生成模拟的模型列表"""
+    rng = random.Random(0)
+    types = ["底模", "LoRA", "VAE", "ControlNet"]
+    words = ["anime", "photo", "realistic", "portrait", "landscape", "detail", "style", "fantasy"]
+    return [
+        {
+            "id": f"model_{i}",
+            "name": " ".join(rng.choice(words) for _ in range(3)).title(),
+            "type": types[i % len(types)],
+            "description": " ".join(rng.choice(words) for _ in range(12)),
+        }
+        for i in range(count)
+    ]
+
+def make_config(width=50, depth=3):
+    """生成多层嵌套的大配置"""
+    if depth == 0:
+        return {f"value_{i}": i for i in range(width)}
+    return {f"section_{i}": make_config(width // 2 or 1, depth - 1) for i in range(width)}
+
+def build_cases():
+    """
+    返回测试用例
+
+    Returns:
+        dict: 名称到 (函数, 每轮调用次数) 的映射
+    """
+    auth = LiblibAIAuth("benchmark_access_key", "benchmark_secret_key_0123456789")
+    api = make_api()
+    models = make_models()
+
+    tmpdir = tempfile.mkdtemp(prefix="liblibai-bench-")
+    atexit.register(shutil.rmtree, tmpdir, ignore_errors=True)
+    image_path = os.path.join(tmpdir, "input.png")
+    with open(image_path, "wb") as f:
+        f.write(random.Random(1).randbytes(512 * 1024))
+
+    import requests
+    response = requests.models.Response()
+    response._content = json.dumps({"models": models}).encode("utf-8")
+    response.encoding = "utf-8"
+
+    # 同一个更新重复合并结果不变，但每次都会完整遍历，不需要每轮复制配置
+    config = make_config()
+    update = make_config(width=20)
+
+    return {
+        "generate_signature": (lambda: auth.generate_signature({"task_id": "task_000001"}), 2000),
+        "text_to_image_payload": (lambda: api.text_to_image("model", "a cat, masterpiece", "blurry", 512, 768, steps=20, cfg_scale=7, sampler="euler_a", seed=1), 2000),
+        "image_to_image_base64": (lambda: api.image_to_image("model", "a cat", image_path, strength=0.6), 20),
+        "filter_models": (lambda: filter_models(models, "LoRA", "anime"), 20),
+        "parse_models_response": (lambda: response.json(), 5),
+        "update_nested_dict": (lambda: update_nested_dict(config, update), 5),
+    }
+
+def measure(func, number, repeat=5):
+    """返回每次调用的最短耗时（秒）"""
+    return min(timeit.repeat(func, number=number, repeat=repeat)) / number
+
+def run(cases):
+    """运行所有用例，返回以校准单位表示的耗时"""
+    # 先各运行一次，排除首次调用的缓存和导入开销
+    calibrate()
+    for func, _ in cases.values():
+        func()
+    unit = measure(calibrate, 5)
+    return unit, {name: measure(func, number) / unit for name, (func, number) in cases.items()}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="客户端热点路径回归测试")
+    parser.add_argument("--update", action="store_true", help="用本次结果更新基准")
+    parser.add_argument("--threshold", type=float, default=None, help="允许的最大倍数，默认使用基准文件中的值")
+    parser.add_argument("--only", default="", help="只运行指定的用例，逗号分隔")
+    args = parser.parse_args(argv)
+
+    cases = build_cases()
+    if args.only:
+        selected = {name.strip() for name in args.only.split(",")}
+        cases = {name: case for name, case in cases.items() if name in selected}
+
+    unit, results = run(cases)
+    if args.update:
+        # 更新基准时取三次运行的中位数
+        runs = [results] + [run(cases)[1] for _ in range(2)]
+        results = {name: sorted(r[name] for r in runs)[1] for name in results}
+    baselines = {}
+    if os.path.exists(BASELINES_PATH):
+        with open(BASELINES_PATH, "r", encoding="utf-8") as f:
+            baselines = json.load(f)
+    threshold = args.threshold or baselines.get("threshold", DEFAULT_THRESHOLD)
+    expected = baselines.get("cases", {})
+
+    print(f"校准单位: {unit * 1000:.3f} ms，阈值: {threshold:.2f}x")
+    print(f"{'用例':<24} {'耗时(us)':>12} {'单位':>10} {'基准':>10} {'倍数':>8}")
+    regressions = []
+    for name, value in results.items():
+        base = expected.get(name)
+        ratio = value / base if base else None
+        flag = ""
+        if ratio is not None and ratio > threshold:
+            regressions.append(name)
+            flag = "  <-- 变慢"
+        print(
+            f"{name:<24} {value * unit * 1e6:>12.1f} {value:>10.4f} "
+            f"{base if base is not None else float('nan'):>10.4f} {ratio if ratio is not None else float('nan'):>7.2f}x{flag}"
+        )
+
+    if args.update:
+        expected.update({name: round(value, 6) for name, value in results.items()})
+        with open(BASELINES_PATH, "w", encoding="utf-8") as f:
+            json.dump({"threshold": threshold, "cases": expected}, f, indent=2, ensure_ascii=False)
+            f.write("\n")
+        print(f"基准已更新: {BASELINES_PATH}")
+        return 0
+
+    if regressions:
+        print(f"以下用例超过阈值: {', '.join(regressions)}")
+        return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
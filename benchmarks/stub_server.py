@@ -0,0 +1,363 @@
+import io
+import sys
+import hmac
+import json
+import time
+import uuid
+import zlib
+import base64
+import random
+import struct
+import hashlib
+import argparse
+import threading
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qsl, quote
+
+# 模拟服务器的路径前缀，与正式接口一致
+API_PREFIX = "/api/v2/"
+
+# 模拟的模型列表
+STUB_MODELS = [
+    {"id": "stub-sd15", "name": "Stub SD 1.5", "type": "底模", "description": "模拟服务器的底模"},
+    {"id": "stub-sdxl", "name": "Stub SDXL", "type": "底模", "description": "模拟服务器的 SDXL 底模"},
+    {"id": "stub-lora", "name": "Stub LoRA", "type": "LoRA", "description": "模拟服务器的 LoRA"},
+]
+
+
+def expected_signature(secret_key, params):
+    """
+    按 LiblibAIAuth 的算法计算签名
+
+    Args:
+        secret_key (str): API 密钥
+        params (dict): 除 Signature 外的查询参数
+
+    Returns:
+        str: Base64 编码的 HMAC-SHA1 签名
+    """
+    pairs = sorted((k, quote(str(v), safe='')) for k, v in params.items() if k != "Signature")
+    string_to_sign = '&'.join(k + '=' + v for k, v in pairs)
+    digest = hmac.new(secret_key.encode('utf-8'), string_to_sign.encode('utf-8'), hashlib.sha1).digest()
+    return base64.b64encode(digest).decode('utf-8')
+
+
+def make_payload(size):
+    """
+    生成大约 size 字节的 PNG 图片
+
+    像素为随机噪声，压缩后的大小接近原始数据大小
+
+    Args:
+        size (int): 目标字节数
+
+    Returns:
+        bytes: PNG 图片内容
+    """
+    from PIL import Image
+
+    side = max(8, int((max(size, 192) / 3) ** 0.5))
+    image = Image.frombytes("RGB", (side, side), random.Random(side).randbytes(side * side * 3))
+    buffer = io.BytesIO()
+    image.save(buffer, "PNG", compress_level=1)
+    return buffer.getvalue()
+
+
+def tag_png(png, text):
+    """
+    在 PNG 的 IEND 前插入一个 tEXt 块
+
+    每个任务的图片内容因此不同，而不需要重新编码像素
+
+    Args:
+        png (bytes): PNG 图片内容
+        text (str): 写入的文本
+
+    Returns:
+        bytes: 新的 PNG 图片内容
+    """
+    data = b"stub\0" + text.encode("latin-1", errors="replace")
+    chunk = struct.pack(">I", len(data)) + b"tEXt" + data + struct.pack(">I", zlib.crc32(b"tEXt" + data) & 0xFFFFFFFF)
+    # IEND 块固定为最后 12 个字节
+    return png[:-12] + chunk + png[-12:]
+
+
+class StubLiblibAIServer:
+    """
+    本地 LiblibAI 模拟服务器
+
+    模拟文生图、图生图、任务结果、模型列表、工作流和取消任务接口，按 LiblibAIAuth 的
+    算法校验签名。任务耗时、错误率、429 比例和图片大小都可以配置，用于在不访问
+    真实服务的情况下测量提交、轮询、下载整条链路
+    """
+
+    def __init__(self, keys=None, host="127.0.0.1", port=0, task_duration=1.0, error_rate=0.0,
+                 rate_limit_rate=0.0, payload_size=64 * 1024, verify_signature=True, max_skew=300, seed=None):
+        """
+        初始化模拟服务器
+
+        Args:
+            keys (dict, optional): AccessKey 到 SecretKey 的映射. Defaults to {"stub_access_key": "stub_secret_key"}.
+            host (str, optional): 监听地址. Defaults to "127.0.0.1".
+            port (int, optional): 监听端口，0 表示随机端口. Defaults to 0.
+            task_duration (float | tuple, optional): 任务耗时（秒），或 (最小, 最大) 随机区间. Defaults to 1.0.
+            error_rate (float, optional): 返回 500 的请求比例. Defaults to 0.0.
+            rate_limit_rate (float, optional): 返回 429 的请求比例. Defaults to 0.0.
+            payload_size (int, optional): 生成图片的大约字节数. Defaults to 64 * 1024.
+            verify_signature (bool, optional): 是否校验签名. Defaults to True.
+            max_skew (float, optional): 允许的时间戳偏差（秒）. Defaults to 300.
+            seed (int, optional): 随机数种子，用于复现错误分布. Defaults to None.
+        """
+        self.keys = dict(keys or {"stub_access_key": "stub_secret_key"})
+        self.task_duration = task_duration
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.verify_signature = verify_signature
+        self.max_skew = max_skew
+        self.payload = make_payload(payload_size)
+        self.stats = {"requests": 0, "submitted": 0, "polled": 0, "downloaded": 0, "errors": 0, "rate_limited": 0, "rejected": 0}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._tasks = {}
+        self._nonces = set()
+        self._nonce_order = deque()
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        """服务器根地址"""
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def base_url(self):
+        """接口地址，用于 LiblibAIAPI.base_url"""
+        return self.url + API_PREFIX.rstrip("/")
+
+    def start(self):
+        """
+        在后台线程中启动服务器
+
+        Returns:
+            StubLiblibAIServer: 自身，便于链式调用
+        """
+        self._thread = threading.Thread(target=self._server.serve_forever, name="liblibai-stub", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """停止服务器"""
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+    def _count(self, name):
+        with self._lock:
+            self.stats[name] += 1
+
+    def _duration(self):
+        if isinstance(self.task_duration, (tuple, list)):
+            with self._lock:
+                return self._random.uniform(*self.task_duration)
+        return self.task_duration
+
+    def _inject_fault(self):
+        # 按配置的比例返回 429 或 500
+        with self._lock:
+            roll = self._random.random()
+        if roll < self.rate_limit_rate:
+            self._count("rate_limited")
+            return 429, {"code": "rate_limited", "message": "Too many requests"}
+        if roll < self.rate_limit_rate + self.error_rate:
+            self._count("errors")
+            return 500, {"code": "internal_error", "message": "Internal server error"}
+        return None
+
+    def _check_signature(self, params):
+        # 返回错误响应，签名有效时返回 None
+        required = ("AccessKey", "SignatureNonce", "Timestamp", "Signature")
+        if any(name not in params for name in required):
+            return 401, {"code": "missing_signature", "message": "Missing signature parameters"}
+        secret = self.keys.get(params["AccessKey"])
+        if secret is None:
+            return 401, {"code": "invalid_access_key", "message": "Invalid AccessKey"}
+        try:
+            skew = abs(time.time() - int(params["Timestamp"]))
+        except ValueError:
+            skew = float("inf")
+        if skew > self.max_skew:
+            return 401, {"code": "timestamp_expired", "message": "Timestamp expired"}
+        if not hmac.compare_digest(expected_signature(secret, params), params["Signature"]):
+            return 401, {"code": "invalid_signature", "message": "Signature mismatch"}
+        with self._lock:
+            if params["SignatureNonce"] in self._nonces:
+                return 401, {"code": "nonce_reused", "message": "SignatureNonce already used"}
+            self._nonces.add(params["SignatureNonce"])
+            self._nonce_order.append(params["SignatureNonce"])
+            # 只保留最近的 nonce，长时间压测时内存不会一直增长
+            if len(self._nonce_order) > 100000:
+                self._nonces.discard(self._nonce_order.popleft())
+        return None
+
+    def _submit(self, kind, body):
+        task_id = uuid.uuid4().hex
+        duration = self._duration()
+        with self._lock:
+            self._tasks[task_id] = {
+                "kind": kind, "created_at": time.time(), "duration": duration, "cancelled": False, "body": body
+            }
+        self._count("submitted")
+        return 200, {"task_id": task_id, "status": "pending"}
+
+    def _task_result(self, task_id):
+        with self._lock:
+            task = self._tasks.get(task_id)
+        if task is None:
+            return 404, {"code": "task_not_found", "message": f"Task {task_id} not found"}
+        self._count("polled")
+        if task["cancelled"]:
+            return 200, {"task_id": task_id, "status": "failed", "error": "cancelled"}
+        elapsed = time.time() - task["created_at"]
+        if elapsed < task["duration"]:
+            progress = elapsed / task["duration"] if task["duration"] else 1.0
+            status = "pending" if progress < 0.1 else "running"
+            return 200, {"task_id": task_id, "status": status, "progress": round(progress, 3)}
+        return 200, {
+            "task_id": task_id,
+            "status": "success",
+            "result": {"image_url": f"{self.url}/images/{task_id}.png"},
+        }
+
+    def _cancel(self, task_id):
+        with self._lock:
+            task = self._tasks.get(task_id)
+            if task is not None:
+                task["cancelled"] = True
+        return (200, {"task_id": task_id, "status": "cancelled"}) if task else (404, {"message": "Task not found"})
+
+    def handle(self, method, path, params, body):
+        """
+        处理一个接口请求
+
+        Args:
+            method (str): GET 或 POST
+            path (str): 去掉前缀后的端点，例如 text-to-image
+            params (dict): 查询参数
+            body (dict): JSON 请求体
+
+        Returns:
+            tuple: (HTTP 状态码, 响应数据)
+        """
+        self._count("requests")
+        if self.verify_signature:
+            rejected = self._check_signature(params)
+            if rejected:
+                self._count("rejected")
+                return rejected
+        fault = self._inject_fault()
+        if fault:
+            return fault
+
+        if method == "POST" and path in ("text-to-image", "image-to-image", "run-workflow", "star3-alpha"):
+            if path != "run-workflow" and not str(body.get("prompt") or "").strip():
+                return 400, {"code": "invalid_params", "message": "prompt is required"}
+            return self._submit(path, body)
+        if method == "GET" and path == "task-result":
+            return self._task_result(params.get("task_id"))
+        if method == "POST" and path == "cancel-task":
+            return self._cancel(body.get("task_id"))
+        if method == "GET" and path == "models":
+            model_type = params.get("type")
+            models = [m for m in STUB_MODELS if not model_type or m["type"] == model_type]
+            return 200, {"models": models}
+        if method == "GET" and path == "workflow-templates":
+            return 200, {"workflows": [{"id": "stub-workflow", "name": "Stub Workflow"}]}
+        return 404, {"code": "not_found", "message": f"Unknown endpoint {method} {path}"}
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                # 压测时不输出访问日志
+                pass
+
+            def _reply(self, status, data, content_type="application/json"):
+                payload = data if isinstance(data, bytes) else json.dumps(data).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(payload)))
+                if status == 429:
+                    self.send_header("Retry-After", "1")
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def _dispatch(self, method):
+                parts = urlsplit(self.path)
+                length = int(self.headers.get("Content-Length") or 0)
+                raw = self.rfile.read(length) if length else b""
+                if parts.path.startswith("/images/"):
+                    server._count("downloaded")
+                    task_id = parts.path[len("/images/"):].rsplit(".", 1)[0]
+                    return self._reply(200, tag_png(server.payload, task_id), "image/png")
+                if not parts.path.startswith(API_PREFIX):
+                    return self._reply(404, {"message": "Not found"})
+                try:
+                    body = json.loads(raw) if raw else {}
+                except ValueError:
+                    return self._reply(400, {"message": "Invalid JSON"})
+                status, data = server.handle(method, parts.path[len(API_PREFIX):], dict(parse_qsl(parts.query)), body)
+                self._reply(status, data)
+
+            def do_GET(self):
+                self._dispatch("GET")
+
+            def do_POST(self):
+                self._dispatch("POST")
+
+        return Handler
+
+
+def main(argv=None):
+    """命令行入口: python benchmarks/stub_server.py --port 8765"""
+    parser = argparse.ArgumentParser(description="本地 LiblibAI 模拟服务器")
+    parser.add_argument("--host", default="127.0.0.1", help="监听地址")
+    parser.add_argument("--port", type=int, default=8765, help="监听端口")
+    parser.add_argument("--access-key", default="stub_access_key", help="接受的 AccessKey")
+    parser.add_argument("--secret-key", default="stub_secret_key", help="对应的 SecretKey")
+    parser.add_argument("--task-duration", type=float, default=1.0, help="任务耗时（秒）")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="返回 500 的请求比例")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="返回 429 的请求比例")
+    parser.add_argument("--payload-size", type=int, default=64 * 1024, help="生成图片的大约字节数")
+    parser.add_argument("--no-verify", action="store_true", help="不校验签名")
+    args = parser.parse_args(argv)
+
+    server = StubLiblibAIServer(
+        keys={args.access_key: args.secret_key}, host=args.host, port=args.port,
+        task_duration=args.task_duration, error_rate=args.error_rate, rate_limit_rate=args.rate_limit_rate,
+        payload_size=args.payload_size, verify_signature=not args.no_verify
+    )
+    print(f"LiblibAI 模拟服务器已启动: {server.base_url}")
+    try:
+        server._server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server._server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -11,6 +11,9 @@ document.addEventListener("DOMContentLoaded", function() {
 function initLiblibAIHelper() {
     console.log("LiblibAI Helper 插件初始化中...");
     
+    // 所有 LiblibAI 按钮共用一个点击处理函数，在捕获阶段处理，避免触发卡片本身的点击
+    document.addEventListener('click', handleLiblibAIButtonClick, true);
+    
     // 监听 WebUI 中的元素变化
     observeElementChanges();
     
@@ -21,45 +24,130 @@ function initLiblibAIHelper() {
     enhancePromptTextarea();
 }
 
+// 模型卡片所在的额外网络容器
+const EXTRA_NETWORKS_SELECTOR = '#txt2img_extra_networks, #img2img_extra_networks, #txt2img_extra_tabs, #img2img_extra_tabs, .extra-networks';
+
+// 需要等待额外网络容器出现的标签页，都出现后不再监听整个页面
+const EXTRA_NETWORKS_TABS = ['txt2img', 'img2img'];
+
+// 已经监听的容器
+const observedContainers = new WeakSet();
+
+// 等待增强的卡片，在浏览器空闲时分批处理
+const pendingCardEnhancements = new Set();
+let cardEnhancementScheduled = false;
+
+// 空闲时执行，不支持 requestIdleCallback 的浏览器退回到下一帧
+const scheduleIdle = window.requestIdleCallback
+    ? callback => window.requestIdleCallback(callback, { timeout: 500 })
+    : callback => window.requestAnimationFrame(() => {
+        const end = performance.now() + 8;
+        callback({ timeRemaining: () => Math.max(0, end - performance.now()), didTimeout: false });
+    });
+
 // 监听元素变化
 function observeElementChanges() {
-    // 创建 MutationObserver 实例
-    const observer = new MutationObserver(function(mutations) {
-        mutations.forEach(function(mutation) {
-            // 检查是否有新的模型卡片添加
-            if (mutation.addedNodes && mutation.addedNodes.length > 0) {
-                for (let i = 0; i < mutation.addedNodes.length; i++) {
-                    const node = mutation.addedNodes[i];
-                    if (node.nodeType === Node.ELEMENT_NODE) {
-                        // 检查是否是模型卡片
-                        const modelCards = node.querySelectorAll('.model-card');
-                        if (modelCards.length > 0) {
-                            modelCards.forEach(card => {
-                                enhanceModelCard(card);
-                            });
-                        }
-                    }
-                }
+    // 额外网络容器出现后只监听容器内部；页面上只检查容器是否出现，每帧最多一次，
+    // 所有标签页的容器都出现后断开页面监听，之后页面上的变化不再触发回调
+    if (observeExtraNetworks()) {
+        return;
+    }
+    let checkScheduled = false;
+    const pageObserver = new MutationObserver(function() {
+        if (checkScheduled) {
+            return;
+        }
+        checkScheduled = true;
+        window.requestAnimationFrame(function() {
+            checkScheduled = false;
+            if (observeExtraNetworks()) {
+                pageObserver.disconnect();
             }
         });
     });
     
-    // 配置 observer
-    const config = { childList: true, subtree: true };
+    pageObserver.observe(document.body, { childList: true, subtree: true });
+}
+
+// 监听所有尚未监听的额外网络容器，返回是否所有标签页的容器都已出现
+function observeExtraNetworks() {
+    document.querySelectorAll(EXTRA_NETWORKS_SELECTOR).forEach(container => {
+        // 嵌套的容器由外层容器的监听覆盖
+        if (observedContainers.has(container) || container.parentElement?.closest(EXTRA_NETWORKS_SELECTOR)) {
+            return;
+        }
+        observedContainers.add(container);
+        
+        // 容器内新增的卡片加入队列，不在回调中直接修改 DOM
+        const observer = new MutationObserver(function(mutations) {
+            mutations.forEach(function(mutation) {
+                mutation.addedNodes.forEach(node => {
+                    if (node.nodeType !== Node.ELEMENT_NODE) {
+                        return;
+                    }
+                    if (node.classList.contains('model-card')) {
+                        queueCardEnhancement(node);
+                    } else if (node.firstElementChild) {
+                        node.querySelectorAll('.model-card').forEach(queueCardEnhancement);
+                    }
+                });
+            });
+        });
+        observer.observe(container, { childList: true, subtree: true });
+        
+        // 容器中已有的卡片
+        container.querySelectorAll('.model-card').forEach(queueCardEnhancement);
+    });
     
-    // 开始观察
-    observer.observe(document.body, config);
+    return EXTRA_NETWORKS_TABS.every(tab => document.querySelector(`#${tab}_extra_networks, #${tab}_extra_tabs`));
 }
 
 // 增强模型卡片
 function enhanceModelCards() {
-    // 查找所有现有的模型卡片
-    const modelCards = document.querySelectorAll('.model-card');
-    modelCards.forEach(card => {
-        enhanceModelCard(card);
+    // 查找额外网络容器中现有的模型卡片
+    document.querySelectorAll(EXTRA_NETWORKS_SELECTOR).forEach(container => {
+        container.querySelectorAll('.model-card').forEach(queueCardEnhancement);
     });
 }
 
+// 把卡片加入增强队列
+function queueCardEnhancement(card) {
+    if (card.dataset.liblibaiEnhanced === 'true') {
+        return;
+    }
+    pendingCardEnhancements.add(card);
+    if (!cardEnhancementScheduled) {
+        cardEnhancementScheduled = true;
+        scheduleIdle(processCardEnhancements);
+    }
+}
+
+// 在空闲时间内尽可能多地增强卡片，剩余的留到下一次空闲
+function processCardEnhancements(deadline) {
+    // 等待超时后强制执行时每次最多处理 200 张，避免长时间阻塞
+    let budget = deadline.didTimeout ? 200 : Infinity;
+    for (const card of pendingCardEnhancements) {
+        if (budget-- <= 0 || (!deadline.didTimeout && deadline.timeRemaining() <= 1)) {
+            break;
+        }
+        pendingCardEnhancements.delete(card);
+        if (card.isConnected) {
+            enhanceModelCard(card);
+        }
+    }
+    
+    if (pendingCardEnhancements.size > 0) {
+        scheduleIdle(processCardEnhancements);
+    } else {
+        cardEnhancementScheduled = false;
+    }
+}
+
+// 所有卡片共用的按钮模板，增强时直接复制
+const cardButtonTemplate = document.createElement('div');
+cardButtonTemplate.className = 'liblibai-buttons';
+cardButtonTemplate.innerHTML = '<button class="liblibai-button" type="button">使用 LiblibAI</button>';
+
 // 增强单个模型卡片
 function enhanceModelCard(card) {
     // 检查是否已经增强
@@ -70,42 +158,99 @@ function enhanceModelCard(card) {
     // 标记为已增强
     card.dataset.liblibaiEnhanced = 'true';
     
-    // 创建 LiblibAI 按钮
-    const buttonContainer = document.createElement('div');
-    buttonContainer.className = 'liblibai-buttons';
-    buttonContainer.style.display = 'flex';
-    buttonContainer.style.justifyContent = 'space-around';
-    buttonContainer.style.marginTop = '8px';
+    // 添加 "使用 LiblibAI" 按钮，样式见 style.css，点击由 handleLiblibAIButtonClick 统一处理
+    card.appendChild(cardButtonTemplate.cloneNode(true));
     
-    // 添加 "使用 LiblibAI" 按钮
-    const useLiblibAIButton = document.createElement('button');
-    useLiblibAIButton.textContent = '使用 LiblibAI';
-    useLiblibAIButton.className = 'liblibai-button';
-    useLiblibAIButton.style.padding = '4px 8px';
-    useLiblibAIButton.style.backgroundColor = '#4b6fff';
-    useLiblibAIButton.style.color = 'white';
-    useLiblibAIButton.style.border = 'none';
-    useLiblibAIButton.style.borderRadius = '4px';
-    useLiblibAIButton.style.cursor = 'pointer';
+    // 加入待查询队列，稍后与其他卡片一起查询 LiblibAI 信息
+    queueModelCardInfo(card);
+}
+
+// 统一处理 "使用 LiblibAI" 按钮的点击
+function handleLiblibAIButtonClick(event) {
+    const button = event.target.closest?.('.liblibai-button');
+    const card = button?.closest('.model-card');
+    if (!card) {
+        return;
+    }
+    event.preventDefault();
+    event.stopPropagation();
     
-    // 添加点击事件
-    useLiblibAIButton.addEventListener('click', function() {
-        // 获取模型名称
-        const modelName = card.querySelector('.model-name')?.textContent;
-        if (modelName) {
-            // 切换到 LiblibAI 选项卡
-            switchToLiblibAITab();
-            
-            // 搜索并选择模型
-            searchAndSelectModel(modelName);
-        }
-    });
+    // 获取模型名称，已匹配到 LiblibAI 模型时使用其名称搜索
+    const modelName = card.dataset.liblibaiRemoteName || card.querySelector('.model-name')?.textContent;
+    if (modelName) {
+        // 切换到 LiblibAI 选项卡
+        switchToLiblibAITab();
+        
+        // 搜索并选择模型
+        searchAndSelectModel(modelName);
+    }
+}
+
+// 等待查询 LiblibAI 信息的卡片，按模型名称分组
+const pendingModelCards = new Map();
+let modelCardInfoTimer = null;
+
+// 把卡片加入待查询队列
+function queueModelCardInfo(card) {
+    const modelName = card.querySelector('.model-name')?.textContent?.trim();
+    if (!modelName) {
+        return;
+    }
+    
+    if (!pendingModelCards.has(modelName)) {
+        pendingModelCards.set(modelName, []);
+    }
+    pendingModelCards.get(modelName).push(card);
     
-    // 添加按钮到容器
-    buttonContainer.appendChild(useLiblibAIButton);
+    // 短时间内加入的卡片合并为一次请求
+    if (modelCardInfoTimer === null) {
+        modelCardInfoTimer = setTimeout(fetchModelCardInfo, 100);
+    }
+}
+
+// 一次请求查询所有待查询卡片的 LiblibAI 信息
+function fetchModelCardInfo() {
+    modelCardInfoTimer = null;
+    const batch = new Map(pendingModelCards);
+    pendingModelCards.clear();
+    if (batch.size === 0) {
+        return;
+    }
     
-    // 添加按钮容器到卡片
-    card.appendChild(buttonContainer);
+    fetch('/liblibai/model-cards', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ names: Array.from(batch.keys()) })
+    })
+        .then(response => response.ok ? response.json() : null)
+        .then(data => {
+            if (!data || !data.models) {
+                return;
+            }
+            batch.forEach((cards, modelName) => {
+                const info = data.models[modelName];
+                if (info) {
+                    cards.forEach(card => applyModelCardInfo(card, info));
+                }
+            });
+        })
+        .catch(error => console.warn('获取 LiblibAI 模型信息失败:', error));
+}
+
+// 在卡片上标注 LiblibAI 信息
+function applyModelCardInfo(card, info) {
+    card.dataset.liblibaiMatch = info.match || 'none';
+    const button = card.querySelector('.liblibai-button');
+    if (info.remote_id) {
+        card.dataset.liblibaiRemoteId = info.remote_id;
+        card.dataset.liblibaiRemoteName = info.remote_name || '';
+        if (button) {
+            const matchText = info.match === 'hash' ? '哈希匹配' : '名称匹配';
+            button.title = `LiblibAI: ${info.remote_name || info.remote_id}（${info.type || '未知类型'}，${matchText}${info.presets ? '，已缓存预设' : ''}）`;
+        }
+    } else if (button) {
+        button.title = '未在 LiblibAI 中找到对应模型，将按名称搜索';
+    }
 }
 
 // 切换到 LiblibAI 选项卡
@@ -158,16 +303,6 @@ function enhancePromptTextarea() {
         const button = document.createElement('button');
         button.textContent = '发送到 LiblibAI';
         button.className = 'liblibai-prompt-button';
-        button.style.position = 'absolute';
-        button.style.right = '10px';
-        button.style.top = '10px';
-        button.style.padding = '4px 8px';
-        button.style.backgroundColor = '#4b6fff';
-        button.style.color = 'white';
-        button.style.border = 'none';
-        button.style.borderRadius = '4px';
-        button.style.cursor = 'pointer';
-        button.style.zIndex = '100';
         
         // 添加点击事件
         button.addEventListener('click', function() {
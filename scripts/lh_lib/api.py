@@ -1,11 +1,54 @@
 import os
+import json
+import time
 import base64
-import requests
-from urllib.parse import urljoin
+import threading
+import datetime
+import contextlib
+from email.utils import parsedate_to_datetime
+
+from scripts.lh_lib.tracing import Tracer
+
+# 签名时间戳过期时 API 返回的状态码、错误码和错误信息，只有这种错误会重新签名重试
+TIMESTAMP_ERROR_STATUS = (401, 403)
+TIMESTAMP_ERROR_CODES = ("timestamp_expired", "signature_expired")
+TIMESTAMP_ERROR_MESSAGES = ("timestamp expired", "signature expired", "时间戳过期", "签名过期")
 
 class APIError(Exception):
     """API 请求错误"""
-    pass
+    
+    def __init__(self, message, status_code=None, code=None):
+        """
+        初始化 API 错误
+        
+        Args:
+            message (str): 错误信息
+            status_code (int, optional): HTTP 状态码. Defaults to None.
+            code (str, optional): API 返回的错误码. Defaults to None.
+        """
+        super().__init__(message)
+        self.status_code = status_code
+        self.code = code
+
+def is_connect_error(error):
+    """
+    判断请求是否在建立连接阶段失败，即请求还没有发送到服务器
+
+    Args:
+        error (requests.exceptions.ConnectionError): 请求异常
+
+    Returns:
+        bool: 是否为代理错误、连接超时或无法建立连接
+    """
+    import requests
+    from urllib3.exceptions import NewConnectionError
+    
+    if isinstance(error, (requests.exceptions.ProxyError, requests.exceptions.ConnectTimeout)):
+        return True
+    # requests 把 urllib3 的 MaxRetryError 包在 ConnectionError 中，reason 是实际的错误
+    reason = error.args[0] if error.args else None
+    reason = getattr(reason, "reason", reason)
+    return isinstance(reason, NewConnectionError)
 
 class LiblibAIAPI:
     """
@@ -23,8 +66,15 @@ class LiblibAIAPI:
         """
         self.auth = auth
         self.base_url = "https://api.liblibai.com/api/v2"
-        self.session = requests.Session()
+        self._session = None
         self.proxy = None
+        self.proxy_pool = None
+        self.key_pool = None
+        self.timestamp_retries = 0
+        self.validator = None
+        self.metrics = None
+        self.tracer = Tracer()
+        self._local = threading.local()
         
     def set_proxy(self, proxy):
         """
@@ -34,15 +84,141 @@ class LiblibAIAPI:
             proxy (str): 代理地址，例如 http://127.0.0.1:7890
         """
         self.proxy = proxy
-        if proxy:
-            self.session.proxies = {
-                "http": proxy,
-                "https": proxy
+        if self._session is not None:
+            self._session.proxies = self._session_proxies()
+            
+    def _session_proxies(self):
+        if self.proxy:
+            return {
+                "http": self.proxy,
+                "https": self.proxy
             }
-        else:
-            self.session.proxies = {}
+        return {}
+        
+    @property
+    def session(self):
+        """
+        HTTP 会话，第一次发送请求时才导入 requests 并创建，避免拖慢 WebUI 启动
+        
+        Returns:
+            requests.Session: HTTP 会话
+        """
+        if self._session is None:
+            import requests
+            self._session = requests.Session()
+            self._session.proxies = self._session_proxies()
+        return self._session
+        
+    @session.setter
+    def session(self, value):
+        self._session = value
+            
+    def set_proxy_pool(self, proxy_pool):
+        """
+        设置代理池
+        
+        Args:
+            proxy_pool (ProxyPool): 代理池，为 None 时使用 set_proxy 设置的单个代理
+        """
+        self.proxy_pool = proxy_pool if proxy_pool else None
+        
+    def set_key_pool(self, key_pool):
+        """
+        设置多账号密钥池
+        
+        Args:
+            key_pool (KeyPool): 密钥池，为 None 时只使用 auth 中的单个密钥
+        """
+        self.key_pool = key_pool
+        # 所有密钥共用同一个服务器时钟偏移
+        clock = getattr(self.auth, "clock", None)
+        if key_pool and clock is not None:
+            for key in key_pool.keys:
+                key.auth.clock = clock
+        
+    def set_validator(self, validator):
+        """
+        设置提交前的参数校验器
+        
+        Args:
+            validator (RequestValidator): 校验器，为 None 时不校验
+        """
+        self.validator = validator
+        
+    def set_metrics(self, metrics):
+        """
+        设置请求指标
+        
+        Args:
+            metrics (MetricsRegistry): 指标注册表，为 None 时不记录
+        """
+        self.metrics = metrics
+        
+    def add_trace_hook(self, hook):
+        """
+        注册请求追踪钩子
+        
+        每个请求记录 request 区间，其下包含 sign、send（及由响应得到的 ttfb、body）、parse，
+        提交任务时还有等待密钥的 queue_wait
+        
+        Args:
+            hook (callable): 接收 Span 的函数，例如 JsonlExporter 实例
+        """
+        self.tracer.add_hook(hook)
+        
+    def remove_trace_hook(self, hook):
+        """
+        移除请求追踪钩子
+        
+        Args:
+            hook (callable): add_trace_hook 注册的钩子
+        """
+        self.tracer.remove_hook(hook)
+        
+    def trace(self, trace_id=None):
+        """
+        在当前线程内设置追踪 ID，范围内的请求都归入同一个追踪
+        
+        Args:
+            trace_id (str, optional): 追踪 ID，为 None 时生成新的. Defaults to None.
+            
+        Returns:
+            contextmanager: 进入时返回追踪 ID
+        """
+        return self.tracer.trace(trace_id)
+        
+    def _validate(self, json_data):
+        # 参数不合法时在本地抛出 ValidationError，不发送请求
+        if self.validator is not None:
+            self.validator.check(json_data)
+            
+    @contextlib.contextmanager
+    def deadline(self, deadline):
+        """
+        在当前线程内限制请求的截止时间
+        
+        范围内每个 HTTP 请求的超时都不超过剩余时间，已经过了截止时间的请求直接失败
+        
+        Args:
+            deadline (float): 截止时间（time.time() 时间戳），None 表示不限
+        """
+        previous = getattr(self._local, "deadline", None)
+        self._local.deadline = deadline
+        try:
+            yield
+        finally:
+            self._local.deadline = previous
             
-    def _request(self, method, endpoint, params=None, json_data=None, files=None):
+    def _request_timeout(self, default=30):
+        deadline = getattr(self._local, "deadline", None)
+        if deadline is None:
+            return default
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            raise APIError("API 请求失败: 已超过任务截止时间")
+        return min(default, remaining)
+        
+    def _request(self, method, endpoint, params=None, json_data=None, files=None, auth=None):
         """
         发送 API 请求
         
@@ -52,6 +228,7 @@ class LiblibAIAPI:
             params (dict, optional): 查询参数. Defaults to None.
             json_data (dict, optional): JSON 数据. Defaults to None.
             files (dict, optional): 文件数据. Defaults to None.
+            auth (LiblibAIAuth, optional): 本次请求使用的密钥，默认使用 self.auth. Defaults to None.
             
         Returns:
             dict: API 响应
@@ -59,25 +236,247 @@ class LiblibAIAPI:
         Raises:
             APIError: 如果 API 请求失败
         """
-        url = urljoin(self.base_url, endpoint)
+        import requests
         
-        # 生成签名参数
-        auth_params = self.auth.generate_signature(params)
+        # base_url 以 /v2 结尾，urljoin 会把最后一段路径替换掉，这里直接拼接
+        url = self.base_url.rstrip('/') + '/' + endpoint.lstrip('/')
+        metrics = self.metrics
+        if metrics is not None:
+            metrics.begin(endpoint)
+            self._local.endpoint = endpoint
+        started = time.perf_counter()
+        status = "error"
+        response = None
         
         # 发送请求
+        with self.tracer.span("request", endpoint=endpoint, method=method.upper()) as request_span:
+            try:
+                for attempt in range(2):
+                    if self.proxy_pool:
+                        response = self._send_via_proxy_pool(method, url, params, json_data, files, auth)
+                    else:
+                        response = self._send(method, url, params, json_data, files, auth)
+                    status = response.status_code
+                    corrected = self._sync_clock(response, auth)
+                
+                    try:
+                        response.raise_for_status()
+                    except requests.exceptions.HTTPError:
+                        # 签名因时间戳被拒绝时，按服务器时间校准后重新签名重试一次
+                        if attempt == 0 and self._is_timestamp_error(response):
+                            if not corrected:
+                                self._sync_clock(response, auth, force=True)
+                            self.timestamp_retries += 1
+                            if metrics is not None:
+                                metrics.retry(endpoint, "timestamp")
+                            continue
+                        raise
+                    with self.tracer.span("parse"):
+                        return response.json()
+            except requests.exceptions.RequestException as e:
+                # 处理请求异常
+                status_code = e.response.status_code if e.response is not None else None
+                if status_code is None:
+                    status = "timeout" if isinstance(e, requests.exceptions.Timeout) else "connection_error"
+                raise APIError(f"API 请求失败: {str(e)}", status_code=status_code)
+            finally:
+                if request_span is not None:
+                    request_span.attrs["status"] = status
+                if metrics is not None:
+                    self._local.endpoint = None
+                    bytes_out, bytes_in = self._body_sizes(response)
+                    metrics.end(endpoint, method, status, time.perf_counter() - started, bytes_out, bytes_in)
+                
+    def _body_sizes(self, response):
+        # 返回最后一次请求的请求体和响应体字节数，无法获取时为 0
+        if response is None:
+            return 0, 0
+        body = getattr(getattr(response, "request", None), "body", None)
+        content = getattr(response, "content", None)
+        bytes_out = len(body) if isinstance(body, (bytes, str)) else 0
+        bytes_in = len(content) if isinstance(content, bytes) else 0
+        return bytes_out, bytes_in
+            
+    def _sync_clock(self, response, auth=None, force=False):
+        """
+        根据响应的 Date 头校准签名时钟
+        
+        Args:
+            response (requests.Response): HTTP 响应
+            auth (LiblibAIAuth, optional): 本次请求使用的密钥. Defaults to None.
+            force (bool, optional): 是否强制采用本次采样. Defaults to False.
+            
+        Returns:
+            bool: 偏移是否被更新
+        """
+        clock = getattr(auth or self.auth, "clock", None)
+        headers = getattr(response, "headers", None)
+        date = headers.get("Date") if headers is not None else None
+        if clock is None or not isinstance(date, str):
+            return False
+        try:
+            server_time = parsedate_to_datetime(date).timestamp()
+        except (TypeError, ValueError):
+            return False
+        return clock.observe(server_time, force=force)
+        
+    def _is_timestamp_error(self, response):
+        """
+        判断请求是否因签名时间戳过期被拒绝
+        
+        只认 401/403 且带有签名过期错误码或错误信息的响应；其他错误即使内容中
+        提到时间戳也不重试，避免服务器已接受的提交请求被重复发送
+        
+        Args:
+            response (requests.Response): HTTP 响应
+            
+        Returns:
+            bool: 是否为时间戳错误
+        """
+        if getattr(response, "status_code", None) not in TIMESTAMP_ERROR_STATUS:
+            return False
+        try:
+            text = response.text
+        except Exception:
+            return False
+        if not isinstance(text, str):
+            return False
         try:
+            body = json.loads(text)
+        except ValueError:
+            body = None
+        if isinstance(body, dict):
+            if str(body.get("code", "")).lower() in TIMESTAMP_ERROR_CODES:
+                return True
+            text = " ".join(str(body.get(key, "")) for key in ("message", "msg", "error"))
+        text = text.lower()
+        return any(message in text for message in TIMESTAMP_ERROR_MESSAGES)
+        
+    def get_clock_stats(self):
+        """
+        返回签名时钟偏移统计
+        
+        Returns:
+            dict: 偏移、采样次数、校准次数和时间戳重试次数
+        """
+        clock = getattr(self.auth, "clock", None)
+        stats = clock.stats() if clock is not None else {}
+        stats["timestamp_retries"] = self.timestamp_retries
+        return stats
+        
+    def _send(self, method, url, params=None, json_data=None, files=None, auth=None, proxies=None):
+        """
+        签名并发送一次 HTTP 请求
+        
+        Args:
+            method (str): 请求方法，'get' 或 'post'
+            url (str): 完整请求地址
+            params (dict, optional): 查询参数. Defaults to None.
+            json_data (dict, optional): JSON 数据. Defaults to None.
+            files (dict, optional): 文件数据. Defaults to None.
+            auth (LiblibAIAuth, optional): 本次请求使用的密钥. Defaults to None.
+            proxies (dict, optional): 本次请求使用的代理. Defaults to None.
+            
+        Returns:
+            requests.Response: HTTP 响应
+        """
+        # 生成签名参数
+        with self.tracer.span("sign"):
+            auth_params = (auth or self.auth).generate_signature(params)
+        
+        kwargs = {"params": auth_params, "timeout": self._request_timeout()}
+        if proxies is not None:
+            kwargs["proxies"] = proxies
+            
+        with self.tracer.span("send", proxied=proxies is not None) as send_span:
             if method.lower() == 'get':
-                response = self.session.get(url, params=auth_params, timeout=30)
+                response = self.session.get(url, **kwargs)
             elif method.lower() == 'post':
-                response = self.session.post(url, params=auth_params, json=json_data, files=files, timeout=30)
+                response = self.session.post(url, json=json_data, files=files, **kwargs)
             else:
                 raise ValueError(f"不支持的请求方法: {method}")
-                
-            response.raise_for_status()
-            return response.json()
-        except requests.exceptions.RequestException as e:
-            # 处理请求异常
-            raise APIError(f"API 请求失败: {str(e)}")
+            if send_span is not None:
+                self._record_response_phases(send_span, response)
+        return response
+        
+    def _record_response_phases(self, send_span, response):
+        # requests 不单独暴露连接和发送阶段，用 elapsed（发出请求到解析完响应头）拆出首字节时间，
+        # 剩余部分为读取响应体的时间
+        elapsed = getattr(response, "elapsed", None)
+        if not isinstance(elapsed, datetime.timedelta):
+            return
+        ttfb_end = send_span.start + elapsed.total_seconds()
+        send_span.attrs["status"] = getattr(response, "status_code", None)
+        self.tracer.record("ttfb", send_span.start, ttfb_end)
+        self.tracer.record("body", ttfb_end, time.time())
+            
+    def _send_via_proxy_pool(self, method, url, params=None, json_data=None, files=None, auth=None):
+        """
+        通过代理池发送请求，代理连接失败时换下一个代理重试
+        
+        只有连接阶段的错误（代理错误、连接超时、无法建立连接）才会换代理重试；
+        其他连接错误（例如请求发出后连接被中断）可能已经提交了任务，只有 GET
+        请求会重试，避免重复提交付费任务
+        
+        Returns:
+            requests.Response: HTTP 响应
+        """
+        import requests
+        
+        attempts = len(self.proxy_pool)
+        tried = []
+        for attempt in range(attempts):
+            proxy = self.proxy_pool.choose(exclude=tried)
+            tried.append(proxy)
+            start = time.time()
+            try:
+                response = self._send(method, url, params, json_data, files, auth, proxy.as_requests_proxies())
+            except requests.exceptions.ConnectionError as e:
+                self.proxy_pool.report_failure(proxy, e)
+                if attempt == attempts - 1 or not (is_connect_error(e) or method.lower() == "get"):
+                    raise
+                if self.metrics is not None:
+                    self.metrics.retry(getattr(self._local, "endpoint", None) or "unknown", "proxy")
+                continue
+            self.proxy_pool.report_success(proxy, time.time() - start)
+            return response
+            
+    def _submit(self, endpoint, json_data):
+        """
+        提交生成任务
+        
+        配置了密钥池时按剩余额度和健康状态选择密钥，密钥出现认证或额度错误时
+        隔离该密钥并换下一个重试，成功后把任务固定到提交它的密钥上
+        
+        Args:
+            endpoint (str): API 端点
+            json_data (dict): JSON 数据
+            
+        Returns:
+            dict: API 响应
+            
+        Raises:
+            APIError: 如果 API 请求失败或没有可用密钥
+        """
+        if not self.key_pool:
+            return self._request('post', endpoint, json_data=json_data)
+            
+        while True:
+            with self.tracer.span("queue_wait", endpoint=endpoint):
+                key = self.key_pool.acquire()
+            try:
+                response = self._request('post', endpoint, json_data=json_data, auth=key.auth)
+            except APIError as e:
+                if self.key_pool.report_error(key, e):
+                    if self.metrics is not None:
+                        self.metrics.retry(endpoint, "key")
+                    continue
+                raise
+            self.key_pool.report_success(key)
+            task_id = response.get("task_id") if isinstance(response, dict) else None
+            if task_id:
+                self.key_pool.pin(task_id, key)
+            return response
             
     def text_to_image(self, model_id, prompt, negative_prompt="", width=512, height=512, **kwargs):
         """
@@ -97,6 +496,9 @@ class LiblibAIAPI:
                 
         Returns:
             dict: API 响应
+            
+        Raises:
+            ValidationError: 如果设置了校验器且参数不合法
         """
         endpoint = "text-to-image"
         json_data = {
@@ -107,7 +509,8 @@ class LiblibAIAPI:
             "height": height,
             **kwargs
         }
-        return self._request('post', endpoint, json_data=json_data)
+        self._validate(json_data)
+        return self._submit(endpoint, json_data)
         
     def image_to_image(self, model_id, prompt, image, negative_prompt="", **kwargs):
         """
@@ -146,7 +549,8 @@ class LiblibAIAPI:
             "image": image_b64,
             **kwargs
         }
-        return self._request('post', endpoint, json_data=json_data)
+        self._validate(json_data)
+        return self._submit(endpoint, json_data)
         
     def get_task_result(self, task_id):
         """
@@ -160,8 +564,32 @@ class LiblibAIAPI:
         """
         endpoint = "task-result"
         params = {"task_id": task_id}
+        if self.key_pool:
+            # 任务只能用提交它的密钥查询
+            key = self.key_pool.for_task(task_id)
+            if key:
+                return self._request('get', endpoint, params=params, auth=key.auth)
         return self._request('get', endpoint, params=params)
         
+    def cancel_task(self, task_id):
+        """
+        取消任务
+        
+        Args:
+            task_id (str): 任务 ID
+            
+        Returns:
+            dict: API 响应
+        """
+        endpoint = "cancel-task"
+        json_data = {"task_id": task_id}
+        if self.key_pool:
+            # 任务只能用提交它的密钥取消
+            key = self.key_pool.for_task(task_id)
+            if key:
+                return self._request('post', endpoint, json_data=json_data, auth=key.auth)
+        return self._request('post', endpoint, json_data=json_data)
+        
     def get_models(self, model_type=None):
         """
         获取模型列表
@@ -206,7 +634,7 @@ class LiblibAIAPI:
         }
         if params:
             json_data["params"] = params
-        return self._request('post', endpoint, json_data=json_data)
+        return self._submit(endpoint, json_data)
         
     def get_model_presets(self, model_id):
         """
@@ -245,4 +673,5 @@ class LiblibAIAPI:
             "negative_prompt": negative_prompt,
             **kwargs
         }
-        return self._request('post', endpoint, json_data=json_data)
\ No newline at end of file
+        self._validate(json_data)
+        return self._submit(endpoint, json_data)
\ No newline at end of file
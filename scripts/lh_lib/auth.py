@@ -1,12 +1,108 @@
 import os
 import time
-import uuid
 import hmac
 import hashlib
 import base64
-import json
+import itertools
+from functools import lru_cache
 from urllib.parse import quote
 
+from scripts.lh_lib.settings import get_store
+
+# 签名时固定加入的参数名
+STATIC_SIGN_KEYS = frozenset(('AccessKey', 'SignatureNonce', 'Timestamp'))
+
+@lru_cache(maxsize=4096)
+def _quote_cached(value):
+    return quote(value, safe='')
+
+def quote_value(value):
+    """
+    按签名规则对参数值进行 URL 编码
+    
+    任务 ID、模型 ID 等短值会被反复签名，编码结果会被缓存
+    
+    Args:
+        value (any): 参数值
+        
+    Returns:
+        str: 编码后的字符串
+    """
+    value = value if isinstance(value, str) else str(value)
+    if len(value) <= 256:
+        return _quote_cached(value)
+    return quote(value, safe='')
+
+class ClockSync:
+    """
+    服务器时钟偏移校准
+    
+    根据响应的 Date 头估算本机与服务器的时间差，签名时间戳加上该偏移，
+    避免本机时钟漂移导致签名被拒绝
+    """
+    
+    def __init__(self, tolerance=2.0):
+        """
+        初始化时钟校准
+        
+        Args:
+            tolerance (float, optional): 偏移变化超过该值（秒）才更新，Date 头只精确到秒. Defaults to 2.0.
+        """
+        self.tolerance = tolerance
+        self.offset = 0.0
+        self.samples = 0
+        self.corrections = 0
+        self.last_sample = None
+        self.max_abs_offset = 0.0
+        
+    def now(self):
+        """
+        返回按服务器时间校准后的当前时间
+        
+        Returns:
+            float: 时间戳（秒）
+        """
+        return time.time() + self.offset
+        
+    def observe(self, server_time, local_time=None, force=False):
+        """
+        记录一次服务器时间采样
+        
+        Args:
+            server_time (float): 服务器时间戳（秒，Date 头精度）
+            local_time (float, optional): 收到响应时的本机时间. Defaults to None.
+            force (bool, optional): 签名因时间戳被拒绝时强制采用该采样. Defaults to False.
+            
+        Returns:
+            bool: 偏移是否被更新
+        """
+        local_time = time.time() if local_time is None else local_time
+        # Date 头截断到秒，取区间中点
+        sample = server_time + 0.5 - local_time
+        self.samples += 1
+        self.last_sample = sample
+        if not force and abs(sample - self.offset) <= self.tolerance:
+            return False
+        self.offset = sample
+        self.corrections += 1
+        self.max_abs_offset = max(self.max_abs_offset, abs(sample))
+        return True
+        
+    def stats(self):
+        """
+        返回时钟偏移统计
+        
+        Returns:
+            dict: 统计信息
+        """
+        return {
+            "offset": round(self.offset, 3),
+            "last_sample": None if self.last_sample is None else round(self.last_sample, 3),
+            "max_abs_offset": round(self.max_abs_offset, 3),
+            "samples": self.samples,
+            "corrections": self.corrections,
+        }
+
 class LiblibAIAuth:
     """
     liblibAI 认证管理模块
@@ -22,6 +118,17 @@ class LiblibAIAuth:
             access_key (str, optional): API 访问密钥. Defaults to None.
             secret_key (str, optional): API 密钥. Defaults to None.
         """
+        self._access_key = None
+        self._secret_key = None
+        self.clock = ClockSync()
+        self._quoted_access_key = None
+        self._hmac_base = None
+        
+        # 随机前缀加递增计数器生成 nonce，保证唯一且比 uuid4 便宜
+        prefix = os.urandom(8).hex()
+        self._nonce_prefix = f"{prefix[:8]}-{prefix[8:12]}-{prefix[12:16]}-"
+        self._nonce_counter = itertools.count(int.from_bytes(os.urandom(4), 'big'))
+        
         self.access_key = access_key
         self.secret_key = secret_key
         
@@ -29,23 +136,43 @@ class LiblibAIAuth:
         if not (self.access_key and self.secret_key):
             self._load_keys()
     
+    @property
+    def access_key(self):
+        return self._access_key
+        
+    @access_key.setter
+    def access_key(self, value):
+        self._access_key = value
+        self._quoted_access_key = quote_value(value) if value else None
+        
+    @property
+    def secret_key(self):
+        return self._secret_key
+        
+    @secret_key.setter
+    def secret_key(self, value):
+        self._secret_key = value
+        # 预先计算 HMAC 密钥状态，每次签名只需复制
+        self._hmac_base = hmac.new(value.encode('utf-8'), digestmod=hashlib.sha1) if value else None
+        
+    def _next_nonce(self):
+        """
+        生成签名随机字符串
+        
+        Returns:
+            str: UUID 格式的唯一字符串
+        """
+        counter = '%016x' % (next(self._nonce_counter) & 0xFFFFFFFFFFFFFFFF)
+        return f"{self._nonce_prefix}{counter[:4]}-{counter[4:]}"
+        
     def _load_keys(self):
         """
         从配置文件加载 API 密钥
         """
-        config_file = os.path.join(
-            os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 
-            "liblibai_helper.json"
-        )
-        
-        if os.path.exists(config_file):
-            try:
-                with open(config_file, 'r', encoding='utf-8') as f:
-                    config = json.load(f)
-                    self.access_key = config.get('access_key', '')
-                    self.secret_key = config.get('secret_key', '')
-            except Exception as e:
-                print(f"加载 API 密钥失败: {str(e)}")
+        config = get_store().load()
+        if 'access_key' in config or 'secret_key' in config:
+            self.access_key = config.get('access_key', '')
+            self.secret_key = config.get('secret_key', '')
         
     def save_keys(self, access_key, secret_key):
         """
@@ -61,32 +188,11 @@ class LiblibAIAuth:
         self.access_key = access_key
         self.secret_key = secret_key
         
-        config_file = os.path.join(
-            os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 
-            "liblibai_helper.json"
-        )
-        
-        # 如果配置文件已存在，先读取现有配置
-        config = {}
-        if os.path.exists(config_file):
-            try:
-                with open(config_file, 'r', encoding='utf-8') as f:
-                    config = json.load(f)
-            except Exception:
-                pass
-        
-        # 更新密钥
-        config['access_key'] = access_key
-        config['secret_key'] = secret_key
-        
-        # 保存配置
-        try:
-            with open(config_file, 'w', encoding='utf-8') as f:
-                json.dump(config, f, ensure_ascii=False, indent=2)
-            return True
-        except Exception as e:
-            print(f"保存 API 密钥失败: {str(e)}")
-            return False
+        # 只更新密钥，保留配置文件中的其他设置
+        return get_store().update({
+            'access_key': access_key,
+            'secret_key': secret_key
+        }, immediate=True)
         
     def generate_signature(self, params=None):
         """
@@ -101,37 +207,76 @@ class LiblibAIAuth:
         Raises:
             ValueError: 如果未配置 API 密钥
         """
-        if not (self.access_key and self.secret_key):
+        if not (self._access_key and self._secret_key):
+            raise ValueError("未配置 API 密钥，请先设置 Access Key 和 Secret Key")
+        
+        # 生成时间戳（按服务器时钟校准）
+        timestamp = str(int(self.clock.now()))
+        return self._sign(timestamp, params)
+        
+    def sign_many(self, params_list):
+        """
+        批量生成签名，供批量轮询使用
+        
+        所有签名共享同一个时间戳，每个签名使用独立的随机字符串
+        
+        Args:
+            params_list (list): 请求参数字典列表，元素可以为 None
+            
+        Returns:
+            list: 与 params_list 一一对应的签名参数字典
+            
+        Raises:
+            ValueError: 如果未配置 API 密钥
+        """
+        if not (self._access_key and self._secret_key):
             raise ValueError("未配置 API 密钥，请先设置 Access Key 和 Secret Key")
         
-        # 生成时间戳和随机字符串
-        timestamp = str(int(time.time()))
-        nonce = str(uuid.uuid4())
+        timestamp = str(int(self.clock.now()))
+        return [self._sign(timestamp, params) for params in params_list]
+        
+    def _sign(self, timestamp, params):
+        """
+        使用给定时间戳生成签名
+        
+        Args:
+            timestamp (str): 时间戳
+            params (dict): 请求参数
+            
+        Returns:
+            dict: 包含签名的完整参数字典
+        """
+        nonce = self._next_nonce()
         
         # 构建参数字典
         sign_params = {
-            'AccessKey': self.access_key,
+            'AccessKey': self._access_key,
             'SignatureNonce': nonce,
             'Timestamp': timestamp
         }
         
-        # 合并传入的参数
-        if params:
+        if params and not STATIC_SIGN_KEYS.isdisjoint(params):
+            # 传入的参数覆盖了固定参数，按通用方式编码全部参数
             sign_params.update(params)
-            
-        # 按照参数名称排序
-        sorted_params = sorted(sign_params.items(), key=lambda x: x[0])
-        
-        # 构建规范化请求字符串
-        canonicalized_query_string = '&'.join(['%s=%s' % (k, quote(str(v), safe='')) for k, v in sorted_params])
+            pairs = [(k, quote_value(v)) for k, v in sign_params.items()]
+        else:
+            # nonce 和时间戳只包含无需编码的字符，AccessKey 的编码结果已缓存
+            pairs = [
+                ('AccessKey', self._quoted_access_key),
+                ('SignatureNonce', nonce),
+                ('Timestamp', timestamp)
+            ]
+            if params:
+                sign_params.update(params)
+                pairs.extend((k, quote_value(v)) for k, v in params.items())
+                
+        # 按照参数名称排序，构建规范化请求字符串
+        pairs.sort()
+        string_to_sign = '&'.join([k + '=' + v for k, v in pairs])
         
         # 计算签名
-        string_to_sign = canonicalized_query_string
-        hmac_algorithm = hmac.new(
-            self.secret_key.encode('utf-8'),
-            string_to_sign.encode('utf-8'),
-            hashlib.sha1
-        )
+        hmac_algorithm = self._hmac_base.copy()
+        hmac_algorithm.update(string_to_sign.encode('utf-8'))
         signature = base64.b64encode(hmac_algorithm.digest()).decode('utf-8')
         
         # 返回完整的参数字典，包含签名
@@ -0,0 +1,114 @@
+import time
+import threading
+
+
+class TTLCache:
+    """
+    带过期时间的内存缓存
+
+    同一个键同时只会有一个线程执行加载函数，其他线程等待并复用结果，
+    避免并发请求重复访问 API
+    """
+
+    def __init__(self, ttl=300):
+        """
+        初始化缓存
+
+        Args:
+            ttl (float, optional): 缓存有效期（秒）. Defaults to 300.
+        """
+        self.ttl = ttl
+        self._data = {}
+        self._loading = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        """
+        读取未过期的缓存值
+
+        Args:
+            key (hashable): 缓存键
+            default (any, optional): 未命中时的返回值. Defaults to None.
+
+        Returns:
+            any: 缓存值
+        """
+        with self._lock:
+            entry = self._data.get(key)
+            if entry and entry[1] > time.time():
+                return entry[0]
+        return default
+
+    def set(self, key, value, ttl=None):
+        """
+        写入缓存
+
+        Args:
+            key (hashable): 缓存键
+            value (any): 缓存值
+            ttl (float, optional): 本条目的有效期，默认使用实例的 ttl. Defaults to None.
+        """
+        expires = time.time() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (value, expires)
+
+    def invalidate(self, key=None):
+        """
+        删除缓存条目
+
+        Args:
+            key (hashable, optional): 缓存键，为 None 时清空全部. Defaults to None.
+        """
+        with self._lock:
+            if key is None:
+                self._data.clear()
+            else:
+                self._data.pop(key, None)
+
+    def get_or_load(self, key, loader, ttl=None):
+        """
+        读取缓存，未命中时调用 loader 加载
+
+        Args:
+            key (hashable): 缓存键
+            loader (callable): 无参加载函数
+            ttl (float, optional): 本条目的有效期. Defaults to None.
+
+        Returns:
+            any: 缓存值或加载结果
+
+        Raises:
+            Exception: loader 抛出的异常会传递给所有等待的线程
+        """
+        with self._lock:
+            entry = self._data.get(key)
+            if entry and entry[1] > time.time():
+                self.hits += 1
+                return entry[0]
+            pending = self._loading.get(key)
+            owner = pending is None
+            if owner:
+                pending = {"event": threading.Event(), "value": None, "error": None}
+                self._loading[key] = pending
+                self.misses += 1
+
+        if not owner:
+            pending["event"].wait()
+            if pending["error"] is not None:
+                raise pending["error"]
+            return pending["value"]
+
+        try:
+            value = loader()
+            pending["value"] = value
+            self.set(key, value, ttl)
+            return value
+        except Exception as e:
+            pending["error"] = e
+            raise
+        finally:
+            with self._lock:
+                self._loading.pop(key, None)
+            pending["event"].set()
@@ -0,0 +1,167 @@
+import os
+import time
+import threading
+import logging
+
+from scripts.lh_lib.settings import SettingsStore
+
+logger = logging.getLogger(__name__)
+
+
+def get_catalog_cache_path():
+    """
+    返回目录缓存文件路径
+
+    Returns:
+        str: 插件根目录下的 liblibai_catalog_cache.json
+    """
+    return os.path.join(
+        os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+        "liblibai_catalog_cache.json"
+    )
+
+
+def filter_models(models, model_type=None, query=""):
+    """
+    按类型和关键词筛选模型列表
+
+    Args:
+        models (list): 模型列表，每项包含 type、name、description
+        model_type (str, optional): 模型类型，为 None 时不按类型筛选. Defaults to None.
+        query (str, optional): 关键词，匹配名称或描述（不区分大小写）. Defaults to "".
+
+    Returns:
+        list: 符合条件的模型
+    """
+    if model_type:
+        models = [m for m in models if m.get("type") == model_type]
+    if query:
+        query = query.lower()
+        models = [
+            m for m in models
+            if query in m.get("name", "").lower() or query in m.get("description", "").lower()
+        ]
+    return models
+
+
+class CatalogCache:
+    """
+    模型、工作流等列表的本地缓存
+
+    WebUI 启动时直接用上一次缓存的列表渲染界面，真实数据在后台线程中拉取后
+    写回缓存，页面加载或手动刷新时读取最新的缓存
+    """
+
+    def __init__(self, path=None, debounce=1.0):
+        """
+        初始化目录缓存
+
+        Args:
+            path (str, optional): 缓存文件路径，默认使用 get_catalog_cache_path(). Defaults to None.
+            debounce (float, optional): 延迟写入的时间（秒）. Defaults to 1.0.
+        """
+        self.store = SettingsStore(path or get_catalog_cache_path(), debounce=debounce)
+        self.hydrated = threading.Event()
+        self.last_hydrate_seconds = None
+        self._thread = None
+
+    def get(self, name, default=None):
+        """
+        读取缓存的列表
+
+        Args:
+            name (str): 列表名称，例如 models、workflows
+            default (any, optional): 没有缓存时的返回值. Defaults to None.
+
+        Returns:
+            any: 缓存的数据
+        """
+        entry = self.store.get(name)
+        if not isinstance(entry, dict) or "items" not in entry:
+            return default
+        return entry["items"]
+
+    def age(self, name):
+        """
+        返回缓存的时长
+
+        Args:
+            name (str): 列表名称
+
+        Returns:
+            float: 距离上次更新的秒数，没有缓存时返回 None
+        """
+        entry = self.store.get(name)
+        if not isinstance(entry, dict) or "updated_at" not in entry:
+            return None
+        return time.time() - entry["updated_at"]
+
+    def set(self, name, items):
+        """
+        更新缓存的列表
+
+        Args:
+            name (str): 列表名称
+            items (any): 数据，需要能被 JSON 序列化
+        """
+        # 整项替换而不是合并，避免旧列表中的条目残留
+        self.store.load()[name] = {"items": items, "updated_at": time.time()}
+        self.store.save()
+
+    def refresh(self, name, loader):
+        """
+        拉取最新数据并写入缓存
+
+        Args:
+            name (str): 列表名称
+            loader (callable): 拉取数据的函数
+
+        Returns:
+            any: 最新数据，拉取失败时返回缓存的数据
+        """
+        try:
+            items = loader()
+        except Exception as e:
+            logger.error(f"刷新 {name} 失败: {str(e)}")
+            return self.get(name, [])
+        self.set(name, items)
+        return items
+
+    def hydrate(self, loaders, callback=None):
+        """
+        依次刷新所有列表
+
+        Args:
+            loaders (dict): 列表名称到拉取函数的映射
+            callback (callable, optional): 全部刷新完成后调用. Defaults to None.
+        """
+        start = time.perf_counter()
+        try:
+            for name, loader in loaders.items():
+                self.refresh(name, loader)
+            self.store.flush()
+        finally:
+            self.last_hydrate_seconds = time.perf_counter() - start
+            self.hydrated.set()
+        if callback:
+            callback()
+
+    def hydrate_async(self, loaders, callback=None):
+        """
+        在后台线程中刷新所有列表，已经在刷新时不重复启动
+
+        Args:
+            loaders (dict): 列表名称到拉取函数的映射
+            callback (callable, optional): 全部刷新完成后调用. Defaults to None.
+
+        Returns:
+            threading.Thread: 后台线程
+        """
+        if self._thread is not None and self._thread.is_alive():
+            return self._thread
+        self.hydrated.clear()
+        self._thread = threading.Thread(
+            target=self.hydrate, args=(loaders, callback), name="liblibai-catalog-hydrate", daemon=True
+        )
+        self._thread.start()
+        return self._thread
@@ -0,0 +1,637 @@
+import os
+import sys
+import json
+import stat
+import time
+import logging
+import socket
+import struct
+import argparse
+import tempfile
+import threading
+import socketserver
+from collections import OrderedDict, deque
+
+from scripts.lh_lib.api import APIError
+from scripts.lh_lib.cache import TTLCache
+from scripts.lh_lib.factory import build_api
+from scripts.lh_lib.settings import SettingsStore, get_store
+from scripts.lh_lib.validation import RequestValidator
+
+logger = logging.getLogger(__name__)
+
+# 客户端可以调用的 API 方法
+SUBMIT_METHODS = ("text_to_image", "image_to_image", "run_workflow", "star3_alpha")
+CATALOG_METHODS = ("get_models", "get_workflow_templates", "get_model_presets")
+DIRECT_METHODS = ("set_proxy", "get_clock_stats")
+ALLOWED_METHODS = SUBMIT_METHODS + CATALOG_METHODS + DIRECT_METHODS + ("get_task_result", "cancel_task", "stats")
+
+
+def default_socket_path():
+    """
+    返回默认的 Socket 路径，所在目录只有当前用户可以访问
+
+    优先使用 XDG_RUNTIME_DIR（通常为 /run/user/<uid>），否则使用临时目录下按用户区分的
+    子目录；目录不存在时以 0700 权限创建
+
+    Returns:
+        str: Socket 路径
+
+    Raises:
+        OSError: 如果目录属于其他用户（例如被其他用户抢先创建）
+    """
+    runtime_dir = os.environ.get("XDG_RUNTIME_DIR")
+    if runtime_dir and os.path.isdir(runtime_dir):
+        directory = os.path.join(runtime_dir, "liblibai_helper")
+    else:
+        directory = os.path.join(tempfile.gettempdir(), f"liblibai_helper-{os.getuid()}")
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    st = os.lstat(directory)
+    # 符号链接或其他用户的目录都不使用
+    if not stat.S_ISDIR(st.st_mode) or st.st_uid != os.getuid():
+        raise OSError(f"Socket 目录不属于当前用户: {directory}")
+    if st.st_mode & 0o077:
+        os.chmod(directory, 0o700)
+    return os.path.join(directory, "daemon.sock")
+
+
+def peer_uid(sock):
+    """
+    返回 Unix Socket 对端进程的用户 ID
+
+    Args:
+        sock (socket.socket): 已连接的 Socket
+
+    Returns:
+        int: 对端的 uid，系统不支持 SO_PEERCRED 时返回 None
+    """
+    if not hasattr(socket, "SO_PEERCRED"):
+        return None
+    creds = sock.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize("3i"))
+    return struct.unpack("3i", creds)[1]
+
+
+class FairRateLimiter:
+    """
+    令牌桶限流器，按客户端轮转分配令牌
+
+    多个 WebUI 进程共用同一份额度时，每个客户端轮流获得令牌，
+    单个进程的批量任务不会饿死其他进程
+    """
+
+    def __init__(self, rate=5.0, burst=10):
+        """
+        初始化限流器
+
+        Args:
+            rate (float, optional): 每秒补充的令牌数. Defaults to 5.0.
+            burst (int, optional): 令牌桶容量. Defaults to 10.
+        """
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self._updated = time.monotonic()
+        self._queues = OrderedDict()
+        self._cond = threading.Condition()
+        self.granted = {}
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def _head(self):
+        for waiters in self._queues.values():
+            return waiters[0]
+        return None
+
+    def acquire(self, client_id, timeout=None):
+        """
+        获取一个令牌
+
+        Args:
+            client_id (str): 客户端标识
+            timeout (float, optional): 最长等待时间（秒）. Defaults to None.
+
+        Returns:
+            bool: 是否在超时前获得令牌
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        ticket = object()
+        with self._cond:
+            self._queues.setdefault(client_id, deque()).append(ticket)
+            while True:
+                self._refill()
+                if self._head() is ticket and self.tokens >= 1:
+                    self.tokens -= 1
+                    self._pop(client_id)
+                    self.granted[client_id] = self.granted.get(client_id, 0) + 1
+                    self._cond.notify_all()
+                    return True
+
+                wait = (1 - self.tokens) / self.rate if self.tokens < 1 else 0.05
+                if deadline is not None:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._queues[client_id].remove(ticket)
+                        if not self._queues[client_id]:
+                            del self._queues[client_id]
+                        self._cond.notify_all()
+                        return False
+                    wait = min(wait, remaining)
+                self._cond.wait(max(wait, 0.001))
+
+    def _pop(self, client_id):
+        waiters = self._queues[client_id]
+        waiters.popleft()
+        if waiters:
+            # 轮到下一个客户端
+            self._queues.move_to_end(client_id)
+        else:
+            del self._queues[client_id]
+
+
+class TaskPoller:
+    """
+    后台任务轮询器
+
+    所有进程提交的任务由守护进程统一轮询，客户端只读取缓存的最新结果
+    """
+
+    def __init__(self, api, limiter, interval=2.0, retain=600):
+        """
+        初始化轮询器
+
+        Args:
+            api (LiblibAIAPI): API 通信模块实例
+            limiter (FairRateLimiter): 限流器
+            interval (float, optional): 轮询间隔（秒）. Defaults to 2.0.
+            retain (float, optional): 已完成任务结果的保留时间（秒）. Defaults to 600.
+        """
+        self.api = api
+        self.limiter = limiter
+        self.interval = interval
+        self.results = TTLCache(ttl=retain)
+        self._watched = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.polls = 0
+
+    def watch(self, task_id):
+        """添加需要轮询的任务"""
+        with self._lock:
+            self._watched.setdefault(task_id, 0.0)
+
+    def unwatch(self, task_id):
+        """停止轮询任务"""
+        with self._lock:
+            self._watched.pop(task_id, None)
+
+    def get(self, task_id):
+        """
+        读取任务结果
+
+        Args:
+            task_id (str): 任务 ID
+
+        Returns:
+            dict: 最新的任务结果
+        """
+        result = self.results.get(task_id)
+        if result is not None:
+            return result
+        # 未被轮询过的任务（例如守护进程重启前提交的）立即查询一次
+        self.watch(task_id)
+        return self._poll(task_id)
+
+    def _poll(self, task_id):
+        def load():
+            self.limiter.acquire("__poller__")
+            self.polls += 1
+            return self.api.get_task_result(task_id)
+
+        # 缓存时间短于轮询间隔，保证后台轮询每轮都会刷新；并发查询合并为一次请求
+        result = self.results.get_or_load(task_id, load, ttl=self.interval / 2)
+        if result.get("status") in ("success", "failed"):
+            self.results.set(task_id, result)
+            with self._lock:
+                self._watched.pop(task_id, None)
+        return result
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="liblibai-poller", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            with self._lock:
+                task_ids = list(self._watched)
+            for task_id in task_ids:
+                try:
+                    self._poll(task_id)
+                except Exception:
+                    # 单个任务失败不影响其他任务，下一轮重试
+                    pass
+
+
+class LiblibAIDaemon:
+    """
+    本机共享的 LiblibAI 守护进程
+
+    持有唯一的连接池、限流器、任务轮询器和目录缓存，通过 Unix Socket 为
+    同一节点上的多个 WebUI 进程提供服务。守护进程使用本用户的 API 密钥，Socket
+    文件权限为 0600，并拒绝其他用户进程的连接
+    """
+
+    def __init__(self, api, socket_path, rate=5.0, burst=10, catalog_ttl=300, poll_interval=2.0):
+        """
+        初始化守护进程
+
+        Args:
+            api (LiblibAIAPI): API 通信模块实例
+            socket_path (str): Unix Socket 路径
+            rate (float, optional): 每秒请求数上限. Defaults to 5.0.
+            burst (int, optional): 突发请求数上限. Defaults to 10.
+            catalog_ttl (float, optional): 模型和工作流目录缓存时间（秒）. Defaults to 300.
+            poll_interval (float, optional): 任务轮询间隔（秒）. Defaults to 2.0.
+        """
+        self.api = api
+        self.socket_path = socket_path
+        self.limiter = FairRateLimiter(rate, burst)
+        self.catalog = TTLCache(ttl=catalog_ttl)
+        self.poller = TaskPoller(api, self.limiter, interval=poll_interval)
+        self.requests = 0
+        self.allowed_uid = os.getuid()
+        self._server = None
+        self._thread = None
+        self._stop = threading.Event()
+        self._watcher = None
+
+    def dispatch(self, client_id, method, args=None, kwargs=None):
+        """
+        执行一次客户端调用
+
+        Args:
+            client_id (str): 客户端标识
+            method (str): 方法名
+            args (list, optional): 位置参数. Defaults to None.
+            kwargs (dict, optional): 关键字参数. Defaults to None.
+
+        Returns:
+            any: 调用结果
+
+        Raises:
+            APIError: 如果方法不存在或 API 调用失败
+        """
+        args = args or []
+        kwargs = kwargs or {}
+        if method not in ALLOWED_METHODS:
+            raise APIError(f"不支持的方法: {method}")
+        self.requests += 1
+
+        if method == "stats":
+            return self.stats()
+        if method in DIRECT_METHODS:
+            return getattr(self.api, method)(*args, **kwargs)
+        if method == "get_task_result":
+            return self.poller.get(*args, **kwargs)
+        if method == "cancel_task":
+            self.limiter.acquire(client_id)
+            response = self.api.cancel_task(*args, **kwargs)
+            self.poller.unwatch(*args, **kwargs)
+            return response
+        if method in CATALOG_METHODS:
+            key = (method, json.dumps([args, kwargs], sort_keys=True))
+
+            def load():
+                self.limiter.acquire(client_id)
+                return getattr(self.api, method)(*args, **kwargs)
+
+            return self.catalog.get_or_load(key, load)
+
+        self.limiter.acquire(client_id)
+        response = getattr(self.api, method)(*args, **kwargs)
+        task_id = response.get("task_id") if isinstance(response, dict) else None
+        if task_id:
+            self.poller.watch(task_id)
+        return response
+
+    def set_api(self, api):
+        """
+        替换 API 客户端，之后的调用和任务轮询都使用新的客户端
+
+        密钥可能已经变化，目录缓存随之清空
+
+        Args:
+            api (LiblibAIAPI): 新的 API 通信模块实例
+        """
+        self.api = api
+        self.poller.api = api
+        self.catalog.invalidate()
+
+    def watch_settings(self, store, build, interval=5.0):
+        """
+        在后台线程中检查配置文件，变化后重新创建 API 客户端
+
+        Args:
+            store (SettingsStore): 设置存储，文件未变化时 load() 返回同一个对象
+            build (callable): 参数为设置字典，返回新的 API 客户端
+            interval (float, optional): 检查间隔（秒）. Defaults to 5.0.
+        """
+        current = store.load()
+
+        def run():
+            nonlocal current
+            while not self._stop.wait(interval):
+                latest = store.load()
+                if latest is current:
+                    continue
+                current = latest
+                try:
+                    self.set_api(build(latest))
+                    logger.info("配置文件已变化，已重新创建 API 客户端")
+                except Exception as e:
+                    logger.error(f"重新创建 API 客户端失败: {str(e)}")
+
+        self._watcher = threading.Thread(target=run, name="liblibai-daemon-settings", daemon=True)
+        self._watcher.start()
+
+    def stats(self):
+        """
+        返回守护进程运行统计
+
+        Returns:
+            dict: 统计信息
+        """
+        return {
+            "requests": self.requests,
+            "polls": self.poller.polls,
+            "catalog_hits": self.catalog.hits,
+            "catalog_misses": self.catalog.misses,
+            "granted": dict(self.limiter.granted),
+        }
+
+    def start(self):
+        """
+        在后台线程中启动服务
+
+        Raises:
+            OSError: 如果该 Socket 上已有守护进程在运行
+        """
+        if os.path.exists(self.socket_path):
+            if DaemonClient(self.socket_path, timeout=1).is_available():
+                raise OSError(f"守护进程已在运行: {self.socket_path}")
+            # 上次异常退出留下的 Socket 文件
+            os.unlink(self.socket_path)
+        daemon = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                for line in self.rfile:
+                    if not line.strip():
+                        continue
+                    try:
+                        message = json.loads(line)
+                        result = daemon.dispatch(
+                            message.get("client", "anonymous"),
+                            message.get("method"),
+                            message.get("args"),
+                            message.get("kwargs"),
+                        )
+                        reply = {"id": message.get("id"), "ok": True, "result": result}
+                    except Exception as e:
+                        reply = {"ok": False, "error": str(e)}
+                    self.wfile.write(json.dumps(reply, ensure_ascii=False).encode("utf-8") + b"\n")
+                    self.wfile.flush()
+
+        class Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+            daemon_threads = True
+
+            def server_bind(self):
+                super().server_bind()
+                # 只有本用户可以连接，其他用户不能用这里的密钥提交任务
+                os.chmod(self.server_address, 0o600)
+
+            def verify_request(self, request, client_address):
+                uid = peer_uid(request)
+                if uid is not None and uid != daemon.allowed_uid:
+                    logger.warning(f"拒绝其他用户的连接: uid={uid}")
+                    return False
+                return True
+
+        self._server = Server(self.socket_path, Handler)
+        self.poller.start()
+        self._thread = threading.Thread(target=self._server.serve_forever, name="liblibai-daemon", daemon=True)
+        self._thread.start()
+
+    def serve_forever(self):
+        """在前台运行服务，直到进程被终止"""
+        self.start()
+        try:
+            self._thread.join()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.shutdown()
+
+    def shutdown(self):
+        """停止服务"""
+        self._stop.set()
+        if self._watcher:
+            self._watcher.join(timeout=5)
+            self._watcher = None
+        self.poller.stop()
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+
+
+class DaemonClient:
+    """
+    守护进程客户端
+
+    提供与 LiblibAIAPI 相同的调用接口，Gradio 回调可以直接替换使用。每个进行中的
+    调用独占一个连接，慢的提交或限流等待不会阻塞同一进程中的其他调用；调用结束后
+    连接放回空闲列表复用
+    """
+
+    def __init__(self, socket_path, client_id=None, timeout=60, max_idle=8):
+        """
+        初始化客户端
+
+        Args:
+            socket_path (str): Unix Socket 路径
+            client_id (str, optional): 客户端标识，默认使用进程 ID. Defaults to None.
+            timeout (float, optional): 调用超时时间（秒）. Defaults to 60.
+            max_idle (int, optional): 最多保留的空闲连接数. Defaults to 8.
+        """
+        self.socket_path = socket_path
+        self.client_id = client_id or f"webui-{os.getpid()}"
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self._idle = []
+        self._lock = threading.Lock()
+        self._counter = 0
+
+    def _connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        try:
+            sock.connect(self.socket_path)
+        except OSError:
+            sock.close()
+            raise
+        return sock, sock.makefile("rb")
+
+    @staticmethod
+    def _discard(conn):
+        if conn is None:
+            return
+        sock, file = conn
+        try:
+            file.close()
+        finally:
+            sock.close()
+
+    def _release(self, conn):
+        with self._lock:
+            if len(self._idle) < self.max_idle:
+                self._idle.append(conn)
+                return
+        self._discard(conn)
+
+    def close(self):
+        """关闭所有空闲连接"""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            self._discard(conn)
+
+    def is_available(self):
+        """
+        检查守护进程是否可连接
+
+        Returns:
+            bool: 是否可连接
+        """
+        try:
+            self.call("stats")
+            return True
+        except APIError:
+            return False
+
+    def call(self, method, *args, **kwargs):
+        """
+        调用守护进程上的方法
+
+        Args:
+            method (str): 方法名
+            *args: 位置参数
+            **kwargs: 关键字参数
+
+        Returns:
+            any: 调用结果
+
+        Raises:
+            APIError: 如果连接失败或远端返回错误
+        """
+        # 锁只保护请求编号和空闲连接列表，发送和等待响应都在锁外进行
+        with self._lock:
+            self._counter += 1
+            request_id = self._counter
+            conn = self._idle.pop() if self._idle else None
+        message = {
+            "id": request_id,
+            "client": self.client_id,
+            "method": method,
+            "args": list(args),
+            "kwargs": kwargs,
+        }
+        payload = json.dumps(message, ensure_ascii=False).encode("utf-8") + b"\n"
+        # 空闲连接可能已被守护进程重启断开，请求发出之前失败时新建连接重试一次
+        for attempt in range(2):
+            try:
+                if conn is None:
+                    conn = self._connect()
+                conn[0].sendall(payload)
+                break
+            except OSError as e:
+                self._discard(conn)
+                conn = None
+                if attempt == 1:
+                    raise APIError(f"连接守护进程失败: {str(e)}")
+                    
+        # 请求已经发出，守护进程可能已经提交了任务，等待响应失败时不再重发
+        try:
+            line = conn[1].readline()
+        except OSError as e:
+            self._discard(conn)
+            raise APIError(f"等待守护进程响应失败: {str(e)}")
+        if not line:
+            self._discard(conn)
+            raise APIError("守护进程关闭了连接")
+        self._release(conn)
+
+        reply = json.loads(line)
+        if not reply.get("ok"):
+            raise APIError(reply.get("error", "未知错误"))
+        return reply.get("result")
+
+    def __getattr__(self, name):
+        if name in ALLOWED_METHODS:
+            return lambda *args, **kwargs: self.call(name, *args, **kwargs)
+        raise AttributeError(name)
+
+
+def main(argv=None):
+    """命令行入口: python -m scripts.lh_lib.daemon --socket $XDG_RUNTIME_DIR/liblibai_helper/daemon.sock"""
+    parser = argparse.ArgumentParser(description="LiblibAI 本机共享守护进程")
+    parser.add_argument("--socket", default="", help="Unix Socket 路径，默认位于只有当前用户可以访问的目录")
+    parser.add_argument("--rate", type=float, default=5.0, help="每秒请求数上限")
+    parser.add_argument("--burst", type=int, default=10, help="突发请求数上限")
+    parser.add_argument("--config", default="", help="配置文件路径，默认使用插件目录下的 liblibai_helper.json")
+    parser.add_argument("--proxy", default="", help="覆盖配置文件中的代理，多个代理用逗号分隔时启用代理池")
+    parser.add_argument("--catalog-ttl", type=float, default=300, help="目录缓存时间（秒）")
+    parser.add_argument("--poll-interval", type=float, default=2.0, help="任务轮询间隔（秒）")
+    parser.add_argument("--reload-interval", type=float, default=5.0, help="检查配置文件变化的间隔（秒）")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+
+    socket_path = args.socket or default_socket_path()
+    store = SettingsStore(args.config) if args.config else get_store()
+    proxy_pools = []
+
+    def build(current):
+        # 与 WebUI 进程使用同一套创建逻辑：密钥、代理池和密钥池都来自配置文件
+        current = dict(current)
+        if "," in args.proxy:
+            current["proxies"] = [p.strip() for p in args.proxy.split(",")]
+        elif args.proxy:
+            current["proxy"] = args.proxy
+        api, proxy_pool, _ = build_api(current)
+        api.set_validator(RequestValidator(api, ttl=args.catalog_ttl))
+        for old in proxy_pools:
+            old.stop()
+        proxy_pools[:] = [proxy_pool] if proxy_pool else []
+        return api
+
+    daemon = LiblibAIDaemon(
+        build(store.load()), socket_path, rate=args.rate, burst=args.burst,
+        catalog_ttl=args.catalog_ttl, poll_interval=args.poll_interval
+    )
+    # 界面中保存的密钥和代理写入配置文件后，运行中的守护进程自动使用
+    daemon.watch_settings(store, build, interval=args.reload_interval)
+    logger.info(f"LiblibAI 守护进程已启动: {socket_path}")
+    daemon.serve_forever()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
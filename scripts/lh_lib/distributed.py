@@ -0,0 +1,387 @@
+import os
+import json
+import time
+import socket
+import sqlite3
+import threading
+import uuid
+
+from scripts.lh_lib.sqlite_util import connect
+
+
+class SharedJobQueue:
+    """
+    基于 SQLite 的共享任务表
+
+    多个节点通过共享文件系统访问同一个数据库文件。所有状态变更都在
+    BEGIN IMMEDIATE 事务中完成，并以 owner 作为条件更新，保证同一任务
+    同一时刻只属于一个节点。共享文件系统上不能使用 WAL，这里使用默认的
+    DELETE 日志模式。
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            job_key TEXT UNIQUE,
+            payload TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending',
+            owner TEXT,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            claimed_at REAL,
+            heartbeat_at REAL,
+            result TEXT,
+            error TEXT,
+            created_at REAL NOT NULL,
+            updated_at REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, heartbeat_at);
+    """
+
+    def __init__(self, db_path, busy_timeout=30):
+        """
+        初始化共享任务表
+
+        Args:
+            db_path (str): 数据库文件路径，应位于所有节点共享的目录中
+            busy_timeout (float, optional): 等待数据库锁的最长时间（秒）. Defaults to 30.
+        """
+        self.db_path = db_path
+        self.busy_timeout = busy_timeout
+        directory = os.path.dirname(os.path.abspath(db_path))
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+        with self._connect() as conn:
+            conn.executescript(self.SCHEMA)
+
+    def _connect(self):
+        return connect(self.db_path, self.busy_timeout)
+
+    def enqueue(self, payload, job_key=None):
+        """
+        添加任务
+
+        Args:
+            payload (dict): 任务参数
+            job_key (str, optional): 幂等键，相同的键只会入队一次. Defaults to None.
+
+        Returns:
+            int: 任务 ID
+        """
+        return self.enqueue_many([payload], [job_key])[0]
+
+    def enqueue_many(self, payloads, job_keys=None):
+        """
+        批量添加任务
+
+        Args:
+            payloads (list): 任务参数列表
+            job_keys (list, optional): 与 payloads 对应的幂等键列表. Defaults to None.
+
+        Returns:
+            list: 任务 ID 列表
+        """
+        job_keys = job_keys or [None] * len(payloads)
+        now = time.time()
+        ids = []
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            for payload, job_key in zip(payloads, job_keys):
+                job_key = job_key or str(uuid.uuid4())
+                conn.execute(
+                    "INSERT OR IGNORE INTO jobs (job_key, payload, created_at, updated_at) VALUES (?, ?, ?, ?)",
+                    (job_key, json.dumps(payload, ensure_ascii=False), now, now)
+                )
+                row = conn.execute("SELECT id FROM jobs WHERE job_key = ?", (job_key,)).fetchone()
+                ids.append(row["id"])
+        return ids
+
+    def claim(self, node_id, limit=1, stale_after=60, max_attempts=3):
+        """
+        认领待处理任务，心跳超时的任务会被重新认领
+
+        心跳超时且已达到最大尝试次数的任务（例如每次都让节点崩溃的任务）标记为失败，
+        不再被认领
+
+        Args:
+            node_id (str): 节点标识
+            limit (int, optional): 最多认领的任务数. Defaults to 1.
+            stale_after (float, optional): 心跳超时时间（秒）. Defaults to 60.
+            max_attempts (int, optional): 最大尝试次数. Defaults to 3.
+
+        Returns:
+            list: 认领到的任务，每项为 dict，包含 id、payload、attempts
+        """
+        now = time.time()
+        stale = now - stale_after
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(
+                "UPDATE jobs SET status = 'failed', owner = NULL, error = ?, updated_at = ? "
+                "WHERE status = 'claimed' AND heartbeat_at < ? AND attempts >= ?",
+                ("节点心跳超时，已达到最大尝试次数", now, stale, max_attempts)
+            )
+            rows = conn.execute(
+                "SELECT id, payload, attempts FROM jobs "
+                "WHERE status = 'pending' OR (status = 'claimed' AND heartbeat_at < ?) "
+                "ORDER BY id LIMIT ?",
+                (stale, limit)
+            ).fetchall()
+            for row in rows:
+                conn.execute(
+                    "UPDATE jobs SET status = 'claimed', owner = ?, attempts = attempts + 1, "
+                    "claimed_at = ?, heartbeat_at = ?, updated_at = ? WHERE id = ?",
+                    (node_id, now, now, now, row["id"])
+                )
+        return [
+            {"id": row["id"], "payload": json.loads(row["payload"]), "attempts": row["attempts"] + 1}
+            for row in rows
+        ]
+
+    def heartbeat(self, node_id, job_ids):
+        """
+        刷新认领任务的心跳
+
+        Args:
+            node_id (str): 节点标识
+            job_ids (list): 任务 ID 列表
+
+        Returns:
+            set: 仍归本节点所有的任务 ID，不在其中的任务已被其他节点接管
+        """
+        if not job_ids:
+            return set()
+        now = time.time()
+        placeholders = ",".join("?" * len(job_ids))
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(
+                f"UPDATE jobs SET heartbeat_at = ? WHERE owner = ? AND status = 'claimed' AND id IN ({placeholders})",
+                [now, node_id] + list(job_ids)
+            )
+            rows = conn.execute(
+                f"SELECT id FROM jobs WHERE owner = ? AND status = 'claimed' AND id IN ({placeholders})",
+                [node_id] + list(job_ids)
+            ).fetchall()
+        return {row["id"] for row in rows}
+
+    def complete(self, node_id, job_id, result=None):
+        """
+        标记任务完成
+
+        Args:
+            node_id (str): 节点标识
+            job_id (int): 任务 ID
+            result (dict, optional): 任务结果. Defaults to None.
+
+        Returns:
+            bool: 是否成功，任务已被其他节点接管时返回 False
+        """
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            cursor = conn.execute(
+                "UPDATE jobs SET status = 'done', result = ?, error = NULL, updated_at = ? "
+                "WHERE id = ? AND owner = ? AND status = 'claimed'",
+                (json.dumps(result or {}, ensure_ascii=False), now, job_id, node_id)
+            )
+            return cursor.rowcount == 1
+
+    def fail(self, node_id, job_id, error, max_attempts=3):
+        """
+        标记任务失败，未超过重试次数时放回队列
+
+        Args:
+            node_id (str): 节点标识
+            job_id (int): 任务 ID
+            error (str): 错误信息
+            max_attempts (int, optional): 最大尝试次数. Defaults to 3.
+
+        Returns:
+            bool: 是否成功更新
+        """
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            cursor = conn.execute(
+                "UPDATE jobs SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, "
+                "owner = NULL, error = ?, updated_at = ? "
+                "WHERE id = ? AND owner = ? AND status = 'claimed'",
+                (max_attempts, str(error), now, job_id, node_id)
+            )
+            return cursor.rowcount == 1
+
+    def get(self, job_id):
+        """
+        读取任务
+
+        Args:
+            job_id (int): 任务 ID
+
+        Returns:
+            dict: 任务信息，不存在时返回 None
+        """
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job["payload"] = json.loads(job["payload"])
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+    def counts(self):
+        """
+        统计各状态的任务数
+
+        Returns:
+            dict: 状态到任务数的映射
+        """
+        with self._connect() as conn:
+            rows = conn.execute("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status").fetchall()
+        counts = {"pending": 0, "claimed": 0, "done": 0, "failed": 0}
+        counts.update({row["status"]: row["n"] for row in rows})
+        return counts
+
+
+class DistributedWorker:
+    """
+    分布式任务节点
+
+    从共享任务表认领任务，执行后把输出写入共享的保存目录。配置了图片保存器时
+    输出和界面生成的图片一样写入参数、按内容哈希命名并记录到输出清单和搜索索引，
+    相同内容只保存一份；否则文件名由任务 ID 决定并通过临时文件加重命名写入。
+    两种方式下任务在节点失联后被接管都不会产生重复文件。
+    """
+
+    def __init__(self, queue, handler, save_path, node_id=None, concurrency=1,
+                 heartbeat_interval=10, stale_after=60, max_attempts=3, idle_interval=2, writer=None):
+        """
+        初始化节点
+
+        Args:
+            queue (SharedJobQueue): 共享任务表
+            handler (callable): 执行任务的函数，接收 payload，返回结果字典；
+                结果中的 content (bytes) 会被写成输出文件，info (str) 为写入图片的生成参数，
+                ext (str) 为未配置图片保存器时的扩展名
+            save_path (str): 共享保存目录
+            node_id (str, optional): 节点标识，默认使用主机名和进程 ID. Defaults to None.
+            concurrency (int, optional): 本节点同时执行的任务数. Defaults to 1.
+            heartbeat_interval (float, optional): 心跳间隔（秒）. Defaults to 10.
+            stale_after (float, optional): 判定节点失联的心跳超时（秒）. Defaults to 60.
+            max_attempts (int, optional): 单个任务最大尝试次数. Defaults to 3.
+            idle_interval (float, optional): 队列为空时的等待间隔（秒）. Defaults to 2.
+            writer (ImageWriter, optional): 图片保存器，为 None 时按任务 ID 直接写入文件. Defaults to None.
+        """
+        self.queue = queue
+        self.handler = handler
+        self.save_path = save_path
+        self.writer = writer
+        self.node_id = node_id or f"{socket.gethostname()}-{os.getpid()}"
+        self.concurrency = max(1, int(concurrency))
+        self.heartbeat_interval = heartbeat_interval
+        self.stale_after = stale_after
+        self.max_attempts = max_attempts
+        self.idle_interval = idle_interval
+        self.processed = 0
+        self._active = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._threads = []
+
+    def output_path(self, job_id, ext="png"):
+        """
+        返回任务输出文件路径
+
+        Args:
+            job_id (int): 任务 ID
+            ext (str, optional): 文件扩展名. Defaults to "png".
+
+        Returns:
+            str: 输出文件路径
+        """
+        return os.path.join(self.save_path, "distributed", f"job_{job_id}.{ext}")
+
+    def _write_output(self, job_id, content, ext):
+        path = self.output_path(job_id, ext)
+        directory = os.path.dirname(path)
+        if not os.path.exists(directory):
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{path}.{self.node_id}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+        return path
+
+    def run_once(self):
+        """
+        认领并执行一个任务
+
+        Returns:
+            bool: 是否认领到任务
+        """
+        jobs = self.queue.claim(self.node_id, limit=1, stale_after=self.stale_after, max_attempts=self.max_attempts)
+        if not jobs:
+            return False
+        job = jobs[0]
+        with self._lock:
+            self._active.add(job["id"])
+        try:
+            result = dict(self.handler(job["payload"]) or {})
+            content = result.pop("content", None)
+            info = result.pop("info", "")
+            ext = result.pop("ext", "png")
+            if content is not None and self.writer is not None:
+                saved = self.writer.submit(
+                    content, info, source="distributed",
+                    metadata={"job_id": job["id"], "task_id": result.get("task_id")}
+                ).result()
+                result.update(path=saved["path"], thumbnail=saved["thumbnail"], hash=saved["hash"])
+            elif content is not None:
+                result["path"] = self._write_output(job["id"], content, ext)
+            if self.queue.complete(self.node_id, job["id"], result):
+                self.processed += 1
+        except Exception as e:
+            self.queue.fail(self.node_id, job["id"], str(e), self.max_attempts)
+        finally:
+            with self._lock:
+                self._active.discard(job["id"])
+        return True
+
+    def _work_loop(self):
+        while not self._stop.is_set():
+            try:
+                if not self.run_once():
+                    self._stop.wait(self.idle_interval)
+            except sqlite3.Error:
+                # 共享存储暂时不可用，稍后重试
+                self._stop.wait(self.idle_interval)
+
+    def _heartbeat_loop(self):
+        while not self._stop.wait(self.heartbeat_interval):
+            with self._lock:
+                active = list(self._active)
+            try:
+                self.queue.heartbeat(self.node_id, active)
+            except sqlite3.Error:
+                pass
+
+    def start(self):
+        """启动工作线程和心跳线程"""
+        self._stop.clear()
+        self._threads = [threading.Thread(target=self._heartbeat_loop, name="liblibai-heartbeat", daemon=True)]
+        for i in range(self.concurrency):
+            self._threads.append(threading.Thread(target=self._work_loop, name=f"liblibai-worker-{i}", daemon=True))
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self, timeout=None):
+        """
+        停止节点
+
+        Args:
+            timeout (float, optional): 等待每个线程退出的时间（秒）. Defaults to None.
+        """
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
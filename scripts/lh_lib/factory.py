@@ -0,0 +1,109 @@
+from scripts.lh_lib.api import LiblibAIAPI
+from scripts.lh_lib.auth import LiblibAIAuth
+from scripts.lh_lib.keypool import KeyPool
+from scripts.lh_lib.proxy import ProxyPool
+
+
+def _pool_keys(settings):
+    keys = list(settings.get("keys") or [])
+    # 主密钥也加入密钥池
+    primary = settings.get("access_key")
+    if primary and settings.get("secret_key") and all(k.get("access_key") != primary for k in keys):
+        keys.insert(0, {"access_key": primary, "secret_key": settings.get("secret_key")})
+    return keys
+
+
+def create_key_pool(settings):
+    """
+    根据设置中的 keys 列表创建密钥池
+
+    Args:
+        settings (dict): 插件设置
+
+    Returns:
+        KeyPool: 密钥池，未配置额外密钥时返回 None
+    """
+    if not settings.get("keys"):
+        return None
+    keys = _pool_keys(settings)
+
+    pool_settings = settings.get("key_pool", {})
+    return KeyPool(
+        keys,
+        quarantine_seconds=pool_settings.get("quarantine_seconds", 300),
+        auth_quarantine_seconds=pool_settings.get("auth_quarantine_seconds", 3600),
+        quota_window=pool_settings.get("quota_window", 86400)
+    )
+
+
+def update_key_pool(key_pool, settings):
+    """
+    按新的设置更新密钥池
+
+    已有密钥池时就地更新，保留任务与密钥的对应关系、隔离状态和使用统计，进行中任务的
+    轮询和取消仍使用提交它的密钥；没有密钥池时按设置创建
+
+    Args:
+        key_pool (KeyPool): 当前的密钥池，可以为 None
+        settings (dict): 插件设置
+
+    Returns:
+        KeyPool: 更新后的密钥池，未配置额外密钥且原来没有密钥池时返回 None
+    """
+    if key_pool is None:
+        return create_key_pool(settings)
+    key_pool.update_keys(_pool_keys(settings))
+    pool_settings = settings.get("key_pool", {})
+    key_pool.quarantine_seconds = pool_settings.get("quarantine_seconds", 300)
+    key_pool.auth_quarantine_seconds = pool_settings.get("auth_quarantine_seconds", 3600)
+    key_pool.quota_window = pool_settings.get("quota_window", 86400)
+    return key_pool
+
+
+def create_proxy_pool(proxies, probe_interval=60):
+    """
+    根据代理列表创建代理池并启动健康探测
+
+    Args:
+        proxies (list): 代理地址列表
+        probe_interval (float, optional): 探测间隔（秒）. Defaults to 60.
+
+    Returns:
+        ProxyPool: 已启动的代理池，列表为空时返回 None
+    """
+    proxies = [p.strip() for p in (proxies or []) if p and p.strip()]
+    if not proxies:
+        return None
+    proxy_pool = ProxyPool(proxies, probe_interval=probe_interval)
+    proxy_pool.start()
+    return proxy_pool
+
+
+def build_api(settings, metrics=None):
+    """
+    按设置创建进程内的 API 客户端
+
+    WebUI 和守护进程都通过这个函数创建客户端，代理、代理池和密钥池的配置保持一致；
+    签名时钟由每个密钥的 LiblibAIAuth 根据响应的 Date 头自动校准
+
+    Args:
+        settings (dict): 插件设置
+        metrics (MetricsRegistry, optional): 请求指标注册表. Defaults to None.
+
+    Returns:
+        tuple: (LiblibAIAPI, ProxyPool 或 None, KeyPool 或 None)
+    """
+    api = LiblibAIAPI(LiblibAIAuth(settings.get("access_key"), settings.get("secret_key")))
+    if metrics is not None:
+        api.set_metrics(metrics)
+    if settings.get("proxy"):
+        api.set_proxy(settings.get("proxy"))
+
+    # 代理池：按延迟选择最快的健康代理
+    proxy_pool = create_proxy_pool(settings.get("proxies"), settings.get("proxy_probe_interval", 60))
+    api.set_proxy_pool(proxy_pool)
+
+    # 多账号密钥池
+    key_pool = create_key_pool(settings)
+    api.set_key_pool(key_pool)
+    return api, proxy_pool, key_pool
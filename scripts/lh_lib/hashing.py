@@ -0,0 +1,277 @@
+import os
+import mmap
+import time
+import hashlib
+import logging
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from scripts.lh_lib.sqlite_util import connect
+
+logger = logging.getLogger(__name__)
+
+# 本地模型文件的扩展名
+MODEL_EXTENSIONS = (".safetensors", ".ckpt", ".pt", ".pth", ".bin")
+
+# 每次送入哈希函数的数据量，hashlib 在处理大块数据时会释放 GIL
+CHUNK_SIZE = 16 * 1024 * 1024
+
+
+def hash_file(path, algorithm="sha256", chunk_size=CHUNK_SIZE):
+    """
+    计算文件哈希
+
+    优先通过 mmap 直接把页缓存交给哈希函数，避免逐块复制到 Python 字节串；
+    无法映射的文件（空文件、部分网络文件系统）退回按大块读取
+
+    Args:
+        path (str): 文件路径
+        algorithm (str, optional): hashlib 支持的算法名. Defaults to "sha256".
+        chunk_size (int, optional): 每次处理的字节数. Defaults to CHUNK_SIZE.
+
+    Returns:
+        str: 十六进制哈希
+    """
+    hasher = hashlib.new(algorithm)
+    with open(path, "rb") as f:
+        try:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (ValueError, OSError):
+            mapped = None
+        if mapped is not None:
+            with mapped, memoryview(mapped) as view:
+                for offset in range(0, len(view), chunk_size):
+                    hasher.update(view[offset:offset + chunk_size])
+        else:
+            for chunk in iter(lambda: f.read(chunk_size), b""):
+                hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def short_hash(full_hash):
+    """
+    返回 WebUI 和模型站常用的 10 位短哈希（AutoV2）
+
+    Args:
+        full_hash (str): SHA-256 哈希
+
+    Returns:
+        str: 前 10 位
+    """
+    return full_hash[:10] if full_hash else full_hash
+
+
+def find_model_files(directories, extensions=MODEL_EXTENSIONS):
+    """
+    递归列出目录中的模型文件
+
+    Args:
+        directories (list): 目录列表，不存在的目录会被跳过
+        extensions (tuple, optional): 模型文件扩展名. Defaults to MODEL_EXTENSIONS.
+
+    Returns:
+        list: 文件绝对路径，按路径排序
+    """
+    paths = set()
+    for directory in directories:
+        if not directory or not os.path.isdir(directory):
+            continue
+        for root, _, files in os.walk(directory, followlinks=True):
+            for name in files:
+                if name.lower().endswith(extensions):
+                    paths.add(os.path.abspath(os.path.join(root, name)))
+    return sorted(paths)
+
+
+class HashCache:
+    """
+    文件哈希的持久缓存
+
+    以 (路径, 大小, 修改时间) 为键，文件未变化时直接返回上次的结果
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS file_hashes (
+            path TEXT NOT NULL,
+            algorithm TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            mtime_ns INTEGER NOT NULL,
+            hash TEXT NOT NULL,
+            hashed_at REAL NOT NULL,
+            PRIMARY KEY (path, algorithm)
+        );
+    """
+
+    def __init__(self, db_path, busy_timeout=30):
+        """
+        初始化哈希缓存
+
+        Args:
+            db_path (str): SQLite 数据库路径
+            busy_timeout (float, optional): 等待数据库锁的最长时间（秒）. Defaults to 30.
+        """
+        self.db_path = db_path
+        self.busy_timeout = busy_timeout
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript(self.SCHEMA)
+
+    def _connect(self):
+        return connect(self.db_path, self.busy_timeout)
+
+    def get_many(self, stats, algorithm="sha256"):
+        """
+        批量查找未变化文件的哈希
+
+        Args:
+            stats (dict): 路径到 (大小, 修改时间纳秒) 的映射
+            algorithm (str, optional): 哈希算法. Defaults to "sha256".
+
+        Returns:
+            dict: 命中的路径到哈希的映射
+        """
+        found = {}
+        with self._connect() as conn:
+            for row in conn.execute("SELECT path, size, mtime_ns, hash FROM file_hashes WHERE algorithm = ?", (algorithm,)):
+                stat = stats.get(row["path"])
+                if stat is not None and stat == (row["size"], row["mtime_ns"]):
+                    found[row["path"]] = row["hash"]
+        return found
+
+    def set_many(self, entries, algorithm="sha256"):
+        """
+        批量写入哈希
+
+        Args:
+            entries (list): (路径, 大小, 修改时间纳秒, 哈希) 列表
+            algorithm (str, optional): 哈希算法. Defaults to "sha256".
+        """
+        if not entries:
+            return
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("BEGIN")
+            conn.executemany(
+                "INSERT OR REPLACE INTO file_hashes (path, algorithm, size, mtime_ns, hash, hashed_at) VALUES (?, ?, ?, ?, ?, ?)",
+                [(path, algorithm, size, mtime_ns, digest, now) for path, size, mtime_ns, digest in entries]
+            )
+
+    def prune(self, keep_paths):
+        """
+        删除不在列表中的文件记录
+
+        Args:
+            keep_paths (iterable): 仍然存在的文件路径
+
+        Returns:
+            int: 删除的记录数
+        """
+        keep = set(keep_paths)
+        with self._connect() as conn:
+            stale = [row[0] for row in conn.execute("SELECT DISTINCT path FROM file_hashes") if row[0] not in keep]
+            if stale:
+                conn.execute("BEGIN")
+                conn.executemany("DELETE FROM file_hashes WHERE path = ?", [(path,) for path in stale])
+        return len(stale)
+
+    def count(self):
+        """
+        返回缓存的记录数
+
+        Returns:
+            int: 记录数
+        """
+        with self._connect() as conn:
+            return conn.execute("SELECT COUNT(*) FROM file_hashes").fetchone()[0]
+
+
+class ModelHasher:
+    """
+    本地模型文件哈希
+
+    文件未变化时从缓存读取，其余文件在进程池中并行计算，结果每完成一个就写入缓存，
+    中途中断也不会丢失已完成的部分
+    """
+
+    def __init__(self, cache=None, workers=None, algorithm="sha256"):
+        """
+        初始化模型哈希器
+
+        Args:
+            cache (HashCache, optional): 持久缓存，为 None 时每次都重新计算. Defaults to None.
+            workers (int, optional): 进程数，默认为 CPU 核数（最多 4 个）；为 1 时在当前进程计算. Defaults to None.
+            algorithm (str, optional): 哈希算法. Defaults to "sha256".
+        """
+        self.cache = cache
+        self.workers = workers or min(4, os.cpu_count() or 1)
+        self.algorithm = algorithm
+        self.last_stats = {}
+
+    def hash_files(self, paths, progress=None):
+        """
+        计算一组文件的哈希
+
+        Args:
+            paths (list): 文件路径
+            progress (callable, optional): 进度回调，参数为 (已完成文件数, 文件总数, 已完成字节数, 总字节数, 路径). Defaults to None.
+
+        Returns:
+            dict: 路径到十六进制哈希的映射，无法读取的文件不包含在内
+        """
+        stats = {}
+        for path in paths:
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            stats[path] = (st.st_size, st.st_mtime_ns)
+
+        results = self.cache.get_many(stats, self.algorithm) if self.cache else {}
+        pending = sorted((p for p in stats if p not in results), key=lambda p: stats[p][0], reverse=True)
+        total_files = len(stats)
+        total_bytes = sum(size for size, _ in stats.values())
+        done_files = len(results)
+        done_bytes = sum(stats[p][0] for p in results)
+        self.last_stats = {"files": total_files, "cached": len(results), "hashed": 0, "errors": 0, "seconds": 0.0}
+        if progress and results:
+            progress(done_files, total_files, done_bytes, total_bytes, None)
+
+        started = time.perf_counter()
+        for path, digest in self._hash_pending(pending):
+            done_files += 1
+            done_bytes += stats[path][0]
+            if digest is None:
+                self.last_stats["errors"] += 1
+            else:
+                results[path] = digest
+                self.last_stats["hashed"] += 1
+                if self.cache:
+                    self.cache.set_many([(path, stats[path][0], stats[path][1], digest)], self.algorithm)
+            if progress:
+                progress(done_files, total_files, done_bytes, total_bytes, path)
+        self.last_stats["seconds"] = time.perf_counter() - started
+        return results
+
+    def _hash_pending(self, pending):
+        # 只有一个文件或单进程时不启动进程池
+        if self.workers <= 1 or len(pending) <= 1:
+            for path in pending:
+                yield path, self._hash_one(path)
+            return
+
+        with ProcessPoolExecutor(max_workers=min(self.workers, len(pending))) as executor:
+            # 大文件先提交，总耗时更接近最大文件的耗时
+            futures = {executor.submit(hash_file, path, self.algorithm): path for path in pending}
+            for future in as_completed(futures):
+                path = futures[future]
+                try:
+                    yield path, future.result()
+                except Exception as e:
+                    logger.error(f"计算模型哈希失败 {path}: {str(e)}")
+                    yield path, None
+
+    def _hash_one(self, path):
+        try:
+            return hash_file(path, self.algorithm)
+        except Exception as e:
+            logger.error(f"计算模型哈希失败 {path}: {str(e)}")
+            return None
@@ -0,0 +1,349 @@
+import os
+import re
+import time
+import sqlite3
+import logging
+
+from scripts.lh_lib.sqlite_util import connect
+from scripts.lh_lib.output import FORMATS, parse_infotext, read_infotext
+
+logger = logging.getLogger(__name__)
+
+# 索引的图片扩展名
+IMAGE_EXTENSIONS = tuple(f".{ext}" for _, ext in FORMATS.values())
+
+
+def _to_int(value):
+    try:
+        return int(float(value))
+    except (TypeError, ValueError):
+        return None
+
+
+def _to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def build_record(info, path, thumbnail=None, metadata=None):
+    """
+    由参数文本和附加信息生成索引记录
+
+    Args:
+        info (str): WebUI 格式的参数文本
+        path (str): 图片路径
+        thumbnail (str, optional): 缩略图路径. Defaults to None.
+        metadata (dict, optional): 附加信息，例如 task_id、hash，优先于参数文本中的同名项. Defaults to None.
+
+    Returns:
+        dict: 索引记录
+    """
+    parsed = parse_infotext(info)
+    width = height = None
+    size = parsed.get("Size", "")
+    if "x" in size:
+        width, height = (_to_int(v) for v in size.split("x", 1))
+    record = {
+        "path": path,
+        "thumbnail": thumbnail,
+        "prompt": parsed.get("prompt", ""),
+        "negative_prompt": parsed.get("negative_prompt", ""),
+        "model": parsed.get("Model", ""),
+        "sampler": parsed.get("Sampler", ""),
+        "width": width,
+        "height": height,
+        "seed": _to_int(parsed.get("Seed")),
+        "steps": _to_int(parsed.get("Steps")),
+        "cfg_scale": _to_float(parsed.get("CFG scale")),
+        "task_id": "",
+        "hash": None,
+    }
+    record.update({k: v for k, v in (metadata or {}).items() if k in record and v is not None})
+    return record
+
+
+class HistoryIndex:
+    """
+    生成结果的搜索索引
+
+    提示词、负面提示词、模型、采样器、任务 ID 和路径写入 FTS5 全文索引，
+    模型、采样器、尺寸、种子另有普通索引用于筛选，结果按时间倒序分页
+    """
+
+    COLUMNS = (
+        "path", "thumbnail", "hash", "task_id", "prompt", "negative_prompt", "model", "sampler",
+        "width", "height", "seed", "steps", "cfg_scale", "mtime", "created_at"
+    )
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS images (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            path TEXT NOT NULL UNIQUE,
+            thumbnail TEXT,
+            hash TEXT,
+            task_id TEXT,
+            prompt TEXT,
+            negative_prompt TEXT,
+            model TEXT,
+            sampler TEXT,
+            width INTEGER,
+            height INTEGER,
+            seed INTEGER,
+            steps INTEGER,
+            cfg_scale REAL,
+            mtime REAL,
+            created_at REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_images_created ON images (created_at);
+        CREATE INDEX IF NOT EXISTS idx_images_model ON images (model, created_at);
+        CREATE INDEX IF NOT EXISTS idx_images_sampler ON images (sampler, created_at);
+        CREATE INDEX IF NOT EXISTS idx_images_size ON images (width, height, created_at);
+        CREATE INDEX IF NOT EXISTS idx_images_seed ON images (seed);
+        CREATE TRIGGER IF NOT EXISTS images_ai AFTER INSERT ON images BEGIN
+            INSERT INTO images_fts (rowid, prompt, negative_prompt, model, sampler, task_id, path)
+            VALUES (new.id, new.prompt, new.negative_prompt, new.model, new.sampler, new.task_id, new.path);
+        END;
+        CREATE TRIGGER IF NOT EXISTS images_ad AFTER DELETE ON images BEGIN
+            INSERT INTO images_fts (images_fts, rowid, prompt, negative_prompt, model, sampler, task_id, path)
+            VALUES ('delete', old.id, old.prompt, old.negative_prompt, old.model, old.sampler, old.task_id, old.path);
+        END;
+    """
+
+    # trigram 分词支持中文子串搜索，SQLite 3.34 之前不可用时退回 unicode61
+    FTS_SCHEMA = """
+        CREATE VIRTUAL TABLE IF NOT EXISTS images_fts USING fts5 (
+            prompt, negative_prompt, model, sampler, task_id, path,
+            content='images', content_rowid='id', tokenize='{tokenizer}'
+        );
+    """
+
+    def __init__(self, db_path, busy_timeout=30):
+        """
+        初始化搜索索引
+
+        Args:
+            db_path (str): 数据库文件路径
+            busy_timeout (float, optional): 等待数据库锁的最长时间（秒）. Defaults to 30.
+        """
+        self.db_path = db_path
+        self.busy_timeout = busy_timeout
+        directory = os.path.dirname(os.path.abspath(db_path))
+        os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            try:
+                conn.execute(self.FTS_SCHEMA.format(tokenizer="trigram"))
+                self.tokenizer = "trigram"
+            except sqlite3.OperationalError:
+                conn.execute(self.FTS_SCHEMA.format(tokenizer="unicode61"))
+                self.tokenizer = "unicode61"
+            conn.executescript(self.SCHEMA)
+
+    def _connect(self):
+        return connect(self.db_path, self.busy_timeout)
+
+    def add(self, record):
+        """
+        添加或更新一条记录
+
+        Args:
+            record (dict): build_record 返回的记录
+
+        Returns:
+            int: 记录 ID
+        """
+        return self.add_many([record])[0]
+
+    def add_image(self, path, info="", thumbnail=None, metadata=None):
+        """
+        把刚保存的图片写入索引
+
+        Args:
+            path (str): 图片路径
+            info (str, optional): 生成参数文本. Defaults to "".
+            thumbnail (str, optional): 缩略图路径. Defaults to None.
+            metadata (dict, optional): 附加信息，例如 task_id、hash. Defaults to None.
+
+        Returns:
+            int: 记录 ID
+        """
+        record = build_record(info, os.path.abspath(path), thumbnail=thumbnail, metadata=metadata)
+        # 记录文件的修改时间，增量重建时不会重复读取
+        record["mtime"] = os.path.getmtime(path)
+        return self.add(record)
+
+    def add_many(self, records):
+        """
+        在一个事务中批量添加或更新记录，相同路径的记录会被替换
+
+        Args:
+            records (list): 记录列表
+
+        Returns:
+            list: 记录 ID 列表
+        """
+        now = time.time()
+        ids = []
+        placeholders = ", ".join("?" * len(self.COLUMNS))
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            for record in records:
+                values = dict(record)
+                values.setdefault("created_at", now)
+                # 先删除旧记录，让删除触发器同步清理全文索引
+                conn.execute("DELETE FROM images WHERE path = ?", (values["path"],))
+                cursor = conn.execute(
+                    f"INSERT INTO images ({', '.join(self.COLUMNS)}) VALUES ({placeholders})",
+                    [values.get(column) for column in self.COLUMNS]
+                )
+                ids.append(cursor.lastrowid)
+        return ids
+
+    def _match_expression(self, text):
+        # 每个词加引号按短语匹配，避免用户输入被解析为 FTS 语法
+        terms = [t for t in re.split(r"\s+", text.strip()) if t]
+        if self.tokenizer == "trigram":
+            fts_terms = [t for t in terms if len(t) >= 3]
+            like_terms = [t for t in terms if len(t) < 3]
+        else:
+            fts_terms, like_terms = terms, []
+        expression = " AND ".join('"{}"'.format(t.replace('"', '""')) for t in fts_terms)
+        return expression, like_terms
+
+    def search(self, text="", model=None, sampler=None, width=None, height=None, seed=None, limit=50, offset=0):
+        """
+        搜索生成结果
+
+        Args:
+            text (str, optional): 关键词，匹配提示词、负面提示词、模型、采样器、任务 ID 和路径. Defaults to "".
+            model (str, optional): 模型. Defaults to None.
+            sampler (str, optional): 采样器. Defaults to None.
+            width (int, optional): 宽度. Defaults to None.
+            height (int, optional): 高度. Defaults to None.
+            seed (int, optional): 种子. Defaults to None.
+            limit (int, optional): 每页数量. Defaults to 50.
+            offset (int, optional): 跳过的数量. Defaults to 0.
+
+        Returns:
+            tuple: (记录列表, 是否还有下一页)
+        """
+        where, args = [], []
+        expression, like_terms = self._match_expression(text or "")
+        if expression:
+            where.append("images.id IN (SELECT rowid FROM images_fts WHERE images_fts MATCH ?)")
+            args.append(expression)
+        for term in like_terms:
+            # trigram 无法匹配少于 3 个字符的词，退回 LIKE
+            where.append("(images.prompt LIKE ? OR images.negative_prompt LIKE ?)")
+            args += [f"%{term}%", f"%{term}%"]
+        for column, value in (("model", model), ("sampler", sampler), ("width", width), ("height", height), ("seed", seed)):
+            if value not in (None, ""):
+                where.append(f"images.{column} = ?")
+                args.append(value)
+
+        sql = "SELECT * FROM images"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        # 多取一条用于判断是否还有下一页，避免对大表 COUNT
+        sql += " ORDER BY created_at DESC, id DESC LIMIT ? OFFSET ?"
+        args += [limit + 1, offset]
+        with self._connect() as conn:
+            rows = conn.execute(sql, args).fetchall()
+        return [dict(row) for row in rows[:limit]], len(rows) > limit
+
+    def facets(self, column, limit=100):
+        """
+        返回某一列出现过的取值，用于筛选下拉框
+
+        Args:
+            column (str): model 或 sampler
+            limit (int, optional): 最多返回的数量. Defaults to 100.
+
+        Returns:
+            list: 取值列表
+        """
+        if column not in ("model", "sampler"):
+            raise ValueError(f"不支持的列: {column}")
+        with self._connect() as conn:
+            rows = conn.execute(
+                f"SELECT DISTINCT {column} FROM images WHERE {column} != '' ORDER BY {column} LIMIT ?", (limit,)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def count(self):
+        """
+        返回索引中的图片数量
+
+        Returns:
+            int: 图片数量
+        """
+        with self._connect() as conn:
+            return conn.execute("SELECT COUNT(*) FROM images").fetchone()[0]
+
+    def rebuild(self, root, batch_size=500):
+        """
+        增量重建索引
+
+        扫描保存目录中的图片，只读取新增或修改时间变化的文件，已删除的文件从索引中移除
+
+        Args:
+            root (str): 保存目录
+            batch_size (int, optional): 每个事务写入的记录数. Defaults to 500.
+
+        Returns:
+            dict: 包含 added、removed、skipped
+        """
+        with self._connect() as conn:
+            known = {row["path"]: row["mtime"] for row in conn.execute("SELECT path, mtime FROM images")}
+
+        seen = set()
+        pending = []
+        stats = {"added": 0, "removed": 0, "skipped": 0}
+        for path, mtime in self._scan(root):
+            seen.add(path)
+            if known.get(path) == mtime:
+                stats["skipped"] += 1
+                continue
+            try:
+                info = read_infotext(path)
+            except Exception as e:
+                logger.error(f"读取图片参数失败: {path}: {str(e)}")
+                continue
+            record = build_record(info, path, metadata={"thumbnail": self._thumbnail_for(root, path)})
+            record.update({"mtime": mtime, "created_at": mtime})
+            pending.append(record)
+            if len(pending) >= batch_size:
+                stats["added"] += len(self.add_many(pending))
+                pending = []
+        if pending:
+            stats["added"] += len(self.add_many(pending))
+
+        removed = [path for path in known if path not in seen and path.startswith(os.path.abspath(root))]
+        if removed:
+            with self._connect() as conn:
+                conn.execute("BEGIN IMMEDIATE")
+                conn.executemany("DELETE FROM images WHERE path = ?", [(path,) for path in removed])
+            stats["removed"] = len(removed)
+        return stats
+
+    def _scan(self, root):
+        root = os.path.abspath(root)
+        stack = [root]
+        while stack:
+            directory = stack.pop()
+            try:
+                entries = list(os.scandir(directory))
+            except OSError:
+                continue
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    if entry.name != "thumbnails":
+                        stack.append(entry.path)
+                elif entry.name.lower().endswith(IMAGE_EXTENSIONS):
+                    yield entry.path, entry.stat().st_mtime
+
+    def _thumbnail_for(self, root, path):
+        relative = os.path.relpath(path, os.path.abspath(root))
+        thumbnail = os.path.join(os.path.abspath(root), "thumbnails", os.path.splitext(relative)[0] + ".webp")
+        return thumbnail if os.path.exists(thumbnail) else None
@@ -0,0 +1,266 @@
+import time
+import threading
+from collections import OrderedDict
+
+from scripts.lh_lib.auth import LiblibAIAuth
+from scripts.lh_lib.api import APIError
+
+# 判定为额度不足的错误信息关键字
+QUOTA_KEYWORDS = ("quota", "insufficient", "额度", "余额", "积分")
+
+
+class PoolKey:
+    """
+    密钥池中的单个密钥及其使用情况
+    """
+
+    def __init__(self, access_key, secret_key, quota=None, name=None):
+        """
+        初始化密钥
+
+        Args:
+            access_key (str): API 访问密钥
+            secret_key (str): API 密钥
+            quota (int, optional): 每个额度周期内可提交的任务数，None 表示不限. Defaults to None.
+            name (str, optional): 显示名称. Defaults to None.
+        """
+        self.auth = LiblibAIAuth(access_key, secret_key)
+        self.quota = quota
+        # 统计信息中只显示密钥首尾几位
+        self.name = name or f"{access_key[:4]}****{access_key[-4:]}"
+        self.used = 0
+        self.submitted = 0
+        self.errors = 0
+        self.quarantined_until = 0.0
+        self.last_error = ""
+
+    @property
+    def access_key(self):
+        return self.auth.access_key
+
+    def remaining(self):
+        """
+        返回剩余额度
+
+        Returns:
+            float: 剩余额度，不限额时返回 inf
+        """
+        if self.quota is None:
+            return float("inf")
+        return max(0, self.quota - self.used)
+
+    def is_healthy(self, now=None):
+        """检查密钥是否可用于提交任务"""
+        now = now or time.time()
+        return self.quarantined_until <= now and self.remaining() > 0
+
+
+class KeyPool:
+    """
+    多账号密钥池
+
+    按剩余额度和健康状态分配提交任务使用的密钥，记录每个任务由哪个密钥提交，
+    并隔离返回认证或额度错误的密钥
+    """
+
+    def __init__(self, keys, quarantine_seconds=300, auth_quarantine_seconds=3600,
+                 quota_window=86400, max_pinned=10000):
+        """
+        初始化密钥池
+
+        Args:
+            keys (list): 密钥配置列表，每项包含 access_key、secret_key，可选 quota、name
+            quarantine_seconds (float, optional): 额度错误的隔离时间（秒）. Defaults to 300.
+            auth_quarantine_seconds (float, optional): 认证错误的隔离时间（秒）. Defaults to 3600.
+            quota_window (float, optional): 额度统计周期（秒）. Defaults to 86400.
+            max_pinned (int, optional): 最多记录的任务与密钥对应关系数. Defaults to 10000.
+        """
+        self.keys = [
+            PoolKey(k.get("access_key", ""), k.get("secret_key", ""), k.get("quota"), k.get("name"))
+            for k in keys
+            if k.get("access_key") and k.get("secret_key")
+        ]
+        self.quarantine_seconds = quarantine_seconds
+        self.auth_quarantine_seconds = auth_quarantine_seconds
+        self.quota_window = quota_window
+        self.max_pinned = max_pinned
+        self._pinned = OrderedDict()
+        self._window_started = time.time()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.keys)
+
+    def is_configured(self):
+        """
+        检查密钥池中是否有密钥
+
+        Returns:
+            bool: 是否有可用配置
+        """
+        return bool(self.keys)
+
+    def update_keys(self, keys):
+        """
+        按新的密钥配置更新密钥池
+
+        按 access_key 对应：已有的密钥保留使用量、隔离状态和统计，secret_key 变化时解除隔离；
+        新增的密钥加入密钥池；删除的密钥不再用于提交，但任务与密钥的对应关系保留，
+        已提交任务的轮询和取消仍使用提交它的密钥
+
+        Args:
+            keys (list): 密钥配置列表，格式同构造函数
+        """
+        with self._lock:
+            existing = {key.access_key: key for key in self.keys}
+            updated = []
+            for config in keys:
+                access_key, secret_key = config.get("access_key"), config.get("secret_key")
+                if not access_key or not secret_key or any(key.access_key == access_key for key in updated):
+                    continue
+                key = existing.get(access_key)
+                if key is None:
+                    key = PoolKey(access_key, secret_key, config.get("quota"), config.get("name"))
+                else:
+                    if key.auth.secret_key != secret_key:
+                        # 修正了密钥后不再沿用之前的认证错误隔离
+                        key.auth.secret_key = secret_key
+                        key.quarantined_until = 0.0
+                        key.last_error = ""
+                    key.quota = config.get("quota")
+                    if config.get("name"):
+                        key.name = config["name"]
+                updated.append(key)
+            self.keys = updated
+
+    def _roll_window(self):
+        if time.time() - self._window_started >= self.quota_window:
+            self._window_started = time.time()
+            for key in self.keys:
+                key.used = 0
+
+    def acquire(self):
+        """
+        选择用于提交任务的密钥
+
+        Returns:
+            PoolKey: 剩余额度最多的健康密钥
+
+        Raises:
+            APIError: 如果没有可用密钥
+        """
+        with self._lock:
+            self._roll_window()
+            now = time.time()
+            healthy = [k for k in self.keys if k.is_healthy(now)]
+            if not healthy:
+                raise APIError("密钥池中没有可用的密钥（全部被隔离或额度已用完）")
+            # 剩余额度相同时优先使用提交次数少的密钥，让负载均匀分布
+            return max(healthy, key=lambda k: (k.remaining(), -k.submitted))
+
+    def report_success(self, key, cost=1):
+        """
+        记录一次成功提交
+
+        Args:
+            key (PoolKey): 提交使用的密钥
+            cost (int, optional): 消耗的额度. Defaults to 1.
+        """
+        with self._lock:
+            key.used += cost
+            key.submitted += 1
+
+    def report_error(self, key, error):
+        """
+        记录一次失败提交，认证或额度错误时隔离该密钥
+
+        Args:
+            key (PoolKey): 提交使用的密钥
+            error (APIError): 错误
+
+        Returns:
+            bool: 是否为密钥相关错误（换一个密钥重试可能成功）
+        """
+        kind = classify_error(error)
+        with self._lock:
+            key.errors += 1
+            key.last_error = str(error)
+            if kind == "auth":
+                key.quarantined_until = time.time() + self.auth_quarantine_seconds
+            elif kind == "quota":
+                key.quarantined_until = time.time() + self.quarantine_seconds
+            else:
+                return False
+        return True
+
+    def pin(self, task_id, key):
+        """
+        记录任务由哪个密钥提交
+
+        Args:
+            task_id (str): 任务 ID
+            key (PoolKey): 提交使用的密钥
+        """
+        with self._lock:
+            self._pinned[task_id] = key
+            self._pinned.move_to_end(task_id)
+            while len(self._pinned) > self.max_pinned:
+                self._pinned.popitem(last=False)
+
+    def for_task(self, task_id):
+        """
+        返回提交该任务的密钥
+
+        Args:
+            task_id (str): 任务 ID
+
+        Returns:
+            PoolKey: 对应的密钥，未知任务返回 None
+        """
+        with self._lock:
+            return self._pinned.get(task_id)
+
+    def stats(self):
+        """
+        返回每个密钥的使用统计
+
+        Returns:
+            list: 每个密钥一项统计信息
+        """
+        now = time.time()
+        with self._lock:
+            return [
+                {
+                    "name": key.name,
+                    "quota": key.quota,
+                    "used": key.used,
+                    "remaining": None if key.quota is None else key.remaining(),
+                    "submitted": key.submitted,
+                    "errors": key.errors,
+                    "healthy": key.is_healthy(now),
+                    "quarantined_for": max(0, round(key.quarantined_until - now)),
+                    "last_error": key.last_error,
+                }
+                for key in self.keys
+            ]
+
+
+def classify_error(error):
+    """
+    判断 API 错误类型
+
+    Args:
+        error (APIError): 错误
+
+    Returns:
+        str: "auth"（认证失败）、"quota"（额度不足或限流）或 "other"
+    """
+    status_code = getattr(error, "status_code", None)
+    if status_code in (401, 403):
+        return "auth"
+    if status_code == 429:
+        return "quota"
+    message = str(error).lower()
+    if any(keyword in message for keyword in QUOTA_KEYWORDS):
+        return "quota"
+    return "other"
@@ -0,0 +1,186 @@
+import sys
+import json
+import time
+import queue
+import atexit
+import logging
+import threading
+import logging.handlers
+
+# 默认格式，与插件原来的控制台输出一致
+DEFAULT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+# 安装状态保存在 logger 对象上：WebUI 重新加载脚本时模块会被重新执行，
+# 但 logging 模块中的 logger 实例保持不变
+_STATE_ATTR = "_liblibai_logging"
+
+_install_lock = threading.Lock()
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    限制同一位置的日志在时间窗口内的输出次数
+
+    以 (logger 名称, 级别, 文件, 行号) 区分日志来源，同一来源在 window 秒内最多输出
+    limit 条，超出的被丢弃；窗口结束后的第一条日志会附带被丢弃的数量。
+    只作用于不低于 level 的日志，适合在失败重试等热循环中打印错误
+    """
+
+    def __init__(self, limit=5, window=60.0, level=logging.ERROR):
+        """
+        初始化限流过滤器
+
+        Args:
+            limit (int, optional): 每个窗口内同一来源最多输出的条数，0 表示不限制. Defaults to 5.
+            window (float, optional): 窗口长度（秒）. Defaults to 60.0.
+            level (int, optional): 只限制不低于该级别的日志. Defaults to logging.ERROR.
+        """
+        super().__init__()
+        self.limit = limit
+        self.window = window
+        self.level = level
+        self.suppressed_total = 0
+        # 来源 -> [窗口开始时间, 已输出条数, 已丢弃条数]
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if self.limit <= 0 or record.levelno < self.level:
+            return True
+        key = (record.name, record.levelno, record.pathname, record.lineno)
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None or now - bucket[0] >= self.window:
+                suppressed = bucket[2] if bucket else 0
+                self._buckets[key] = [now, 1, 0]
+                if suppressed:
+                    record.suppressed = suppressed
+                return True
+            if bucket[1] < self.limit:
+                bucket[1] += 1
+                return True
+            bucket[2] += 1
+            self.suppressed_total += 1
+            return False
+
+
+class SuppressedFormatter(logging.Formatter):
+    """在消息末尾注明此前被限流丢弃的条数"""
+
+    def format(self, record):
+        message = super().format(record)
+        suppressed = getattr(record, "suppressed", 0)
+        if suppressed:
+            message += f" (此前 {suppressed} 条相同日志已被限流丢弃)"
+        return message
+
+
+class JsonFormatter(logging.Formatter):
+    """把日志格式化为单行 JSON，便于日志收集系统解析"""
+
+    # LogRecord 的标准属性，其余属性视为通过 extra 传入的字段
+    _RESERVED = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+    def format(self, record):
+        data = {
+            "time": record.created,
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "thread": record.threadName,
+        }
+        for key, value in vars(record).items():
+            if key not in self._RESERVED and not key.startswith("_"):
+                data[key] = value
+        if record.exc_info:
+            data["exc_info"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            data["exc_info"] = record.exc_text
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+class _LoggingState:
+    """记录已安装的队列、处理器和后台监听线程"""
+
+    def __init__(self, queue_handler, stream_handler, listener, rate_filter):
+        self.queue_handler = queue_handler
+        self.stream_handler = stream_handler
+        self.listener = listener
+        self.rate_filter = rate_filter
+
+
+def setup_logging(name="liblibai_helper", level=logging.INFO, json_format=False,
+                  rate_limit=5, rate_window=60.0, stream=None):
+    """
+    为 logger 安装基于队列的非阻塞日志输出
+
+    调用线程只把日志放入队列，格式化和写控制台在后台监听线程中完成。
+    同一个 logger 只安装一次，重复调用（例如 WebUI 重新加载脚本）只更新级别、
+    格式和限流参数，不会重复添加处理器
+
+    Args:
+        name (str, optional): logger 名称. Defaults to "liblibai_helper".
+        level (int | str, optional): 日志级别. Defaults to logging.INFO.
+        json_format (bool, optional): 是否输出单行 JSON. Defaults to False.
+        rate_limit (int, optional): 同一位置的错误日志每个窗口最多输出的条数，0 表示不限制. Defaults to 5.
+        rate_window (float, optional): 限流窗口（秒）. Defaults to 60.0.
+        stream (file, optional): 输出流，默认为 sys.stderr. Defaults to None.
+
+    Returns:
+        logging.Logger: 配置好的 logger
+    """
+    logger = logging.getLogger(name)
+    if isinstance(level, str):
+        level = logging.getLevelName(level.upper())
+        if not isinstance(level, int):
+            level = logging.INFO
+
+    with _install_lock:
+        state = getattr(logger, _STATE_ATTR, None)
+        if state is None:
+            # 移除旧版本在每次加载时添加的同步控制台处理器
+            for handler in list(logger.handlers):
+                if type(handler) is logging.StreamHandler:
+                    logger.removeHandler(handler)
+
+            log_queue = queue.SimpleQueue()
+            stream_handler = logging.StreamHandler(stream or sys.stderr)
+            listener = logging.handlers.QueueListener(log_queue, stream_handler, respect_handler_level=True)
+            queue_handler = logging.handlers.QueueHandler(log_queue)
+            rate_filter = RateLimitFilter()
+            # 在入队前限流，被丢弃的日志不会占用队列
+            queue_handler.addFilter(rate_filter)
+            logger.addHandler(queue_handler)
+            # 插件的日志不再重复交给根 logger 处理
+            logger.propagate = False
+            listener.start()
+            atexit.register(listener.stop)
+            state = _LoggingState(queue_handler, stream_handler, listener, rate_filter)
+            setattr(logger, _STATE_ATTR, state)
+        elif stream is not None:
+            state.stream_handler.setStream(stream)
+
+        logger.setLevel(level)
+        state.rate_filter.limit = rate_limit
+        state.rate_filter.window = rate_window
+        state.stream_handler.setFormatter(JsonFormatter() if json_format else SuppressedFormatter(DEFAULT_FORMAT))
+    return logger
+
+
+def shutdown_logging(name="liblibai_helper"):
+    """
+    停止后台监听线程并移除队列处理器，队列中剩余的日志会先写完
+
+    Args:
+        name (str, optional): logger 名称. Defaults to "liblibai_helper".
+    """
+    logger = logging.getLogger(name)
+    with _install_lock:
+        state = getattr(logger, _STATE_ATTR, None)
+        if state is None:
+            return
+        atexit.unregister(state.listener.stop)
+        state.listener.stop()
+        logger.removeHandler(state.queue_handler)
+        delattr(logger, _STATE_ATTR)
@@ -0,0 +1,289 @@
+import json
+import time
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+# 请求延迟直方图的桶上限（秒）
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Prometheus 指标名前缀
+PREFIX = "liblibai"
+
+
+class Histogram:
+    """
+    固定桶的延迟直方图
+
+    只记录每个桶的计数、总和与总数，记录一次的开销是常数级，分位数按桶内线性插值估算
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        """
+        初始化直方图
+
+        Args:
+            buckets (tuple, optional): 升序的桶上限. Defaults to LATENCY_BUCKETS.
+        """
+        self.buckets = tuple(buckets)
+        # 最后一个桶对应 +Inf
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        """
+        记录一次观测值
+
+        Args:
+            value (float): 观测值（秒）
+        """
+        index = len(self.buckets)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                index = i
+                break
+        self.counts[index] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q):
+        """
+        估算分位数
+
+        Args:
+            q (float): 分位，0-1 之间
+
+        Returns:
+            float: 估算值，没有观测值时返回 None
+        """
+        if not self.count:
+            return None
+        rank = q * self.count
+        cumulative = 0
+        lower = 0.0
+        for i, count in enumerate(self.counts):
+            upper = self.buckets[i] if i < len(self.buckets) else self.buckets[-1]
+            if count and cumulative + count >= rank:
+                return lower + (upper - lower) * (rank - cumulative) / count
+            cumulative += count
+            lower = upper
+        return self.buckets[-1]
+
+
+def _labels(**labels):
+    return "{" + ",".join('{}="{}"'.format(k, str(v).replace("\\", "\\\\").replace('"', '\\"')) for k, v in labels.items()) + "}"
+
+
+class MetricsRegistry:
+    """
+    API 请求指标
+
+    按端点记录延迟直方图、状态码、重试次数、收发字节数和并发请求数，
+    另外可以注册在导出时才读取的仪表（例如排队深度、剩余额度）
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        """
+        初始化指标注册表
+
+        Args:
+            buckets (tuple, optional): 延迟直方图的桶上限. Defaults to LATENCY_BUCKETS.
+        """
+        self.buckets = tuple(buckets)
+        self.started_at = time.time()
+        self._lock = threading.Lock()
+        self._latency = {}
+        self._requests = {}
+        self._retries = {}
+        self._bytes_in = {}
+        self._bytes_out = {}
+        self._in_flight = {}
+        self._gauges = {}
+
+    def begin(self, endpoint):
+        """
+        记录请求开始
+
+        Args:
+            endpoint (str): API 端点
+        """
+        with self._lock:
+            self._in_flight[endpoint] = self._in_flight.get(endpoint, 0) + 1
+
+    def end(self, endpoint, method, status, seconds, bytes_out=0, bytes_in=0):
+        """
+        记录请求结束
+
+        Args:
+            endpoint (str): API 端点
+            method (str): 请求方法
+            status (int | str): HTTP 状态码，没有响应时为错误类型，例如 timeout
+            seconds (float): 耗时（秒）
+            bytes_out (int, optional): 请求体字节数. Defaults to 0.
+            bytes_in (int, optional): 响应体字节数. Defaults to 0.
+        """
+        method = method.upper()
+        with self._lock:
+            self._in_flight[endpoint] = max(0, self._in_flight.get(endpoint, 0) - 1)
+            histogram = self._latency.get(endpoint)
+            if histogram is None:
+                histogram = self._latency[endpoint] = Histogram(self.buckets)
+            histogram.observe(seconds)
+            key = (endpoint, method, str(status))
+            self._requests[key] = self._requests.get(key, 0) + 1
+            self._bytes_out[endpoint] = self._bytes_out.get(endpoint, 0) + bytes_out
+            self._bytes_in[endpoint] = self._bytes_in.get(endpoint, 0) + bytes_in
+
+    def retry(self, endpoint, reason):
+        """
+        记录一次重试
+
+        Args:
+            endpoint (str): API 端点
+            reason (str): 重试原因，例如 timestamp、proxy、key
+        """
+        with self._lock:
+            key = (endpoint, reason)
+            self._retries[key] = self._retries.get(key, 0) + 1
+
+    def register_gauge(self, name, fn, help_text=""):
+        """
+        注册在导出时读取的仪表
+
+        Args:
+            name (str): 指标名（不含前缀），例如 queue_depth
+            fn (callable): 返回数值，或标签值到数值的字典（标签名为 name）
+            help_text (str, optional): 说明. Defaults to "".
+        """
+        with self._lock:
+            self._gauges[name] = (fn, help_text)
+
+    def _read_gauges(self):
+        with self._lock:
+            gauges = dict(self._gauges)
+        values = {}
+        for name, (fn, help_text) in gauges.items():
+            try:
+                values[name] = (fn(), help_text)
+            except Exception as e:
+                # 某个仪表读取失败不影响其他指标的导出
+                logger.error(f"读取指标 {name} 失败: {str(e)}")
+        return values
+
+    def snapshot(self):
+        """
+        返回 JSON 格式的指标
+
+        Returns:
+            dict: 包含 uptime、endpoints（每个端点的请求数、状态码、分位数、字节数、并发数）、
+                retries 和 gauges
+        """
+        with self._lock:
+            endpoints = {}
+            for endpoint, histogram in self._latency.items():
+                endpoints[endpoint] = {
+                    "requests": histogram.count,
+                    "status": {},
+                    "latency_avg": round(histogram.sum / histogram.count, 4) if histogram.count else None,
+                    "p50": histogram.quantile(0.5),
+                    "p95": histogram.quantile(0.95),
+                    "p99": histogram.quantile(0.99),
+                    "bytes_out": self._bytes_out.get(endpoint, 0),
+                    "bytes_in": self._bytes_in.get(endpoint, 0),
+                    "in_flight": self._in_flight.get(endpoint, 0),
+                }
+            for (endpoint, method, status), count in self._requests.items():
+                entry = endpoints[endpoint]["status"]
+                entry[status] = entry.get(status, 0) + count
+            for endpoint, count in self._in_flight.items():
+                if endpoint not in endpoints and count:
+                    endpoints[endpoint] = {"requests": 0, "status": {}, "in_flight": count}
+            retries = {}
+            for (endpoint, reason), count in self._retries.items():
+                retries.setdefault(endpoint, {})[reason] = count
+        for entry in endpoints.values():
+            for name in ("p50", "p95", "p99"):
+                if entry.get(name) is not None:
+                    entry[name] = round(entry[name], 4)
+        return {
+            "uptime": round(time.time() - self.started_at, 1),
+            "endpoints": endpoints,
+            "retries": retries,
+            "gauges": {name: value for name, (value, _) in self._read_gauges().items()},
+        }
+
+    def render_prometheus(self):
+        """
+        返回 Prometheus 文本格式的指标
+
+        Returns:
+            str: 指标文本
+        """
+        lines = []
+        with self._lock:
+            lines += [
+                f"# HELP {PREFIX}_request_duration_seconds API 请求耗时",
+                f"# TYPE {PREFIX}_request_duration_seconds histogram",
+            ]
+            for endpoint, histogram in sorted(self._latency.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets + ("+Inf",), histogram.counts):
+                    cumulative += count
+                    lines.append(f"{PREFIX}_request_duration_seconds_bucket{_labels(endpoint=endpoint, le=bound)} {cumulative}")
+                lines.append(f"{PREFIX}_request_duration_seconds_sum{_labels(endpoint=endpoint)} {histogram.sum:.6f}")
+                lines.append(f"{PREFIX}_request_duration_seconds_count{_labels(endpoint=endpoint)} {histogram.count}")
+
+            lines += [f"# HELP {PREFIX}_requests_total API 请求数", f"# TYPE {PREFIX}_requests_total counter"]
+            for (endpoint, method, status), count in sorted(self._requests.items()):
+                lines.append(f"{PREFIX}_requests_total{_labels(endpoint=endpoint, method=method, status=status)} {count}")
+
+            lines += [f"# HELP {PREFIX}_retries_total API 重试次数", f"# TYPE {PREFIX}_retries_total counter"]
+            for (endpoint, reason), count in sorted(self._retries.items()):
+                lines.append(f"{PREFIX}_retries_total{_labels(endpoint=endpoint, reason=reason)} {count}")
+
+            for name, values, help_text in (
+                ("request_bytes_total", self._bytes_out, "发送的请求体字节数"),
+                ("response_bytes_total", self._bytes_in, "接收的响应体字节数"),
+            ):
+                lines += [f"# HELP {PREFIX}_{name} {help_text}", f"# TYPE {PREFIX}_{name} counter"]
+                for endpoint, value in sorted(values.items()):
+                    lines.append(f"{PREFIX}_{name}{_labels(endpoint=endpoint)} {value}")
+
+            lines += [f"# HELP {PREFIX}_in_flight_requests 正在进行的 API 请求数", f"# TYPE {PREFIX}_in_flight_requests gauge"]
+            for endpoint, value in sorted(self._in_flight.items()):
+                lines.append(f"{PREFIX}_in_flight_requests{_labels(endpoint=endpoint)} {value}")
+
+        for name, (value, help_text) in sorted(self._read_gauges().items()):
+            lines += [f"# HELP {PREFIX}_{name} {help_text or name}", f"# TYPE {PREFIX}_{name} gauge"]
+            if isinstance(value, dict):
+                for label, item in sorted(value.items()):
+                    if isinstance(item, (int, float)):
+                        lines.append(f"{PREFIX}_{name}{_labels(**{name: label})} {item}")
+            elif isinstance(value, (int, float)):
+                lines.append(f"{PREFIX}_{name} {value}")
+        return "\n".join(lines) + "\n"
+
+
+def register_routes(app, registry, path="/liblibai/metrics"):
+    """
+    在 WebUI 的 FastAPI 应用上注册指标路由
+
+    path 返回 Prometheus 文本格式，path + "/json" 返回 JSON
+
+    Args:
+        app (fastapi.FastAPI): WebUI 的应用实例
+        registry (MetricsRegistry): 指标注册表
+        path (str, optional): 路由路径. Defaults to "/liblibai/metrics".
+    """
+    from fastapi.responses import Response
+
+    def prometheus_metrics():
+        return Response(registry.render_prometheus(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+    def json_metrics():
+        return Response(json.dumps(registry.snapshot(), ensure_ascii=False), media_type="application/json")
+
+    app.add_api_route(path, prometheus_metrics, methods=["GET"])
+    app.add_api_route(path + "/json", json_metrics, methods=["GET"])
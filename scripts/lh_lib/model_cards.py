@@ -0,0 +1,87 @@
+from scripts.lh_lib.hashing import short_hash
+
+# 单次请求最多查询的模型数
+MAX_NAMES = 10000
+
+
+def describe_model(entry, has_presets=None):
+    """
+    把本地索引条目转换为前端模型卡片使用的信息
+
+    Args:
+        entry (dict): LocalModelIndex 的条目，为 None 表示本地没有该模型
+        has_presets (callable, optional): 接收模型 ID，返回是否已缓存该模型的预设. Defaults to None.
+
+    Returns:
+        dict: 卡片信息
+    """
+    if not entry:
+        return {"local": False, "match": None}
+    remote = entry.get("remote") or {}
+    remote_id = remote.get("id")
+    return {
+        "local": True,
+        "kind": entry.get("kind"),
+        "hash": short_hash(entry.get("hash")),
+        "match": entry.get("match"),
+        "remote_id": remote_id,
+        "remote_name": remote.get("name"),
+        "type": remote.get("type"),
+        "presets": bool(remote_id and has_presets and has_presets(remote_id)),
+    }
+
+
+def describe_models(index, names, kind=None, has_presets=None):
+    """
+    批量查询模型卡片信息
+
+    只读取本地索引和已缓存的数据，不访问网络
+
+    Args:
+        index (LocalModelIndex): 本地模型索引，为 None 时所有模型都视为未找到
+        names (list): WebUI 中显示的模型名称
+        kind (str, optional): 模型类型. Defaults to None.
+        has_presets (callable, optional): 接收模型 ID，返回是否已缓存该模型的预设. Defaults to None.
+
+    Returns:
+        dict: 模型名称到卡片信息的映射
+    """
+    result = {}
+    for name in names[:MAX_NAMES]:
+        if not isinstance(name, str) or name in result:
+            continue
+        entry = index.find(name, kind) if index is not None else None
+        result[name] = describe_model(entry, has_presets)
+    return result
+
+
+def register_routes(app, get_index, has_presets=None, path="/liblibai/model-cards"):
+    """
+    在 WebUI 的 FastAPI 应用上注册模型卡片信息路由
+
+    POST path，请求体为 {"names": [...], "kind": "LoRA"}，一次返回所有模型的信息
+
+    Args:
+        app (fastapi.FastAPI): WebUI 的应用实例
+        get_index (callable): 返回当前的 LocalModelIndex（可能为 None），索引会在重新加载设置时替换
+        has_presets (callable, optional): 接收模型 ID，返回是否已缓存该模型的预设. Defaults to None.
+        path (str, optional): 路由路径. Defaults to "/liblibai/model-cards".
+    """
+    from fastapi import Request
+    from fastapi.responses import JSONResponse
+
+    async def model_cards(request: Request):
+        try:
+            payload = await request.json()
+        except ValueError:
+            return JSONResponse({"error": "请求体不是有效的 JSON"}, status_code=400)
+        names = payload.get("names") if isinstance(payload, dict) else None
+        if not isinstance(names, list):
+            return JSONResponse({"error": "names 必须是列表"}, status_code=400)
+        index = get_index()
+        return JSONResponse({
+            "ready": index is not None and index.last_scan_seconds is not None,
+            "models": describe_models(index, names, payload.get("kind"), has_presets),
+        })
+
+    app.add_api_route(path, model_cards, methods=["POST"])
@@ -0,0 +1,417 @@
+import io
+import os
+import re
+import time
+import uuid
+import hashlib
+import threading
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image, PngImagePlugin
+
+from scripts.lh_lib.sqlite_util import connect
+
+logger = logging.getLogger(__name__)
+
+# 支持的输出格式及对应的扩展名
+FORMATS = {
+    "png": ("PNG", "png"),
+    "webp": ("WEBP", "webp"),
+    "jpeg": ("JPEG", "jpg"),
+    "jpg": ("JPEG", "jpg"),
+}
+
+# 参数行中的 "键: 值" 项，与 WebUI 解析 infotext 的规则一致
+RE_PARAM = re.compile(r'\s*([\w ]+):\s*("(?:\\.|[^\\"])+"|[^,]*)(?:,|$)')
+
+# EXIF 中 ExifIFD 和 UserComment 的标签号，与 WebUI 保存 JPEG/WebP 参数的位置一致
+EXIF_IFD = 0x8769
+USER_COMMENT = 0x9286
+
+
+def format_infotext(prompt, negative_prompt="", **params):
+    """
+    按 WebUI 的格式生成参数文本
+
+    Args:
+        prompt (str): 提示词
+        negative_prompt (str, optional): 负面提示词. Defaults to "".
+        **params: 其他参数，例如 Steps=20、Sampler="euler_a"，值为 None 的项会被忽略
+
+    Returns:
+        str: 参数文本
+    """
+    lines = [prompt or ""]
+    if negative_prompt:
+        lines.append(f"Negative prompt: {negative_prompt}")
+    fields = ", ".join(f"{key}: {value}" for key, value in params.items() if value is not None)
+    if fields:
+        lines.append(fields)
+    return "\n".join(lines)
+
+
+def parse_infotext(info):
+    """
+    解析 WebUI 格式的参数文本
+
+    Args:
+        info (str): 参数文本
+
+    Returns:
+        dict: 包含 prompt、negative_prompt 和参数行中的各项（键保持原样，例如 Steps、CFG scale）
+    """
+    lines = (info or "").strip().split("\n")
+    params = {}
+    found = RE_PARAM.findall(lines[-1])
+    if len(found) >= 3:
+        # 最后一行至少包含 3 个 "键: 值" 项时视为参数行
+        params = {key.strip(): value.strip().strip('"') for key, value in found}
+        lines = lines[:-1]
+
+    prompt_lines, negative_lines = [], []
+    target = prompt_lines
+    for line in lines:
+        if line.startswith("Negative prompt:"):
+            target = negative_lines
+            line = line[len("Negative prompt:"):].strip()
+        target.append(line)
+
+    return {"prompt": "\n".join(prompt_lines).strip(), "negative_prompt": "\n".join(negative_lines).strip(), **params}
+
+
+def build_exif(info):
+    """
+    把生成参数写入 EXIF UserComment
+
+    Args:
+        info (str): 生成参数文本
+
+    Returns:
+        Image.Exif: EXIF 数据
+    """
+    exif = Image.Exif()
+    exif.get_ifd(EXIF_IFD)[USER_COMMENT] = b"UNICODE\0" + info.encode("utf-16-be")
+    return exif
+
+
+def read_infotext(path):
+    """
+    读取图片中保存的生成参数
+
+    Args:
+        path (str): 图片路径
+
+    Returns:
+        str: 生成参数文本，没有时返回空字符串
+    """
+    with Image.open(path) as image:
+        if "parameters" in image.info:
+            return image.info["parameters"]
+        comment = image.getexif().get_ifd(EXIF_IFD).get(USER_COMMENT)
+    if isinstance(comment, bytes) and comment.startswith(b"UNICODE\0"):
+        return comment[8:].decode("utf-16-be", errors="replace")
+    if isinstance(comment, bytes):
+        return comment.decode("utf-8", errors="replace")
+    return comment or ""
+
+
+class OutputManifest:
+    """
+    输出清单
+
+    记录每张图片的内容哈希、相对路径和缩略图，按哈希查找或按时间分页浏览
+    都不需要列目录。多个进程可以同时写入同一个清单
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS outputs (
+            hash TEXT PRIMARY KEY,
+            path TEXT NOT NULL,
+            thumbnail TEXT,
+            format TEXT,
+            source TEXT,
+            width INTEGER,
+            height INTEGER,
+            bytes INTEGER,
+            created_at REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_outputs_created ON outputs (created_at);
+    """
+
+    def __init__(self, root, busy_timeout=30):
+        """
+        初始化输出清单
+
+        Args:
+            root (str): 保存目录，清单文件为其中的 manifest.db，路径相对于该目录保存
+            busy_timeout (float, optional): 等待数据库锁的最长时间（秒）. Defaults to 30.
+        """
+        self.root = root
+        self.db_path = os.path.join(root, "manifest.db")
+        self.busy_timeout = busy_timeout
+        os.makedirs(root, exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript(self.SCHEMA)
+
+    def _connect(self):
+        return connect(self.db_path, self.busy_timeout)
+
+    def _to_entry(self, row):
+        entry = dict(row)
+        entry["path"] = os.path.join(self.root, entry["path"])
+        if entry["thumbnail"]:
+            entry["thumbnail"] = os.path.join(self.root, entry["thumbnail"])
+        return entry
+
+    def add(self, entry):
+        """
+        添加图片记录，相同哈希的图片只记录第一次
+
+        Args:
+            entry (dict): 图片信息，包含 hash、path、thumbnail、format、source、width、height、bytes
+
+        Returns:
+            bool: 是否为新记录
+        """
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "INSERT OR IGNORE INTO outputs (hash, path, thumbnail, format, source, width, height, bytes, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    entry["hash"],
+                    os.path.relpath(entry["path"], self.root),
+                    os.path.relpath(entry["thumbnail"], self.root) if entry.get("thumbnail") else None,
+                    entry.get("format"),
+                    entry.get("source"),
+                    entry.get("width"),
+                    entry.get("height"),
+                    entry.get("bytes"),
+                    entry.get("created_at", time.time()),
+                )
+            )
+            return cursor.rowcount == 1
+
+    def get(self, content_hash):
+        """
+        按内容哈希查找图片
+
+        Args:
+            content_hash (str): SHA-256 哈希
+
+        Returns:
+            dict: 图片信息（路径为绝对路径），不存在时返回 None
+        """
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM outputs WHERE hash = ?", (content_hash,)).fetchone()
+        return self._to_entry(row) if row else None
+
+    def list(self, limit=50, offset=0):
+        """
+        按时间倒序分页列出图片
+
+        Args:
+            limit (int, optional): 每页数量. Defaults to 50.
+            offset (int, optional): 跳过的数量. Defaults to 0.
+
+        Returns:
+            list: 图片信息列表
+        """
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT * FROM outputs ORDER BY created_at DESC LIMIT ? OFFSET ?", (limit, offset)
+            ).fetchall()
+        return [self._to_entry(row) for row in rows]
+
+    def count(self):
+        """
+        返回图片数量
+
+        Returns:
+            int: 图片数量
+        """
+        with self._connect() as conn:
+            return conn.execute("SELECT COUNT(*) FROM outputs").fetchone()[0]
+
+
+def shard_path(root, content_hash, ext, day=None):
+    """
+    返回按日期和哈希前缀分片的路径
+
+    Args:
+        root (str): 根目录
+        content_hash (str): 内容哈希
+        ext (str): 扩展名
+        day (str, optional): 日期目录，默认为今天. Defaults to None.
+
+    Returns:
+        str: root/YYYY-MM-DD/哈希前两位/哈希.扩展名
+    """
+    day = day or time.strftime("%Y-%m-%d")
+    return os.path.join(root, day, content_hash[:2], f"{content_hash}.{ext}")
+
+
+class ImageWriter:
+    """
+    后台图片保存
+
+    图片在后台线程中解码一次，写入生成参数后按配置的格式编码保存，同时生成缩略图。
+    文件以编码后内容的 SHA-256 命名，按日期和哈希前缀分片存放，并记录到输出清单；
+    不同图片的文件名不会冲突，相同图片只保存一份。文件先写临时文件再重命名，
+    界面不会读到写了一半的图片
+    """
+
+    def __init__(self, save_path, image_format="png", quality=90, thumbnail_size=256, workers=1, manifest=True,
+                 index=None):
+        """
+        初始化图片保存器
+
+        Args:
+            save_path (str): 保存目录
+            image_format (str, optional): 输出格式，png、webp 或 jpeg. Defaults to "png".
+            quality (int, optional): WebP/JPEG 的编码质量（1-100）. Defaults to 90.
+            thumbnail_size (int, optional): 缩略图最长边，0 表示不生成. Defaults to 256.
+            workers (int, optional): 后台线程数. Defaults to 1.
+            manifest (bool, optional): 是否记录输出清单. Defaults to True.
+            index (HistoryIndex, optional): 搜索索引，新保存的图片会同时写入索引. Defaults to None.
+        """
+        self.save_path = save_path
+        self.image_format = image_format.lower() if image_format.lower() in FORMATS else "png"
+        self.quality = max(1, min(100, int(quality)))
+        self.thumbnail_size = thumbnail_size
+        self.saved = 0
+        self.deduplicated = 0
+        self._manifest = None
+        self._manifest_enabled = manifest
+        self.index = index
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="liblibai-writer")
+
+    @property
+    def manifest(self):
+        """
+        输出清单，第一次保存时创建
+
+        Returns:
+            OutputManifest: 输出清单，未启用时为 None
+        """
+        if self._manifest is None and self._manifest_enabled:
+            with self._lock:
+                if self._manifest is None:
+                    self._manifest = OutputManifest(self.save_path)
+        return self._manifest
+
+    def submit(self, image, info="", source="liblibai", metadata=None):
+        """
+        提交保存任务
+
+        Args:
+            image (bytes | PIL.Image.Image): 下载的图片内容或已解码的图片
+            info (str, optional): 生成参数文本. Defaults to "".
+            source (str, optional): 图片来源，记录在清单中. Defaults to "liblibai".
+            metadata (dict, optional): 写入搜索索引的附加信息，例如 task_id. Defaults to None.
+
+        Returns:
+            concurrent.futures.Future: 完成后返回 save 的结果
+        """
+        return self._executor.submit(self.save, image, info, source, metadata)
+
+    def save(self, image, info="", source="liblibai", metadata=None):
+        """
+        在当前线程中保存图片
+
+        Args:
+            image (bytes | PIL.Image.Image): 下载的图片内容或已解码的图片
+            info (str, optional): 生成参数文本. Defaults to "".
+            source (str, optional): 图片来源，记录在清单中. Defaults to "liblibai".
+            metadata (dict, optional): 写入搜索索引的附加信息，例如 task_id. Defaults to None.
+
+        Returns:
+            dict: 包含 path（图片路径）、thumbnail（缩略图路径，未生成时为 None）、
+                format、hash、created（是否新写入，相同内容已存在时为 False）
+        """
+        if isinstance(image, (bytes, bytearray)):
+            image = Image.open(io.BytesIO(image))
+        image.load()
+
+        pil_format, ext = FORMATS[self.image_format]
+        if pil_format == "JPEG" and image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+
+        buffer = io.BytesIO()
+        image.save(buffer, pil_format, **self._save_options(pil_format, info))
+        data = buffer.getvalue()
+        content_hash = hashlib.sha256(data).hexdigest()
+
+        manifest = self.manifest
+        existing = manifest.get(content_hash) if manifest else None
+        if existing and os.path.exists(existing["path"]):
+            with self._lock:
+                self.deduplicated += 1
+            return {
+                "path": existing["path"], "thumbnail": existing["thumbnail"],
+                "format": existing["format"], "hash": content_hash, "created": False
+            }
+
+        path = shard_path(self.save_path, content_hash, ext)
+        self._write(path, data)
+
+        thumbnail = None
+        if self.thumbnail_size:
+            thumb = image.convert("RGB")
+            thumb.thumbnail((self.thumbnail_size, self.thumbnail_size))
+            thumb_buffer = io.BytesIO()
+            thumb.save(thumb_buffer, "WEBP", quality=80)
+            thumbnail = shard_path(os.path.join(self.save_path, "thumbnails"), content_hash, "webp")
+            self._write(thumbnail, thumb_buffer.getvalue())
+
+        if manifest:
+            manifest.add({
+                "hash": content_hash, "path": path, "thumbnail": thumbnail, "format": self.image_format,
+                "source": source, "width": image.width, "height": image.height, "bytes": len(data)
+            })
+        if self.index is not None:
+            try:
+                self.index.add_image(path, info, thumbnail=thumbnail, metadata={**(metadata or {}), "hash": content_hash})
+            except Exception as e:
+                # 索引失败不影响图片保存，之后可以通过重建索引补上
+                logger.error(f"写入搜索索引失败: {str(e)}")
+        with self._lock:
+            self.saved += 1
+        return {"path": path, "thumbnail": thumbnail, "format": self.image_format, "hash": content_hash, "created": True}
+
+    def _save_options(self, pil_format, info):
+        if pil_format == "PNG":
+            options = {}
+            if info:
+                pnginfo = PngImagePlugin.PngInfo()
+                # 与 WebUI 相同的 parameters 文本块，PNG Info 页面可以直接读取
+                pnginfo.add_text("parameters", info)
+                options["pnginfo"] = pnginfo
+            return options
+        options = {"quality": self.quality}
+        if info:
+            options["exif"] = build_exif(info)
+        return options
+
+    def _write(self, path, data):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # 临时文件名包含随机部分，多个进程同时写同一张图片也不会互相覆盖临时文件
+        tmp_path = f"{path}.{uuid.uuid4().hex[:8]}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+    def shutdown(self, wait=True):
+        """
+        停止后台线程
+
+        Args:
+            wait (bool, optional): 是否等待已提交的任务完成. Defaults to True.
+        """
+        self._executor.shutdown(wait=wait)
@@ -0,0 +1,300 @@
+import os
+import re
+import sys
+import time
+import types
+import inspect
+import logging
+import cProfile
+import functools
+import threading
+from collections import Counter
+
+logger = logging.getLogger(__name__)
+
+# 环境变量：设置为 1/deterministic 或 sampling 时启用，优先于设置文件
+ENV_ENABLED = "LIBLIBAI_PROFILE"
+ENV_THRESHOLD = "LIBLIBAI_PROFILE_THRESHOLD_MS"
+ENV_OUTPUT_DIR = "LIBLIBAI_PROFILE_DIR"
+
+# 支持的分析方式
+MODES = ("deterministic", "sampling")
+
+
+class _DeterministicSession:
+    """cProfile 确定性分析，记录每个函数调用"""
+
+    extension = "prof"
+
+    def __init__(self, interval):
+        self.profile = cProfile.Profile()
+
+    def resume(self):
+        self.profile.enable()
+
+    def pause(self):
+        self.profile.disable()
+
+    def dump(self, path):
+        self.profile.dump_stats(path)
+
+
+class _SamplingSession:
+    """
+    采样分析
+
+    后台线程按固定间隔读取被分析线程的调用栈，结果保存为折叠栈格式
+    （每行 "函数;函数;... 次数"），可以直接用 flamegraph.pl 或 speedscope 打开
+    """
+
+    extension = "folded"
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.samples = Counter()
+        self._thread_id = None
+        self._stop = threading.Event()
+        self._sampler = None
+
+    def resume(self):
+        self._thread_id = threading.get_ident()
+        self._stop.clear()
+        self._sampler = threading.Thread(target=self._run, name="liblibai-profiler", daemon=True)
+        self._sampler.start()
+
+    def pause(self):
+        self._stop.set()
+        if self._sampler is not None:
+            self._sampler.join()
+            self._sampler = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                frame = frame.f_back
+            if stack:
+                self.samples[";".join(reversed(stack))] += 1
+
+    def dump(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in self.samples.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+@types.coroutine
+def _profile_steps(session, coro, elapsed):
+    """
+    逐步驱动协程，只在协程自身执行时启用分析
+
+    协程每次挂起（等待网络、sleep 等）时暂停分析，事件循环在这期间运行的其他任务
+    不会被记录到本次分析中
+
+    Args:
+        session: 分析会话
+        coro: 协程或其他支持 send/throw 的可等待对象
+        elapsed (list): 单元素列表，累加本次驱动的执行时间（秒）
+
+    Returns:
+        any: 协程的返回值
+    """
+    value, error = None, None
+    while True:
+        started = time.perf_counter()
+        session.resume()
+        try:
+            if error is not None:
+                yielded = coro.throw(error)
+            else:
+                yielded = coro.send(value)
+        except StopIteration as stop:
+            return stop.value
+        finally:
+            session.pause()
+            elapsed[0] += time.perf_counter() - started
+        value, error = None, None
+        try:
+            value = yield yielded
+        except BaseException as e:
+            # 取消等异常转交给协程处理
+            error = e
+
+
+class HandlerProfiler:
+    """
+    界面事件处理函数的按需性能分析
+
+    关闭时包装后的函数只多一次属性判断；开启后每次调用都会被分析，耗时超过阈值的调用
+    把分析结果写入文件，文件名包含处理函数名称、时间和耗时
+    """
+
+    def __init__(self, output_dir, enabled=False, mode="deterministic", threshold_ms=500, interval=0.005):
+        """
+        初始化性能分析器
+
+        Args:
+            output_dir (str): 分析结果的保存目录
+            enabled (bool, optional): 是否启用. Defaults to False.
+            mode (str, optional): deterministic（cProfile）或 sampling（调用栈采样）. Defaults to "deterministic".
+            threshold_ms (float, optional): 只保存耗时超过该值（毫秒）的调用. Defaults to 500.
+            interval (float, optional): 采样间隔（秒）. Defaults to 0.005.
+        """
+        self.output_dir = output_dir
+        self.enabled = enabled
+        self.mode = mode if mode in MODES else "deterministic"
+        self.threshold_ms = threshold_ms
+        self.interval = interval
+        self.dumped = []
+        # cProfile 同一时间只能有一个实例处于启用状态，分析串行进行
+        self._lock = threading.Lock()
+
+    def configure(self, enabled=None, mode=None, threshold_ms=None, output_dir=None):
+        """
+        更新配置，值为 None 的项保持不变
+
+        环境变量 LIBLIBAI_PROFILE、LIBLIBAI_PROFILE_THRESHOLD_MS、LIBLIBAI_PROFILE_DIR
+        存在时优先于传入的值
+
+        Args:
+            enabled (bool, optional): 是否启用. Defaults to None.
+            mode (str, optional): 分析方式. Defaults to None.
+            threshold_ms (float, optional): 阈值（毫秒）. Defaults to None.
+            output_dir (str, optional): 保存目录. Defaults to None.
+        """
+        env = os.environ.get(ENV_ENABLED, "").strip().lower()
+        if env:
+            enabled = env not in ("0", "false", "off", "no")
+            if env in MODES:
+                mode = env
+        if os.environ.get(ENV_THRESHOLD):
+            threshold_ms = float(os.environ[ENV_THRESHOLD])
+        output_dir = os.environ.get(ENV_OUTPUT_DIR) or output_dir
+
+        if enabled is not None:
+            self.enabled = bool(enabled)
+        if mode in MODES:
+            self.mode = mode
+        if threshold_ms is not None:
+            self.threshold_ms = float(threshold_ms)
+        if output_dir:
+            self.output_dir = output_dir
+
+    def _start(self):
+        # 已有分析在进行时（例如并发的另一个请求）本次调用不分析
+        if not self._lock.acquire(blocking=False):
+            return None
+        session_class = _SamplingSession if self.mode == "sampling" else _DeterministicSession
+        return session_class(self.interval)
+
+    def _finish(self, name, session, elapsed):
+        try:
+            elapsed_ms = elapsed * 1000
+            if elapsed_ms < self.threshold_ms:
+                return None
+            os.makedirs(self.output_dir, exist_ok=True)
+            safe_name = re.sub(r"[^\w.-]", "_", name)
+            stamp = time.strftime("%Y%m%d-%H%M%S")
+            path = os.path.join(self.output_dir, f"{safe_name}-{stamp}-{elapsed_ms:.0f}ms.{session.extension}")
+            session.dump(path)
+            self.dumped.append(path)
+            logger.info(f"{name} 耗时 {elapsed_ms:.0f}ms，性能分析已保存: {path}")
+            return path
+        except Exception as e:
+            logger.error(f"保存性能分析失败: {str(e)}")
+            return None
+        finally:
+            self._lock.release()
+
+    def wrap(self, name, fn):
+        """
+        包装处理函数
+
+        包装后的函数与原函数类型相同（普通函数、协程函数、生成器函数、异步生成器函数），
+        签名也保持不变，Gradio 按原来的方式调用。生成器只在产出之间分析，等待界面
+        取值的时间不计入；协程和异步生成器只在自身执行时分析，await 挂起的时间不计入
+
+        Args:
+            name (str): 处理函数名称，用于分析结果的文件名
+            fn (callable): 处理函数
+
+        Returns:
+            callable: 包装后的函数
+        """
+        profiler = self
+
+        if inspect.isasyncgenfunction(fn):
+            @functools.wraps(fn)
+            async def async_gen_wrapper(*args, **kwargs):
+                session = profiler._start() if profiler.enabled else None
+                if session is None:
+                    async for item in fn(*args, **kwargs):
+                        yield item
+                    return
+                elapsed = [0.0]
+                agen = fn(*args, **kwargs)
+                try:
+                    while True:
+                        try:
+                            item = await _profile_steps(session, agen.__anext__(), elapsed)
+                        except StopAsyncIteration:
+                            break
+                        yield item
+                finally:
+                    await agen.aclose()
+                    profiler._finish(name, session, elapsed[0])
+            return async_gen_wrapper
+
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def coroutine_wrapper(*args, **kwargs):
+                session = profiler._start() if profiler.enabled else None
+                if session is None:
+                    return await fn(*args, **kwargs)
+                elapsed = [0.0]
+                try:
+                    return await _profile_steps(session, fn(*args, **kwargs), elapsed)
+                finally:
+                    profiler._finish(name, session, elapsed[0])
+            return coroutine_wrapper
+
+        if inspect.isgeneratorfunction(fn):
+            @functools.wraps(fn)
+            def generator_wrapper(*args, **kwargs):
+                session = profiler._start() if profiler.enabled else None
+                if session is None:
+                    return (yield from fn(*args, **kwargs))
+                elapsed = 0.0
+                gen = fn(*args, **kwargs)
+                try:
+                    while True:
+                        started = time.perf_counter()
+                        session.resume()
+                        try:
+                            item = next(gen)
+                        except StopIteration as stop:
+                            return stop.value
+                        finally:
+                            session.pause()
+                            elapsed += time.perf_counter() - started
+                        yield item
+                finally:
+                    gen.close()
+                    profiler._finish(name, session, elapsed)
+            return generator_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            session = profiler._start() if profiler.enabled else None
+            if session is None:
+                return fn(*args, **kwargs)
+            started = time.perf_counter()
+            session.resume()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                session.pause()
+                profiler._finish(name, session, time.perf_counter() - started)
+        return wrapper
@@ -0,0 +1,213 @@
+import time
+import threading
+
+
+class ProxyState:
+    """
+    单个代理的健康状态与延迟统计
+    """
+
+    def __init__(self, url, alpha=0.3):
+        """
+        初始化代理状态
+
+        Args:
+            url (str): 代理地址，例如 http://127.0.0.1:7890
+            alpha (float, optional): EWMA 平滑系数. Defaults to 0.3.
+        """
+        self.url = url
+        self.alpha = alpha
+        self.healthy = True
+        self.latency_ewma = None
+        self.successes = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.last_checked = 0.0
+        self.last_error = ""
+
+    def as_requests_proxies(self):
+        """
+        返回 requests 使用的代理字典
+
+        Returns:
+            dict: 代理配置
+        """
+        return {"http": self.url, "https": self.url}
+
+    def observe(self, latency):
+        if self.latency_ewma is None:
+            self.latency_ewma = latency
+        else:
+            self.latency_ewma = self.alpha * latency + (1 - self.alpha) * self.latency_ewma
+
+
+class ProxyPool:
+    """
+    代理池
+
+    主动探测每个代理的可用性，用 EWMA 跟踪请求延迟，每次请求选择最快的健康代理，
+    连续失败的代理会被标记为不可用，直到下一次探测成功
+    """
+
+    def __init__(self, proxies, probe_url="https://api.liblibai.com", probe_interval=60,
+                 probe_timeout=5, max_failures=3, alpha=0.3):
+        """
+        初始化代理池
+
+        Args:
+            proxies (list): 代理地址列表
+            probe_url (str, optional): 健康探测地址. Defaults to "https://api.liblibai.com".
+            probe_interval (float, optional): 探测间隔（秒）. Defaults to 60.
+            probe_timeout (float, optional): 探测超时时间（秒）. Defaults to 5.
+            max_failures (int, optional): 连续失败多少次后标记为不可用. Defaults to 3.
+            alpha (float, optional): EWMA 平滑系数. Defaults to 0.3.
+        """
+        self.proxies = [ProxyState(url, alpha) for url in dict.fromkeys(p.strip() for p in proxies) if url]
+        self.probe_url = probe_url
+        self.probe_interval = probe_interval
+        self.probe_timeout = probe_timeout
+        self.max_failures = max_failures
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @classmethod
+    def from_string(cls, value, **kwargs):
+        """
+        从逗号或换行分隔的字符串创建代理池
+
+        Args:
+            value (str): 代理地址列表字符串
+            **kwargs: 传给构造函数的其他参数
+
+        Returns:
+            ProxyPool: 代理池
+        """
+        return cls((value or "").replace(",", "\n").splitlines(), **kwargs)
+
+    def __len__(self):
+        return len(self.proxies)
+
+    def choose(self, exclude=()):
+        """
+        选择一个代理
+
+        Args:
+            exclude (iterable, optional): 本次请求已经失败过的代理. Defaults to ().
+
+        Returns:
+            ProxyState: 延迟最低的健康代理；全部不可用时返回连续失败次数最少的代理
+        """
+        with self._lock:
+            candidates = [p for p in self.proxies if p not in exclude] or self.proxies
+            healthy = [p for p in candidates if p.healthy]
+            if not healthy:
+                return min(candidates, key=lambda p: p.consecutive_failures)
+            # 尚未测得延迟的代理优先，尽快获得它的延迟数据
+            return min(healthy, key=lambda p: -1 if p.latency_ewma is None else p.latency_ewma)
+
+    def report_success(self, proxy, latency):
+        """
+        记录一次成功请求
+
+        Args:
+            proxy (ProxyState): 使用的代理
+            latency (float): 请求耗时（秒）
+        """
+        with self._lock:
+            proxy.observe(latency)
+            proxy.successes += 1
+            proxy.consecutive_failures = 0
+            proxy.healthy = True
+
+    def report_failure(self, proxy, error):
+        """
+        记录一次失败请求
+
+        Args:
+            proxy (ProxyState): 使用的代理
+            error (Exception): 错误
+        """
+        with self._lock:
+            proxy.failures += 1
+            proxy.consecutive_failures += 1
+            proxy.last_error = str(error)
+            if proxy.consecutive_failures >= self.max_failures:
+                proxy.healthy = False
+
+    def probe(self, proxy):
+        """
+        探测单个代理
+
+        Args:
+            proxy (ProxyState): 代理
+
+        Returns:
+            bool: 是否可用
+        """
+        import requests
+        
+        start = time.time()
+        try:
+            requests.head(
+                self.probe_url,
+                proxies=proxy.as_requests_proxies(),
+                timeout=self.probe_timeout,
+                allow_redirects=False
+            )
+        except requests.exceptions.RequestException as e:
+            with self._lock:
+                proxy.last_checked = time.time()
+                proxy.last_error = str(e)
+                proxy.failures += 1
+                proxy.consecutive_failures += 1
+                proxy.healthy = False
+            return False
+        # 任何 HTTP 响应都说明代理能连通目标服务
+        self.report_success(proxy, time.time() - start)
+        proxy.last_checked = time.time()
+        return True
+
+    def probe_all(self):
+        """探测所有代理"""
+        for proxy in list(self.proxies):
+            self.probe(proxy)
+
+    def start(self):
+        """启动后台探测线程"""
+        if self._thread is None and self.proxies:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="liblibai-proxy-probe", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """停止后台探测线程"""
+        self._stop.set()
+        self._thread = None
+
+    def _run(self):
+        while True:
+            self.probe_all()
+            if self._stop.wait(self.probe_interval):
+                break
+
+    def stats(self):
+        """
+        返回每个代理的统计信息
+
+        Returns:
+            list: 每个代理一项统计信息
+        """
+        with self._lock:
+            return [
+                {
+                    "proxy": p.url,
+                    "healthy": p.healthy,
+                    "latency_ewma": None if p.latency_ewma is None else round(p.latency_ewma, 3),
+                    "successes": p.successes,
+                    "failures": p.failures,
+                    "consecutive_failures": p.consecutive_failures,
+                    "last_error": p.last_error,
+                }
+                for p in self.proxies
+            ]
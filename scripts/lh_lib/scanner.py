@@ -0,0 +1,410 @@
+import os
+import re
+import time
+import threading
+import logging
+
+from scripts.lh_lib.hashing import MODEL_EXTENSIONS, find_model_files, short_hash
+
+logger = logging.getLogger(__name__)
+
+# LiblibAI 模型信息中可能包含文件哈希的字段
+REMOTE_HASH_FIELDS = ("sha256", "hash", "model_hash")
+
+
+def normalize_name(name):
+    """
+    规范化模型名称，用于按名称匹配
+
+    Args:
+        name (str): 模型名称或文件名
+
+    Returns:
+        str: 去掉扩展名、大小写和标点后的名称
+    """
+    base = os.path.basename(name or "")
+    stem, ext = os.path.splitext(base)
+    if ext.lower() in MODEL_EXTENSIONS:
+        base = stem
+    return re.sub(r"[\W_]+", "", base.lower())
+
+
+class LocalModelIndex:
+    """
+    本地模型文件索引
+
+    启动时完整扫描一次各类模型目录并计算哈希（未变化的文件使用哈希缓存），
+    之后通过文件系统事件（watchdog）增量更新；未安装 watchdog 时定期比较文件的
+    大小和修改时间，只处理发生变化的文件。每个文件按哈希或名称匹配 LiblibAI 模型
+    """
+
+    def __init__(self, directories, hasher, poll_interval=30, debounce=2.0):
+        """
+        初始化索引
+
+        Args:
+            directories (dict): 模型类型到目录的映射，例如 {"底模": "models/Stable-diffusion"}
+            hasher (ModelHasher): 哈希计算器，为 None 时不计算哈希，只按名称匹配
+            poll_interval (float, optional): 无法监听文件事件时的轮询间隔（秒）. Defaults to 30.
+            debounce (float, optional): 文件事件停止后等待多久再处理（秒），避免处理复制到一半的文件. Defaults to 2.0.
+        """
+        self.directories = {kind: os.path.abspath(path) for kind, path in directories.items() if path}
+        self.hasher = hasher
+        self.poll_interval = poll_interval
+        self.debounce = debounce
+        self.mode = None
+        self.progress = {"done": 0, "total": 0, "bytes_done": 0, "bytes_total": 0}
+        self.last_scan_seconds = None
+        self._entries = {}
+        self._by_name = {}
+        self._remote_by_hash = {}
+        self._remote_by_name = {}
+        self._remote_source = None
+        self._lock = threading.RLock()
+        self._pending = set()
+        self._pending_changed = threading.Condition()
+        self._last_event = 0.0
+        self._stop = threading.Event()
+        self._threads = []
+        self._observer = None
+
+    # ---------- 查询 ----------
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    def get(self, path):
+        """
+        按路径查找
+
+        Args:
+            path (str): 文件路径
+
+        Returns:
+            dict: 索引条目，不存在时返回 None
+        """
+        with self._lock:
+            entry = self._entries.get(os.path.abspath(path))
+            return dict(entry) if entry else None
+
+    def find(self, name, kind=None):
+        """
+        按 WebUI 中显示的模型名称查找本地文件
+
+        Args:
+            name (str): 模型名称，可以带子目录和扩展名
+            kind (str, optional): 模型类型. Defaults to None.
+
+        Returns:
+            dict: 索引条目，不存在时返回 None
+        """
+        with self._lock:
+            for entry in self._by_name.get(normalize_name(name), ()):
+                if kind is None or entry["kind"] == kind:
+                    return dict(entry)
+        return None
+
+    def entries(self, kind=None):
+        """
+        列出索引条目
+
+        Args:
+            kind (str, optional): 只返回该类型. Defaults to None.
+
+        Returns:
+            list: 索引条目，按路径排序
+        """
+        with self._lock:
+            return [dict(e) for path, e in sorted(self._entries.items()) if kind is None or e["kind"] == kind]
+
+    def local_by_remote_id(self):
+        """
+        返回已匹配的 LiblibAI 模型 ID 到本地条目的映射
+
+        Returns:
+            dict: 模型 ID 到索引条目的映射
+        """
+        with self._lock:
+            return {e["remote"]["id"]: dict(e) for e in self._entries.values() if e["remote"] and e["remote"].get("id")}
+
+    def stats(self):
+        """
+        返回索引统计
+
+        Returns:
+            dict: 各类型的文件数、已匹配数、监听方式和扫描耗时
+        """
+        with self._lock:
+            kinds = {}
+            for entry in self._entries.values():
+                counts = kinds.setdefault(entry["kind"], {"files": 0, "matched": 0})
+                counts["files"] += 1
+                counts["matched"] += 1 if entry["remote"] else 0
+        return {"kinds": kinds, "mode": self.mode, "last_scan_seconds": self.last_scan_seconds}
+
+    # ---------- 远程匹配 ----------
+
+    def set_remote_models(self, models):
+        """
+        设置 LiblibAI 模型列表并重新匹配所有本地文件
+
+        同一个列表对象重复传入时直接返回
+
+        Args:
+            models (list): 模型列表
+        """
+        with self._lock:
+            if models is self._remote_source:
+                return
+            self._remote_source = models
+            self._remote_by_hash = {}
+            self._remote_by_name = {}
+            for model in models or []:
+                for field in REMOTE_HASH_FIELDS:
+                    value = str(model.get(field) or "").lower()
+                    if value:
+                        self._remote_by_hash.setdefault(value, model)
+                self._remote_by_name.setdefault(normalize_name(model.get("name", "")), []).append(model)
+            for entry in self._entries.values():
+                self._match(entry)
+
+    def _match(self, entry):
+        remote, match = None, None
+        digest = entry.get("hash")
+        if digest:
+            remote = self._remote_by_hash.get(digest) or self._remote_by_hash.get(short_hash(digest))
+            match = "hash" if remote else None
+        if remote is None:
+            candidates = self._remote_by_name.get(normalize_name(entry["name"]), [])
+            # 同名时优先类型相同的模型
+            remote = next((m for m in candidates if m.get("type") == entry["kind"]), candidates[0] if candidates else None)
+            match = "name" if remote else None
+        entry["remote"] = remote
+        entry["match"] = match
+
+    # ---------- 扫描与增量更新 ----------
+
+    def _kind_of(self, path):
+        for kind, directory in self.directories.items():
+            if path == directory or path.startswith(directory + os.sep):
+                return kind, directory
+        return None, None
+
+    def _add_entries(self, paths, progress=None):
+        hashes = self.hasher.hash_files(paths, progress=progress) if self.hasher and paths else {}
+        with self._lock:
+            for path in paths:
+                kind, directory = self._kind_of(path)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    self._remove(path)
+                    continue
+                self._remove(path)
+                entry = {
+                    "path": path,
+                    "name": os.path.splitext(os.path.relpath(path, directory))[0].replace(os.sep, "/"),
+                    "kind": kind,
+                    "size": st.st_size,
+                    "mtime_ns": st.st_mtime_ns,
+                    "hash": hashes.get(path),
+                    "remote": None,
+                    "match": None,
+                }
+                self._match(entry)
+                self._entries[path] = entry
+                for key in {normalize_name(entry["name"]), normalize_name(os.path.basename(path))}:
+                    self._by_name.setdefault(key, []).append(entry)
+
+    def _remove(self, path):
+        entry = self._entries.pop(path, None)
+        if entry is None:
+            return
+        for key in {normalize_name(entry["name"]), normalize_name(os.path.basename(path))}:
+            remaining = [e for e in self._by_name.get(key, []) if e is not entry]
+            if remaining:
+                self._by_name[key] = remaining
+            else:
+                self._by_name.pop(key, None)
+
+    def scan(self, progress=None):
+        """
+        完整扫描所有目录
+
+        Args:
+            progress (callable, optional): 哈希进度回调，参数同 ModelHasher.hash_files. Defaults to None.
+
+        Returns:
+            int: 索引中的文件数
+        """
+        started = time.perf_counter()
+
+        def report(done, total, bytes_done, bytes_total, path):
+            self.progress.update(done=done, total=total, bytes_done=bytes_done, bytes_total=bytes_total)
+            if progress:
+                progress(done, total, bytes_done, bytes_total, path)
+
+        paths = find_model_files(self.directories.values())
+        self._add_entries(paths, report)
+        with self._lock:
+            for path in set(self._entries) - set(paths):
+                self._remove(path)
+        self.last_scan_seconds = time.perf_counter() - started
+        return len(self)
+
+    def update_paths(self, paths):
+        """
+        增量处理发生变化的路径
+
+        存在的模型文件在大小或修改时间变化时重新计算哈希，不存在的路径（包括目录）
+        从索引中删除，新出现的目录会被扫描
+
+        Args:
+            paths (iterable): 发生变化的文件或目录路径
+
+        Returns:
+            int: 新增或更新的文件数
+        """
+        changed = set()
+        with self._lock:
+            for path in {os.path.abspath(p) for p in paths}:
+                if self._kind_of(path)[0] is None:
+                    continue
+                if os.path.isdir(path):
+                    changed.update(p for p in find_model_files([path]) if self._is_changed(p))
+                elif os.path.isfile(path):
+                    if path.lower().endswith(MODEL_EXTENSIONS) and self._is_changed(path):
+                        changed.add(path)
+                else:
+                    prefix = path + os.sep
+                    for stale in [p for p in self._entries if p == path or p.startswith(prefix)]:
+                        self._remove(stale)
+        self._add_entries(sorted(changed))
+        return len(changed)
+
+    def _is_changed(self, path):
+        entry = self._entries.get(path)
+        if entry is None:
+            return True
+        try:
+            st = os.stat(path)
+        except OSError:
+            return True
+        return (st.st_size, st.st_mtime_ns) != (entry["size"], entry["mtime_ns"])
+
+    def poll_once(self):
+        """
+        比较所有目录中文件的大小和修改时间，处理发生变化的文件
+
+        Returns:
+            int: 新增或更新的文件数
+        """
+        paths = find_model_files(self.directories.values())
+        with self._lock:
+            removed = set(self._entries) - set(paths)
+            changed = [p for p in paths if self._is_changed(p)]
+        return self.update_paths(changed + list(removed))
+
+    # ---------- 后台监听 ----------
+
+    def start(self, scan=True, use_watchdog=True, progress=None, callback=None):
+        """
+        在后台线程中完成首次扫描，然后开始监听文件变化
+
+        Args:
+            scan (bool, optional): 是否先完整扫描. Defaults to True.
+            use_watchdog (bool, optional): 是否尝试使用 watchdog 监听文件事件. Defaults to True.
+            progress (callable, optional): 首次扫描的哈希进度回调. Defaults to None.
+            callback (callable, optional): 首次扫描完成后调用，参数为索引本身. Defaults to None.
+
+        Returns:
+            LocalModelIndex: 索引本身
+        """
+        self._stop.clear()
+
+        def run():
+            if scan:
+                try:
+                    self.scan(progress)
+                except Exception as e:
+                    logger.error(f"扫描本地模型失败: {str(e)}")
+            if callback:
+                callback(self)
+            if self._stop.is_set():
+                return
+            if use_watchdog and self._start_observer():
+                self.mode = "watchdog"
+                self._process_events()
+            else:
+                self.mode = "polling"
+                while not self._stop.wait(self.poll_interval):
+                    try:
+                        self.poll_once()
+                    except Exception as e:
+                        logger.error(f"检查本地模型变化失败: {str(e)}")
+
+        thread = threading.Thread(target=run, name="liblibai-model-scanner", daemon=True)
+        thread.start()
+        self._threads.append(thread)
+        return self
+
+    def _start_observer(self):
+        try:
+            from watchdog.observers import Observer
+            from watchdog.events import FileSystemEventHandler
+        except ImportError:
+            return False
+
+        index = self
+
+        class Handler(FileSystemEventHandler):
+            def on_any_event(self, event):
+                index._enqueue(getattr(event, "src_path", None), getattr(event, "dest_path", None))
+
+        try:
+            observer = Observer()
+            for directory in set(self.directories.values()):
+                if os.path.isdir(directory):
+                    observer.schedule(Handler(), directory, recursive=True)
+            observer.daemon = True
+            observer.start()
+        except Exception as e:
+            logger.warning(f"监听模型目录失败，改为定期检查: {str(e)}")
+            return False
+        self._observer = observer
+        return True
+
+    def _enqueue(self, *paths):
+        with self._pending_changed:
+            self._pending.update(p for p in paths if p)
+            self._last_event = time.monotonic()
+            self._pending_changed.notify()
+
+    def _process_events(self):
+        while not self._stop.is_set():
+            with self._pending_changed:
+                while not self._pending and not self._stop.is_set():
+                    self._pending_changed.wait(1.0)
+                # 事件停止 debounce 秒后再处理，复制中的大文件只计算一次哈希
+                quiet = time.monotonic() - self._last_event
+                if quiet < self.debounce:
+                    self._pending_changed.wait(self.debounce - quiet)
+                    continue
+                paths, self._pending = self._pending, set()
+            try:
+                self.update_paths(paths)
+            except Exception as e:
+                logger.error(f"更新本地模型索引失败: {str(e)}")
+
+    def stop(self):
+        """停止后台监听"""
+        self._stop.set()
+        with self._pending_changed:
+            self._pending_changed.notify_all()
+        if self._observer is not None:
+            self._observer.stop()
+            self._observer = None
+        for thread in self._threads:
+            thread.join(timeout=5)
+        self._threads = []
@@ -0,0 +1,423 @@
+import time
+import threading
+from collections import deque
+
+from scripts.lh_lib.api import APIError
+from scripts.lh_lib.tasks import poll_task, call_with_token, TaskCancelled, TaskTimeout
+
+
+def percentile(values, pct):
+    """
+    计算百分位数（最近邻插值）
+
+    Args:
+        values (list): 数值列表
+        pct (float): 百分位，0-100
+
+    Returns:
+        float: 百分位数，列表为空时返回 0.0
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = int(round((pct / 100.0) * (len(ordered) - 1)))
+    return ordered[max(0, min(index, len(ordered) - 1))]
+
+
+class Backend:
+    """
+    生成后端接口
+
+    调度器只依赖这里定义的方法，本地管线和 LiblibAI 远程服务都实现同一接口
+    """
+
+    name = "backend"
+
+    def queue_depth(self):
+        """
+        返回调度器之外的排队任务数（例如 WebUI 自己的生成队列）
+
+        Returns:
+            int: 外部排队深度
+        """
+        return 0
+
+    def concurrency(self):
+        """
+        返回后端可同时处理的任务数
+
+        Returns:
+            int: 并发数
+        """
+        return 1
+
+    def estimate_cost(self, job):
+        """
+        估算任务消耗的额度
+
+        Args:
+            job (dict): 生成任务
+
+        Returns:
+            float: 额度消耗
+        """
+        return 0.0
+
+    def generate(self, job, token=None):
+        """
+        执行生成任务
+
+        Args:
+            job (dict): 生成任务，包含 model_id、prompt、negative_prompt、width、height、params
+            token (CancelToken, optional): 取消令牌，携带截止时间. Defaults to None.
+
+        Returns:
+            dict: 生成结果
+        """
+        raise NotImplementedError
+
+
+class LocalBackend(Backend):
+    """
+    本地 WebUI 管线后端
+    """
+
+    name = "local"
+
+    def __init__(self, generate_fn, queue_depth_fn=None, concurrency=1):
+        """
+        初始化本地后端
+
+        Args:
+            generate_fn (callable): 执行生成的函数，接收 job 返回结果字典
+            queue_depth_fn (callable, optional): 返回外部排队深度的函数. Defaults to None.
+            concurrency (int, optional): 本地并发数. Defaults to 1.
+        """
+        self.generate_fn = generate_fn
+        self.queue_depth_fn = queue_depth_fn
+        self._concurrency = max(1, int(concurrency))
+
+    def queue_depth(self):
+        """
+        返回 WebUI 自己的生成队列中排队和正在执行的任务数
+
+        Returns:
+            int: 外部排队深度，未提供 queue_depth_fn 或读取失败时返回 0
+        """
+        if self.queue_depth_fn is None:
+            return 0
+        try:
+            return int(self.queue_depth_fn() or 0)
+        except Exception:
+            return 0
+
+    def concurrency(self):
+        """
+        返回本地并发数
+
+        Returns:
+            int: 并发数
+        """
+        return self._concurrency
+
+    def generate(self, job, token=None):
+        """
+        使用本地管线执行生成任务
+
+        Args:
+            job (dict): 生成任务
+            token (CancelToken, optional): 取消令牌，只在开始执行前检查. Defaults to None.
+
+        Returns:
+            dict: generate_fn 返回的结果
+
+        Raises:
+            TaskCancelled: 如果开始执行前已取消
+        """
+        # 本地管线开始执行后无法中途取消，只在开始前检查
+        if token is not None:
+            token.check()
+        return self.generate_fn(job)
+
+
+class LiblibAIBackend(Backend):
+    """
+    LiblibAI 远程后端，通过 text_to_image 提交并轮询任务结果
+    """
+
+    name = "liblibai"
+
+    def __init__(self, api, poll_interval=2.0, timeout=600, cost_per_image=1.0, concurrency=4):
+        """
+        初始化远程后端
+
+        Args:
+            api (LiblibAIAPI): API 通信模块实例
+            poll_interval (float, optional): 轮询间隔（秒）. Defaults to 2.0.
+            timeout (float, optional): 单个任务最长等待时间（秒）. Defaults to 600.
+            cost_per_image (float, optional): 每张图片消耗的额度. Defaults to 1.0.
+            concurrency (int, optional): 远程并发数. Defaults to 4.
+        """
+        self.api = api
+        self.poll_interval = poll_interval
+        self.timeout = timeout
+        self.cost_per_image = cost_per_image
+        self._concurrency = max(1, int(concurrency))
+
+    def concurrency(self):
+        """
+        返回远程并发数
+
+        Returns:
+            int: 并发数
+        """
+        return self._concurrency
+
+    def estimate_cost(self, job):
+        """
+        按图片数量估算任务消耗的额度
+
+        Args:
+            job (dict): 生成任务，params 中的 batch_size 为图片数量
+
+        Returns:
+            float: 额度消耗
+        """
+        count = job.get("params", {}).get("batch_size", 1) or 1
+        return self.cost_per_image * count
+
+    def generate(self, job, token=None):
+        """
+        提交文生图任务并轮询直到完成
+
+        Args:
+            job (dict): 生成任务
+            token (CancelToken, optional): 取消令牌，取消或超时后停止轮询并取消远程任务. Defaults to None.
+
+        Returns:
+            dict: 任务结果，包含 task_id
+
+        Raises:
+            APIError: 如果提交失败或任务失败
+            TaskCancelled: 如果任务被取消
+            TaskTimeout: 如果超过截止时间
+        """
+        response = call_with_token(
+            self.api, token, self.api.text_to_image,
+            job.get("model_id"),
+            job.get("prompt", ""),
+            job.get("negative_prompt", ""),
+            job.get("width", 512),
+            job.get("height", 512),
+            **job.get("params", {})
+        )
+        task_id = response.get("task_id")
+        if not task_id:
+            raise APIError(f"创建任务失败: {response.get('message', '未知错误')}")
+
+        for progress in poll_task(self.api, task_id, self.poll_interval, self.timeout, token):
+            pass
+        result = progress["result"]
+        result.setdefault("task_id", task_id)
+        return result
+
+
+class BackendStats:
+    """
+    单个后端的运行统计
+    """
+
+    def __init__(self, window=300, max_samples=1000, initial_latency=10.0, alpha=0.3):
+        """
+        初始化统计
+
+        Args:
+            window (float, optional): 吞吐量统计窗口（秒）. Defaults to 300.
+            max_samples (int, optional): 最多保留的延迟样本数. Defaults to 1000.
+            initial_latency (float, optional): 还没有样本时假定的延迟（秒）. Defaults to 10.0.
+            alpha (float, optional): 延迟 EWMA 平滑系数. Defaults to 0.3.
+        """
+        self.window = window
+        self.alpha = alpha
+        self.latencies = deque(maxlen=max_samples)
+        self.completions = deque(maxlen=max_samples)
+        self.latency_ewma = initial_latency
+        self.inflight = 0
+        self.succeeded = 0
+        self.failed = 0
+
+    def record(self, latency, ok=True):
+        """
+        记录一次任务完成
+
+        Args:
+            latency (float): 任务耗时（秒）
+            ok (bool, optional): 是否成功，失败的任务只计数，不计入延迟. Defaults to True.
+        """
+        now = time.time()
+        if ok:
+            self.succeeded += 1
+            self.latencies.append(latency)
+            self.completions.append(now)
+            self.latency_ewma = self.alpha * latency + (1 - self.alpha) * self.latency_ewma
+        else:
+            self.failed += 1
+
+    def throughput(self):
+        """
+        返回最近 window 秒内的吞吐量
+
+        Returns:
+            float: 每分钟完成的任务数
+        """
+        cutoff = time.time() - self.window
+        recent = sum(1 for t in self.completions if t >= cutoff)
+        return recent * 60.0 / self.window
+
+    def snapshot(self):
+        """
+        返回统计快照
+
+        Returns:
+            dict: 进行中、成功、失败的任务数，吞吐量，延迟 EWMA 和 p50/p95
+        """
+        latencies = list(self.latencies)
+        return {
+            "inflight": self.inflight,
+            "succeeded": self.succeeded,
+            "failed": self.failed,
+            "throughput_per_min": round(self.throughput(), 3),
+            "latency_ewma": round(self.latency_ewma, 3),
+            "p50": round(percentile(latencies, 50), 3),
+            "p95": round(percentile(latencies, 95), 3),
+        }
+
+
+class OffloadScheduler:
+    """
+    本地/远程混合调度器
+
+    根据实时排队深度、测得的延迟和额度预算，把每个任务路由到预计最早完成的后端
+    """
+
+    def __init__(self, local, remote, cost_budget=0, budget_window=86400, fallback=True):
+        """
+        初始化调度器
+
+        Args:
+            local (Backend): 本地后端
+            remote (Backend): 远程后端
+            cost_budget (float, optional): 每个预算周期内远程可用额度，0 表示不限. Defaults to 0.
+            budget_window (float, optional): 预算周期（秒）. Defaults to 86400.
+            fallback (bool, optional): 远程失败时是否回退到本地. Defaults to True.
+        """
+        self.backends = {local.name: local, remote.name: remote}
+        self.local = local
+        self.remote = remote
+        self.cost_budget = cost_budget
+        self.budget_window = budget_window
+        self.fallback = fallback
+        self.stats = {name: BackendStats() for name in self.backends}
+        self._spent = 0.0
+        self._budget_started = time.time()
+        self._lock = threading.Lock()
+
+    def remaining_budget(self):
+        """
+        返回当前周期剩余的远程额度
+
+        Returns:
+            float: 剩余额度，不限额时返回 None
+        """
+        if not self.cost_budget:
+            return None
+        with self._lock:
+            self._roll_budget()
+            return max(0.0, self.cost_budget - self._spent)
+
+    def _roll_budget(self):
+        if time.time() - self._budget_started >= self.budget_window:
+            self._spent = 0.0
+            self._budget_started = time.time()
+
+    def _expected_wait(self, backend):
+        stats = self.stats[backend.name]
+        depth = stats.inflight + backend.queue_depth()
+        # 排在前面的任务按并发数分批完成，加上自身的一次执行时间
+        return (depth // backend.concurrency() + 1) * stats.latency_ewma
+
+    def choose(self, job):
+        """
+        为任务选择后端
+
+        选中远程后端时在检查预算的同一把锁内预留额度，并发提交的任务不会同时通过
+        预算检查而超出预算；任务失败时由 _run_on 退还预留的额度
+
+        Args:
+            job (dict): 生成任务
+
+        Returns:
+            tuple: (选中的后端, 预留的额度)
+        """
+        with self._lock:
+            self._roll_budget()
+            cost = self.remote.estimate_cost(job)
+            if self.cost_budget and self._spent + cost > self.cost_budget:
+                return self.local, 0.0
+            if self._expected_wait(self.remote) < self._expected_wait(self.local):
+                self._spent += cost
+                return self.remote, cost
+            return self.local, 0.0
+
+    def _run_on(self, backend, job, token=None, reserved=0.0):
+        stats = self.stats[backend.name]
+        with self._lock:
+            stats.inflight += 1
+        start = time.time()
+        try:
+            result = backend.generate(job, token)
+        except Exception:
+            with self._lock:
+                stats.inflight -= 1
+                stats.record(time.time() - start, ok=False)
+                # 失败的远程任务不计入额度
+                self._spent = max(0.0, self._spent - reserved)
+            raise
+        with self._lock:
+            stats.inflight -= 1
+            stats.record(time.time() - start)
+        return result
+
+    def run(self, job, token=None):
+        """
+        调度并同步执行任务
+
+        Args:
+            job (dict): 生成任务
+            token (CancelToken, optional): 取消令牌，取消或超时后停止等待并释放并发名额. Defaults to None.
+
+        Returns:
+            tuple: (后端名称, 生成结果)
+        """
+        backend, reserved = self.choose(job)
+        try:
+            return backend.name, self._run_on(backend, job, token, reserved)
+        except (TaskCancelled, TaskTimeout):
+            # 用户取消或已超时的任务不再回退到本地
+            raise
+        except APIError:
+            if backend is self.remote and self.fallback:
+                return self.local.name, self._run_on(self.local, job, token)
+            raise
+
+    def get_stats(self):
+        """
+        返回各后端的吞吐量与延迟统计
+
+        Returns:
+            dict: 后端名称到统计信息的映射
+        """
+        with self._lock:
+            stats = {name: s.snapshot() for name, s in self.stats.items()}
+        stats["remaining_budget"] = self.remaining_budget()
+        return stats
@@ -0,0 +1,277 @@
+import os
+import copy
+import json
+import atexit
+import tempfile
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def get_config_path():
+    """
+    返回插件配置文件路径
+
+    Returns:
+        str: 插件根目录下的 liblibai_helper.json
+    """
+    return os.path.join(
+        os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+        "liblibai_helper.json"
+    )
+
+
+def update_nested_dict(d, u):
+    """递归更新嵌套字典"""
+    for k, v in u.items():
+        if isinstance(v, dict) and k in d and isinstance(d[k], dict):
+            update_nested_dict(d[k], v)
+        else:
+            d[k] = v
+
+
+def diff_nested_dict(old, new):
+    """
+    返回 new 相对 old 新增或修改的项
+
+    Args:
+        old (dict): 原来的字典
+        new (dict): 修改后的字典
+
+    Returns:
+        dict: 变化的项，嵌套字典只包含变化的子项
+    """
+    changes = {}
+    for k, v in new.items():
+        if k not in old:
+            changes[k] = copy.deepcopy(v)
+        elif isinstance(v, dict) and isinstance(old[k], dict):
+            sub = diff_nested_dict(old[k], v)
+            if sub:
+                changes[k] = sub
+        elif v != old[k]:
+            changes[k] = copy.deepcopy(v)
+    return changes
+
+
+class SettingsStore:
+    """
+    统一的设置存储
+
+    缓存解析后的配置，只有配置文件的修改时间或大小变化时才重新读取；
+    写入时先写临时文件再重命名，保证文件不会在写到一半时被读到或损坏；
+    连续的修改会被合并为一次延迟写入。写入时只把内存中修改过的项合并到
+    文件的最新内容上，等待写入期间文件中的外部修改不会丢失，默认值也不会
+    写入文件
+    """
+
+    def __init__(self, path=None, defaults=None, debounce=1.0):
+        """
+        初始化设置存储
+
+        Args:
+            path (str, optional): 配置文件路径，默认使用 get_config_path(). Defaults to None.
+            defaults (dict, optional): 默认设置，文件中缺少的项使用默认值. Defaults to None.
+            debounce (float, optional): 延迟写入的时间（秒）. Defaults to 1.0.
+        """
+        self.path = path or get_config_path()
+        self.defaults = copy.deepcopy(defaults or {})
+        self.debounce = debounce
+        self.reloads = 0
+        self.writes = 0
+        self._data = None
+        self._raw = {}
+        self._snapshot = None
+        self._signature = None
+        self._timer = None
+        self._dirty = False
+        self._lock = threading.RLock()
+
+    def _file_signature(self):
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def _read_file(self):
+        with open(self.path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def exists(self):
+        """
+        检查配置文件是否存在
+
+        Returns:
+            bool: 是否存在
+        """
+        return self._file_signature() is not None
+
+    def set_defaults(self, defaults):
+        """
+        设置默认值，下次读取时重新合并
+
+        Args:
+            defaults (dict): 默认设置
+        """
+        with self._lock:
+            self.defaults = copy.deepcopy(defaults)
+            if not self._dirty:
+                self._signature = None
+                self._data = None
+
+    def load(self):
+        """
+        读取设置
+
+        文件未变化时直接返回缓存；有尚未写入的修改时以内存中的数据为准
+
+        Returns:
+            dict: 合并默认值后的设置（缓存对象，修改后需调用 save 或 update）
+        """
+        signature = self._file_signature()
+        with self._lock:
+            if self._data is not None and (self._dirty or signature == self._signature):
+                return self._data
+
+            raw = {}
+            if signature is not None:
+                try:
+                    raw = self._read_file()
+                except Exception as e:
+                    logger.error(f"加载设置失败: {str(e)}")
+                    if self._data is not None:
+                        # 文件损坏时保留上一次成功读取的设置
+                        return self._data
+            data = copy.deepcopy(self.defaults)
+            update_nested_dict(data, copy.deepcopy(raw))
+
+            self._data = data
+            self._raw = raw
+            # 写入时与这份快照比较，找出内存中修改过的项
+            self._snapshot = copy.deepcopy(data)
+            self._signature = signature
+            self.reloads += 1
+            return data
+
+    def get(self, key, default=None):
+        """
+        读取单个设置项
+
+        Args:
+            key (str): 设置项名称
+            default (any, optional): 不存在时的返回值. Defaults to None.
+
+        Returns:
+            any: 设置值
+        """
+        return self.load().get(key, default)
+
+    def update(self, values, immediate=False):
+        """
+        更新设置并保存
+
+        Args:
+            values (dict): 需要更新的设置，嵌套字典按项合并
+            immediate (bool, optional): 是否立即写入，否则延迟合并写入. Defaults to False.
+
+        Returns:
+            bool: 是否保存成功（延迟写入时总是返回 True）
+        """
+        with self._lock:
+            update_nested_dict(self.load(), values)
+            return self.save(immediate)
+
+    def save(self, immediate=False):
+        """
+        保存当前缓存的设置
+
+        Args:
+            immediate (bool, optional): 是否立即写入，否则延迟合并写入. Defaults to False.
+
+        Returns:
+            bool: 是否保存成功（延迟写入时总是返回 True）
+        """
+        with self._lock:
+            # 已有缓存时直接保存缓存：调用方可能修改过缓存对象，重新读取会用文件内容覆盖这些修改
+            if self._data is None:
+                self.load()
+            self._dirty = True
+            if immediate or self.debounce <= 0:
+                return self.flush()
+            if self._timer is None:
+                self._timer = threading.Timer(self.debounce, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+            return True
+
+    def flush(self):
+        """
+        立即写入尚未保存的修改
+
+        Returns:
+            bool: 是否保存成功
+        """
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if not self._dirty:
+                return True
+            changes = diff_nested_dict(self._snapshot or {}, self._data)
+            raw = self._raw
+            if self._file_signature() != self._signature:
+                # 读取后文件被外部修改过，在最新内容上合并本进程的修改
+                try:
+                    raw = self._read_file()
+                except Exception as e:
+                    logger.error(f"加载设置失败: {str(e)}")
+            raw = copy.deepcopy(raw)
+            update_nested_dict(raw, changes)
+            try:
+                self._write(raw)
+            except Exception as e:
+                logger.error(f"保存设置失败: {str(e)}")
+                return False
+            # 就地合并文件中的外部修改，持有缓存对象的调用方也能看到
+            update_nested_dict(self._data, copy.deepcopy(raw))
+            self._raw = raw
+            self._snapshot = copy.deepcopy(self._data)
+            self._dirty = False
+            self._signature = self._file_signature()
+            self.writes += 1
+            return True
+
+    def _write(self, data):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(prefix=".liblibai_helper.", suffix=".tmp", dir=directory)
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False, indent=2)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    """
+    返回插件共用的设置存储
+
+    Returns:
+        SettingsStore: 设置存储实例
+    """
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = SettingsStore()
+            atexit.register(_store.flush)
+        return _store
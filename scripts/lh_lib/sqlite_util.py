@@ -0,0 +1,38 @@
+import sqlite3
+
+
+class Transaction:
+    """连接上下文：正常退出时提交，异常时回滚，最后关闭连接"""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            if self.conn.in_transaction:
+                self.conn.execute("ROLLBACK" if exc_type else "COMMIT")
+        finally:
+            self.conn.close()
+        return False
+
+
+def connect(db_path, busy_timeout=30):
+    """
+    打开数据库连接
+
+    连接使用自动提交模式，需要原子更新时由调用方执行 BEGIN IMMEDIATE，
+    离开 with 块时提交或回滚
+
+    Args:
+        db_path (str): 数据库文件路径
+        busy_timeout (float, optional): 等待其他连接释放锁的时间（秒）. Defaults to 30.
+
+    Returns:
+        Transaction: 连接上下文，with 语句中得到 sqlite3.Connection
+    """
+    conn = sqlite3.connect(db_path, timeout=busy_timeout, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    return Transaction(conn)
@@ -0,0 +1,385 @@
+import time
+import asyncio
+import threading
+import contextlib
+import logging
+
+from scripts.lh_lib.api import APIError
+from scripts.lh_lib.tracing import new_trace_id, span
+
+logger = logging.getLogger(__name__)
+
+# 任务结束时的状态
+TERMINAL_STATUSES = ("success", "failed")
+
+# 任务状态的中文说明
+STATUS_LABELS = {
+    "pending": "排队中",
+    "queued": "排队中",
+    "running": "生成中",
+    "processing": "生成中",
+    "success": "已完成",
+    "failed": "失败",
+}
+
+
+class TaskCancelled(APIError):
+    """任务已被取消"""
+
+
+class TaskTimeout(APIError):
+    """任务超过截止时间"""
+
+
+class CancelToken:
+    """
+    任务取消令牌
+
+    在提交、轮询和下载之间传递，用户取消或超过截止时间后，各阶段在下一次检查时
+    停止等待，尽快释放并发名额。令牌同时携带追踪 ID，同一个任务各阶段的追踪区间
+    关联到同一个追踪
+    """
+
+    def __init__(self, timeout=None):
+        """
+        初始化取消令牌
+
+        Args:
+            timeout (float, optional): 从现在起的最长执行时间（秒），None 表示不限. Defaults to None.
+        """
+        self.deadline = None if timeout is None else time.time() + timeout
+        self.reason = ""
+        self.task_id = None
+        self.trace_id = new_trace_id()
+        self._event = threading.Event()
+
+    @property
+    def cancelled(self):
+        """是否已被取消"""
+        return self._event.is_set()
+
+    def cancel(self, reason="用户取消"):
+        """
+        取消任务
+
+        Args:
+            reason (str, optional): 取消原因. Defaults to "用户取消".
+        """
+        if not self._event.is_set():
+            self.reason = reason
+            self._event.set()
+
+    def remaining(self):
+        """
+        返回距离截止时间的秒数
+
+        Returns:
+            float: 剩余时间，不限时返回 None
+        """
+        if self.deadline is None:
+            return None
+        return self.deadline - time.time()
+
+    def check(self):
+        """
+        检查是否应该停止
+
+        Raises:
+            TaskCancelled: 如果已被取消
+            TaskTimeout: 如果已超过截止时间
+        """
+        if self.cancelled:
+            raise TaskCancelled(f"任务已取消: {self.reason}")
+        remaining = self.remaining()
+        if remaining is not None and remaining <= 0:
+            raise TaskTimeout(f"任务超时: {self.task_id or '未提交'}")
+
+    def wait(self, seconds):
+        """
+        等待一段时间，被取消或到达截止时间时提前返回
+
+        Args:
+            seconds (float): 等待时间（秒）
+
+        Returns:
+            bool: 是否已被取消
+        """
+        remaining = self.remaining()
+        if remaining is not None:
+            seconds = min(seconds, max(0.0, remaining))
+        return self._event.wait(seconds)
+
+    async def wait_async(self, seconds, step=0.25):
+        """
+        异步等待一段时间，被取消或到达截止时间时提前返回
+
+        Args:
+            seconds (float): 等待时间（秒）
+            step (float, optional): 检查取消状态的间隔（秒）. Defaults to 0.25.
+
+        Returns:
+            bool: 是否已被取消
+        """
+        remaining = self.remaining()
+        if remaining is not None:
+            seconds = min(seconds, max(0.0, remaining))
+        end = time.time() + seconds
+        while not self.cancelled:
+            left = end - time.time()
+            if left <= 0:
+                break
+            await asyncio.sleep(min(step, left))
+        return self.cancelled
+
+
+def call_with_token(api, token, fn, *args, **kwargs):
+    """
+    在令牌的截止时间内调用 API
+
+    调用前检查是否已取消；API 支持 deadline 时，单次 HTTP 请求的超时不会超过剩余时间；
+    API 支持 trace 时，调用期间的追踪区间使用令牌的追踪 ID
+
+    Args:
+        api (LiblibAIAPI): API 通信模块实例
+        token (CancelToken): 取消令牌，为 None 时直接调用
+        fn (callable): API 方法
+        *args: 位置参数
+        **kwargs: 关键字参数
+
+    Returns:
+        any: API 方法的返回值
+    """
+    if token is None:
+        return fn(*args, **kwargs)
+    token.check()
+    scope = getattr(api, "deadline", None)
+    context = scope(token.deadline) if token.deadline is not None and callable(scope) else contextlib.nullcontext()
+    trace = getattr(api, "trace", None)
+    trace_context = trace(token.trace_id) if callable(trace) else contextlib.nullcontext()
+    with context, trace_context:
+        return fn(*args, **kwargs)
+
+
+def cancel_remote(api, task_id):
+    """
+    取消远程任务，API 不支持取消时忽略
+
+    Args:
+        api (LiblibAIAPI): API 通信模块实例
+        task_id (str): 任务 ID
+
+    Returns:
+        bool: 是否已请求远程取消
+    """
+    if not task_id or not hasattr(api, "cancel_task"):
+        return False
+    try:
+        api.cancel_task(task_id)
+    except Exception as e:
+        logger.error(f"取消远程任务失败: {str(e)}")
+        return False
+    return True
+
+
+def parse_progress(task_id, result):
+    """
+    从任务结果中提取进度信息
+
+    Args:
+        task_id (str): 任务 ID
+        result (dict): get_task_result 的响应
+
+    Returns:
+        dict: 包含 task_id、status、progress（0-100，未知时为 None）、
+            queue_position、preview（中间预览图地址）、image_url、result
+    """
+    data = result.get("result") or {}
+    if not isinstance(data, dict):
+        data = {}
+
+    progress = result.get("progress", data.get("progress"))
+    if isinstance(progress, bool) or not isinstance(progress, (int, float)):
+        progress = None
+    else:
+        # 兼容 0-1 小数和 0-100 百分比两种表示
+        if isinstance(progress, float) and progress <= 1:
+            progress *= 100
+        progress = max(0.0, min(100.0, float(progress)))
+
+    status = result.get("status", "unknown")
+    if status == "success":
+        progress = 100.0
+
+    return {
+        "task_id": task_id,
+        "status": status,
+        "progress": progress,
+        "queue_position": result.get("queue_position", data.get("queue_position")),
+        "preview": data.get("preview_url") or data.get("preview") or result.get("preview"),
+        "image_url": data.get("image_url"),
+        "result": result,
+    }
+
+
+def format_progress(progress, elapsed=None):
+    """
+    把进度信息格式化为界面显示的文本
+
+    Args:
+        progress (dict): parse_progress 的返回值
+        elapsed (float, optional): 已等待的时间（秒）. Defaults to None.
+
+    Returns:
+        str: 进度文本
+    """
+    parts = [f"任务 ID: {progress['task_id']}", f"状态: {STATUS_LABELS.get(progress['status'], progress['status'])}"]
+    if progress.get("queue_position") is not None:
+        parts.append(f"排队位置: {progress['queue_position']}")
+    if progress.get("progress") is not None:
+        parts.append(f"进度: {progress['progress']:.0f}%")
+    if elapsed is not None:
+        parts.append(f"已等待: {elapsed:.0f}s")
+    return "\n".join(parts)
+
+
+def _poll_deadline(task_id, timeout, token):
+    deadline = time.time() + timeout
+    if token is not None:
+        # 记录任务 ID，取消时用于请求取消远程任务
+        token.task_id = task_id
+        if token.deadline is not None:
+            deadline = min(deadline, token.deadline)
+    return deadline
+
+
+def _poll_once(api, task_id, attempt):
+    with span(api, "poll", task_id=task_id, attempt=attempt) as poll_span:
+        result = api.get_task_result(task_id)
+        if poll_span is not None and isinstance(result, dict):
+            poll_span.attrs["status"] = result.get("status")
+        return result
+
+
+def _check_terminal(task_id, progress, deadline):
+    if progress["status"] == "failed":
+        raise APIError(f"任务失败: {progress['result'].get('error', '未知错误')}")
+    if progress["status"] not in TERMINAL_STATUSES and time.time() >= deadline:
+        raise TaskTimeout(f"任务超时: {task_id}")
+
+
+def poll_task(api, task_id, interval=2.0, timeout=600, token=None):
+    """
+    轮询任务直到完成，每次查询后产出一次进度
+
+    Args:
+        api (LiblibAIAPI): API 通信模块实例
+        task_id (str): 任务 ID
+        interval (float, optional): 轮询间隔（秒）. Defaults to 2.0.
+        timeout (float, optional): 最长等待时间（秒）. Defaults to 600.
+        token (CancelToken, optional): 取消令牌，取消时同时请求取消远程任务. Defaults to None.
+
+    Yields:
+        dict: parse_progress 的返回值，最后一项的状态为 success
+
+    Raises:
+        APIError: 如果任务失败
+        TaskTimeout: 如果任务超时
+        TaskCancelled: 如果任务被取消
+    """
+    deadline = _poll_deadline(task_id, timeout, token)
+    attempt = 0
+    try:
+        while True:
+            attempt += 1
+            progress = parse_progress(task_id, call_with_token(api, token, _poll_once, api, task_id, attempt))
+            _check_terminal(task_id, progress, deadline)
+            yield progress
+            if progress["status"] == "success":
+                return
+            if token is None:
+                time.sleep(interval)
+            else:
+                token.wait(interval)
+    except (TaskCancelled, TaskTimeout):
+        # 不再等待的任务在远程也取消，避免继续消耗额度
+        cancel_remote(api, task_id)
+        raise
+
+
+async def poll_task_async(api, task_id, interval=2.0, timeout=600, token=None):
+    """
+    异步轮询任务直到完成
+
+    查询在线程池中执行，两次查询之间用 asyncio.sleep 等待，不占用工作线程
+
+    Args:
+        api (LiblibAIAPI): API 通信模块实例
+        task_id (str): 任务 ID
+        interval (float, optional): 轮询间隔（秒）. Defaults to 2.0.
+        timeout (float, optional): 最长等待时间（秒）. Defaults to 600.
+        token (CancelToken, optional): 取消令牌，取消时同时请求取消远程任务. Defaults to None.
+
+    Yields:
+        dict: parse_progress 的返回值，最后一项的状态为 success
+
+    Raises:
+        APIError: 如果任务失败
+        TaskTimeout: 如果任务超时
+        TaskCancelled: 如果任务被取消
+    """
+    loop = asyncio.get_running_loop()
+    deadline = _poll_deadline(task_id, timeout, token)
+    attempt = 0
+    try:
+        while True:
+            attempt += 1
+            result = await loop.run_in_executor(None, call_with_token, api, token, _poll_once, api, task_id, attempt)
+            progress = parse_progress(task_id, result)
+            _check_terminal(task_id, progress, deadline)
+            yield progress
+            if progress["status"] == "success":
+                return
+            if token is None:
+                await asyncio.sleep(interval)
+            else:
+                await token.wait_async(interval)
+    except (TaskCancelled, TaskTimeout):
+        # 不再等待的任务在远程也取消，避免继续消耗额度
+        await loop.run_in_executor(None, cancel_remote, api, task_id)
+        raise
+
+
+def download_image(url, timeout=60, token=None, tracer=None):
+    """
+    下载生成的图片
+
+    Args:
+        url (str): 图片地址
+        timeout (float, optional): 超时时间（秒）. Defaults to 60.
+        token (CancelToken, optional): 取消令牌，超时不会超过它的剩余时间. Defaults to None.
+        tracer (Tracer, optional): 追踪器，记录 download 区间，使用令牌的追踪 ID. Defaults to None.
+
+    Returns:
+        bytes: 图片内容
+
+    Raises:
+        APIError: 如果下载失败或超时
+        TaskCancelled: 如果任务已被取消
+    """
+    import requests
+
+    if token is not None:
+        token.check()
+        remaining = token.remaining()
+        if remaining is not None:
+            timeout = min(timeout, remaining)
+    trace_context = tracer.trace(token.trace_id if token else None) if tracer is not None else contextlib.nullcontext()
+    with trace_context, span(tracer, "download", url=url) as download_span:
+        try:
+            response = requests.get(url, timeout=timeout)
+            response.raise_for_status()
+        except requests.exceptions.RequestException as e:
+            raise APIError(f"下载图片失败: {str(e)}")
+        if download_span is not None:
+            download_span.attrs["bytes"] = len(response.content)
+    return response.content
@@ -0,0 +1,276 @@
+import os
+import json
+import time
+import uuid
+import threading
+import contextlib
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def new_trace_id():
+    """
+    生成新的追踪 ID
+
+    Returns:
+        str: 32 位十六进制字符串
+    """
+    return uuid.uuid4().hex
+
+
+class Span:
+    """一段计时区间，记录所属追踪、父区间、起止时间和属性"""
+
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "start", "end", "attrs")
+
+    def __init__(self, trace_id, name, parent_id=None, start=None, attrs=None):
+        """
+        初始化计时区间
+
+        Args:
+            trace_id (str): 追踪 ID
+            name (str): 区间名称，例如 sign、send、poll
+            parent_id (str, optional): 父区间 ID. Defaults to None.
+            start (float, optional): 开始时间（time.time() 时间戳），默认为现在. Defaults to None.
+            attrs (dict, optional): 属性. Defaults to None.
+        """
+        self.trace_id = trace_id
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.name = name
+        self.start = time.time() if start is None else start
+        self.end = None
+        self.attrs = dict(attrs or {})
+
+    @property
+    def duration(self):
+        """耗时（秒），未结束时为 None"""
+        return None if self.end is None else self.end - self.start
+
+    def to_dict(self):
+        """
+        转换为可以 JSON 序列化的字典
+
+        Returns:
+            dict: 区间信息
+        """
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start": self.start,
+            "end": self.end,
+            "duration": self.duration,
+            "attrs": self.attrs,
+        }
+
+
+class Tracer:
+    """
+    请求生命周期追踪
+
+    每个线程维护当前的追踪 ID 和区间栈，区间结束时依次调用已注册的钩子。
+    没有注册钩子时 span() 直接返回空上下文，不产生额外开销
+    """
+
+    def __init__(self):
+        """初始化追踪器"""
+        self._hooks = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    @property
+    def enabled(self):
+        """是否注册了钩子"""
+        return bool(self._hooks)
+
+    def add_hook(self, hook):
+        """
+        注册区间结束时调用的钩子
+
+        Args:
+            hook (callable): 接收 Span 的函数，例如 JsonlExporter 实例
+        """
+        with self._lock:
+            # 复制后替换，遍历钩子时不需要加锁
+            self._hooks = self._hooks + [hook]
+
+    def remove_hook(self, hook):
+        """
+        移除钩子
+
+        Args:
+            hook (callable): add_hook 注册的钩子
+        """
+        with self._lock:
+            self._hooks = [h for h in self._hooks if h is not hook]
+
+    def current_trace_id(self):
+        """
+        返回当前线程的追踪 ID
+
+        Returns:
+            str: 追踪 ID，不在追踪范围内时返回 None
+        """
+        return getattr(self._local, "trace_id", None)
+
+    @contextlib.contextmanager
+    def trace(self, trace_id=None):
+        """
+        在当前线程内设置追踪 ID
+
+        同一个任务的提交、轮询和下载可能在不同线程中执行，用同一个追踪 ID 进入
+        各自的范围即可关联到一起
+
+        Args:
+            trace_id (str, optional): 追踪 ID，为 None 时生成新的. Defaults to None.
+
+        Yields:
+            str: 追踪 ID
+        """
+        previous = self.current_trace_id()
+        self._local.trace_id = trace_id or new_trace_id()
+        try:
+            yield self._local.trace_id
+        finally:
+            self._local.trace_id = previous
+
+    def _stack(self):
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def span(self, name, **attrs):
+        """
+        记录一段计时区间
+
+        Args:
+            name (str): 区间名称
+            **attrs: 属性
+
+        Returns:
+            contextmanager: 进入时返回 Span（未启用时为 None），可以在范围内补充 attrs
+        """
+        if not self._hooks:
+            return contextlib.nullcontext()
+        return self._span(name, attrs)
+
+    @contextlib.contextmanager
+    def _span(self, name, attrs):
+        stack = self._stack()
+        parent = stack[-1] if stack else None
+        trace_id = parent.trace_id if parent else (self.current_trace_id() or new_trace_id())
+        span = Span(trace_id, name, parent.span_id if parent else None, attrs=attrs)
+        stack.append(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.attrs["error"] = f"{type(e).__name__}: {str(e)}"
+            raise
+        finally:
+            stack.pop()
+            span.end = time.time()
+            self._emit(span)
+
+    def record(self, name, start, end, **attrs):
+        """
+        记录已经结束的区间，父区间为当前区间
+
+        用于事后才能得到起止时间的阶段，例如从响应中得到的首字节时间
+
+        Args:
+            name (str): 区间名称
+            start (float): 开始时间（time.time() 时间戳）
+            end (float): 结束时间（time.time() 时间戳）
+            **attrs: 属性
+        """
+        if not self._hooks:
+            return
+        stack = self._stack()
+        parent = stack[-1] if stack else None
+        trace_id = parent.trace_id if parent else (self.current_trace_id() or new_trace_id())
+        span = Span(trace_id, name, parent.span_id if parent else None, start=start, attrs=attrs)
+        span.end = end
+        self._emit(span)
+
+    def event(self, name, **attrs):
+        """
+        记录一个瞬时事件
+
+        Args:
+            name (str): 事件名称
+            **attrs: 属性
+        """
+        now = time.time()
+        self.record(name, now, now, **attrs)
+
+    def _emit(self, span):
+        for hook in self._hooks:
+            try:
+                hook(span)
+            except Exception as e:
+                # 钩子出错不影响请求本身
+                logger.error(f"追踪钩子执行失败: {str(e)}")
+
+
+def span(target, name, **attrs):
+    """
+    在对象的追踪器上记录区间，对象没有追踪器时什么也不做
+
+    Args:
+        target (any): 带有 tracer 属性的对象，例如 LiblibAIAPI；也可以直接传入 Tracer
+        name (str): 区间名称
+        **attrs: 属性
+
+    Returns:
+        contextmanager: Tracer.span 的返回值
+    """
+    tracer = target if isinstance(target, Tracer) else getattr(target, "tracer", None)
+    if not isinstance(tracer, Tracer):
+        return contextlib.nullcontext()
+    return tracer.span(name, **attrs)
+
+
+class JsonlExporter:
+    """
+    把区间逐行写入本地 JSONL 文件，供离线分析
+
+    每行一个区间，按 trace_id 分组、按 parent_id 还原层级即可绘制火焰图
+    """
+
+    def __init__(self, path):
+        """
+        初始化导出器
+
+        Args:
+            path (str): 输出文件路径，追加写入
+        """
+        self.path = path
+        self.exported = 0
+        self._file = None
+        self._lock = threading.Lock()
+
+    def __call__(self, span):
+        """
+        写入一个区间
+
+        Args:
+            span (Span): 已结束的区间
+        """
+        line = json.dumps(span.to_dict(), ensure_ascii=False, default=str) + "\n"
+        with self._lock:
+            if self._file is None:
+                os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+                self._file = open(self.path, "a", encoding="utf-8", buffering=1)
+            self._file.write(line)
+            self.exported += 1
+
+    def close(self):
+        """关闭输出文件"""
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
@@ -0,0 +1,206 @@
+import copy
+import logging
+
+from scripts.lh_lib.api import APIError
+from scripts.lh_lib.cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+# 没有模型预设时使用的约束，与生成页面的默认取值范围一致
+DEFAULT_CONSTRAINTS = {
+    "samplers": [
+        "euler_a", "euler", "lms", "heun", "dpm2", "dpm2_ancestral",
+        "dpmpp_2s_ancestral", "dpmpp_2m", "dpmpp_sde", "ddim"
+    ],
+    "width": [64, 2048],
+    "height": [64, 2048],
+    "steps": [1, 150],
+    "cfg_scale": [1, 30],
+    "size_multiple": 8,
+    "max_pixels": None,
+    "resolutions": None,
+}
+
+
+class ValidationError(APIError):
+    """请求参数未通过本地校验"""
+
+    def __init__(self, errors):
+        """
+        初始化校验错误
+
+        Args:
+            errors (list): 错误信息列表
+        """
+        super().__init__("参数校验失败: " + "；".join(errors), status_code=400)
+        self.errors = list(errors)
+
+
+def _range(data, name):
+    value = data.get(name)
+    if isinstance(value, dict):
+        low, high = value.get("min"), value.get("max")
+    elif isinstance(value, (list, tuple)) and len(value) == 2:
+        low, high = value
+    else:
+        low, high = data.get(f"min_{name}"), data.get(f"max_{name}")
+    if low is None and high is None:
+        return None
+    default = DEFAULT_CONSTRAINTS[name]
+    return [default[0] if low is None else low, default[1] if high is None else high]
+
+
+def parse_presets(response):
+    """
+    从 get_model_presets 的响应中提取约束
+
+    接口没有给出的项使用 DEFAULT_CONSTRAINTS 中的默认值
+
+    Args:
+        response (dict): get_model_presets 的响应
+
+    Returns:
+        dict: 约束，包含 samplers、width、height、steps、cfg_scale、size_multiple、max_pixels、resolutions
+    """
+    constraints = copy.deepcopy(DEFAULT_CONSTRAINTS)
+    data = response.get("data", response) if isinstance(response, dict) else {}
+    if not isinstance(data, dict):
+        return constraints
+
+    samplers = data.get("samplers", data.get("supported_samplers"))
+    if isinstance(samplers, list) and samplers:
+        constraints["samplers"] = [s.get("name") if isinstance(s, dict) else s for s in samplers]
+
+    for name in ("width", "height", "steps", "cfg_scale"):
+        value = _range(data, name)
+        if value is not None:
+            constraints[name] = value
+
+    size_multiple = data.get("size_multiple", data.get("resolution_step"))
+    if isinstance(size_multiple, int) and size_multiple > 0:
+        constraints["size_multiple"] = size_multiple
+    if data.get("max_pixels"):
+        constraints["max_pixels"] = data["max_pixels"]
+
+    resolutions = data.get("resolutions")
+    if isinstance(resolutions, list) and resolutions:
+        constraints["resolutions"] = [
+            [r["width"], r["height"]] if isinstance(r, dict) else list(r) for r in resolutions
+        ]
+    return constraints
+
+
+def validate_payload(payload, constraints):
+    """
+    按约束校验请求参数
+
+    Args:
+        payload (dict): text_to_image / image_to_image / star3_alpha 的请求数据
+        constraints (dict): parse_presets 返回的约束
+
+    Returns:
+        list: 错误信息列表，为空表示校验通过
+    """
+    errors = []
+    if not str(payload.get("prompt") or "").strip():
+        errors.append("提示词不能为空")
+
+    for name, label in (("width", "宽度"), ("height", "高度"), ("steps", "步数"), ("cfg_scale", "CFG Scale")):
+        value = payload.get(name)
+        if value is None:
+            continue
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            errors.append(f"{label}必须是数字")
+            continue
+        low, high = constraints[name]
+        if not low <= value <= high:
+            errors.append(f"{label} {value} 超出范围 {low}-{high}")
+
+    width, height = payload.get("width"), payload.get("height")
+    if isinstance(width, (int, float)) and isinstance(height, (int, float)):
+        multiple = constraints.get("size_multiple")
+        if multiple and (width % multiple or height % multiple):
+            errors.append(f"宽度和高度必须是 {multiple} 的倍数")
+        max_pixels = constraints.get("max_pixels")
+        if max_pixels and width * height > max_pixels:
+            errors.append(f"分辨率 {width}x{height} 超过模型支持的最大像素数 {max_pixels}")
+        resolutions = constraints.get("resolutions")
+        if resolutions and [width, height] not in resolutions:
+            supported = "、".join(f"{w}x{h}" for w, h in resolutions)
+            errors.append(f"模型只支持以下分辨率: {supported}")
+
+    sampler = payload.get("sampler")
+    if sampler is not None and constraints.get("samplers") and sampler not in constraints["samplers"]:
+        errors.append(f"模型不支持采样器 {sampler}")
+    return errors
+
+
+class RequestValidator:
+    """
+    提交前的本地参数校验
+
+    模型约束来自缓存的 get_model_presets 结果，参数不合法的请求在本地直接拒绝，
+    不会发送到 API
+    """
+
+    def __init__(self, api, ttl=3600, error_ttl=60):
+        """
+        初始化校验器
+
+        Args:
+            api (LiblibAIAPI): API 通信模块实例，用于获取模型预设
+            ttl (float, optional): 模型预设的缓存时间（秒）. Defaults to 3600.
+            error_ttl (float, optional): 获取预设失败时默认约束的缓存时间（秒）. Defaults to 60.
+        """
+        self.api = api
+        self.error_ttl = error_ttl
+        self.cache = TTLCache(ttl=ttl)
+        self.rejected = 0
+
+    def constraints(self, model_id=None):
+        """
+        返回模型的约束
+
+        Args:
+            model_id (str, optional): 模型 ID，为 None 时返回默认约束. Defaults to None.
+
+        Returns:
+            dict: 约束
+        """
+        if not model_id:
+            return copy.deepcopy(DEFAULT_CONSTRAINTS)
+        try:
+            return self.cache.get_or_load(model_id, lambda: parse_presets(self.api.get_model_presets(model_id)))
+        except Exception as e:
+            # 预设获取失败不应阻止生成，短时间内使用默认约束
+            logger.warning(f"获取模型预设失败: {str(e)}")
+            constraints = copy.deepcopy(DEFAULT_CONSTRAINTS)
+            self.cache.set(model_id, constraints, ttl=self.error_ttl)
+            return constraints
+
+    def validate(self, payload):
+        """
+        校验请求参数
+
+        Args:
+            payload (dict): 请求数据，包含 model_id 时按该模型的预设校验
+
+        Returns:
+            list: 错误信息列表，为空表示校验通过
+        """
+        return validate_payload(payload, self.constraints(payload.get("model_id")))
+
+    def check(self, payload):
+        """
+        校验请求参数，不通过时抛出异常
+
+        Args:
+            payload (dict): 请求数据
+
+        Raises:
+            ValidationError: 如果参数不合法
+        """
+        errors = self.validate(payload)
+        if errors:
+            self.rejected += 1
+            raise ValidationError(errors)
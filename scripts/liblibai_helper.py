@@ -1,106 +1,491 @@
 import os
+import sys
 import time
+
+# 记录插件开始加载的时间，用于统计对 WebUI 启动的影响
+_module_started = time.perf_counter()
+
+import io
 import json
+import base64
+import socket
+import asyncio
+import functools
+import subprocess
 from datetime import datetime
-import requests
 import modules.scripts as scripts
 from modules import script_callbacks
 import gradio as gr
 
 # 导入插件库
-from scripts.lh_lib.auth import LiblibAIAuth
-from scripts.lh_lib.api import LiblibAIAPI, APIError
-
-# 设置日志记录器
-import logging
-logger = logging.getLogger("liblibai_helper")
-logger.setLevel(logging.INFO)
-
-# 创建控制台处理器
-console_handler = logging.StreamHandler()
-console_handler.setLevel(logging.INFO)
+from scripts.lh_lib.api import APIError
+from scripts.lh_lib.scheduler import LocalBackend, LiblibAIBackend, OffloadScheduler
+from scripts.lh_lib.daemon import DaemonClient, default_socket_path
+from scripts.lh_lib.distributed import SharedJobQueue, DistributedWorker
+from scripts.lh_lib.factory import build_api, create_proxy_pool, update_key_pool
+from scripts.lh_lib.settings import get_store, update_nested_dict
+from scripts.lh_lib.catalog import CatalogCache, filter_models
+from scripts.lh_lib.validation import RequestValidator, DEFAULT_CONSTRAINTS
+from scripts.lh_lib.output import ImageWriter, format_infotext
+from scripts.lh_lib.history import HistoryIndex
+from scripts.lh_lib.metrics import MetricsRegistry, register_routes
+from scripts.lh_lib.tracing import JsonlExporter
+from scripts.lh_lib.profiling import HandlerProfiler
+from scripts.lh_lib.log import setup_logging
+from scripts.lh_lib.hashing import HashCache, ModelHasher
+from scripts.lh_lib.scanner import LocalModelIndex
+from scripts.lh_lib import model_cards
+from scripts.lh_lib.tasks import (
+    poll_task_async, format_progress, download_image,
+    CancelToken, TaskCancelled, call_with_token
+)
 
-# 创建格式化器
-formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-console_handler.setFormatter(formatter)
-
-# 添加处理器到记录器
-logger.addHandler(console_handler)
+# 设置日志记录器，日志经队列由后台线程输出，重新加载脚本时不会重复添加处理器
+logger = setup_logging("liblibai_helper")
 
 # 全局实例
 settings = {}
 auth = None
 api = None
+scheduler = None
+key_pool = None
+proxy_pool = None
+job_queue = None
+worker = None
+validator = None
+image_writer = None
+trace_exporter = None
+history_index = None
+
+# 模型、工作流、最近任务列表的本地缓存，界面先用缓存渲染，后台再拉取最新数据
+catalog = CatalogCache()
+
+# 页面加载时从缓存填充组件的函数，on_ui_tabs 中注册到 Blocks.load
+ui_loaders = []
+
+# 启动耗时统计（秒）
+startup_timings = {}
+
+# API 请求指标，WebUI 启动后通过 /liblibai/metrics 导出
+metrics = MetricsRegistry()
+
+# 界面处理函数的按需性能分析，关闭时几乎没有开销
+profiler = HandlerProfiler(os.path.join("outputs", "liblibai", "profiles"))
+
+# 本地模型文件索引，按哈希或名称与 LiblibAI 模型匹配
+model_index = None
+
+# 默认设置
+DEFAULT_SETTINGS = {
+    "access_key": "",
+    "secret_key": "",
+    "proxy": "",
+    "proxies": [],
+    "proxy_probe_interval": 60,
+    "auto_update_check": True,
+    "update_interval": 3600,
+    "save_path": "",
+    "default_model": "",
+    "default_workflow": "",
+    "task": {
+        "poll_interval": 2.0,
+        "timeout": 600
+    },
+    "tracing": {
+        "enabled": False,
+        "path": ""
+    },
+    "logging": {
+        "level": "INFO",
+        "json": False,
+        "rate_limit": 5,
+        "rate_window": 60
+    },
+    "profiling": {
+        "enabled": False,
+        "mode": "deterministic",
+        "threshold_ms": 500,
+        "output_dir": ""
+    },
+    "output": {
+        "format": "png",
+        "quality": 90,
+        "thumbnail_size": 256
+    },
+    "ui_defaults": {
+        "width": 512,
+        "height": 512,
+        "steps": 20,
+        "cfg_scale": 7.0,
+        "sampler": "euler_a"
+    },
+    "offload": {
+        "enabled": False,
+        "local_concurrency": 1,
+        "remote_concurrency": 4,
+        "cost_budget": 0,
+        "budget_window": 86400,
+        "cost_per_image": 1.0
+    },
+    "daemon": {
+        "enabled": False,
+        "socket_path": "",
+        "rate": 5.0,
+        "burst": 10
+    },
+    "keys": [],
+    "key_pool": {
+        "quarantine_seconds": 300,
+        "auth_quarantine_seconds": 3600,
+        "quota_window": 86400
+    },
+    "distributed": {
+        "enabled": False,
+        "db_path": "",
+        "node_id": "",
+        "concurrency": 1,
+        "stale_after": 60
+    },
+    "hashing": {
+        "enabled": True,
+        "workers": 0
+    },
+    "model_index": {
+        "enabled": True,
+        "watch": True,
+        "poll_interval": 30
+    }
+}
+
+# LiblibAI 采样器名称到 WebUI 采样器名称的映射
+LOCAL_SAMPLER_NAMES = {
+    "euler_a": "Euler a",
+    "euler": "Euler",
+    "lms": "LMS",
+    "heun": "Heun",
+    "dpm2": "DPM2",
+    "dpm2_ancestral": "DPM2 a",
+    "dpmpp_2s_ancestral": "DPM++ 2S a",
+    "dpmpp_2m": "DPM++ 2M",
+    "dpmpp_sde": "DPM++ SDE",
+    "ddim": "DDIM"
+}
 
 # 加载设置
 def load_settings():
-    global settings, auth, api
+    global settings, auth, api, scheduler, key_pool, proxy_pool, job_queue, worker, validator, image_writer
     
-    config_file = os.path.join(
-        os.path.dirname(os.path.abspath(__file__)),
-        "..", "liblibai_helper.json"
-    )
+    # 读取设置（文件未变化时直接使用缓存），文件中缺少的项使用默认值
+    store = get_store()
+    store.set_defaults(DEFAULT_SETTINGS)
+    settings = store.load()
+    update_logging()
     
-    # 默认设置
-    settings = {
-        "access_key": "",
-        "secret_key": "",
-        "proxy": "",
-        "auto_update_check": True,
-        "update_interval": 3600,
-        "save_path": "",
-        "default_model": "",
-        "default_workflow": "",
-        "ui_defaults": {
-            "width": 512,
-            "height": 512,
-            "steps": 20,
-            "cfg_scale": 7.0,
-            "sampler": "euler_a"
-        }
-    }
+    # 初始化认证和 API，代理、代理池和密钥池与守护进程使用同一套创建逻辑
+    if proxy_pool:
+        proxy_pool.stop()
+    api, proxy_pool, key_pool = build_api(settings, metrics)
+    auth = api.auth
+    update_trace_exporter()
+        
+    # 启用守护进程时，所有 API 调用都通过本机共享的守护进程转发
+    if settings.get("daemon", {}).get("enabled"):
+        client = connect_daemon(settings["daemon"])
+        if client:
+            api = client
+            
+    # 提交前按缓存的模型预设校验参数；使用守护进程时由守护进程校验
+    validator = RequestValidator(api)
+    if hasattr(api, "set_validator"):
+        api.set_validator(validator)
+        
+    # 后台保存生成结果
+    update_image_writer()
     
-    # 加载设置
-    if os.path.exists(config_file):
+    # 界面处理函数的性能分析，环境变量 LIBLIBAI_PROFILE 优先
+    update_profiler()
+        
+    # 初始化本地/远程混合调度器
+    scheduler = create_scheduler(settings.get("offload", {}), settings.get("task", {}))
+    
+    # 分布式模式：从共享任务表认领批量任务
+    if worker:
+        worker.stop()
+        worker = None
+    job_queue = None
+    distributed_settings = settings.get("distributed", {})
+    if distributed_settings.get("enabled"):
         try:
-            with open(config_file, 'r', encoding='utf-8') as f:
-                loaded_settings = json.load(f)
-                # 更新设置，但保留默认值中存在但加载的设置中不存在的项
-                update_nested_dict(settings, loaded_settings)
+            save_path = settings.get("save_path") or "outputs/liblibai"
+            db_path = distributed_settings.get("db_path") or os.path.join(save_path, "liblibai_jobs.db")
+            job_queue = SharedJobQueue(db_path)
+            worker = DistributedWorker(
+                job_queue,
+                run_distributed_job,
+                save_path,
+                node_id=distributed_settings.get("node_id") or None,
+                concurrency=distributed_settings.get("concurrency", 1),
+                stale_after=distributed_settings.get("stale_after", 60),
+                writer=image_writer
+            )
+            worker.start()
+            logger.info(f"分布式节点已启动: {worker.node_id}")
         except Exception as e:
-            logger.error(f"加载设置失败: {str(e)}")
-    
-    # 初始化认证和 API
-    auth = LiblibAIAuth(settings.get("access_key"), settings.get("secret_key"))
-    api = LiblibAIAPI(auth)
-    
-    # 设置代理
-    if settings.get("proxy"):
-        api.set_proxy(settings.get("proxy"))
+            logger.error(f"启动分布式节点失败: {str(e)}")
+            job_queue = None
+            worker = None
 
-# 递归更新嵌套字典
-def update_nested_dict(d, u):
-    """递归更新嵌套字典"""
-    for k, v in u.items():
-        if isinstance(v, dict) and k in d and isinstance(d[k], dict):
-            update_nested_dict(d[k], v)
-        else:
-            d[k] = v
+# 执行分布式批量任务
+def run_distributed_job(job):
+    """在 LiblibAI 上生成并下载图片，由分布式节点交给图片保存器写入共享目录"""
+    result = scheduler.remote.generate(job)
+    image_url = result.get("result", {}).get("image_url")
+    if not image_url:
+        raise APIError(f"获取图片失败: {result.get('message', '未知错误')}")
+    params = job.get("params", {})
+    infotext = format_infotext(
+        job.get("prompt", ""), job.get("negative_prompt", ""),
+        Steps=params.get("steps"), Sampler=params.get("sampler"), **{"CFG scale": params.get("cfg_scale")},
+        Seed=params.get("seed"), Size=f"{job.get('width', 512)}x{job.get('height', 512)}", Model=job.get("model_id")
+    )
+    return {"task_id": result.get("task_id"), "image_url": image_url, "content": download_image(image_url), "info": infotext}
 
-# 保存设置
-def save_settings():
-    config_file = os.path.join(
-        os.path.dirname(os.path.abspath(__file__)),
-        "..", "liblibai_helper.json"
+# 更新追踪导出器
+def update_trace_exporter():
+    """按设置把请求追踪区间写入 JSONL 文件，未启用时关闭导出器"""
+    global trace_exporter
+    if trace_exporter:
+        trace_exporter.close()
+        trace_exporter = None
+    tracing_settings = settings.get("tracing", {})
+    if tracing_settings.get("enabled"):
+        path = tracing_settings.get("path") or os.path.join(settings.get("save_path") or "outputs/liblibai", "traces.jsonl")
+        trace_exporter = JsonlExporter(path)
+        api.add_trace_hook(trace_exporter)
+        logger.info(f"请求追踪已启用: {path}")
+
+# 更新日志设置
+def update_logging():
+    """按设置更新日志级别、格式和错误日志限流，插件库模块的日志使用同样的设置"""
+    logging_settings = settings.get("logging", {})
+    for name in ("liblibai_helper", "scripts.lh_lib"):
+        setup_logging(
+            name,
+            level=logging_settings.get("level", "INFO"),
+            json_format=logging_settings.get("json", False),
+            rate_limit=logging_settings.get("rate_limit", 5),
+            rate_window=logging_settings.get("rate_window", 60)
+        )
+
+# 更新性能分析设置
+def update_profiler():
+    """按设置更新处理函数的性能分析器"""
+    profiling_settings = settings.get("profiling", {})
+    profiler.configure(
+        enabled=profiling_settings.get("enabled", False),
+        mode=profiling_settings.get("mode", "deterministic"),
+        threshold_ms=profiling_settings.get("threshold_ms", 500),
+        output_dir=profiling_settings.get("output_dir") or os.path.join(settings.get("save_path") or "outputs/liblibai", "profiles")
     )
-    
+
+# 更新图片保存器
+def update_image_writer():
+    """按当前的保存路径和输出设置重建后台图片保存器"""
+    global image_writer, history_index
+    if image_writer:
+        # 已提交的图片继续在后台保存完
+        image_writer.shutdown(wait=False)
+    output_settings = settings.get("output", {})
+    save_path = settings.get("save_path") or "outputs/liblibai"
     try:
-        with open(config_file, 'w', encoding='utf-8') as f:
-            json.dump(settings, f, ensure_ascii=False, indent=2)
-        return True
+        history_index = HistoryIndex(os.path.join(save_path, "history.db"))
     except Exception as e:
-        logger.error(f"保存设置失败: {str(e)}")
-        return False
+        # 索引不可用时照常保存图片，只是历史页面无法搜索
+        logger.error(f"打开历史索引失败: {str(e)}")
+        history_index = None
+    image_writer = ImageWriter(
+        save_path,
+        image_format=output_settings.get("format", "png"),
+        quality=output_settings.get("quality", 90),
+        thumbnail_size=output_settings.get("thumbnail_size", 256),
+        index=history_index
+    )
+
+# 更新代理池
+def update_proxy_pool(proxies):
+    """根据代理列表重建代理池并启动健康探测，列表为空时停用代理池"""
+    global proxy_pool
+    if proxy_pool:
+        proxy_pool.stop()
+        proxy_pool = None
+    proxy_pool = create_proxy_pool(proxies, settings.get("proxy_probe_interval", 60))
+    api.set_proxy_pool(proxy_pool)
+
+# 连接本机守护进程
+def connect_daemon(daemon_settings):
+    """连接守护进程，未运行时自动启动，失败时返回 None"""
+    if not hasattr(socket, "AF_UNIX"):
+        logger.warning("当前系统不支持 Unix Socket，守护进程模式已禁用")
+        return None
+        
+    # 未指定时使用只有当前用户可以访问的目录，其他用户不能连接守护进程使用本用户的密钥
+    try:
+        socket_path = daemon_settings.get("socket_path") or default_socket_path()
+    except OSError as e:
+        logger.error(f"创建守护进程 Socket 目录失败: {str(e)}")
+        return None
+    client = DaemonClient(socket_path)
+    if client.is_available():
+        return client
+        
+    extension_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    command = [
+        sys.executable, "-m", "scripts.lh_lib.daemon",
+        "--socket", socket_path,
+        "--rate", str(daemon_settings.get("rate", 5.0)),
+        "--burst", str(daemon_settings.get("burst", 10))
+    ]
+    # 守护进程自行读取配置文件中的密钥、代理和密钥池，并在配置变化时重新加载
+    try:
+        subprocess.Popen(command, cwd=extension_dir, start_new_session=True)
+    except Exception as e:
+        logger.error(f"启动守护进程失败: {str(e)}")
+        return None
+        
+    # 等待守护进程就绪
+    for _ in range(50):
+        time.sleep(0.1)
+        if client.is_available():
+            logger.info(f"已连接 LiblibAI 守护进程: {socket_path}")
+            return client
+            
+    logger.error("守护进程未能在 5 秒内就绪，回退到进程内 API 客户端")
+    return None
+
+# 本地 WebUI 管线生成
+def local_txt2img(job):
+    """使用 WebUI 本地管线执行文生图任务"""
+    from modules import processing, shared
+    from modules.call_queue import queue_lock
+    
+    params = job.get("params", {})
+    p = processing.StableDiffusionProcessingTxt2Img(
+        sd_model=shared.sd_model,
+        prompt=job.get("prompt", ""),
+        negative_prompt=job.get("negative_prompt", ""),
+        width=job.get("width", 512),
+        height=job.get("height", 512),
+        steps=params.get("steps", 20),
+        cfg_scale=params.get("cfg_scale", 7.0),
+        sampler_name=LOCAL_SAMPLER_NAMES.get(params.get("sampler"), "Euler a"),
+        seed=params.get("seed") if params.get("seed") is not None else -1,
+        do_not_save_samples=True,
+        do_not_save_grid=True
+    )
+    
+    with queue_lock:
+        processed = processing.process_images(p)
+        
+    return {"images": processed.images, "info": processed.info}
+
+# 本地 WebUI 队列深度
+def local_queue_depth():
+    """返回 WebUI 生成队列中排队和正在执行的任务数"""
+    # 等待 queue_lock 的任务在 progress.pending_tasks 中，正在执行的任务是 current_task；
+    # 调度器自己提交的本地任务不经过这个队列，由调度器的 inflight 统计
+    try:
+        from modules import progress
+    except ImportError:
+        return 0
+    pending = len(getattr(progress, "pending_tasks", None) or ())
+    return pending + (1 if getattr(progress, "current_task", None) else 0)
+
+# 创建调度器
+def create_scheduler(offload_settings, task_settings):
+    """根据设置创建本地/远程混合调度器，远程任务的轮询间隔和超时时间使用任务设置"""
+    local = LocalBackend(
+        local_txt2img,
+        queue_depth_fn=local_queue_depth,
+        concurrency=offload_settings.get("local_concurrency", 1)
+    )
+    remote = LiblibAIBackend(
+        api,
+        poll_interval=task_settings.get("poll_interval", 2.0),
+        timeout=task_settings.get("timeout", 600),
+        cost_per_image=offload_settings.get("cost_per_image", 1.0),
+        concurrency=offload_settings.get("remote_concurrency", 4)
+    )
+    return OffloadScheduler(
+        local,
+        remote,
+        cost_budget=offload_settings.get("cost_budget", 0),
+        budget_window=offload_settings.get("budget_window", 86400)
+    )
+
+# 拉取模型列表
+def fetch_models():
+    """从 LiblibAI 拉取模型列表，未配置密钥时返回空列表"""
+    if not auth.is_configured():
+        return []
+        
+    # 模拟 API 调用，实际应该调用 api.get_models()
+    return [
+        {"id": "model1", "name": "模型1", "type": "底模", "description": "这是模型1的描述"},
+        {"id": "model2", "name": "模型2", "type": "LoRA", "description": "这是模型2的描述"},
+        {"id": "model3", "name": "模型3", "type": "VAE", "description": "这是模型3的描述"}
+    ]
+
+# 拉取工作流列表
+def fetch_workflows():
+    """从 LiblibAI 拉取工作流列表，未配置密钥时返回空列表"""
+    if not auth.is_configured():
+        return []
+        
+    # 模拟 API 调用，实际应该调用 api.get_workflow_templates()
+    return [
+        {"id": "workflow1", "name": "工作流1"},
+        {"id": "workflow2", "name": "工作流2"},
+        {"id": "workflow3", "name": "工作流3"}
+    ]
+
+# 拉取最近任务
+def fetch_recent_tasks():
+    """拉取最近任务，未配置密钥时返回空列表"""
+    if not auth.is_configured():
+        return []
+        
+    # 模拟最近任务，实际应该从某处获取
+    return [
+        {"task_id": "task1", "type": "text_to_image", "status": "success", "created_at": time.time() - 3600, "completed_at": time.time() - 3500},
+        {"task_id": "task2", "type": "image_to_image", "status": "failed", "created_at": time.time() - 7200, "completed_at": time.time() - 7100},
+        {"task_id": "task3", "type": "workflow", "status": "pending", "created_at": time.time() - 1800}
+    ]
+
+# 后台刷新目录缓存
+def hydrate_catalog():
+    """在后台线程中拉取模型、工作流和最近任务并写入缓存"""
+    def report():
+        logger.info(f"LiblibAI 列表已在后台刷新，耗时 {catalog.last_hydrate_seconds:.3f}s")
+        if model_index:
+            model_index.set_remote_models(catalog.get("models", []))
+        
+    catalog.hydrate_async({
+        "models": fetch_models,
+        "workflows": fetch_workflows,
+        "recent_tasks": fetch_recent_tasks
+    }, callback=report)
+
+# 重新读取设置
+def refresh_settings():
+    """重新绑定全局设置，配置文件被外部修改后读取到的是新内容"""
+    global settings
+    settings = get_store().load()
+    return settings
+
+# 保存设置
+def save_settings(immediate=True):
+    """保存设置，immediate 为 False 时延迟合并写入"""
+    return get_store().save(immediate)
 
 # 确保目录存在
 def ensure_directory(directory):
@@ -112,9 +497,16 @@ def ensure_directory(directory):
 # 创建 UI
 def on_ui_tabs():
     """创建插件 UI 选项卡"""
+    started = time.perf_counter()
+    
     # 加载设置
     load_settings()
+    startup_timings["load_settings"] = time.perf_counter() - started
     
+    # 各选项卡只使用缓存数据构建，不在这里访问网络
+    ui_loaders.clear()
+    # 页面加载时先读取配置文件的最新内容
+    ui_loaders.append((refresh_settings, [], []))
     with gr.Blocks(analytics_enabled=False) as liblibai_interface:
         with gr.Tabs():
             with gr.TabItem("生成"):
@@ -125,16 +517,46 @@ def on_ui_tabs():
                 create_models_ui()
             with gr.TabItem("任务"):
                 create_tasks_ui()
+            with gr.TabItem("历史"):
+                create_history_ui()
             with gr.TabItem("设置"):
                 create_settings_ui()
                 
+        # 每次打开页面时用最新的缓存填充列表
+        for fn, inputs, outputs in ui_loaders:
+            liblibai_interface.load(fn, inputs=inputs, outputs=outputs)
+            
+    startup_timings["build_ui"] = time.perf_counter() - started - startup_timings["load_settings"]
+    logger.info(
+        f"LiblibAI 选项卡构建耗时 {time.perf_counter() - started:.3f}s"
+        f"（读取设置 {startup_timings['load_settings']:.3f}s，构建界面 {startup_timings['build_ui']:.3f}s，"
+        f"插件导入 {startup_timings.get('import', 0):.3f}s）"
+    )
     return [(liblibai_interface, "LiblibAI", "liblibai_interface")]
 
+# 取消正在进行的任务
+def cancel_task(state):
+    """取消当前会话中正在进行的生成或工作流任务"""
+    token = state.get("token")
+    if token is None or token.cancelled:
+        return "没有正在进行的任务"
+    token.cancel()
+    return "正在取消..."
+
+# 下拉框选项
+def model_choices(models):
+    """把模型列表转换为下拉框选项"""
+    return [f"{m['name']} ({m['id']})" for m in models]
+
+def workflow_choices(workflows):
+    """把工作流列表转换为下拉框选项"""
+    return [f"{w['name']} ({w['id']})" for w in workflows]
+
 def create_generation_ui():
     """创建生成 UI"""
     with gr.Row():
         with gr.Column(scale=4):
-            model_id = gr.Dropdown(label="模型", choices=[], interactive=True)
+            model_id = gr.Dropdown(label="模型", choices=model_choices(catalog.get("models", [])), interactive=True)
             prompt = gr.Textbox(label="提示词", lines=3, placeholder="输入提示词...")
             negative_prompt = gr.Textbox(label="负面提示词", lines=2, placeholder="输入负面提示词...")
             
@@ -145,7 +567,7 @@ def create_generation_ui():
                 height = gr.Slider(label="高度", minimum=64, maximum=2048, step=8, value=settings.get("ui_defaults", {}).get("height", 512))
                 steps = gr.Slider(label="步数", minimum=1, maximum=150, step=1, value=settings.get("ui_defaults", {}).get("steps", 20))
                 cfg_scale = gr.Slider(label="CFG Scale", minimum=1, maximum=30, step=0.5, value=settings.get("ui_defaults", {}).get("cfg_scale", 7.0))
-                sampler = gr.Dropdown(label="采样器", choices=["euler_a", "euler", "lms", "heun", "dpm2", "dpm2_ancestral", "dpmpp_2s_ancestral", "dpmpp_2m", "dpmpp_sde", "ddim"], value=settings.get("ui_defaults", {}).get("sampler", "euler_a"))
+                sampler = gr.Dropdown(label="采样器", choices=DEFAULT_CONSTRAINTS["samplers"], value=settings.get("ui_defaults", {}).get("sampler", "euler_a"))
                 seed = gr.Number(label="种子", value=-1)
                 
     with gr.Row():
@@ -159,124 +581,194 @@ def create_generation_ui():
             use_img2img.change(toggle_img2img, use_img2img, image_input)
             
         with gr.Column():
-            generate_btn = gr.Button("生成", variant="primary")
+            with gr.Row():
+                generate_btn = gr.Button("生成", variant="primary")
+                cancel_btn = gr.Button("取消")
+            task_state = gr.State({})
             output_image = gr.Image(label="生成结果")
             output_info = gr.Textbox(label="生成信息", interactive=False)
             
-    # 加载模型列表
+    # 加载模型列表（读取缓存）
     def load_models():
         try:
             if not auth.is_configured():
                 return gr.Dropdown.update(choices=[], value=None)
                 
-            # 模拟 API 调用，实际应该调用 api.get_models()
-            models = [
-                {"id": "model1", "name": "模型1"},
-                {"id": "model2", "name": "模型2"},
-                {"id": "model3", "name": "模型3"}
-            ]
-            return gr.Dropdown.update(choices=[f"{m['name']} ({m['id']})" for m in models])
+            return gr.Dropdown.update(choices=model_choices(catalog.get("models", [])))
         except Exception as e:
             logger.error(f"加载模型列表失败: {str(e)}")
             return gr.Dropdown.update(choices=[])
             
-    # 生成图像
-    def generate_image(model_selection, prompt, negative_prompt, width, height, steps, cfg_scale, sampler, seed, use_img2img, image_input):
+    # 按模型预设更新参数范围和可选采样器
+    def update_constraints(model_selection, sampler_value):
+        try:
+            if not model_selection or not auth.is_configured():
+                constraints = validator.constraints()
+            else:
+                constraints = validator.constraints(model_selection.split("(")[-1].rstrip(")"))
+        except Exception as e:
+            logger.error(f"获取模型约束失败: {str(e)}")
+            constraints = DEFAULT_CONSTRAINTS
+        samplers = constraints["samplers"]
+        return (
+            gr.Slider.update(minimum=constraints["width"][0], maximum=constraints["width"][1], step=constraints["size_multiple"] or 8),
+            gr.Slider.update(minimum=constraints["height"][0], maximum=constraints["height"][1], step=constraints["size_multiple"] or 8),
+            gr.Slider.update(minimum=constraints["steps"][0], maximum=constraints["steps"][1]),
+            gr.Slider.update(minimum=constraints["cfg_scale"][0], maximum=constraints["cfg_scale"][1]),
+            gr.Dropdown.update(choices=samplers, value=sampler_value if sampler_value in samplers else samplers[0])
+        )
+        
+    # 生成图像（异步生成器，逐步返回排队位置、进度和中间预览，等待期间不占用工作线程）
+    async def generate_image(model_selection, prompt, negative_prompt, width, height, steps, cfg_scale, sampler, seed, use_img2img, image_input, state):
+        loop = asyncio.get_running_loop()
         try:
             if not auth.is_configured():
-                return None, "请先在设置中配置 API 密钥"
+                yield None, "请先在设置中配置 API 密钥"
+                return
                 
             # 从选择中提取模型 ID
             if not model_selection:
-                return None, "请选择模型"
+                yield None, "请选择模型"
+                return
                 
             model_id = model_selection.split("(")[-1].rstrip(")")
             
             # 准备参数
             params = {
-                "width": width,
-                "height": height,
                 "steps": steps,
                 "cfg_scale": cfg_scale,
-                "sampler": sampler,
-                "seed": seed if seed != -1 else None
+                "sampler": sampler
             }
-            
-            # 创建任务
-            if use_img2img and image_input is not None:
-                # 保存临时图片
-                temp_img_path = "temp_img2img_input.png"
-                image_input.save(temp_img_path)
+            if seed != -1:
+                params["seed"] = seed
                 
-                # 图生图任务
-                # 实际应该调用 api.image_to_image()
-                response = {"task_id": "img2img_task_123"}
+            task_settings = settings.get("task", {})
+            poll_interval = task_settings.get("poll_interval", 2.0)
+            
+            # 取消令牌：取消按钮和截止时间都通过它传递到提交、轮询和下载
+            token = CancelToken(timeout=task_settings.get("timeout", 600))
+            state["token"] = token
+            info = f"模型: {model_selection}\n提示词: {prompt}\n负面提示词: {negative_prompt}\n参数: {width}x{height}, 步数={steps}, CFG={cfg_scale}, 采样器={sampler}, 种子={seed if seed != -1 else '随机'}"
+            infotext = format_infotext(
+                prompt, negative_prompt,
+                Steps=steps, Sampler=sampler, **{"CFG scale": cfg_scale},
+                Seed=params.get("seed"), Size=f"{width}x{height}", Model=model_id
+            )
+            
+            if settings.get("offload", {}).get("enabled") and not (use_img2img and image_input is not None):
+                # 混合调度：根据队列深度、延迟和额度选择本地或 LiblibAI
+                job = {
+                    "model_id": model_id,
+                    "prompt": prompt,
+                    "negative_prompt": negative_prompt,
+                    "width": width,
+                    "height": height,
+                    "params": params
+                }
+                started = time.time()
+                future = loop.run_in_executor(None, scheduler.run, job, token)
+                while not future.done():
+                    status = "正在取消" if token.cancelled else "调度中"
+                    yield gr.update(), f"{status}，已等待 {time.time() - started:.0f}s"
+                    await asyncio.wait([future], timeout=poll_interval)
+                backend_name, result = future.result()
+                if backend_name == "local":
+                    saved = await asyncio.wrap_future(image_writer.submit(result["images"][0], result.get("info", ""), source="local"))
+                    yield saved["path"], f"后端: 本地\n{result.get('info', '')}"
+                    return
+                task_id = result.get("task_id")
+                image_url = result.get("result", {}).get("image_url")
             else:
-                # 文生图任务
-                # 实际应该调用 api.text_to_image()
-                response = {"task_id": "txt2img_task_123"}
+                # 创建任务
+                if use_img2img and image_input is not None:
+                    # 图片在内存中编码为 base64 直接传给 API；使用守护进程时同样通过 Socket 传递，
+                    # 不依赖当前工作目录，并发请求之间也不会互相覆盖
+                    buffer = io.BytesIO()
+                    image_input.save(buffer, format="PNG")
+                    image_b64 = base64.b64encode(buffer.getvalue()).decode("utf-8")
+                    
+                    # 图生图任务
+                    submit = functools.partial(api.image_to_image, model_id, prompt, image_b64, negative_prompt, width=width, height=height, **params)
+                else:
+                    # 文生图任务
+                    submit = functools.partial(api.text_to_image, model_id, prompt, negative_prompt, width, height, **params)
+                response = await loop.run_in_executor(None, call_with_token, api, token, submit)
                 
-            # 获取任务 ID
-            task_id = response.get("task_id")
-            if not task_id:
-                return None, f"创建任务失败: {response.get('message', '未知错误')}"
+                # 获取任务 ID
+                task_id = response.get("task_id")
+                if not task_id:
+                    yield None, f"创建任务失败: {response.get('message', '未知错误')}"
+                    return
+                    
+                # 轮询任务结果，每次查询后更新进度和预览
+                started = time.time()
+                progress = None
+                async for progress in poll_task_async(api, task_id, poll_interval, task_settings.get("timeout", 600), token):
+                    yield progress.get("preview") or gr.update(), format_progress(progress, time.time() - started)
+                image_url = progress.get("image_url")
                 
-            # 轮询任务结果
-            # 实际应该调用 api.get_task_result() 并轮询
-            # 这里模拟任务完成
-            time.sleep(2)  # 模拟等待
-            result = {
-                "status": "success",
-                "result": {
-                    "image_url": "https://example.com/image.png"
-                }
-            }
-            
             # 获取生成的图片
-            image_url = result.get("result", {}).get("image_url")
             if not image_url:
-                return None, f"获取图片失败: {result.get('message', '未知错误')}"
+                yield None, "获取图片失败: 任务结果中没有图片地址"
+                return
                 
-            # 下载图片
-            # 实际应该下载图片，这里模拟
-            output_dir = settings.get("save_path") or "outputs/liblibai"
-            ensure_directory(output_dir)
-            
-            timestamp = int(time.time())
-            output_path = os.path.join(output_dir, f"liblibai_{timestamp}.png")
-            
-            # 模拟下载图片
-            with open("scripts/lh_lib/__init__.py", "rb") as f:
-                content = f.read()
-                
-            with open(output_path, "wb") as f:
-                f.write(content)
+            # 下载图片，在后台写入参数并保存
+            content = await loop.run_in_executor(None, download_image, image_url, 60, token, getattr(api, "tracer", None))
+            saved = await asyncio.wrap_future(image_writer.submit(content, infotext, metadata={"task_id": task_id}))
                 
             # 返回结果
-            info = f"任务 ID: {task_id}\n模型: {model_selection}\n提示词: {prompt}\n负面提示词: {negative_prompt}\n参数: {width}x{height}, 步数={steps}, CFG={cfg_scale}, 采样器={sampler}, 种子={seed if seed != -1 else '随机'}"
-            return output_path, info
+            trace_info = f"\n追踪 ID: {token.trace_id}" if trace_exporter else ""
+            yield saved["path"], f"任务 ID: {task_id}{trace_info}\n{info}"
             
+        except TaskCancelled:
+            yield None, "已取消生成"
         except Exception as e:
             logger.error(f"生成失败: {str(e)}")
-            return None, f"生成失败: {str(e)}"
+            yield None, f"生成失败: {str(e)}"
+        finally:
+            state.pop("token", None)
             
+    # 开启性能分析时，耗时超过阈值的调用会保存分析结果
+    generate_image = profiler.wrap("generate_image", generate_image)
+    
     # 绑定事件
     generate_btn.click(
         generate_image,
-        inputs=[model_id, prompt, negative_prompt, width, height, steps, cfg_scale, sampler, seed, use_img2img, image_input],
+        inputs=[model_id, prompt, negative_prompt, width, height, steps, cfg_scale, sampler, seed, use_img2img, image_input, task_state],
         outputs=[output_image, output_info]
     )
     
-    # 初始加载模型列表
-    model_id.choices = load_models().choices
+    model_id.change(
+        update_constraints,
+        inputs=[model_id, sampler],
+        outputs=[width, height, steps, cfg_scale, sampler]
+    )
+    
+    # 取消不经过队列，生成任务占用队列时也能立即生效
+    cancel_btn.click(cancel_task, inputs=[task_state], outputs=[output_info], queue=False)
+
+    # 记住最近使用的参数，拖动滑块时的多次修改会合并为一次写入
+    def remember_ui_default(name):
+        def handler(value):
+            get_store().update({"ui_defaults": {name: value}})
+        return handler
+
+    for name, component in (("width", width), ("height", height), ("steps", steps), ("cfg_scale", cfg_scale), ("sampler", sampler)):
+        component.change(remember_ui_default(name), inputs=component, outputs=None)
+
+    # 页面加载时刷新模型列表
+    ui_loaders.append((load_models, [], [model_id]))
 
 def create_workflow_ui():
     """创建工作流 UI"""
     with gr.Row():
         with gr.Column():
-            workflow_id = gr.Dropdown(label="工作流", choices=[], interactive=True)
+            workflow_id = gr.Dropdown(label="工作流", choices=workflow_choices(catalog.get("workflows", [])), interactive=True)
             workflow_params = gr.JSON(label="工作流参数", value={})
-            run_workflow_btn = gr.Button("运行工作流", variant="primary")
+            with gr.Row():
+                run_workflow_btn = gr.Button("运行工作流", variant="primary")
+                cancel_workflow_btn = gr.Button("取消")
+            workflow_state = gr.State({})
             
         with gr.Column():
             workflow_output = gr.Image(label="工作流结果")
@@ -288,86 +780,81 @@ def create_workflow_ui():
             if not auth.is_configured():
                 return gr.Dropdown.update(choices=[], value=None)
                 
-            # 模拟 API 调用，实际应该调用 api.get_workflow_templates()
-            workflows = [
-                {"id": "workflow1", "name": "工作流1"},
-                {"id": "workflow2", "name": "工作流2"},
-                {"id": "workflow3", "name": "工作流3"}
-            ]
-            return gr.Dropdown.update(choices=[f"{w['name']} ({w['id']})" for w in workflows])
+            return gr.Dropdown.update(choices=workflow_choices(catalog.get("workflows", [])))
         except Exception as e:
             logger.error(f"加载工作流列表失败: {str(e)}")
             return gr.Dropdown.update(choices=[])
             
-    # 运行工作流
-    def run_workflow(workflow_selection, params):
+    # 运行工作流（异步生成器，逐步返回任务进度）
+    async def run_workflow(workflow_selection, params, state):
+        loop = asyncio.get_running_loop()
         try:
             if not auth.is_configured():
-                return None, "请先在设置中配置 API 密钥"
+                yield None, "请先在设置中配置 API 密钥"
+                return
                 
             # 从选择中提取工作流 ID
             if not workflow_selection:
-                return None, "请选择工作流"
+                yield None, "请选择工作流"
+                return
                 
             workflow_id = workflow_selection.split("(")[-1].rstrip(")")
             
+            # 取消令牌：取消按钮和截止时间都通过它传递到提交、轮询和下载
+            task_settings = settings.get("task", {})
+            token = CancelToken(timeout=task_settings.get("timeout", 600))
+            state["token"] = token
+            
             # 运行工作流
-            # 实际应该调用 api.run_workflow()
-            response = {"task_id": "workflow_task_123"}
+            response = await loop.run_in_executor(None, call_with_token, api, token, api.run_workflow, workflow_id, params)
             
             # 获取任务 ID
             task_id = response.get("task_id")
             if not task_id:
-                return None, f"创建任务失败: {response.get('message', '未知错误')}"
+                yield None, f"创建任务失败: {response.get('message', '未知错误')}"
+                return
                 
             # 轮询任务结果
-            # 实际应该调用 api.get_task_result() 并轮询
-            # 这里模拟任务完成
-            time.sleep(2)  # 模拟等待
-            result = {
-                "status": "success",
-                "result": {
-                    "image_url": "https://example.com/image.png"
-                }
-            }
-            
+            started = time.time()
+            progress = None
+            async for progress in poll_task_async(api, task_id, task_settings.get("poll_interval", 2.0), task_settings.get("timeout", 600), token):
+                yield progress.get("preview") or gr.update(), format_progress(progress, time.time() - started)
+                
             # 获取生成的图片
-            image_url = result.get("result", {}).get("image_url")
+            image_url = progress.get("image_url")
             if not image_url:
-                return None, f"获取图片失败: {result.get('message', '未知错误')}"
+                yield None, "获取图片失败: 任务结果中没有图片地址"
+                return
                 
-            # 下载图片
-            # 实际应该下载图片，这里模拟
-            output_dir = settings.get("save_path") or "outputs/liblibai"
-            ensure_directory(output_dir)
-            
-            timestamp = int(time.time())
-            output_path = os.path.join(output_dir, f"liblibai_workflow_{timestamp}.png")
-            
-            # 模拟下载图片
-            with open("scripts/lh_lib/__init__.py", "rb") as f:
-                content = f.read()
-                
-            with open(output_path, "wb") as f:
-                f.write(content)
+            # 下载图片，在后台写入参数并保存
+            info = f"任务 ID: {task_id}\n工作流: {workflow_selection}\n参数: {json.dumps(params, ensure_ascii=False, indent=2)}"
+            content = await loop.run_in_executor(None, download_image, image_url, 60, token, getattr(api, "tracer", None))
+            saved = await asyncio.wrap_future(image_writer.submit(content, info, source="workflow", metadata={"task_id": task_id}))
                 
             # 返回结果
-            info = f"任务 ID: {task_id}\n工作流: {workflow_selection}\n参数: {json.dumps(params, ensure_ascii=False, indent=2)}"
-            return output_path, info
+            yield saved["path"], info
             
+        except TaskCancelled:
+            yield None, "已取消工作流"
         except Exception as e:
             logger.error(f"运行工作流失败: {str(e)}")
-            return None, f"运行工作流失败: {str(e)}"
+            yield None, f"运行工作流失败: {str(e)}"
+        finally:
+            state.pop("token", None)
             
+    run_workflow = profiler.wrap("run_workflow", run_workflow)
+    
     # 绑定事件
     run_workflow_btn.click(
         run_workflow,
-        inputs=[workflow_id, workflow_params],
+        inputs=[workflow_id, workflow_params, workflow_state],
         outputs=[workflow_output, workflow_info]
     )
     
-    # 初始加载工作流列表
-    workflow_id.choices = load_workflows().choices
+    cancel_workflow_btn.click(cancel_task, inputs=[workflow_state], outputs=[workflow_info], queue=False)
+    
+    # 页面加载时刷新工作流列表
+    ui_loaders.append((load_workflows, [], [workflow_id]))
 
 def create_models_ui():
     """创建模型 UI"""
@@ -379,35 +866,33 @@ def create_models_ui():
             
         with gr.Column():
             models_list = gr.Dataframe(
-                headers=["ID", "名称", "类型", "描述"],
-                datatype=["str", "str", "str", "str"],
-                col_count=(4, "fixed"),
+                headers=["ID", "名称", "类型", "本地", "描述"],
+                datatype=["str", "str", "str", "str", "str"],
+                col_count=(5, "fixed"),
                 interactive=False
             )
             
-    # 加载模型列表
-    def load_models_list(model_type_value, query=""):
+    # 加载模型列表（读取缓存，refresh 为 True 时先拉取最新列表）
+    def load_models_list(model_type_value, query="", refresh=False):
         try:
             if not auth.is_configured():
                 return []
                 
             type_value = None if model_type_value == "全部" else model_type_value
             
-            # 模拟 API 调用，实际应该调用 api.get_models()
-            models = [
-                {"id": "model1", "name": "模型1", "type": "底模", "description": "这是模型1的描述"},
-                {"id": "model2", "name": "模型2", "type": "LoRA", "description": "这是模型2的描述"},
-                {"id": "model3", "name": "模型3", "type": "VAE", "description": "这是模型3的描述"}
-            ]
+            if refresh:
+                models = catalog.refresh("models", fetch_models)
+            else:
+                models = catalog.get("models", [])
             
-            # 过滤模型类型
-            if type_value:
-                models = [m for m in models if m.get("type") == type_value]
+            # 本地状态来自模型索引，列表未变化时不重新匹配
+            local_models = {}
+            if model_index:
+                model_index.set_remote_models(models)
+                local_models = model_index.local_by_remote_id()
                 
-            # 过滤搜索关键词
-            if query:
-                query = query.lower()
-                models = [m for m in models if query in m.get("name", "").lower() or query in m.get("description", "").lower()]
+            # 按模型类型和搜索关键词过滤
+            models = filter_models(models, type_value, query)
                 
             # 转换为数据框格式
             data = []
@@ -416,6 +901,7 @@ def create_models_ui():
                     model.get("id", ""),
                     model.get("name", ""),
                     model.get("type", ""),
+                    local_model_status(local_models.get(model.get("id"))),
                     model.get("description", "")
                 ])
                 
@@ -424,6 +910,8 @@ def create_models_ui():
             logger.error(f"加载模型列表失败: {str(e)}")
             return []
             
+    load_models_list = profiler.wrap("load_models_list", load_models_list)
+    
     # 绑定事件
     model_type.change(
         load_models_list,
@@ -438,13 +926,13 @@ def create_models_ui():
     )
     
     refresh_btn.click(
-        load_models_list,
+        lambda model_type_value, query: load_models_list(model_type_value, query, refresh=True),
         inputs=[model_type, search_query],
         outputs=[models_list]
     )
     
-    # 初始加载模型列表
-    models_list.value = load_models_list("全部")
+    # 页面加载时按当前筛选条件用缓存的模型列表填充
+    ui_loaders.append((load_models_list, [model_type, search_query], [models_list]))
 
 def create_tasks_ui():
     """创建任务 UI"""
@@ -465,6 +953,18 @@ def create_tasks_ui():
         )
         refresh_recent_btn = gr.Button("刷新最近任务")
         
+    with gr.Row():
+        with gr.Column():
+            batch_jobs = gr.JSON(label="分布式批量任务（任务列表，每项包含 model_id、prompt、negative_prompt、width、height、params）", value=[])
+            enqueue_btn = gr.Button("提交到共享任务表")
+        with gr.Column():
+            queue_status = gr.JSON(label="共享任务表状态", value={})
+            refresh_queue_btn = gr.Button("刷新任务表状态")
+            
+    with gr.Row():
+        scheduler_stats = gr.JSON(label="调度统计（各后端吞吐量与 p95 延迟）", value={})
+        refresh_stats_btn = gr.Button("刷新调度统计")
+        
     # 获取任务状态
     def get_task_status(task_id):
         try:
@@ -494,18 +994,16 @@ def create_tasks_ui():
             logger.error(f"获取任务状态失败: {str(e)}")
             return f"获取任务状态失败: {str(e)}"
             
-    # 获取最近任务
-    def get_recent_tasks():
+    # 获取最近任务（读取缓存，refresh 为 True 时先拉取最新数据）
+    def get_recent_tasks(refresh=False):
         try:
             if not auth.is_configured():
                 return []
                 
-            # 模拟最近任务，实际应该从某处获取
-            recent = [
-                {"task_id": "task1", "type": "text_to_image", "status": "success", "created_at": time.time() - 3600, "completed_at": time.time() - 3500},
-                {"task_id": "task2", "type": "image_to_image", "status": "failed", "created_at": time.time() - 7200, "completed_at": time.time() - 7100},
-                {"task_id": "task3", "type": "workflow", "status": "pending", "created_at": time.time() - 1800}
-            ]
+            if refresh:
+                recent = catalog.refresh("recent_tasks", fetch_recent_tasks)
+            else:
+                recent = catalog.get("recent_tasks", [])
             
             # 转换为数据框格式
             data = []
@@ -528,6 +1026,40 @@ def create_tasks_ui():
             logger.error(f"获取最近任务失败: {str(e)}")
             return []
             
+    # 提交分布式批量任务
+    def enqueue_batch_jobs(jobs):
+        try:
+            if job_queue is None:
+                return {"error": "未启用分布式模式"}
+            if not isinstance(jobs, list) or not jobs:
+                return {"error": "请输入任务列表"}
+            ids = job_queue.enqueue_many(jobs)
+            return {"enqueued": len(ids), **job_queue.counts()}
+        except Exception as e:
+            logger.error(f"提交批量任务失败: {str(e)}")
+            return {"error": str(e)}
+            
+    # 获取共享任务表状态
+    def get_queue_status():
+        try:
+            if job_queue is None:
+                return {"error": "未启用分布式模式"}
+            return {"node_id": worker.node_id, "processed": worker.processed, **job_queue.counts()}
+        except Exception as e:
+            logger.error(f"获取任务表状态失败: {str(e)}")
+            return {"error": str(e)}
+            
+    # 获取调度统计
+    def get_scheduler_stats():
+        try:
+            return scheduler.get_stats() if scheduler else {}
+        except Exception as e:
+            logger.error(f"获取调度统计失败: {str(e)}")
+            return {}
+            
+    get_task_status = profiler.wrap("get_task_status", get_task_status)
+    get_recent_tasks = profiler.wrap("get_recent_tasks", get_recent_tasks)
+    
     # 绑定事件
     refresh_task_btn.click(
         get_task_status,
@@ -536,13 +1068,137 @@ def create_tasks_ui():
     )
     
     refresh_recent_btn.click(
-        get_recent_tasks,
+        lambda: get_recent_tasks(refresh=True),
         inputs=[],
         outputs=[recent_tasks]
     )
     
-    # 初始加载最近任务
+    enqueue_btn.click(
+        enqueue_batch_jobs,
+        inputs=[batch_jobs],
+        outputs=[queue_status]
+    )
+    
+    refresh_queue_btn.click(
+        get_queue_status,
+        inputs=[],
+        outputs=[queue_status]
+    )
+    
+    refresh_stats_btn.click(
+        get_scheduler_stats,
+        inputs=[],
+        outputs=[scheduler_stats]
+    )
+    
+    # 初始使用缓存的最近任务，页面加载时再刷新
     recent_tasks.value = get_recent_tasks()
+    ui_loaders.append((get_recent_tasks, [], [recent_tasks]))
+
+def create_history_ui():
+    """创建历史 UI"""
+    page_size = 48
+    with gr.Row():
+        with gr.Column(scale=3):
+            history_query = gr.Textbox(label="搜索", placeholder="提示词、模型、任务 ID 或路径...")
+        with gr.Column(scale=1):
+            history_model = gr.Dropdown(label="模型", choices=[], value=None, allow_custom_value=True)
+        with gr.Column(scale=1):
+            history_sampler = gr.Dropdown(label="采样器", choices=[], value=None, allow_custom_value=True)
+        with gr.Column(scale=1):
+            history_size = gr.Textbox(label="尺寸", placeholder="例如 512x768")
+        with gr.Column(scale=1):
+            history_seed = gr.Textbox(label="种子")
+            
+    with gr.Row():
+        search_history_btn = gr.Button("搜索")
+        prev_page_btn = gr.Button("上一页")
+        next_page_btn = gr.Button("下一页")
+        rebuild_index_btn = gr.Button("重建索引")
+        
+    history_gallery = gr.Gallery(label="生成历史", columns=8, height="auto")
+    history_info = gr.Textbox(label="状态", interactive=False)
+    history_page = gr.State(0)
+    
+    # 按条件搜索一页结果，返回缩略图（没有缩略图时用原图）和说明
+    def search_history(query, model, sampler, size, seed, page=0):
+        try:
+            if history_index is None:
+                return [], "历史索引不可用", 0
+            width = height = None
+            if size and "x" in size:
+                width, height = (int(v) for v in size.lower().split("x", 1))
+            page = max(0, int(page))
+            rows, has_more = history_index.search(
+                query, model=model or None, sampler=sampler or None, width=width, height=height,
+                seed=int(seed) if str(seed or "").strip() else None, limit=page_size, offset=page * page_size
+            )
+            if not rows and page > 0:
+                # 已经是最后一页时停留在当前页
+                return search_history(query, model, sampler, size, seed, page - 1)
+            images = [(row["thumbnail"] or row["path"], row["prompt"][:80]) for row in rows]
+            status = f"第 {page + 1} 页，本页 {len(rows)} 张" + ("" if has_more else "（最后一页）")
+            return images, status, page
+        except ValueError:
+            return [], "尺寸或种子格式不正确", 0
+        except Exception as e:
+            logger.error(f"搜索历史失败: {str(e)}")
+            return [], f"搜索历史失败: {str(e)}", 0
+            
+    # 刷新模型和采样器筛选项
+    def load_facets():
+        if history_index is None:
+            return gr.update(), gr.update()
+        return gr.update(choices=history_index.facets("model")), gr.update(choices=history_index.facets("sampler"))
+        
+    # 增量重建索引，只读取新增或修改过的图片
+    def rebuild_history_index():
+        try:
+            if history_index is None:
+                return "历史索引不可用"
+            stats = history_index.rebuild(settings.get("save_path") or "outputs/liblibai")
+            return f"索引已更新：新增 {stats['added']}，移除 {stats['removed']}，未变化 {stats['skipped']}"
+        except Exception as e:
+            logger.error(f"重建索引失败: {str(e)}")
+            return f"重建索引失败: {str(e)}"
+            
+    search_history = profiler.wrap("search_history", search_history)
+    
+    # 绑定事件
+    filters = [history_query, history_model, history_sampler, history_size, history_seed]
+    search_history_btn.click(
+        search_history,
+        inputs=filters,
+        outputs=[history_gallery, history_info, history_page]
+    )
+    
+    history_query.submit(
+        search_history,
+        inputs=filters,
+        outputs=[history_gallery, history_info, history_page]
+    )
+    
+    prev_page_btn.click(
+        lambda *args: search_history(*args[:-1], page=args[-1] - 1),
+        inputs=filters + [history_page],
+        outputs=[history_gallery, history_info, history_page]
+    )
+    
+    next_page_btn.click(
+        lambda *args: search_history(*args[:-1], page=args[-1] + 1),
+        inputs=filters + [history_page],
+        outputs=[history_gallery, history_info, history_page]
+    )
+    
+    rebuild_index_btn.click(
+        rebuild_history_index,
+        inputs=[],
+        outputs=[history_info]
+    )
+    
+    # 页面加载时显示最新的一页
+    ui_loaders.append((load_facets, [], [history_model, history_sampler]))
+    ui_loaders.append((search_history, filters, [history_gallery, history_info, history_page]))
 
 def create_settings_ui():
     """创建设置 UI"""
@@ -551,11 +1207,27 @@ def create_settings_ui():
             access_key = gr.Textbox(label="Access Key", value=settings.get("access_key", ""), type="password")
             secret_key = gr.Textbox(label="Secret Key", value=settings.get("secret_key", ""), type="password")
             proxy = gr.Textbox(label="代理设置 (例如: http://127.0.0.1:7890)", value=settings.get("proxy", ""))
+            proxies = gr.Textbox(label="代理池 (每行一个，配置后按延迟自动选择并故障切换)", lines=3, value="\n".join(settings.get("proxies", [])))
             save_path = gr.Textbox(label="保存路径", value=settings.get("save_path", ""))
             
         with gr.Column():
             auto_update = gr.Checkbox(label="自动检查更新", value=settings.get("auto_update_check", True))
             update_interval = gr.Slider(label="更新间隔 (秒)", minimum=60, maximum=86400, step=60, value=settings.get("update_interval", 3600))
+            offload_enabled = gr.Checkbox(label="启用本地/远程混合调度", value=settings.get("offload", {}).get("enabled", False))
+            cost_budget = gr.Number(label="远程额度预算 (每日，0 表示不限)", value=settings.get("offload", {}).get("cost_budget", 0))
+            profiling_enabled = gr.Checkbox(label="性能分析（记录慢操作的分析结果）", value=profiler.enabled)
+            profiling_threshold = gr.Number(label="性能分析阈值 (毫秒)", value=profiler.threshold_ms)
+            
+    with gr.Row():
+        with gr.Column():
+            pool_keys = gr.JSON(label="密钥池（列表，每项包含 access_key、secret_key，可选 quota、name）", value=settings.get("keys", []))
+        with gr.Column():
+            key_stats = gr.JSON(label="密钥使用统计", value=[])
+            refresh_key_stats_btn = gr.Button("刷新密钥统计")
+            proxy_stats = gr.JSON(label="代理统计", value=[])
+            refresh_proxy_stats_btn = gr.Button("刷新代理统计")
+            clock_stats = gr.JSON(label="签名时钟偏移（本机与服务器的时间差，秒）", value={})
+            refresh_clock_stats_btn = gr.Button("刷新时钟偏移")
             
     with gr.Row():
         save_settings_btn = gr.Button("保存设置", variant="primary")
@@ -563,22 +1235,39 @@ def create_settings_ui():
         settings_status = gr.Textbox(label="状态", interactive=False)
         
     # 保存设置
-    def save_settings_func(access_key_value, secret_key_value, proxy_value, save_path_value, auto_update_value, update_interval_value):
+    def save_settings_func(access_key_value, secret_key_value, proxy_value, proxies_value, save_path_value, auto_update_value, update_interval_value, offload_enabled_value, cost_budget_value, pool_keys_value):
+        global key_pool
         try:
-            # 更新设置
-            settings["access_key"] = access_key_value
-            settings["secret_key"] = secret_key_value
-            settings["proxy"] = proxy_value
-            settings["save_path"] = save_path_value
-            settings["auto_update_check"] = auto_update_value
-            settings["update_interval"] = update_interval_value
-            
-            # 保存设置
-            if save_settings():
+            # 只写入界面上修改的项，文件中的其他设置（包括外部修改）保持不变
+            changes = {
+                "access_key": access_key_value,
+                "secret_key": secret_key_value,
+                "proxy": proxy_value,
+                "proxies": [p.strip() for p in (proxies_value or "").splitlines() if p.strip()],
+                "save_path": save_path_value,
+                "auto_update_check": auto_update_value,
+                "update_interval": update_interval_value,
+                "offload": {"enabled": offload_enabled_value, "cost_budget": cost_budget_value or 0},
+                "keys": pool_keys_value if isinstance(pool_keys_value, list) else []
+            }
+            saved = get_store().update(changes, immediate=True)
+            refresh_settings()
+            
+            if saved:
                 # 更新 auth 和 api
                 auth.access_key = access_key_value
                 auth.secret_key = secret_key_value
                 api.set_proxy(proxy_value)
+                if hasattr(api, "set_proxy_pool"):
+                    update_proxy_pool(settings["proxies"])
+                scheduler.cost_budget = settings["offload"]["cost_budget"]
+                # 就地更新密钥池，进行中任务的轮询和取消仍使用提交它的密钥
+                key_pool = update_key_pool(key_pool, settings)
+                if hasattr(api, "set_key_pool"):
+                    api.set_key_pool(key_pool)
+                    
+                # 密钥变化后在后台重新拉取列表
+                hydrate_catalog()
                 
                 return "设置已保存"
             else:
@@ -587,6 +1276,39 @@ def create_settings_ui():
             logger.error(f"保存设置失败: {str(e)}")
             return f"保存设置失败: {str(e)}"
             
+    # 切换性能分析，立即生效并保存
+    def set_profiling(enabled_value, threshold_value):
+        get_store().update({"profiling": {"enabled": bool(enabled_value), "threshold_ms": threshold_value or 0}})
+        refresh_settings()
+        update_profiler()
+        if not profiler.enabled:
+            return "性能分析已关闭"
+        return f"性能分析已开启，超过 {profiler.threshold_ms:.0f}ms 的操作保存到 {profiler.output_dir}"
+        
+    # 获取密钥使用统计
+    def get_key_stats():
+        try:
+            return key_pool.stats() if key_pool else []
+        except Exception as e:
+            logger.error(f"获取密钥统计失败: {str(e)}")
+            return []
+            
+    # 获取代理统计
+    def get_proxy_stats():
+        try:
+            return proxy_pool.stats() if proxy_pool else []
+        except Exception as e:
+            logger.error(f"获取代理统计失败: {str(e)}")
+            return []
+            
+    # 获取签名时钟偏移
+    def get_clock_stats():
+        try:
+            return api.get_clock_stats()
+        except Exception as e:
+            logger.error(f"获取时钟偏移失败: {str(e)}")
+            return {}
+            
     # 测试连接
     def test_connection():
         try:
@@ -604,15 +1326,151 @@ def create_settings_ui():
     # 绑定事件
     save_settings_btn.click(
         save_settings_func,
-        inputs=[access_key, secret_key, proxy, save_path, auto_update, update_interval],
+        inputs=[access_key, secret_key, proxy, proxies, save_path, auto_update, update_interval, offload_enabled, cost_budget, pool_keys],
         outputs=[settings_status]
     )
     
+    for component in (profiling_enabled, profiling_threshold):
+        component.change(
+            set_profiling,
+            inputs=[profiling_enabled, profiling_threshold],
+            outputs=[settings_status]
+        )
+    
+    refresh_key_stats_btn.click(
+        get_key_stats,
+        inputs=[],
+        outputs=[key_stats]
+    )
+    
+    refresh_proxy_stats_btn.click(
+        get_proxy_stats,
+        inputs=[],
+        outputs=[proxy_stats]
+    )
+    
+    refresh_clock_stats_btn.click(
+        get_clock_stats,
+        inputs=[],
+        outputs=[clock_stats]
+    )
+    
     test_connection_btn.click(
         test_connection,
         inputs=[],
         outputs=[settings_status]
     )
 
+# 导出时读取的仪表
+def register_gauges():
+    """注册排队深度、并发任务、剩余额度、时钟偏移和启动耗时等仪表"""
+    def scheduler_in_flight():
+        stats = scheduler.get_stats() if scheduler else {}
+        return {name: s["inflight"] for name, s in stats.items() if isinstance(s, dict)}
+        
+    def job_queue_depth():
+        return job_queue.counts() if job_queue is not None else {}
+        
+    def key_quota_remaining():
+        stats = key_pool.stats() if key_pool else []
+        return {k["name"]: k["remaining"] for k in stats if k["remaining"] is not None}
+        
+    def clock():
+        stats = api.get_clock_stats() if hasattr(api, "get_clock_stats") else {}
+        return {k: v for k, v in stats.items() if isinstance(v, (int, float))}
+        
+    metrics.register_gauge("scheduler_in_flight", scheduler_in_flight, "各后端正在执行的任务数")
+    metrics.register_gauge("job_queue_depth", job_queue_depth, "共享任务表中各状态的任务数")
+    metrics.register_gauge("key_quota_remaining", key_quota_remaining, "各密钥的剩余额度")
+    metrics.register_gauge("validation_rejected", lambda: validator.rejected if validator else 0, "本地校验拒绝的请求数")
+    metrics.register_gauge("clock", clock, "签名时钟偏移统计")
+    metrics.register_gauge("model_hash_progress", lambda: dict(model_index.progress) if model_index else {}, "本地模型哈希进度")
+    metrics.register_gauge(
+        "local_models",
+        lambda: {kind: c["files"] for kind, c in model_index.stats()["kinds"].items()} if model_index else {},
+        "本地模型索引中各类型的文件数"
+    )
+    metrics.register_gauge("startup_seconds", lambda: dict(startup_timings), "插件启动各阶段耗时")
+
+register_gauges()
+
+# 本地模型目录
+def local_model_dirs():
+    """返回 WebUI 各类模型的目录，键与 LiblibAI 的模型类型一致"""
+    from modules import paths, shared
+    models_path = getattr(paths, "models_path", "models")
+    cmd_opts = getattr(shared, "cmd_opts", None)
+    return {
+        "底模": getattr(cmd_opts, "ckpt_dir", None) or os.path.join(models_path, "Stable-diffusion"),
+        "LoRA": getattr(cmd_opts, "lora_dir", None) or os.path.join(models_path, "Lora"),
+        "VAE": getattr(cmd_opts, "vae_dir", None) or os.path.join(models_path, "VAE"),
+        "ControlNet": os.path.join(models_path, "ControlNet")
+    }
+
+# 启动本地模型索引
+def start_model_index():
+    """在后台扫描本地模型目录并计算哈希，之后监听文件变化增量更新"""
+    global model_index
+    index_settings = settings.get("model_index", {})
+    hashing_settings = settings.get("hashing", {})
+    if model_index:
+        model_index.stop()
+        model_index = None
+    if not index_settings.get("enabled", True):
+        return
+        
+    def report(done, total, bytes_done, bytes_total, path):
+        # 每完成约 10% 输出一次进度
+        step = max(1, total // 10)
+        if path and (done % step == 0 or done == total):
+            logger.info(f"本地模型哈希进度: {done}/{total}（{bytes_done / 1024 ** 3:.1f}/{bytes_total / 1024 ** 3:.1f} GB）")
+            
+    def scanned(index):
+        index.set_remote_models(catalog.get("models", []))
+        stats = index.hasher.last_stats if index.hasher else {}
+        logger.info(
+            f"本地模型索引完成: {len(index)} 个文件，哈希缓存命中 {stats.get('cached', 0)} 个，"
+            f"新计算 {stats.get('hashed', 0)} 个，耗时 {index.last_scan_seconds or 0:.1f}s"
+        )
+        
+    hasher = None
+    if hashing_settings.get("enabled", True):
+        save_path = settings.get("save_path") or "outputs/liblibai"
+        hasher = ModelHasher(HashCache(os.path.join(save_path, "model_hashes.db")), workers=hashing_settings.get("workers") or None)
+    try:
+        model_index = LocalModelIndex(local_model_dirs(), hasher, poll_interval=index_settings.get("poll_interval", 30))
+        model_index.start(use_watchdog=index_settings.get("watch", True), progress=report, callback=scanned)
+    except Exception as e:
+        logger.error(f"启动本地模型索引失败: {str(e)}")
+
+# 本地状态文字
+def local_model_status(entry):
+    """返回 LiblibAI 模型在本地的状态"""
+    if not entry:
+        return ""
+    return "已下载（哈希匹配）" if entry.get("match") == "hash" else "已下载（名称匹配）"
+
+# WebUI 启动完成后在后台拉取最新列表
+def on_app_started(demo, app):
+    """WebUI 启动完成回调"""
+    try:
+        register_routes(app, metrics)
+    except Exception as e:
+        logger.error(f"注册指标路由失败: {str(e)}")
+    try:
+        # 前端一次请求获取所有模型卡片的信息，只读取本地索引和预设缓存
+        model_cards.register_routes(
+            app,
+            lambda: model_index,
+            lambda model_id: validator is not None and validator.cache.get(model_id) is not None
+        )
+    except Exception as e:
+        logger.error(f"注册模型卡片路由失败: {str(e)}")
+    hydrate_catalog()
+    start_model_index()
+
+startup_timings["import"] = time.perf_counter() - _module_started
+
 # 注册插件到 WebUI
-script_callbacks.on_ui_tabs(on_ui_tabs)
\ No newline at end of file
+script_callbacks.on_ui_tabs(on_ui_tabs)
+script_callbacks.on_app_started(on_app_started)
\ No newline at end of file
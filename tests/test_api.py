@@ -4,11 +4,14 @@ import unittest
 from unittest.mock import patch, mock_open, MagicMock, ANY
 import sys
 import json
+import time
+import requests
 
 # 添加父目录到 sys.path，以便导入 api 模块
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 from scripts.lh_lib.api import LiblibAIAPI, APIError
 from scripts.lh_lib.auth import LiblibAIAuth
+from scripts.lh_lib.metrics import MetricsRegistry
 
 class TestLiblibAIAPI(unittest.TestCase):
     """
@@ -63,6 +66,58 @@ class TestLiblibAIAPI(unittest.TestCase):
         self.assertIsNone(self.api.proxy)
         self.assertEqual(self.api.session.proxies, {})
 
+    @patch('requests.Session.post')
+    def test_cancel_task(self, mock_post):
+        """
+        测试取消任务
+        """
+        response = MagicMock()
+        response.headers = {}
+        response.json.return_value = {"status": "cancelled"}
+        mock_post.return_value = response
+        
+        result = self.api.cancel_task("task_1")
+        
+        self.assertEqual(result, {"status": "cancelled"})
+        self.assertEqual(mock_post.call_args.kwargs["json"], {"task_id": "task_1"})
+        
+    @patch('requests.Session.get')
+    def test_deadline_limits_request_timeout(self, mock_get):
+        """
+        测试截止时间限制单次请求的超时，过期后不再发送请求
+        """
+        response = MagicMock()
+        response.headers = {}
+        response.json.return_value = {}
+        mock_get.return_value = response
+        
+        with self.api.deadline(time.time() + 5):
+            self.api.get_models()
+        self.assertLessEqual(mock_get.call_args.kwargs["timeout"], 5)
+        
+        mock_get.reset_mock()
+        with self.api.deadline(time.time() - 1):
+            with self.assertRaises(APIError):
+                self.api.get_models()
+        mock_get.assert_not_called()
+        
+        self.api.get_models()
+        self.assertEqual(mock_get.call_args.kwargs["timeout"], 30)
+        
+    def test_session_created_lazily(self):
+        """
+        测试 HTTP 会话在第一次使用时才创建，并应用之前设置的代理
+        """
+        api = LiblibAIAPI(self.mock_auth)
+        api.set_proxy("http://127.0.0.1:7890")
+        
+        self.assertIsNone(api._session)
+        self.assertEqual(api.session.proxies, {
+            "http": "http://127.0.0.1:7890",
+            "https": "http://127.0.0.1:7890"
+        })
+        self.assertIs(api.session, api._session)
+
     @patch('requests.Session.get')
     def test_request_get(self, mock_get):
         """
@@ -495,5 +550,119 @@ class TestLiblibAIAPI(unittest.TestCase):
         # 验证返回结果
         self.assertEqual(result, {"task_id": "test_task_id"})
 
+    @patch('requests.Session.get')
+    def test_timestamp_rejection_resigns_once(self, mock_get):
+        """
+        测试签名时间戳被拒绝时按服务器时间校准后重试一次
+        """
+        api = LiblibAIAPI(LiblibAIAuth("test_access_key", "test_secret_key"))
+        server_date = "Thu, 01 Jul 2021 00:00:00 GMT"
+        
+        rejected = MagicMock()
+        rejected.headers = {"Date": server_date}
+        rejected.status_code = 403
+        rejected.text = '{"msg": "Timestamp expired"}'
+        rejected.raise_for_status.side_effect = requests.exceptions.HTTPError("403", response=rejected)
+        accepted = MagicMock()
+        accepted.headers = {"Date": server_date}
+        accepted.json.return_value = {"status": "success"}
+        mock_get.side_effect = [rejected, accepted]
+        
+        result = api.get_task_result("task_1")
+        
+        # 验证重试成功，且第二次签名使用了服务器时间
+        self.assertEqual(result, {"status": "success"})
+        self.assertEqual(mock_get.call_count, 2)
+        retried_timestamp = int(mock_get.call_args_list[1].kwargs["params"]["Timestamp"])
+        self.assertLess(abs(retried_timestamp - 1625097600), 5)
+        self.assertEqual(api.get_clock_stats()["timestamp_retries"], 1)
+        self.assertEqual(api.get_clock_stats()["corrections"], 1)
+
+    @patch('requests.Session.get')
+    def test_other_http_errors_not_retried(self, mock_get):
+        """
+        测试非时间戳错误不重试
+        """
+        api = LiblibAIAPI(LiblibAIAuth("test_access_key", "test_secret_key"))
+        response = MagicMock()
+        response.headers = {}
+        response.status_code = 500
+        response.text = "internal error"
+        response.raise_for_status.side_effect = requests.exceptions.HTTPError("500", response=response)
+        mock_get.return_value = response
+        
+        with self.assertRaises(APIError) as ctx:
+            api.get_task_result("task_1")
+        self.assertEqual(ctx.exception.status_code, 500)
+        self.assertEqual(mock_get.call_count, 1)
+
+    @patch('requests.Session.post')
+    def test_server_error_mentioning_timestamp_not_retried(self, mock_post):
+        """
+        测试内容提到时间戳的 500 错误不重试，提交请求不会被重复发送
+        """
+        api = LiblibAIAPI(LiblibAIAuth("test_access_key", "test_secret_key"))
+        response = MagicMock()
+        response.headers = {}
+        response.status_code = 500
+        response.text = '{"code": "internal_error", "message": "failed", "timestamp": 1625097600}'
+        response.raise_for_status.side_effect = requests.exceptions.HTTPError("500", response=response)
+        mock_post.return_value = response
+        
+        with self.assertRaises(APIError) as ctx:
+            api.text_to_image("model", "a cat", "", 512, 512)
+        self.assertEqual(ctx.exception.status_code, 500)
+        self.assertEqual(mock_post.call_count, 1)
+        self.assertEqual(api.get_clock_stats()["timestamp_retries"], 0)
+
+    @patch('requests.Session.post')
+    def test_unauthorized_signature_error_not_retried(self, mock_post):
+        """
+        测试其他签名错误（例如签名不匹配）即使内容提到时间戳也不重试
+        """
+        api = LiblibAIAPI(LiblibAIAuth("test_access_key", "test_secret_key"))
+        response = MagicMock()
+        response.headers = {}
+        response.status_code = 401
+        response.text = '{"code": "invalid_signature", "message": "Signature mismatch", "timestamp": 1}'
+        response.raise_for_status.side_effect = requests.exceptions.HTTPError("401", response=response)
+        mock_post.return_value = response
+        
+        with self.assertRaises(APIError):
+            api.text_to_image("model", "a cat", "", 512, 512)
+        self.assertEqual(mock_post.call_count, 1)
+
+    @patch('requests.Session.get')
+    def test_metrics_recorded(self, mock_get):
+        """
+        测试设置指标后记录每个端点的状态码、重试、字节数和并发数
+        """
+        api = LiblibAIAPI(LiblibAIAuth("test_access_key", "test_secret_key"))
+        metrics = MetricsRegistry()
+        api.set_metrics(metrics)
+        
+        rejected = MagicMock()
+        rejected.headers = {}
+        rejected.status_code = 403
+        rejected.text = "timestamp expired"
+        rejected.raise_for_status.side_effect = requests.exceptions.HTTPError("403", response=rejected)
+        accepted = MagicMock()
+        accepted.headers = {}
+        accepted.status_code = 200
+        accepted.content = b'{"status": "success"}'
+        accepted.json.return_value = {"status": "success"}
+        mock_get.side_effect = [rejected, accepted, requests.exceptions.ConnectTimeout("timeout")]
+        
+        api.get_task_result("task_1")
+        with self.assertRaises(APIError):
+            api.get_task_result("task_2")
+            
+        endpoint = metrics.snapshot()["endpoints"]["task-result"]
+        self.assertEqual(endpoint["requests"], 2)
+        self.assertEqual(endpoint["status"], {"200": 1, "timeout": 1})
+        self.assertEqual(endpoint["bytes_in"], len(accepted.content))
+        self.assertEqual(endpoint["in_flight"], 0)
+        self.assertEqual(metrics.snapshot()["retries"], {"task-result": {"timestamp": 1}})
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
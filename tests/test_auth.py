@@ -4,6 +4,8 @@ import unittest
 from unittest.mock import patch, mock_open, MagicMock
 import sys
 import time
+import shutil
+import tempfile
 import uuid
 import hmac
 import hashlib
@@ -12,7 +14,8 @@ from urllib.parse import quote
 
 # 添加父目录到 sys.path，以便导入 auth 模块
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-from scripts.lh_lib.auth import LiblibAIAuth
+from scripts.lh_lib.auth import LiblibAIAuth, ClockSync
+from scripts.lh_lib.settings import SettingsStore
 
 class TestLiblibAIAuth(unittest.TestCase):
     """
@@ -30,61 +33,61 @@ class TestLiblibAIAuth(unittest.TestCase):
         # 创建一个带有测试密钥的 auth 实例
         self.auth = LiblibAIAuth(self.access_key, self.secret_key)
 
-    @patch('os.path.exists')
-    @patch('builtins.open', new_callable=mock_open)
-    def test_init_with_no_keys(self, mock_file, mock_exists):
+    def _temp_store(self, content=None):
+        """
+        创建使用临时配置文件的设置存储
+        """
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir, True)
+        path = os.path.join(tmpdir, "liblibai_helper.json")
+        if content is not None:
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(content)
+        return SettingsStore(path)
+
+    def test_init_with_no_keys(self):
         """
         测试不提供密钥时的初始化
         """
-        # 模拟配置文件存在
-        mock_exists.return_value = True
-        
         # 模拟配置文件内容
-        mock_file.return_value.read.return_value = json.dumps({
+        store = self._temp_store(json.dumps({
             'access_key': 'config_access_key',
             'secret_key': 'config_secret_key'
-        })
+        }))
         
         # 创建一个不带密钥的 auth 实例
-        auth = LiblibAIAuth()
+        with patch('scripts.lh_lib.auth.get_store', return_value=store):
+            auth = LiblibAIAuth()
         
         # 验证是否从配置文件加载了密钥
         self.assertEqual(auth.access_key, 'config_access_key')
         self.assertEqual(auth.secret_key, 'config_secret_key')
-        
-        # 验证是否调用了正确的文件路径
-        mock_exists.assert_called_once()
-        mock_file.assert_called_once()
 
-    @patch('os.path.exists')
-    def test_init_with_no_config_file(self, mock_exists):
+    def test_init_with_no_config_file(self):
         """
         测试配置文件不存在时的初始化
         """
         # 模拟配置文件不存在
-        mock_exists.return_value = False
+        store = self._temp_store()
         
         # 创建一个不带密钥的 auth 实例
-        auth = LiblibAIAuth()
+        with patch('scripts.lh_lib.auth.get_store', return_value=store):
+            auth = LiblibAIAuth()
         
         # 验证密钥为空
         self.assertEqual(auth.access_key, None)
         self.assertEqual(auth.secret_key, None)
 
-    @patch('os.path.exists')
-    @patch('builtins.open', new_callable=mock_open)
-    def test_init_with_invalid_config_file(self, mock_file, mock_exists):
+    def test_init_with_invalid_config_file(self):
         """
         测试配置文件无效时的初始化
         """
-        # 模拟配置文件存在
-        mock_exists.return_value = True
-        
-        # 模拟配置文件读取异常
-        mock_file.return_value.read.side_effect = Exception("Invalid JSON")
+        # 模拟配置文件内容无效
+        store = self._temp_store("Invalid JSON")
         
         # 创建一个不带密钥的 auth 实例
-        auth = LiblibAIAuth()
+        with patch('scripts.lh_lib.auth.get_store', return_value=store):
+            auth = LiblibAIAuth()
         
         # 验证密钥为空
         self.assertEqual(auth.access_key, None)
@@ -98,17 +101,16 @@ class TestLiblibAIAuth(unittest.TestCase):
         self.assertEqual(self.auth.access_key, self.access_key)
         self.assertEqual(self.auth.secret_key, self.secret_key)
 
-    @patch('os.path.exists')
-    @patch('builtins.open', new_callable=mock_open)
-    def test_save_keys(self, mock_file, mock_exists):
+    def test_save_keys(self):
         """
         测试保存密钥
         """
         # 模拟配置文件不存在
-        mock_exists.return_value = False
+        store = self._temp_store()
         
         # 调用保存密钥方法
-        result = self.auth.save_keys("new_access_key", "new_secret_key")
+        with patch('scripts.lh_lib.auth.get_store', return_value=store):
+            result = self.auth.save_keys("new_access_key", "new_secret_key")
         
         # 验证返回值
         self.assertTrue(result)
@@ -117,36 +119,28 @@ class TestLiblibAIAuth(unittest.TestCase):
         self.assertEqual(self.auth.access_key, "new_access_key")
         self.assertEqual(self.auth.secret_key, "new_secret_key")
         
-        # 验证文件写入
-        mock_file.assert_called_once()
-        mock_file.return_value.write.assert_called_once()
-        
         # 获取写入的内容
-        written_content = mock_file.return_value.write.call_args[0][0]
-        config = json.loads(written_content)
+        with open(store.path, 'r', encoding='utf-8') as f:
+            config = json.load(f)
         
         # 验证写入的内容
         self.assertEqual(config['access_key'], "new_access_key")
         self.assertEqual(config['secret_key'], "new_secret_key")
 
-    @patch('os.path.exists')
-    @patch('builtins.open', new_callable=mock_open)
-    def test_save_keys_with_existing_config(self, mock_file, mock_exists):
+    def test_save_keys_with_existing_config(self):
         """
         测试保存密钥到现有配置文件
         """
-        # 模拟配置文件存在
-        mock_exists.return_value = True
-        
         # 模拟配置文件内容
-        mock_file.return_value.read.return_value = json.dumps({
+        store = self._temp_store(json.dumps({
             'access_key': 'old_access_key',
             'secret_key': 'old_secret_key',
             'other_setting': 'value'
-        })
+        }))
         
         # 调用保存密钥方法
-        result = self.auth.save_keys("new_access_key", "new_secret_key")
+        with patch('scripts.lh_lib.auth.get_store', return_value=store):
+            result = self.auth.save_keys("new_access_key", "new_secret_key")
         
         # 验证返回值
         self.assertTrue(result)
@@ -155,29 +149,25 @@ class TestLiblibAIAuth(unittest.TestCase):
         self.assertEqual(self.auth.access_key, "new_access_key")
         self.assertEqual(self.auth.secret_key, "new_secret_key")
         
-        # 验证文件读写
-        self.assertEqual(mock_file.call_count, 2)  # 一次读，一次写
-        mock_file.return_value.write.assert_called_once()
-        
         # 获取写入的内容
-        written_content = mock_file.return_value.write.call_args[0][0]
-        config = json.loads(written_content)
+        with open(store.path, 'r', encoding='utf-8') as f:
+            config = json.load(f)
         
         # 验证写入的内容
         self.assertEqual(config['access_key'], "new_access_key")
         self.assertEqual(config['secret_key'], "new_secret_key")
         self.assertEqual(config['other_setting'], "value")  # 保留其他设置
 
-    @patch('builtins.open')
-    def test_save_keys_with_exception(self, mock_file):
+    def test_save_keys_with_exception(self):
         """
         测试保存密钥时发生异常
         """
-        # 模拟文件写入异常
-        mock_file.side_effect = Exception("Write error")
+        store = self._temp_store(json.dumps({'access_key': 'old_access_key'}))
         
-        # 调用保存密钥方法
-        result = self.auth.save_keys("new_access_key", "new_secret_key")
+        # 模拟文件写入异常
+        with patch('scripts.lh_lib.auth.get_store', return_value=store), \
+                patch('os.replace', side_effect=OSError("Write error")):
+            result = self.auth.save_keys("new_access_key", "new_secret_key")
         
         # 验证返回值
         self.assertFalse(result)
@@ -185,17 +175,21 @@ class TestLiblibAIAuth(unittest.TestCase):
         # 验证密钥已更新（即使保存失败）
         self.assertEqual(self.auth.access_key, "new_access_key")
         self.assertEqual(self.auth.secret_key, "new_secret_key")
+        
+        # 验证原配置文件未被破坏，也没有残留临时文件
+        with open(store.path, 'r', encoding='utf-8') as f:
+            self.assertEqual(json.load(f), {'access_key': 'old_access_key'})
+        self.assertEqual(os.listdir(os.path.dirname(store.path)), ["liblibai_helper.json"])
 
     @patch('time.time')
-    @patch('uuid.uuid4')
+    @patch.object(LiblibAIAuth, '_next_nonce')
     def test_generate_signature(self, mock_uuid, mock_time):
         """
         测试生成签名
         """
-        # 模拟时间和 UUID
+        # 模拟时间和随机字符串
         mock_time.return_value = 1625097600  # 2021-07-01 00:00:00 UTC
-        mock_uuid.return_value = MagicMock()
-        mock_uuid.return_value.__str__.return_value = "12345678-1234-5678-1234-567812345678"
+        mock_uuid.return_value = "12345678-1234-5678-1234-567812345678"
         
         # 调用生成签名方法
         params = self.auth.generate_signature()
@@ -231,15 +225,14 @@ class TestLiblibAIAuth(unittest.TestCase):
         self.assertEqual(params['Signature'], expected_signature)
 
     @patch('time.time')
-    @patch('uuid.uuid4')
+    @patch.object(LiblibAIAuth, '_next_nonce')
     def test_generate_signature_with_params(self, mock_uuid, mock_time):
         """
         测试使用额外参数生成签名
         """
-        # 模拟时间和 UUID
+        # 模拟时间和随机字符串
         mock_time.return_value = 1625097600  # 2021-07-01 00:00:00 UTC
-        mock_uuid.return_value = MagicMock()
-        mock_uuid.return_value.__str__.return_value = "12345678-1234-5678-1234-567812345678"
+        mock_uuid.return_value = "12345678-1234-5678-1234-567812345678"
         
         # 额外参数
         extra_params = {
@@ -286,6 +279,64 @@ class TestLiblibAIAuth(unittest.TestCase):
         # 验证签名
         self.assertEqual(params['Signature'], expected_signature)
 
+    def _legacy_signature(self, secret_key, sign_params):
+        """
+        按原始算法计算签名，用于校验快速签名路径
+        """
+        sorted_params = sorted(sign_params.items(), key=lambda x: x[0])
+        canonicalized_query_string = '&'.join(['%s=%s' % (k, quote(str(v), safe='')) for k, v in sorted_params])
+        hmac_algorithm = hmac.new(
+            secret_key.encode('utf-8'),
+            canonicalized_query_string.encode('utf-8'),
+            hashlib.sha1
+        )
+        return base64.b64encode(hmac_algorithm.digest()).decode('utf-8')
+
+    def test_sign_many(self):
+        """
+        测试批量签名
+        """
+        params_list = [{'task_id': 'task/%d' % i} for i in range(5)] + [None]
+
+        signed = self.auth.sign_many(params_list)
+
+        self.assertEqual(len(signed), 6)
+        self.assertEqual(len({p['SignatureNonce'] for p in signed}), 6)
+        self.assertEqual(len({p['Timestamp'] for p in signed}), 1)
+        for params in signed:
+            signature = params.pop('Signature')
+            self.assertEqual(signature, self._legacy_signature(self.secret_key, params))
+
+    def test_signature_with_overridden_static_params(self):
+        """
+        测试参数覆盖固定字段时签名仍与原始算法一致
+        """
+        params = self.auth.generate_signature({'Timestamp': '1 2', 'a b': 'c&d'})
+        signature = params.pop('Signature')
+
+        self.assertEqual(params['Timestamp'], '1 2')
+        self.assertEqual(signature, self._legacy_signature(self.secret_key, params))
+
+    def test_key_rotation_resets_cached_state(self):
+        """
+        测试更换密钥后使用新的 HMAC 状态和 AccessKey
+        """
+        self.auth.access_key = "rotated_access_key"
+        self.auth.secret_key = "rotated_secret_key"
+
+        params = self.auth.generate_signature({'task_id': 'task_1'})
+        signature = params.pop('Signature')
+
+        self.assertEqual(params['AccessKey'], "rotated_access_key")
+        self.assertEqual(signature, self._legacy_signature("rotated_secret_key", params))
+
+    def test_sign_many_with_no_keys(self):
+        """
+        测试在没有密钥的情况下批量签名
+        """
+        with self.assertRaises(ValueError):
+            LiblibAIAuth(None, None).sign_many([None])
+
     def test_generate_signature_with_no_keys(self):
         """
         测试在没有密钥的情况下生成签名
@@ -346,5 +397,42 @@ class TestLiblibAIAuth(unittest.TestCase):
         self.assertFalse(success)
         self.assertEqual(message, "未配置 API 密钥")
 
+class TestClockSync(unittest.TestCase):
+    """
+    测试 ClockSync 类
+    """
+
+    def test_small_drift_ignored(self):
+        """
+        测试 Date 头精度内的偏差不更新偏移
+        """
+        clock = ClockSync(tolerance=2.0)
+        self.assertFalse(clock.observe(1000.0, local_time=1001.0))
+        self.assertEqual(clock.offset, 0.0)
+        self.assertEqual(clock.samples, 1)
+
+    def test_large_drift_corrected(self):
+        """
+        测试较大偏差被校准并用于签名
+        """
+        clock = ClockSync(tolerance=2.0)
+        self.assertTrue(clock.observe(1000.0, local_time=1300.0))
+        self.assertEqual(clock.offset, -299.5)
+        self.assertEqual(clock.stats()["max_abs_offset"], 299.5)
+
+        auth = LiblibAIAuth("test_access_key", "test_secret_key")
+        auth.clock = clock
+        with patch('time.time', return_value=1300.0):
+            self.assertEqual(auth.generate_signature()['Timestamp'], "1000")
+
+    def test_force(self):
+        """
+        测试强制采用采样
+        """
+        clock = ClockSync(tolerance=2.0)
+        self.assertTrue(clock.observe(1000.0, local_time=1000.0, force=True))
+        self.assertEqual(clock.offset, 0.5)
+        self.assertEqual(clock.corrections, 1)
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,94 @@
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+# 添加父目录到 sys.path，以便导入 catalog 模块
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from scripts.lh_lib.catalog import CatalogCache, filter_models
+
+class TestCatalogCache(unittest.TestCase):
+    """
+    测试 CatalogCache 类
+    """
+
+    def setUp(self):
+        """
+        测试前的设置
+        """
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, "liblibai_catalog_cache.json")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    def test_empty_cache_returns_default(self):
+        """
+        测试没有缓存时返回默认值
+        """
+        cache = CatalogCache(self.path)
+
+        self.assertEqual(cache.get("models", []), [])
+        self.assertIsNone(cache.age("models"))
+
+    def test_hydrate_persists_for_next_start(self):
+        """
+        测试刷新后的数据写入文件，下次启动直接可用
+        """
+        cache = CatalogCache(self.path)
+        cache.hydrate({"models": lambda: [{"id": "m1", "name": "模型1"}]})
+
+        restarted = CatalogCache(self.path)
+        self.assertEqual(restarted.get("models"), [{"id": "m1", "name": "模型1"}])
+        self.assertLess(restarted.age("models"), 60)
+
+    def test_failed_refresh_keeps_cached_items(self):
+        """
+        测试拉取失败时保留缓存的数据
+        """
+        cache = CatalogCache(self.path, debounce=0)
+        cache.set("workflows", [{"id": "w1"}])
+
+        def broken():
+            raise RuntimeError("network down")
+
+        self.assertEqual(cache.refresh("workflows", broken), [{"id": "w1"}])
+        self.assertEqual(cache.get("workflows"), [{"id": "w1"}])
+
+    def test_hydrate_async_runs_in_background(self):
+        """
+        测试后台刷新完成后调用回调
+        """
+        cache = CatalogCache(self.path)
+        done = []
+
+        thread = cache.hydrate_async({"recent_tasks": lambda: [{"task_id": "t1"}]}, callback=lambda: done.append(True))
+        thread.join(5)
+
+        self.assertTrue(cache.hydrated.is_set())
+        self.assertEqual(done, [True])
+        self.assertEqual(cache.get("recent_tasks"), [{"task_id": "t1"}])
+        self.assertIsNotNone(cache.last_hydrate_seconds)
+
+class TestFilterModels(unittest.TestCase):
+    """
+    测试 filter_models 函数
+    """
+
+    def test_filter_by_type_and_query(self):
+        """
+        测试按类型筛选和不区分大小写的关键词匹配
+        """
+        models = [
+            {"id": "1", "name": "Anime XL", "type": "底模", "description": ""},
+            {"id": "2", "name": "Detail", "type": "LoRA", "description": "anime style"},
+            {"id": "3", "name": "Photo", "type": "底模"},
+        ]
+        self.assertEqual([m["id"] for m in filter_models(models)], ["1", "2", "3"])
+        self.assertEqual([m["id"] for m in filter_models(models, "底模")], ["1", "3"])
+        self.assertEqual([m["id"] for m in filter_models(models, query="ANIME")], ["1", "2"])
+        self.assertEqual([m["id"] for m in filter_models(models, "LoRA", "anime")], ["2"])
+
+if __name__ == '__main__':
+    unittest.main()
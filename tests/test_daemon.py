@@ -0,0 +1,244 @@
+import os
+import sys
+import socket
+import tempfile
+import threading
+import unittest
+from unittest.mock import MagicMock, patch
+
+# 添加父目录到 sys.path，以便导入 daemon 模块
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from scripts.lh_lib.api import LiblibAIAPI, APIError
+from scripts.lh_lib.cache import TTLCache
+from scripts.lh_lib.daemon import FairRateLimiter, LiblibAIDaemon, DaemonClient, default_socket_path
+
+class TestFairRateLimiter(unittest.TestCase):
+    """
+    测试 FairRateLimiter 类
+    """
+
+    def test_burst_then_timeout(self):
+        """
+        测试令牌耗尽后超时返回 False
+        """
+        limiter = FairRateLimiter(rate=0.1, burst=2)
+        self.assertTrue(limiter.acquire("a"))
+        self.assertTrue(limiter.acquire("a"))
+        self.assertFalse(limiter.acquire("a", timeout=0.05))
+
+    def test_round_robin_between_clients(self):
+        """
+        测试多个客户端轮流获得令牌
+        """
+        limiter = FairRateLimiter(rate=200, burst=1)
+        limiter.tokens = 0
+        order = []
+        lock = threading.Lock()
+
+        def worker(client_id):
+            limiter.acquire(client_id)
+            with lock:
+                order.append(client_id)
+
+        threads = [threading.Thread(target=worker, args=("a",)) for _ in range(3)]
+        threads += [threading.Thread(target=worker, args=("b",)) for _ in range(3)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join(5)
+
+        self.assertEqual(sorted(order), ["a", "a", "a", "b", "b", "b"])
+        self.assertEqual(limiter.granted, {"a": 3, "b": 3})
+
+class TestTTLCache(unittest.TestCase):
+    """
+    测试 TTLCache 类
+    """
+
+    def test_get_or_load_caches(self):
+        """
+        测试加载结果被缓存
+        """
+        cache = TTLCache(ttl=60)
+        loader = MagicMock(return_value={"models": []})
+
+        self.assertEqual(cache.get_or_load("k", loader), {"models": []})
+        self.assertEqual(cache.get_or_load("k", loader), {"models": []})
+        loader.assert_called_once()
+
+    def test_loader_error_not_cached(self):
+        """
+        测试加载失败时不缓存结果
+        """
+        cache = TTLCache(ttl=60)
+        loader = MagicMock(side_effect=[APIError("boom"), {"ok": True}])
+
+        with self.assertRaises(APIError):
+            cache.get_or_load("k", loader)
+        self.assertEqual(cache.get_or_load("k", loader), {"ok": True})
+
+class TestLiblibAIDaemon(unittest.TestCase):
+    """
+    测试 LiblibAIDaemon 类
+    """
+
+    def setUp(self):
+        """
+        测试前的设置
+        """
+        self.api = MagicMock(spec=LiblibAIAPI)
+        self.api.get_models.return_value = {"models": [{"id": "model1"}]}
+        self.api.text_to_image.return_value = {"task_id": "task_1"}
+        self.api.get_task_result.return_value = {"status": "success", "result": {}}
+        self.tmpdir = tempfile.mkdtemp()
+        self.socket_path = os.path.join(self.tmpdir, "liblibai.sock")
+        self.daemon = LiblibAIDaemon(self.api, self.socket_path, rate=100, burst=100)
+
+    def test_catalog_shared_between_clients(self):
+        """
+        测试不同客户端的目录请求只访问一次 API
+        """
+        self.daemon.dispatch("a", "get_models", ["lora"])
+        self.daemon.dispatch("b", "get_models", ["lora"])
+        self.daemon.dispatch("b", "get_models", ["vae"])
+
+        self.assertEqual(self.api.get_models.call_count, 2)
+
+    def test_submit_watches_task_and_dedupes_polls(self):
+        """
+        测试提交的任务被轮询器接管，完成后不再重复查询
+        """
+        self.daemon.dispatch("a", "text_to_image", ["model1", "prompt"])
+        self.daemon.dispatch("a", "get_task_result", ["task_1"])
+        self.daemon.dispatch("b", "get_task_result", ["task_1"])
+
+        self.api.get_task_result.assert_called_once_with("task_1")
+
+    def test_settings_change_replaces_api(self):
+        """
+        测试配置变化后使用新的 API 客户端，目录缓存被清空
+        """
+        new_api = MagicMock(spec=LiblibAIAPI)
+        new_api.get_models.return_value = {"models": [{"id": "model2"}]}
+        old_settings, new_settings = {"access_key": "old"}, {"access_key": "new"}
+        loads = iter([old_settings])
+        store = MagicMock()
+        store.load.side_effect = lambda: next(loads, new_settings)
+        changed = threading.Event()
+
+        def build(current):
+            changed.set()
+            return new_api
+
+        self.daemon.dispatch("a", "get_models", ["lora"])
+        self.daemon.watch_settings(store, build, interval=0.01)
+        try:
+            self.assertTrue(changed.wait(5))
+        finally:
+            self.daemon.shutdown()
+
+        self.assertIs(self.daemon.poller.api, new_api)
+        self.assertEqual(self.daemon.dispatch("a", "get_models", ["lora"]), {"models": [{"id": "model2"}]})
+
+    def test_unknown_method(self):
+        """
+        测试调用不支持的方法
+        """
+        with self.assertRaises(APIError):
+            self.daemon.dispatch("a", "save_keys")
+
+    @unittest.skipUnless(hasattr(socket, "AF_UNIX"), "需要 Unix Socket")
+    def test_client_round_trip(self):
+        """
+        测试客户端通过 Unix Socket 调用守护进程
+        """
+        self.daemon.start()
+        try:
+            client = DaemonClient(self.socket_path, client_id="webui-1")
+            self.assertTrue(client.is_available())
+            self.assertEqual(client.get_models(), {"models": [{"id": "model1"}]})
+            self.assertEqual(client.text_to_image("model1", "prompt", width=768), {"task_id": "task_1"})
+            self.api.text_to_image.assert_called_once_with("model1", "prompt", width=768)
+            with self.assertRaises(APIError):
+                client.call("save_keys")
+            client.close()
+        finally:
+            self.daemon.shutdown()
+
+    @unittest.skipUnless(hasattr(socket, "AF_UNIX"), "需要 Unix Socket")
+    def test_client_does_not_resend_after_timeout(self):
+        """
+        测试请求发出后等待响应超时时报错，不重发提交请求
+        """
+        released = threading.Event()
+        self.api.text_to_image.side_effect = lambda *args, **kwargs: released.wait(5) and {"task_id": "task_1"}
+        self.daemon.start()
+        try:
+            client = DaemonClient(self.socket_path, client_id="webui-1", timeout=0.2)
+            with self.assertRaises(APIError):
+                client.text_to_image("model1", "prompt")
+            released.set()
+            client.close()
+        finally:
+            self.daemon.shutdown()
+        self.assertEqual(self.api.text_to_image.call_count, 1)
+
+    @unittest.skipUnless(hasattr(socket, "AF_UNIX"), "需要 Unix Socket")
+    def test_slow_call_does_not_block_others(self):
+        """
+        测试同一客户端中慢的提交不阻塞其他调用
+        """
+        released = threading.Event()
+        self.api.text_to_image.side_effect = lambda *args, **kwargs: released.wait(5) and {"task_id": "task_1"}
+        self.daemon.start()
+        try:
+            client = DaemonClient(self.socket_path, client_id="webui-1", timeout=5)
+            results = []
+            submit = threading.Thread(target=lambda: results.append(client.text_to_image("model1", "prompt")))
+            submit.start()
+            self.assertEqual(client.get_models(), {"models": [{"id": "model1"}]})
+            self.assertEqual(results, [])
+            released.set()
+            submit.join(5)
+            self.assertEqual(results, [{"task_id": "task_1"}])
+            client.close()
+        finally:
+            released.set()
+            self.daemon.shutdown()
+
+    @unittest.skipUnless(hasattr(socket, "AF_UNIX"), "需要 Unix Socket")
+    def test_socket_private_to_user(self):
+        """
+        测试 Socket 文件只有本用户可以访问，其他用户的连接被拒绝
+        """
+        self.daemon.start()
+        try:
+            self.assertEqual(os.stat(self.socket_path).st_mode & 0o777, 0o600)
+            self.assertTrue(DaemonClient(self.socket_path).is_available())
+            if hasattr(socket, "SO_PEERCRED"):
+                self.daemon.allowed_uid = os.getuid() + 1
+                self.assertFalse(DaemonClient(self.socket_path, timeout=1).is_available())
+        finally:
+            self.daemon.shutdown()
+
+    @unittest.skipUnless(hasattr(os, "getuid"), "需要 Unix 用户 ID")
+    def test_default_socket_path_is_private(self):
+        """
+        测试默认 Socket 目录以 0700 权限创建
+        """
+        with patch.dict(os.environ, {"XDG_RUNTIME_DIR": self.tmpdir}):
+            path = default_socket_path()
+
+        directory = os.path.dirname(path)
+        self.assertEqual(directory, os.path.join(self.tmpdir, "liblibai_helper"))
+        self.assertEqual(os.stat(directory).st_mode & 0o777, 0o700)
+
+    def test_client_unavailable(self):
+        """
+        测试守护进程未运行时客户端报错
+        """
+        client = DaemonClient(self.socket_path)
+        self.assertFalse(client.is_available())
+
+if __name__ == '__main__':
+    unittest.main()
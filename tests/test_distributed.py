@@ -0,0 +1,185 @@
+import io
+import os
+import sys
+import time
+import shutil
+import tempfile
+import threading
+import unittest
+
+from PIL import Image
+
+# 添加父目录到 sys.path，以便导入 distributed 模块
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from scripts.lh_lib.distributed import SharedJobQueue, DistributedWorker
+from scripts.lh_lib.output import ImageWriter, read_infotext
+
+class TestSharedJobQueue(unittest.TestCase):
+    """
+    测试 SharedJobQueue 类
+    """
+
+    def setUp(self):
+        """
+        测试前的设置
+        """
+        self.tmpdir = tempfile.mkdtemp()
+        self.queue = SharedJobQueue(os.path.join(self.tmpdir, "jobs.db"))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    def test_enqueue_is_idempotent(self):
+        """
+        测试相同幂等键只入队一次
+        """
+        first = self.queue.enqueue({"prompt": "a"}, job_key="batch-1")
+        second = self.queue.enqueue({"prompt": "a"}, job_key="batch-1")
+
+        self.assertEqual(first, second)
+        self.assertEqual(self.queue.counts()["pending"], 1)
+
+    def test_claim_is_exclusive(self):
+        """
+        测试同一任务只能被一个节点认领
+        """
+        self.queue.enqueue_many([{"n": i} for i in range(3)])
+
+        a = self.queue.claim("node-a", limit=2)
+        b = self.queue.claim("node-b", limit=2)
+
+        self.assertEqual([job["payload"]["n"] for job in a], [0, 1])
+        self.assertEqual([job["payload"]["n"] for job in b], [2])
+        self.assertEqual(self.queue.claim("node-c"), [])
+
+    def test_steal_stale_claim(self):
+        """
+        测试心跳超时的任务被其他节点接管，原节点无法再提交结果
+        """
+        job_id = self.queue.enqueue({"prompt": "a"})
+        self.queue.claim("dead-node")
+
+        self.assertEqual(self.queue.claim("node-b", stale_after=60), [])
+        stolen = self.queue.claim("node-b", stale_after=-1)
+
+        self.assertEqual(stolen[0]["id"], job_id)
+        self.assertEqual(stolen[0]["attempts"], 2)
+        self.assertEqual(self.queue.heartbeat("dead-node", [job_id]), set())
+        self.assertFalse(self.queue.complete("dead-node", job_id, {"x": 1}))
+        self.assertTrue(self.queue.complete("node-b", job_id, {"x": 2}))
+        self.assertEqual(self.queue.get(job_id)["result"], {"x": 2})
+
+    def test_stale_claim_respects_max_attempts(self):
+        """
+        测试心跳超时的任务达到最大尝试次数后标记为失败，不再被接管
+        """
+        job_id = self.queue.enqueue({"prompt": "a"})
+        self.queue.claim("dead-node-1", max_attempts=2)
+        self.queue.claim("dead-node-2", stale_after=-1, max_attempts=2)
+
+        self.assertEqual(self.queue.claim("node-b", stale_after=-1, max_attempts=2), [])
+        job = self.queue.get(job_id)
+        self.assertEqual(job["status"], "failed")
+        self.assertEqual(job["attempts"], 2)
+        self.assertIsNone(job["owner"])
+
+    def test_fail_requeues_until_max_attempts(self):
+        """
+        测试失败任务重试，超过次数后标记为失败
+        """
+        job_id = self.queue.enqueue({"prompt": "a"})
+
+        self.queue.claim("node-a")
+        self.queue.fail("node-a", job_id, "boom", max_attempts=2)
+        self.assertEqual(self.queue.get(job_id)["status"], "pending")
+
+        self.queue.claim("node-a")
+        self.queue.fail("node-a", job_id, "boom", max_attempts=2)
+        self.assertEqual(self.queue.get(job_id)["status"], "failed")
+        self.assertEqual(self.queue.get(job_id)["error"], "boom")
+
+class TestDistributedWorker(unittest.TestCase):
+    """
+    测试 DistributedWorker 类
+    """
+
+    def setUp(self):
+        """
+        测试前的设置
+        """
+        self.tmpdir = tempfile.mkdtemp()
+        self.queue = SharedJobQueue(os.path.join(self.tmpdir, "jobs.db"))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    def test_run_once_writes_output(self):
+        """
+        测试任务输出写入共享保存目录
+        """
+        job_id = self.queue.enqueue({"prompt": "a"})
+        worker = DistributedWorker(
+            self.queue, lambda payload: {"content": b"image", "ext": "png", "task_id": "t1"},
+            self.tmpdir, node_id="node-a"
+        )
+
+        self.assertTrue(worker.run_once())
+        self.assertFalse(worker.run_once())
+
+        job = self.queue.get(job_id)
+        self.assertEqual(job["status"], "done")
+        self.assertEqual(job["result"]["task_id"], "t1")
+        with open(job["result"]["path"], "rb") as f:
+            self.assertEqual(f.read(), b"image")
+
+    def test_run_once_uses_image_writer(self):
+        """
+        测试配置了图片保存器时输出写入参数并记录到输出清单
+        """
+        buffer = io.BytesIO()
+        Image.new("RGB", (8, 8), "red").save(buffer, "PNG")
+        job_id = self.queue.enqueue({"prompt": "a"})
+        writer = ImageWriter(os.path.join(self.tmpdir, "outputs"), image_format="webp", thumbnail_size=0)
+        worker = DistributedWorker(
+            self.queue, lambda payload: {"content": buffer.getvalue(), "info": "a cat\nSteps: 20", "task_id": "t1"},
+            self.tmpdir, node_id="node-a", writer=writer
+        )
+
+        self.assertTrue(worker.run_once())
+        writer.shutdown()
+
+        result = self.queue.get(job_id)["result"]
+        self.assertTrue(result["path"].endswith(".webp"))
+        self.assertEqual(read_infotext(result["path"]), "a cat\nSteps: 20")
+        self.assertEqual(writer.manifest.get(result["hash"])["source"], "distributed")
+
+    def test_nodes_process_every_job_once(self):
+        """
+        测试多个节点并发处理时任务不重复不丢失
+        """
+        self.queue.enqueue_many([{"n": i} for i in range(20)])
+        seen = []
+        lock = threading.Lock()
+
+        def handler(payload):
+            with lock:
+                seen.append(payload["n"])
+            return {"n": payload["n"]}
+
+        workers = [
+            DistributedWorker(self.queue, handler, self.tmpdir, node_id=f"node-{i}", concurrency=2, idle_interval=0.01)
+            for i in range(3)
+        ]
+        for worker in workers:
+            worker.start()
+        deadline = time.time() + 10
+        while self.queue.counts()["done"] < 20 and time.time() < deadline:
+            time.sleep(0.05)
+        for worker in workers:
+            worker.stop(timeout=5)
+
+        self.assertEqual(sorted(seen), list(range(20)))
+        self.assertEqual(sum(w.processed for w in workers), 20)
+
+if __name__ == '__main__':
+    unittest.main()
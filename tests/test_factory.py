@@ -0,0 +1,87 @@
+import os
+import sys
+import unittest
+from unittest.mock import patch
+
+# 添加父目录到 sys.path，以便导入 factory 模块
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from scripts.lh_lib.factory import build_api, create_key_pool, create_proxy_pool, update_key_pool
+
+class TestFactory(unittest.TestCase):
+    """
+    测试按设置创建 API 客户端
+    """
+
+    def test_key_pool_includes_primary_key(self):
+        """
+        测试密钥池包含主密钥且不重复
+        """
+        settings = {
+            "access_key": "main",
+            "secret_key": "main_secret",
+            "keys": [{"access_key": "extra", "secret_key": "extra_secret"}],
+            "key_pool": {"quarantine_seconds": 10}
+        }
+        key_pool = create_key_pool(settings)
+
+        self.assertEqual([k.access_key for k in key_pool.keys], ["main", "extra"])
+        self.assertEqual(key_pool.quarantine_seconds, 10)
+        self.assertIsNone(create_key_pool({"access_key": "main", "secret_key": "main_secret"}))
+
+    def test_update_key_pool_in_place(self):
+        """
+        测试保存设置时就地更新密钥池，保留任务与密钥的对应关系
+        """
+        settings = {
+            "access_key": "main",
+            "secret_key": "main_secret",
+            "keys": [{"access_key": "extra", "secret_key": "extra_secret"}]
+        }
+        key_pool = create_key_pool(settings)
+        key_pool.pin("t1", key_pool.keys[1])
+
+        settings["keys"] = []
+        settings["key_pool"] = {"quarantine_seconds": 10}
+        updated = update_key_pool(key_pool, settings)
+
+        self.assertIs(updated, key_pool)
+        self.assertEqual([k.access_key for k in key_pool.keys], ["main"])
+        self.assertEqual(key_pool.for_task("t1").access_key, "extra")
+        self.assertEqual(key_pool.quarantine_seconds, 10)
+        self.assertIsNone(update_key_pool(None, settings))
+
+    @patch('scripts.lh_lib.factory.ProxyPool.start')
+    def test_proxy_pool_ignores_blank_entries(self, mock_start):
+        """
+        测试代理池忽略空白项，列表为空时不创建
+        """
+        proxy_pool = create_proxy_pool(["http://a:1", " ", ""], probe_interval=5)
+
+        self.assertEqual(len(proxy_pool), 1)
+        self.assertEqual(proxy_pool.probe_interval, 5)
+        mock_start.assert_called_once()
+        self.assertIsNone(create_proxy_pool([" "]))
+
+    @patch('scripts.lh_lib.factory.ProxyPool.start')
+    def test_build_api_from_settings(self, mock_start):
+        """
+        测试密钥、代理、代理池和密钥池都按设置安装
+        """
+        settings = {
+            "access_key": "main",
+            "secret_key": "main_secret",
+            "proxy": "http://127.0.0.1:7890",
+            "proxies": ["http://a:1", "http://b:2"],
+            "keys": [{"access_key": "extra", "secret_key": "extra_secret"}]
+        }
+        api, proxy_pool, key_pool = build_api(settings)
+
+        self.assertTrue(api.auth.is_configured())
+        self.assertEqual(api.proxy, "http://127.0.0.1:7890")
+        self.assertIs(api.proxy_pool, proxy_pool)
+        self.assertEqual(len(proxy_pool), 2)
+        self.assertIs(api.key_pool, key_pool)
+        self.assertEqual(len(key_pool), 2)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,130 @@
+import os
+import sys
+import time
+import shutil
+import hashlib
+import tempfile
+import unittest
+from unittest.mock import patch
+
+# 添加父目录到 sys.path，以便导入 hashing 模块
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from scripts.lh_lib import hashing
+from scripts.lh_lib.hashing import HashCache, ModelHasher, hash_file, short_hash, find_model_files
+
+class TestHashFile(unittest.TestCase):
+    """
+    测试 hash_file 和 find_model_files 函数
+    """
+
+    def setUp(self):
+        """
+        测试前的设置
+        """
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    def write(self, name, data):
+        path = os.path.join(self.tmpdir, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(data)
+        return path
+
+    def test_hash_matches_hashlib(self):
+        """
+        测试 mmap 分块计算的结果与一次性计算相同，空文件也能处理
+        """
+        data = os.urandom(100000)
+        path = self.write("model.safetensors", data)
+        self.assertEqual(hash_file(path, chunk_size=4096), hashlib.sha256(data).hexdigest())
+        empty = self.write("empty.safetensors", b"")
+        self.assertEqual(hash_file(empty), hashlib.sha256(b"").hexdigest())
+        self.assertEqual(short_hash(hash_file(path)), hashlib.sha256(data).hexdigest()[:10])
+
+    def test_find_model_files(self):
+        """
+        测试递归查找模型文件，忽略其他文件和不存在的目录
+        """
+        a = self.write("sd/a.safetensors", b"a")
+        b = self.write("sd/sub/b.CKPT", b"b")
+        self.write("sd/readme.txt", b"c")
+        self.assertEqual(find_model_files([os.path.join(self.tmpdir, "sd"), os.path.join(self.tmpdir, "missing")]), sorted([a, b]))
+
+class TestModelHasher(unittest.TestCase):
+    """
+    测试 ModelHasher 和 HashCache 类
+    """
+
+    def setUp(self):
+        """
+        测试前的设置
+        """
+        self.tmpdir = tempfile.mkdtemp()
+        self.cache = HashCache(os.path.join(self.tmpdir, "cache", "hashes.db"))
+        self.paths = []
+        for i in range(3):
+            path = os.path.join(self.tmpdir, f"model_{i}.safetensors")
+            with open(path, "wb") as f:
+                f.write(bytes([i]) * (1000 * (i + 1)))
+            self.paths.append(path)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    def expected(self, path):
+        with open(path, "rb") as f:
+            return hashlib.sha256(f.read()).hexdigest()
+
+    def test_process_pool_and_progress(self):
+        """
+        测试进程池计算结果正确，进度回调覆盖全部文件和字节
+        """
+        calls = []
+        hasher = ModelHasher(self.cache, workers=2)
+        results = hasher.hash_files(self.paths, progress=lambda *args: calls.append(args))
+        self.assertEqual(results, {path: self.expected(path) for path in self.paths})
+        self.assertEqual(calls[-1][:4], (3, 3, 6000, 6000))
+        self.assertEqual(hasher.last_stats["hashed"], 3)
+        self.assertEqual(self.cache.count(), 3)
+
+    def test_unchanged_files_not_rehashed(self):
+        """
+        测试未变化的文件从缓存读取，修改过的文件重新计算
+        """
+        ModelHasher(self.cache, workers=1).hash_files(self.paths)
+        with open(self.paths[0], "ab") as f:
+            f.write(b"changed")
+
+        with patch.object(hashing, "hash_file", wraps=hash_file) as mocked:
+            hasher = ModelHasher(HashCache(self.cache.db_path), workers=1)
+            results = hasher.hash_files(self.paths)
+        mocked.assert_called_once_with(self.paths[0], "sha256")
+        self.assertEqual(results[self.paths[0]], self.expected(self.paths[0]))
+        self.assertEqual(hasher.last_stats["cached"], 2)
+
+    def test_mtime_change_invalidates(self):
+        """
+        测试大小相同但修改时间不同的文件重新计算
+        """
+        hasher = ModelHasher(self.cache, workers=1)
+        hasher.hash_files(self.paths)
+        future = time.time() + 100
+        os.utime(self.paths[1], (future, future))
+        hasher.hash_files(self.paths)
+        self.assertEqual(hasher.last_stats["hashed"], 1)
+
+    def test_missing_files_and_prune(self):
+        """
+        测试不存在的文件被跳过，prune 删除已移除文件的记录
+        """
+        hasher = ModelHasher(self.cache, workers=1)
+        results = hasher.hash_files(self.paths + [os.path.join(self.tmpdir, "missing.safetensors")])
+        self.assertEqual(len(results), 3)
+        self.assertEqual(self.cache.prune(self.paths[:2]), 1)
+        self.assertEqual(self.cache.count(), 2)
+
+if __name__ == '__main__':
+    unittest.main()
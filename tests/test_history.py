@@ -0,0 +1,123 @@
+import io
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+from PIL import Image
+
+# 添加父目录到 sys.path，以便导入 history 模块
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from scripts.lh_lib.history import HistoryIndex, build_record
+from scripts.lh_lib.output import ImageWriter, format_infotext
+
+def make_png(color, size=(64, 64)):
+    buffer = io.BytesIO()
+    Image.new("RGB", size, color).save(buffer, "PNG")
+    return buffer.getvalue()
+
+class TestHistoryIndex(unittest.TestCase):
+    """
+    测试 HistoryIndex 类
+    """
+
+    def setUp(self):
+        """
+        测试前的设置
+        """
+        self.tmpdir = tempfile.mkdtemp()
+        self.index = HistoryIndex(os.path.join(self.tmpdir, "history.db"))
+        self.writer = ImageWriter(self.tmpdir, index=self.index)
+
+    def tearDown(self):
+        self.writer.shutdown()
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    def save(self, color, prompt, sampler="euler_a", size="512x512", seed=1, model="sdxl", task_id=None):
+        info = format_infotext(prompt, "模糊", Steps=20, Sampler=sampler, Seed=seed, Size=size, Model=model)
+        return self.writer.save(make_png(color), info, metadata={"task_id": task_id})
+
+    def test_build_record(self):
+        """
+        测试从参数文本生成索引记录，附加信息优先
+        """
+        info = format_infotext("一只猫", "", Steps=20, Sampler="euler_a", **{"CFG scale": 7.5}, Seed=42, Size="512x768")
+        record = build_record(info, "/tmp/a.png", metadata={"task_id": "t1", "unknown": "x"})
+        self.assertEqual(record["width"], 512)
+        self.assertEqual(record["height"], 768)
+        self.assertEqual(record["seed"], 42)
+        self.assertEqual(record["cfg_scale"], 7.5)
+        self.assertEqual(record["task_id"], "t1")
+        self.assertNotIn("unknown", record)
+
+    def test_save_indexes_image(self):
+        """
+        测试保存图片时写入索引，可以按提示词和任务 ID 搜索
+        """
+        saved = self.save((255, 0, 0), "一只橘猫坐在窗台上", task_id="task-abc")
+        self.save((0, 255, 0), "a dog running on the beach")
+
+        rows, has_more = self.index.search("橘猫")
+        self.assertEqual([row["path"] for row in rows], [saved["path"]])
+        self.assertFalse(has_more)
+        self.assertEqual(rows[0]["thumbnail"], saved["thumbnail"])
+        self.assertEqual(len(self.index.search("task-abc")[0]), 1)
+        self.assertEqual(len(self.index.search("running beach")[0]), 1)
+        # 少于 3 个字符的词退回子串匹配
+        self.assertEqual(len(self.index.search("猫")[0]), 1)
+        self.assertEqual(len(self.index.search("不存在的内容")[0]), 0)
+
+    def test_filters_and_pagination(self):
+        """
+        测试参数筛选和分页
+        """
+        for i in range(5):
+            self.save((i, 0, 0), f"landscape {i}", sampler="ddim" if i % 2 else "euler_a", size="768x512", seed=i)
+
+        self.assertEqual(len(self.index.search(sampler="ddim")[0]), 2)
+        self.assertEqual(len(self.index.search(width=768, height=512)[0]), 5)
+        self.assertEqual(self.index.search(seed=3)[0][0]["prompt"], "landscape 3")
+        self.assertEqual(self.index.facets("sampler"), ["ddim", "euler_a"])
+
+        first, has_more = self.index.search("landscape", limit=2)
+        self.assertTrue(has_more)
+        last, has_more = self.index.search("landscape", limit=2, offset=4)
+        self.assertEqual(len(last), 1)
+        self.assertFalse(has_more)
+
+    def test_query_syntax_is_escaped(self):
+        """
+        测试用户输入中的引号和 FTS 运算符不会导致查询出错
+        """
+        self.save((1, 2, 3), 'masterpiece "best quality" OR NOT')
+        self.assertEqual(len(self.index.search('"best quality" OR')[0]), 1)
+        self.assertEqual(len(self.index.search("NOT*")[0]), 0)
+
+    def test_incremental_rebuild(self):
+        """
+        测试增量重建只读取新增的图片，并移除已删除的文件
+        """
+        kept = self.save((10, 10, 10), "kept image")
+        removed = self.save((20, 20, 20), "removed image")
+
+        # 新索引从现有输出重建
+        index = HistoryIndex(os.path.join(self.tmpdir, "rebuilt.db"))
+        stats = index.rebuild(self.tmpdir)
+        self.assertEqual(stats["added"], 2)
+        rows = index.search("kept")[0]
+        self.assertEqual(rows[0]["path"], kept["path"])
+        self.assertEqual(rows[0]["thumbnail"], kept["thumbnail"])
+        self.assertEqual(rows[0]["sampler"], "euler_a")
+
+        # 保存时已写入索引的文件不会被重复读取
+        self.assertEqual(self.index.rebuild(self.tmpdir), {"added": 0, "removed": 0, "skipped": 2})
+
+        os.unlink(removed["path"])
+        stats = self.index.rebuild(self.tmpdir)
+        self.assertEqual(stats["removed"], 1)
+        self.assertEqual(self.index.count(), 1)
+        self.assertEqual(len(self.index.search("removed")[0]), 0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,181 @@
+import os
+import sys
+import unittest
+from unittest.mock import patch, MagicMock
+
+# 添加父目录到 sys.path，以便导入 keypool 模块
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from scripts.lh_lib.api import LiblibAIAPI, APIError
+from scripts.lh_lib.auth import LiblibAIAuth
+from scripts.lh_lib.keypool import KeyPool, classify_error
+
+class TestKeyPool(unittest.TestCase):
+    """
+    测试 KeyPool 类
+    """
+
+    def setUp(self):
+        """
+        测试前的设置
+        """
+        self.pool = KeyPool([
+            {"access_key": "access_key_a", "secret_key": "secret_a", "quota": 2},
+            {"access_key": "access_key_b", "secret_key": "secret_b", "quota": 5},
+            {"access_key": "", "secret_key": "ignored"}
+        ])
+
+    def test_ignores_incomplete_keys(self):
+        """
+        测试忽略不完整的密钥配置
+        """
+        self.assertEqual(len(self.pool), 2)
+        self.assertEqual(self.pool.keys[0].name, "acce****ey_a")
+
+    def test_acquire_by_remaining_quota(self):
+        """
+        测试按剩余额度选择密钥
+        """
+        key = self.pool.acquire()
+        self.assertEqual(key.access_key, "access_key_b")
+
+        for _ in range(4):
+            self.pool.report_success(self.pool.keys[1])
+        self.assertEqual(self.pool.acquire().access_key, "access_key_a")
+
+    def test_all_keys_exhausted(self):
+        """
+        测试所有密钥额度用完
+        """
+        for key in self.pool.keys:
+            key.used = key.quota
+        with self.assertRaises(APIError):
+            self.pool.acquire()
+
+    def test_quarantine(self):
+        """
+        测试认证和额度错误隔离密钥，其他错误不隔离
+        """
+        key_b = self.pool.keys[1]
+
+        self.assertFalse(self.pool.report_error(key_b, APIError("timeout")))
+        self.assertTrue(key_b.is_healthy())
+
+        self.assertTrue(self.pool.report_error(key_b, APIError("forbidden", status_code=403)))
+        self.assertFalse(key_b.is_healthy())
+        self.assertEqual(self.pool.acquire().access_key, "access_key_a")
+
+        stats = self.pool.stats()
+        self.assertFalse(stats[1]["healthy"])
+        self.assertEqual(stats[1]["errors"], 2)
+        self.assertEqual(stats[1]["last_error"], "forbidden")
+
+    def test_pin(self):
+        """
+        测试任务固定到提交它的密钥
+        """
+        pool = KeyPool([{"access_key": "ak", "secret_key": "sk"}], max_pinned=2)
+        key = pool.keys[0]
+        for task_id in ("t1", "t2", "t3"):
+            pool.pin(task_id, key)
+
+        self.assertIsNone(pool.for_task("t1"))
+        self.assertIs(pool.for_task("t3"), key)
+
+    def test_update_keys_keeps_state(self):
+        """
+        测试更新密钥配置时保留已有密钥的统计、隔离状态和任务对应关系
+        """
+        key_a, key_b = self.pool.keys
+        self.pool.report_success(key_a)
+        self.pool.report_error(key_b, APIError("quota exceeded"))
+        self.pool.pin("t1", key_b)
+
+        self.pool.update_keys([
+            {"access_key": "access_key_a", "secret_key": "secret_a", "quota": 2},
+            {"access_key": "access_key_c", "secret_key": "secret_c"}
+        ])
+
+        self.assertEqual([k.access_key for k in self.pool.keys], ["access_key_a", "access_key_c"])
+        self.assertIs(self.pool.keys[0], key_a)
+        self.assertEqual(key_a.used, 1)
+        # 被删除的密钥不再用于提交，但已提交的任务仍使用它轮询
+        self.assertIs(self.pool.for_task("t1"), key_b)
+
+    def test_update_keys_new_secret_clears_quarantine(self):
+        """
+        测试修改 secret_key 后解除该密钥的隔离
+        """
+        key_b = self.pool.keys[1]
+        self.pool.report_error(key_b, APIError("forbidden", status_code=403))
+
+        self.pool.update_keys([{"access_key": "access_key_b", "secret_key": "fixed_secret", "quota": 5}])
+
+        self.assertTrue(key_b.is_healthy())
+        self.assertEqual(key_b.auth.secret_key, "fixed_secret")
+
+    def test_classify_error(self):
+        """
+        测试错误分类
+        """
+        self.assertEqual(classify_error(APIError("x", status_code=401)), "auth")
+        self.assertEqual(classify_error(APIError("x", status_code=429)), "quota")
+        self.assertEqual(classify_error(APIError("账户额度不足")), "quota")
+        self.assertEqual(classify_error(APIError("x", status_code=500)), "other")
+
+class TestAPIWithKeyPool(unittest.TestCase):
+    """
+    测试 LiblibAIAPI 使用密钥池
+    """
+
+    def setUp(self):
+        """
+        测试前的设置
+        """
+        self.api = LiblibAIAPI(LiblibAIAuth("primary", "primary_secret"))
+        self.pool = KeyPool([
+            {"access_key": "access_key_a", "secret_key": "secret_a", "quota": 10},
+            {"access_key": "access_key_b", "secret_key": "secret_b", "quota": 5}
+        ])
+        self.api.set_key_pool(self.pool)
+
+    @patch('scripts.lh_lib.api.LiblibAIAPI._request')
+    def test_submit_pins_and_polls_with_same_key(self, mock_request):
+        """
+        测试提交和轮询使用同一个密钥
+        """
+        mock_request.return_value = {"task_id": "task_1"}
+
+        self.api.text_to_image("model1", "prompt")
+        submit_auth = mock_request.call_args.kwargs["auth"]
+        self.api.get_task_result("task_1")
+
+        self.assertEqual(submit_auth.access_key, "access_key_a")
+        self.assertIs(mock_request.call_args.kwargs["auth"], submit_auth)
+        self.assertEqual(self.pool.keys[0].used, 1)
+
+    @patch('scripts.lh_lib.api.LiblibAIAPI._request')
+    def test_submit_fails_over_on_quota_error(self, mock_request):
+        """
+        测试额度错误时换下一个密钥重试
+        """
+        mock_request.side_effect = [APIError("quota exceeded", status_code=429), {"task_id": "task_2"}]
+
+        result = self.api.star3_alpha("prompt")
+
+        self.assertEqual(result, {"task_id": "task_2"})
+        self.assertFalse(self.pool.keys[0].is_healthy())
+        self.assertIs(self.pool.for_task("task_2"), self.pool.keys[1])
+
+    @patch('scripts.lh_lib.api.LiblibAIAPI._request')
+    def test_submit_raises_other_errors(self, mock_request):
+        """
+        测试非密钥错误直接抛出
+        """
+        mock_request.side_effect = APIError("server error", status_code=500)
+
+        with self.assertRaises(APIError):
+            self.api.run_workflow("workflow1")
+        self.assertEqual(mock_request.call_count, 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,112 @@
+import os
+import io
+import sys
+import json
+import time
+import logging
+import logging.handlers
+import unittest
+
+# 添加父目录到 sys.path，以便导入 log 模块
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from scripts.lh_lib.log import setup_logging, shutdown_logging, RateLimitFilter
+
+class TestSetupLogging(unittest.TestCase):
+    """
+    测试 setup_logging 函数
+    """
+
+    def setUp(self):
+        """
+        测试前的设置
+        """
+        self.name = f"liblibai_test_{self._testMethodName}"
+        self.stream = io.StringIO()
+
+    def tearDown(self):
+        shutdown_logging(self.name)
+
+    def flush(self):
+        # 停止监听线程会先写完队列中的日志
+        shutdown_logging(self.name)
+        return self.stream.getvalue()
+
+    def test_installed_once(self):
+        """
+        测试重复调用只安装一个处理器，并移除旧的同步控制台处理器
+        """
+        logger = logging.getLogger(self.name)
+        logger.addHandler(logging.StreamHandler(io.StringIO()))
+        setup_logging(self.name, stream=self.stream)
+        setup_logging(self.name, stream=self.stream)
+        setup_logging(self.name, stream=self.stream)
+        self.assertEqual(len(logger.handlers), 1)
+        self.assertIsInstance(logger.handlers[0], logging.handlers.QueueHandler)
+
+        logger.info("hello")
+        output = self.flush()
+        self.assertEqual(output.count("hello"), 1)
+        self.assertIn(f"{self.name} - INFO - hello", output)
+
+    def test_reconfigure_level_and_json(self):
+        """
+        测试重复调用更新级别和 JSON 格式
+        """
+        logger = setup_logging(self.name, stream=self.stream)
+        setup_logging(self.name, level="WARNING", json_format=True)
+        logger.info("hidden")
+        logger.warning("visible %s", 1, extra={"task_id": "t1"})
+        output = self.flush()
+        lines = output.strip().splitlines()
+        self.assertEqual(len(lines), 1)
+        data = json.loads(lines[0])
+        self.assertEqual(data["level"], "WARNING")
+        self.assertEqual(data["message"], "visible 1")
+        self.assertEqual(data["task_id"], "t1")
+
+    def test_error_rate_limit(self):
+        """
+        测试热循环中的错误日志被限流，其他级别不受影响
+        """
+        logger = setup_logging(self.name, rate_limit=3, rate_window=60, stream=self.stream)
+        for i in range(20):
+            logger.error(f"failure {i}")
+            logger.info(f"info {i}")
+        output = self.flush()
+        self.assertEqual(output.count("failure"), 3)
+        self.assertEqual(output.count("info"), 20)
+
+class TestRateLimitFilter(unittest.TestCase):
+    """
+    测试 RateLimitFilter 类
+    """
+
+    def make_record(self, lineno, level=logging.ERROR):
+        return logging.LogRecord("test", level, "file.py", lineno, "message", (), None)
+
+    def test_window_reports_suppressed(self):
+        """
+        测试窗口结束后的第一条日志附带被丢弃的数量，不同位置分别计数
+        """
+        rate_filter = RateLimitFilter(limit=2, window=0.05)
+        results = [rate_filter.filter(self.make_record(10)) for _ in range(5)]
+        self.assertEqual(results, [True, True, False, False, False])
+        self.assertTrue(rate_filter.filter(self.make_record(11)))
+        self.assertEqual(rate_filter.suppressed_total, 3)
+
+        time.sleep(0.06)
+        record = self.make_record(10)
+        self.assertTrue(rate_filter.filter(record))
+        self.assertEqual(record.suppressed, 3)
+
+    def test_disabled_and_low_levels_pass(self):
+        """
+        测试 limit 为 0 或级别较低时不限流
+        """
+        rate_filter = RateLimitFilter(limit=0)
+        self.assertTrue(all(rate_filter.filter(self.make_record(1)) for _ in range(10)))
+        rate_filter = RateLimitFilter(limit=1)
+        self.assertTrue(all(rate_filter.filter(self.make_record(1, logging.WARNING)) for _ in range(10)))
+
+if __name__ == '__main__':
+    unittest.main()
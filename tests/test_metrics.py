@@ -0,0 +1,97 @@
+import os
+import sys
+import json
+import unittest
+from unittest.mock import MagicMock
+
+# 添加父目录到 sys.path，以便导入 metrics 模块
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from scripts.lh_lib.metrics import Histogram, MetricsRegistry, register_routes
+
+class TestHistogram(unittest.TestCase):
+    """
+    测试 Histogram 类
+    """
+
+    def test_quantile(self):
+        """
+        测试按桶估算分位数
+        """
+        histogram = Histogram(buckets=(1, 2, 4))
+        self.assertIsNone(histogram.quantile(0.5))
+        for value in (0.5, 0.5, 1.5, 3, 10):
+            histogram.observe(value)
+        self.assertEqual(histogram.counts, [2, 1, 1, 1])
+        self.assertEqual(histogram.count, 5)
+        self.assertAlmostEqual(histogram.sum, 15.5)
+        self.assertLessEqual(histogram.quantile(0.4), 1)
+        self.assertTrue(2 < histogram.quantile(0.8) <= 4)
+        # 超出最大桶的观测值按最大桶上限估算
+        self.assertEqual(histogram.quantile(0.99), 4)
+
+class TestMetricsRegistry(unittest.TestCase):
+    """
+    测试 MetricsRegistry 类
+    """
+
+    def setUp(self):
+        """
+        测试前的设置
+        """
+        self.metrics = MetricsRegistry(buckets=(0.1, 1))
+        self.metrics.begin("text-to-image")
+        self.metrics.end("text-to-image", "post", 200, 0.05, bytes_out=100, bytes_in=20)
+        self.metrics.begin("text-to-image")
+        self.metrics.end("text-to-image", "post", 429, 0.5)
+        self.metrics.begin("task-result")
+        self.metrics.retry("text-to-image", "key")
+
+    def test_snapshot(self):
+        """
+        测试 JSON 快照包含状态码、字节数、并发数、重试和仪表
+        """
+        self.metrics.register_gauge("key_quota_remaining", lambda: {"main": 10})
+        self.metrics.register_gauge("broken", lambda: 1 / 0)
+        snapshot = self.metrics.snapshot()
+        
+        endpoint = snapshot["endpoints"]["text-to-image"]
+        self.assertEqual(endpoint["requests"], 2)
+        self.assertEqual(endpoint["status"], {"200": 1, "429": 1})
+        self.assertEqual(endpoint["bytes_out"], 100)
+        self.assertEqual(endpoint["in_flight"], 0)
+        self.assertIsNotNone(endpoint["p99"])
+        self.assertEqual(snapshot["endpoints"]["task-result"]["in_flight"], 1)
+        self.assertEqual(snapshot["retries"], {"text-to-image": {"key": 1}})
+        # 读取失败的仪表被跳过
+        self.assertEqual(snapshot["gauges"], {"key_quota_remaining": {"main": 10}})
+        json.dumps(snapshot)
+
+    def test_render_prometheus(self):
+        """
+        测试 Prometheus 文本格式的直方图为累计计数
+        """
+        self.metrics.register_gauge("queue_depth", lambda: 3, "排队深度")
+        text = self.metrics.render_prometheus()
+        
+        self.assertIn('liblibai_request_duration_seconds_bucket{endpoint="text-to-image",le="0.1"} 1', text)
+        self.assertIn('liblibai_request_duration_seconds_bucket{endpoint="text-to-image",le="+Inf"} 2', text)
+        self.assertIn('liblibai_requests_total{endpoint="text-to-image",method="POST",status="429"} 1', text)
+        self.assertIn('liblibai_retries_total{endpoint="text-to-image",reason="key"} 1', text)
+        self.assertIn('liblibai_in_flight_requests{endpoint="task-result"} 1', text)
+        self.assertIn("liblibai_queue_depth 3", text)
+
+    def test_register_routes(self):
+        """
+        测试在应用上注册 Prometheus 和 JSON 两个路由
+        """
+        try:
+            import fastapi  # noqa: F401
+        except ImportError:
+            self.skipTest("未安装 fastapi")
+        app = MagicMock()
+        register_routes(app, self.metrics)
+        paths = [call.args[0] for call in app.add_api_route.call_args_list]
+        self.assertEqual(paths, ["/liblibai/metrics", "/liblibai/metrics/json"])
+
+if __name__ == '__main__':
+    unittest.main()
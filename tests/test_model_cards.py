@@ -0,0 +1,82 @@
+import os
+import sys
+import json
+import shutil
+import asyncio
+import hashlib
+import tempfile
+import unittest
+from unittest.mock import MagicMock
+
+# 添加父目录到 sys.path，以便导入 model_cards 模块
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from scripts.lh_lib.hashing import HashCache, ModelHasher
+from scripts.lh_lib.scanner import LocalModelIndex
+from scripts.lh_lib.model_cards import describe_models, register_routes
+
+class TestModelCards(unittest.TestCase):
+    """
+    测试模型卡片信息查询
+    """
+
+    def setUp(self):
+        """
+        测试前的设置
+        """
+        self.tmpdir = tempfile.mkdtemp()
+        lora_dir = os.path.join(self.tmpdir, "Lora")
+        os.makedirs(lora_dir)
+        for name, data in (("detail.safetensors", b"detail"), ("unknown.safetensors", b"unknown")):
+            with open(os.path.join(lora_dir, name), "wb") as f:
+                f.write(data)
+        hasher = ModelHasher(HashCache(os.path.join(self.tmpdir, "hashes.db")), workers=1)
+        self.index = LocalModelIndex({"LoRA": lora_dir}, hasher)
+        self.index.scan()
+        self.index.set_remote_models([
+            {"id": "lora-1", "name": "Detail Tweaker", "type": "LoRA", "sha256": hashlib.sha256(b"detail").hexdigest()},
+        ])
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    def test_describe_models(self):
+        """
+        测试一次返回所有模型的匹配状态、远程 ID 和预设缓存情况
+        """
+        result = describe_models(self.index, ["detail", "unknown", "missing", "detail", 1], has_presets=lambda model_id: model_id == "lora-1")
+        self.assertEqual(set(result), {"detail", "unknown", "missing"})
+        self.assertEqual(result["detail"]["remote_id"], "lora-1")
+        self.assertEqual(result["detail"]["match"], "hash")
+        self.assertEqual(result["detail"]["type"], "LoRA")
+        self.assertEqual(result["detail"]["hash"], hashlib.sha256(b"detail").hexdigest()[:10])
+        self.assertTrue(result["detail"]["presets"])
+        self.assertTrue(result["unknown"]["local"])
+        self.assertIsNone(result["unknown"]["remote_id"])
+        self.assertFalse(result["unknown"]["presets"])
+        self.assertEqual(result["missing"], {"local": False, "match": None})
+        self.assertFalse(describe_models(None, ["detail"])["detail"]["local"])
+
+    def test_route(self):
+        """
+        测试路由返回 JSON 并校验请求体
+        """
+        try:
+            import fastapi  # noqa: F401
+        except ImportError:
+            self.skipTest("未安装 fastapi")
+        app = MagicMock()
+        register_routes(app, lambda: self.index)
+        path, handler = app.add_api_route.call_args.args[:2]
+        self.assertEqual(path, "/liblibai/model-cards")
+
+        request = MagicMock()
+        async def body():
+            return {"names": ["detail"]}
+        request.json = body
+        response = asyncio.run(handler(request))
+        data = json.loads(response.body)
+        self.assertTrue(data["ready"])
+        self.assertEqual(data["models"]["detail"]["remote_id"], "lora-1")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,128 @@
+import io
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+from PIL import Image
+
+# 添加父目录到 sys.path，以便导入 output 模块
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from scripts.lh_lib.output import ImageWriter, format_infotext, parse_infotext, read_infotext
+
+def make_png(size=(640, 480)):
+    buffer = io.BytesIO()
+    Image.new("RGBA", size, (255, 0, 0, 255)).save(buffer, "PNG")
+    return buffer.getvalue()
+
+class TestImageWriter(unittest.TestCase):
+    """
+    测试 ImageWriter 类
+    """
+
+    def setUp(self):
+        """
+        测试前的设置
+        """
+        self.tmpdir = tempfile.mkdtemp()
+        self.info = format_infotext("一只猫", "模糊", Steps=20, Sampler="euler_a", Seed=None, Size="640x480")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    def test_format_infotext(self):
+        """
+        测试生成 WebUI 格式的参数文本，忽略值为 None 的项
+        """
+        self.assertEqual(self.info, "一只猫\nNegative prompt: 模糊\nSteps: 20, Sampler: euler_a, Size: 640x480")
+
+    def test_parse_infotext(self):
+        """
+        测试解析参数文本，多行提示词和负面提示词保持原样
+        """
+        info = format_infotext("一只猫\n坐在窗台", "模糊, 低质量", Steps=20, Sampler="euler_a", **{"CFG scale": 7}, Size="512x768")
+        parsed = parse_infotext(info)
+        self.assertEqual(parsed["prompt"], "一只猫\n坐在窗台")
+        self.assertEqual(parsed["negative_prompt"], "模糊, 低质量")
+        self.assertEqual(parsed["CFG scale"], "7")
+        self.assertEqual(parsed["Size"], "512x768")
+        self.assertEqual(parse_infotext("a, b: c"), {"prompt": "a, b: c", "negative_prompt": ""})
+
+    def test_png_embeds_parameters(self):
+        """
+        测试 PNG 写入 parameters 文本块并生成缩略图
+        """
+        writer = ImageWriter(self.tmpdir)
+        saved = writer.submit(make_png(), self.info).result(timeout=10)
+        writer.shutdown()
+
+        self.assertTrue(saved["path"].endswith(".png"))
+        self.assertEqual(read_infotext(saved["path"]), self.info)
+        with Image.open(saved["thumbnail"]) as thumb:
+            self.assertEqual(max(thumb.size), 256)
+        self.assertEqual(writer.saved, 1)
+
+    def test_jpeg_and_webp(self):
+        """
+        测试 JPEG/WebP 输出把参数写入 EXIF
+        """
+        for image_format, ext in (("jpeg", ".jpg"), ("webp", ".webp")):
+            writer = ImageWriter(self.tmpdir, image_format=image_format, quality=70, thumbnail_size=0)
+            saved = writer.save(make_png(), self.info)
+
+            self.assertTrue(saved["path"].endswith(ext))
+            self.assertIsNone(saved["thumbnail"])
+            self.assertEqual(read_infotext(saved["path"]), self.info)
+
+    def test_content_addressed_sharded_layout(self):
+        """
+        测试文件以内容哈希命名并按日期和哈希前缀分片，清单可按哈希查找
+        """
+        writer = ImageWriter(self.tmpdir)
+
+        saved = writer.save(make_png(), self.info, source="workflow")
+
+        relative = os.path.relpath(saved["path"], self.tmpdir).split(os.sep)
+        self.assertEqual(len(relative), 3)
+        self.assertEqual(relative[1], saved["hash"][:2])
+        self.assertEqual(relative[2], f"{saved['hash']}.png")
+        entry = writer.manifest.get(saved["hash"])
+        self.assertEqual(entry["path"], saved["path"])
+        self.assertEqual(entry["thumbnail"], saved["thumbnail"])
+        self.assertEqual(entry["source"], "workflow")
+        self.assertEqual((entry["width"], entry["height"]), (640, 480))
+
+    def test_same_content_saved_once(self):
+        """
+        测试相同内容只保存一份
+        """
+        writer = ImageWriter(self.tmpdir, thumbnail_size=0)
+
+        first = writer.save(make_png(), self.info)
+        second = writer.save(make_png(), self.info)
+
+        self.assertTrue(first["created"])
+        self.assertFalse(second["created"])
+        self.assertEqual(first["path"], second["path"])
+        self.assertEqual(writer.manifest.count(), 1)
+        self.assertEqual(writer.deduplicated, 1)
+
+    def test_concurrent_writes_never_collide(self):
+        """
+        测试并发保存的不同图片互不覆盖，且不留下临时文件
+        """
+        writer = ImageWriter(self.tmpdir, thumbnail_size=0, workers=4)
+        images = [make_png((32 + i, 32)) for i in range(20)]
+
+        results = [f.result(timeout=10) for f in [writer.submit(image) for image in images]]
+        writer.shutdown()
+
+        self.assertEqual(len({r["path"] for r in results}), 20)
+        self.assertEqual(writer.manifest.count(), 20)
+        self.assertEqual(len(writer.manifest.list(limit=5)), 5)
+        leftovers = [name for _, _, names in os.walk(self.tmpdir) for name in names if name.endswith(".tmp")]
+        self.assertEqual(leftovers, [])
+
+if __name__ == '__main__':
+    unittest.main()
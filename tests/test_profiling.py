@@ -0,0 +1,154 @@
+import os
+import sys
+import time
+import shutil
+import asyncio
+import inspect
+import pstats
+import tempfile
+import unittest
+from unittest.mock import patch
+
+# 添加父目录到 sys.path，以便导入 profiling 模块
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from scripts.lh_lib.profiling import HandlerProfiler
+
+def slow_function(x, y=1):
+    time.sleep(0.03)
+    return x + y
+
+async def slow_coroutine(x):
+    await asyncio.sleep(0)
+    time.sleep(0.03)
+    return x * 2
+
+def slow_generator(n):
+    for i in range(n):
+        time.sleep(0.01)
+        yield i
+    return "done"
+
+async def slow_async_generator(n):
+    for i in range(n):
+        await asyncio.sleep(0)
+        time.sleep(0.01)
+        yield i
+
+async def collect(agen):
+    return [item async for item in agen]
+
+class TestHandlerProfiler(unittest.TestCase):
+    """
+    测试 HandlerProfiler 类
+    """
+
+    def setUp(self):
+        """
+        测试前的设置
+        """
+        self.tmpdir = tempfile.mkdtemp()
+        self.profiler = HandlerProfiler(self.tmpdir, enabled=True, threshold_ms=10)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    def test_wrapper_keeps_handler_kind(self):
+        """
+        测试包装后的函数类型和签名不变，Gradio 按原方式调用
+        """
+        wrapped = self.profiler.wrap("f", slow_function)
+        self.assertEqual(str(inspect.signature(wrapped)), "(x, y=1)")
+        self.assertTrue(inspect.iscoroutinefunction(self.profiler.wrap("c", slow_coroutine)))
+        self.assertTrue(inspect.isgeneratorfunction(self.profiler.wrap("g", slow_generator)))
+        self.assertTrue(inspect.isasyncgenfunction(self.profiler.wrap("a", slow_async_generator)))
+
+    def test_slow_calls_dumped(self):
+        """
+        测试每种处理函数的慢调用都会保存分析结果，返回值不变
+        """
+        self.assertEqual(self.profiler.wrap("load_models_list", slow_function)(1, y=2), 3)
+        self.assertEqual(asyncio.run(self.profiler.wrap("get_task_status", slow_coroutine)(2)), 4)
+        self.assertEqual(list(self.profiler.wrap("run_workflow", slow_generator)(3)), [0, 1, 2])
+        self.assertEqual(asyncio.run(collect(self.profiler.wrap("generate_image", slow_async_generator)(3))), [0, 1, 2])
+
+        names = sorted(os.path.basename(path).split("-")[0] for path in self.profiler.dumped)
+        self.assertEqual(names, ["generate_image", "get_task_status", "load_models_list", "run_workflow"])
+        stats = pstats.Stats(self.profiler.dumped[0])
+        self.assertTrue(any(func[2] == "slow_function" for func in stats.stats))
+
+    def test_fast_and_disabled_calls_not_dumped(self):
+        """
+        测试低于阈值或关闭时不保存
+        """
+        self.profiler.threshold_ms = 10000
+        self.profiler.wrap("f", slow_function)(1)
+        self.profiler.threshold_ms = 0
+        self.profiler.enabled = False
+        self.profiler.wrap("f", slow_function)(1)
+        self.assertEqual(self.profiler.dumped, [])
+        self.assertEqual(os.listdir(self.tmpdir), [])
+
+    def test_await_time_not_counted(self):
+        """
+        测试协程和异步生成器挂起等待的时间不计入，期间分析处于暂停状态
+        """
+        async def waiting_coroutine():
+            await asyncio.sleep(0.05)
+            return "ok"
+
+        async def waiting_async_generator():
+            for i in range(2):
+                await asyncio.sleep(0.03)
+                yield i
+
+        async def other_task():
+            time.sleep(0.05)
+
+        async def run_both():
+            wrapped = self.profiler.wrap("waiting", waiting_coroutine)
+            result, _ = await asyncio.gather(wrapped(), other_task())
+            return result
+
+        self.assertEqual(asyncio.run(run_both()), "ok")
+        self.assertEqual(asyncio.run(collect(self.profiler.wrap("waiting_gen", waiting_async_generator)())), [0, 1])
+        self.assertEqual(self.profiler.dumped, [])
+
+    def test_exceptions_propagate(self):
+        """
+        测试处理函数的异常照常抛出，分析器可以继续使用
+        """
+        def failing():
+            time.sleep(0.02)
+            raise ValueError("boom")
+
+        with self.assertRaises(ValueError):
+            self.profiler.wrap("failing", failing)()
+        self.assertEqual(len(self.profiler.dumped), 1)
+        self.profiler.wrap("f", slow_function)(1)
+        self.assertEqual(len(self.profiler.dumped), 2)
+
+    def test_sampling_mode(self):
+        """
+        测试采样模式保存折叠栈文件
+        """
+        self.profiler.configure(mode="sampling")
+        self.profiler.interval = 0.001
+        self.profiler.wrap("f", slow_function)(1)
+
+        path = self.profiler.dumped[0]
+        self.assertTrue(path.endswith(".folded"))
+        with open(path, encoding="utf-8") as f:
+            self.assertIn("slow_function", f.read())
+
+    def test_environment_overrides_settings(self):
+        """
+        测试环境变量优先于设置
+        """
+        with patch.dict(os.environ, {"LIBLIBAI_PROFILE": "sampling", "LIBLIBAI_PROFILE_THRESHOLD_MS": "250"}):
+            self.profiler.configure(enabled=False, mode="deterministic", threshold_ms=500)
+        self.assertTrue(self.profiler.enabled)
+        self.assertEqual(self.profiler.mode, "sampling")
+        self.assertEqual(self.profiler.threshold_ms, 250)
+
+if __name__ == '__main__':
+    unittest.main()
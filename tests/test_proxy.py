@@ -0,0 +1,171 @@
+import os
+import sys
+import unittest
+from unittest.mock import patch, MagicMock
+
+import requests
+from http.client import RemoteDisconnected
+from urllib3.exceptions import MaxRetryError, NewConnectionError, ProtocolError
+
+# 添加父目录到 sys.path，以便导入 proxy 模块
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from scripts.lh_lib.api import LiblibAIAPI, APIError
+from scripts.lh_lib.auth import LiblibAIAuth
+from scripts.lh_lib.proxy import ProxyPool
+
+class TestProxyPool(unittest.TestCase):
+    """
+    测试 ProxyPool 类
+    """
+
+    def setUp(self):
+        """
+        测试前的设置
+        """
+        self.pool = ProxyPool.from_string("http://fast:1, http://slow:2\nhttp://fast:1", max_failures=2)
+        self.fast, self.slow = self.pool.proxies
+
+    def test_from_string(self):
+        """
+        测试解析代理列表并去重
+        """
+        self.assertEqual([p.url for p in self.pool.proxies], ["http://fast:1", "http://slow:2"])
+
+    def test_choose_fastest(self):
+        """
+        测试选择延迟最低的代理
+        """
+        self.pool.report_success(self.fast, 0.1)
+        self.pool.report_success(self.slow, 2.0)
+
+        self.assertIs(self.pool.choose(), self.fast)
+
+        # EWMA 平滑后慢代理变快
+        for _ in range(10):
+            self.pool.report_success(self.slow, 0.01)
+        self.assertIs(self.pool.choose(), self.slow)
+
+    def test_failures_mark_unhealthy(self):
+        """
+        测试连续失败后代理不再被选择
+        """
+        self.pool.report_success(self.fast, 0.1)
+        self.pool.report_success(self.slow, 2.0)
+        self.pool.report_failure(self.fast, "boom")
+        self.assertIs(self.pool.choose(), self.fast)
+
+        self.pool.report_failure(self.fast, "boom")
+        self.assertFalse(self.fast.healthy)
+        self.assertIs(self.pool.choose(), self.slow)
+
+    @patch('requests.head')
+    def test_probe(self, mock_head):
+        """
+        测试健康探测
+        """
+        self.fast.healthy = False
+        self.assertTrue(self.pool.probe(self.fast))
+        self.assertTrue(self.fast.healthy)
+        mock_head.assert_called_once_with(
+            "https://api.liblibai.com", proxies={"http": "http://fast:1", "https": "http://fast:1"},
+            timeout=5, allow_redirects=False
+        )
+
+        mock_head.side_effect = requests.exceptions.ConnectTimeout("timeout")
+        self.assertFalse(self.pool.probe(self.slow))
+        self.assertFalse(self.slow.healthy)
+        self.assertEqual(self.pool.stats()[1]["last_error"], "timeout")
+
+class TestAPIWithProxyPool(unittest.TestCase):
+    """
+    测试 LiblibAIAPI 使用代理池
+    """
+
+    def setUp(self):
+        """
+        测试前的设置
+        """
+        self.api = LiblibAIAPI(LiblibAIAuth("test_access_key", "test_secret_key"))
+        self.pool = ProxyPool(["http://a:1", "http://b:2"])
+        self.api.set_proxy_pool(self.pool)
+
+    @patch('requests.Session.get')
+    def test_failover(self, mock_get):
+        """
+        测试代理连接失败时切换到下一个代理
+        """
+        response = MagicMock()
+        response.json.return_value = {"status": "success"}
+        mock_get.side_effect = [requests.exceptions.ProxyError("dead"), response]
+        self.pool.report_success(self.pool.proxies[1], 1.0)
+
+        result = self.api.get_task_result("task_1")
+
+        self.assertEqual(result, {"status": "success"})
+        proxies_used = [call.kwargs["proxies"]["https"] for call in mock_get.call_args_list]
+        self.assertEqual(proxies_used, ["http://a:1", "http://b:2"])
+        self.assertEqual(self.pool.proxies[0].failures, 1)
+        self.assertEqual(self.pool.proxies[1].successes, 2)
+
+    @patch('requests.Session.post')
+    def test_all_proxies_fail(self, mock_post):
+        """
+        测试所有代理都失败时抛出 APIError
+        """
+        mock_post.side_effect = requests.exceptions.ProxyError("down")
+
+        with self.assertRaises(APIError):
+            self.api.text_to_image("model1", "prompt")
+        self.assertEqual(mock_post.call_count, 2)
+
+    @patch('requests.Session.post')
+    def test_connect_failure_retried(self, mock_post):
+        """
+        测试无法建立连接时提交请求换代理重试
+        """
+        refused = NewConnectionError(None, "Connection refused")
+        response = MagicMock()
+        response.json.return_value = {"task_id": "task_1"}
+        mock_post.side_effect = [requests.exceptions.ConnectionError(MaxRetryError(None, "/", refused)), response]
+
+        self.assertEqual(self.api.text_to_image("model1", "prompt")["task_id"], "task_1")
+        self.assertEqual(mock_post.call_count, 2)
+
+    @patch('requests.Session.post')
+    def test_aborted_submit_not_retried(self, mock_post):
+        """
+        测试请求发出后连接中断时不重发提交请求，避免重复创建任务
+        """
+        mock_post.side_effect = requests.exceptions.ConnectionError(
+            ProtocolError("Connection aborted.", RemoteDisconnected("Remote end closed connection without response"))
+        )
+
+        with self.assertRaises(APIError):
+            self.api.text_to_image("model1", "prompt")
+        self.assertEqual(mock_post.call_count, 1)
+
+    @patch('requests.Session.get')
+    def test_aborted_get_retried(self, mock_get):
+        """
+        测试查询请求连接中断时换代理重试
+        """
+        response = MagicMock()
+        response.json.return_value = {"status": "success"}
+        mock_get.side_effect = [requests.exceptions.ConnectionError(ProtocolError("Connection aborted.")), response]
+
+        self.assertEqual(self.api.get_task_result("task_1"), {"status": "success"})
+        self.assertEqual(mock_get.call_count, 2)
+
+    @patch('requests.Session.post')
+    def test_read_timeout_not_retried(self, mock_post):
+        """
+        测试读取超时不重发，避免重复提交
+        """
+        mock_post.side_effect = requests.exceptions.ReadTimeout("slow")
+
+        with self.assertRaises(APIError):
+            self.api.text_to_image("model1", "prompt")
+        self.assertEqual(mock_post.call_count, 1)
+
+if __name__ == '__main__':
+    unittest.main()
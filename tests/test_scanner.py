@@ -0,0 +1,148 @@
+import os
+import sys
+import time
+import shutil
+import hashlib
+import tempfile
+import threading
+import unittest
+
+# 添加父目录到 sys.path，以便导入 scanner 模块
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from scripts.lh_lib.hashing import HashCache, ModelHasher
+from scripts.lh_lib.scanner import LocalModelIndex, normalize_name
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if condition():
+            return True
+        time.sleep(0.02)
+    return False
+
+class TestLocalModelIndex(unittest.TestCase):
+    """
+    测试 LocalModelIndex 类
+    """
+
+    def setUp(self):
+        """
+        测试前的设置
+        """
+        self.tmpdir = tempfile.mkdtemp()
+        self.dirs = {"底模": os.path.join(self.tmpdir, "Stable-diffusion"), "LoRA": os.path.join(self.tmpdir, "Lora")}
+        self.ckpt = self.write("Stable-diffusion/Anime Model.safetensors", b"checkpoint")
+        self.lora = self.write("Lora/styles/detail_lora.safetensors", b"lora")
+        self.write("Lora/readme.txt", b"ignored")
+        self.hasher = ModelHasher(HashCache(os.path.join(self.tmpdir, "hashes.db")), workers=1)
+        self.index = LocalModelIndex(self.dirs, self.hasher, poll_interval=0.05, debounce=0.05)
+
+    def tearDown(self):
+        self.index.stop()
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    def write(self, relpath, data):
+        path = os.path.join(self.tmpdir, relpath)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(data)
+        return path
+
+    def test_scan_and_find(self):
+        """
+        测试完整扫描后按名称和路径查找
+        """
+        self.assertEqual(self.index.scan(), 2)
+        entry = self.index.find("styles/detail_lora")
+        self.assertEqual(entry["kind"], "LoRA")
+        self.assertEqual(entry["name"], "styles/detail_lora")
+        self.assertEqual(entry["hash"], hashlib.sha256(b"lora").hexdigest())
+        self.assertEqual(self.index.find("Anime Model.safetensors")["path"], self.ckpt)
+        self.assertIsNone(self.index.find("detail_lora", kind="底模"))
+        self.assertEqual(self.index.get(self.ckpt)["kind"], "底模")
+
+    def test_remote_matching(self):
+        """
+        测试优先按哈希匹配，其次按名称匹配，列表对象不变时不重新匹配
+        """
+        self.index.scan()
+        models = [
+            {"id": "m1", "name": "Something Else", "type": "LoRA", "hash": hashlib.sha256(b"lora").hexdigest()[:10]},
+            {"id": "m2", "name": "anime-model", "type": "底模"},
+        ]
+        self.index.set_remote_models(models)
+        self.assertEqual(self.index.find("detail_lora")["remote"]["id"], "m1")
+        self.assertEqual(self.index.find("detail_lora")["match"], "hash")
+        self.assertEqual(self.index.find("Anime Model")["match"], "name")
+        self.assertEqual(set(self.index.local_by_remote_id()), {"m1", "m2"})
+        self.assertEqual(self.index.stats()["kinds"]["LoRA"], {"files": 1, "matched": 1})
+
+        models.append({"id": "m3", "name": "detail lora", "type": "LoRA"})
+        self.index.set_remote_models(models)
+        self.assertNotIn("m3", self.index.local_by_remote_id())
+
+    def test_update_paths(self):
+        """
+        测试增量更新新增、修改和删除的文件与目录
+        """
+        self.index.scan()
+        self.index.set_remote_models([{"id": "m4", "name": "new model", "type": "底模"}])
+        new = self.write("Stable-diffusion/new_model.ckpt", b"new")
+        self.assertEqual(self.index.update_paths([new, self.ckpt]), 1)
+        self.assertEqual(self.index.find("new_model")["remote"]["id"], "m4")
+
+        self.write("Stable-diffusion/new_model.ckpt", b"changed content")
+        self.index.update_paths([new])
+        self.assertEqual(self.index.find("new_model")["hash"], hashlib.sha256(b"changed content").hexdigest())
+
+        shutil.rmtree(os.path.join(self.tmpdir, "Lora", "styles"))
+        self.index.update_paths([os.path.join(self.tmpdir, "Lora", "styles"), os.path.join(self.tmpdir, "outside.ckpt")])
+        self.assertIsNone(self.index.find("detail_lora"))
+        self.assertEqual(len(self.index), 2)
+
+    def test_poll_once(self):
+        """
+        测试轮询只处理发生变化的文件
+        """
+        self.index.scan()
+        self.assertEqual(self.index.poll_once(), 0)
+        os.remove(self.ckpt)
+        self.write("Lora/another.pt", b"another")
+        self.assertEqual(self.index.poll_once(), 1)
+        self.assertEqual(sorted(e["name"] for e in self.index.entries()), ["another", "styles/detail_lora"])
+
+    def test_background_polling(self):
+        """
+        测试后台扫描完成后回调，并在轮询中发现新文件
+        """
+        scanned = threading.Event()
+        self.index.start(use_watchdog=False, callback=lambda index: scanned.set())
+        self.assertTrue(scanned.wait(5))
+        self.assertEqual(self.index.mode, "polling")
+        self.write("Lora/late.safetensors", b"late")
+        self.assertTrue(wait_for(lambda: self.index.find("late") is not None))
+
+    def test_file_events_debounced(self):
+        """
+        测试文件事件在停止一段时间后合并处理
+        """
+        self.index.scan()
+        worker = threading.Thread(target=self.index._process_events, daemon=True)
+        worker.start()
+        path = self.write("Lora/evented.safetensors", b"evented")
+        for _ in range(3):
+            self.index._enqueue(path)
+        self.assertTrue(wait_for(lambda: self.index.find("evented") is not None))
+        self.index.stop()
+        worker.join(2)
+        self.assertFalse(worker.is_alive())
+
+    def test_normalize_name(self):
+        """
+        测试名称规范化
+        """
+        self.assertEqual(normalize_name("sub/Anime_Model-v1.safetensors"), "animemodelv1")
+        self.assertEqual(normalize_name("Model v1.5"), "modelv15")
+
+if __name__ == '__main__':
+    unittest.main()
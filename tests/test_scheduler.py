@@ -0,0 +1,173 @@
+import os
+import sys
+import threading
+import unittest
+from unittest.mock import MagicMock, patch
+
+# 添加父目录到 sys.path，以便导入 scheduler 模块
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from scripts.lh_lib.api import LiblibAIAPI, APIError
+from scripts.lh_lib.scheduler import (
+    Backend, LocalBackend, LiblibAIBackend, OffloadScheduler, percentile
+)
+from scripts.lh_lib.tasks import CancelToken, TaskCancelled
+
+class FakeLocalBackend(Backend):
+    """
+    模拟本地管线
+    """
+
+    name = "local"
+
+    def __init__(self, depth=0):
+        self.depth = depth
+        self.jobs = []
+
+    def queue_depth(self):
+        return self.depth
+
+    def generate(self, job, token=None):
+        self.jobs.append(job)
+        return {"images": ["local_image"]}
+
+class TestOffloadScheduler(unittest.TestCase):
+    """
+    测试 OffloadScheduler 类
+    """
+
+    def setUp(self):
+        """
+        测试前的设置
+        """
+        self.stub_api = MagicMock(spec=LiblibAIAPI)
+        self.stub_api.text_to_image.return_value = {"task_id": "task_1"}
+        self.stub_api.get_task_result.return_value = {
+            "status": "success",
+            "result": {"image_url": "https://example.com/image.png"}
+        }
+        self.local = FakeLocalBackend()
+        self.remote = LiblibAIBackend(self.stub_api, poll_interval=0)
+        self.job = {"model_id": "model1", "prompt": "a cat", "width": 512, "height": 512, "params": {"steps": 20}}
+
+    def test_prefers_idle_local(self):
+        """
+        测试本地空闲时使用本地后端
+        """
+        scheduler = OffloadScheduler(self.local, self.remote)
+        scheduler.stats["local"].latency_ewma = 5.0
+        scheduler.stats["liblibai"].latency_ewma = 10.0
+
+        backend_name, result = scheduler.run(self.job)
+
+        self.assertEqual(backend_name, "local")
+        self.assertEqual(result, {"images": ["local_image"]})
+        self.stub_api.text_to_image.assert_not_called()
+
+    def test_offloads_when_local_queue_backs_up(self):
+        """
+        测试本地队列积压时分流到远程
+        """
+        self.local.depth = 5
+        scheduler = OffloadScheduler(self.local, self.remote)
+        scheduler.stats["local"].latency_ewma = 5.0
+        scheduler.stats["liblibai"].latency_ewma = 10.0
+
+        backend_name, result = scheduler.run(self.job)
+
+        self.assertEqual(backend_name, "liblibai")
+        self.assertEqual(result["task_id"], "task_1")
+        self.stub_api.text_to_image.assert_called_once_with(
+            "model1", "a cat", "", 512, 512, steps=20
+        )
+
+    def test_budget_exhausted_stays_local(self):
+        """
+        测试额度用尽后不再分流
+        """
+        self.local.depth = 5
+        scheduler = OffloadScheduler(self.local, self.remote, cost_budget=1)
+
+        self.assertEqual(scheduler.run(self.job)[0], "liblibai")
+        self.assertEqual(scheduler.remaining_budget(), 0)
+        self.assertEqual(scheduler.run(self.job)[0], "local")
+
+    def test_budget_reserved_when_chosen(self):
+        """
+        测试选中远程后端时立即预留额度，并发选择不会超出预算
+        """
+        self.local.depth = 5
+        scheduler = OffloadScheduler(self.local, self.remote, cost_budget=1)
+
+        self.assertEqual(scheduler.choose(self.job), (self.remote, 1.0))
+        self.assertEqual(scheduler.choose(self.job), (self.local, 0.0))
+        self.assertEqual(scheduler.remaining_budget(), 0)
+
+    def test_remote_failure_falls_back(self):
+        """
+        测试远程失败时回退到本地且不计入额度
+        """
+        self.local.depth = 5
+        self.stub_api.get_task_result.return_value = {"status": "failed", "error": "boom"}
+        scheduler = OffloadScheduler(self.local, self.remote, cost_budget=10)
+
+        backend_name, _ = scheduler.run(self.job)
+
+        self.assertEqual(backend_name, "local")
+        self.assertEqual(scheduler.remaining_budget(), 10)
+        self.assertEqual(scheduler.stats["liblibai"].failed, 1)
+
+    def test_remote_failure_without_fallback(self):
+        """
+        测试禁用回退时抛出 APIError
+        """
+        self.local.depth = 5
+        self.stub_api.text_to_image.return_value = {"message": "quota"}
+        scheduler = OffloadScheduler(self.local, self.remote, fallback=False)
+
+        with self.assertRaises(APIError):
+            scheduler.run(self.job)
+
+    def test_cancel_releases_slot_without_fallback(self):
+        """
+        测试取消远程任务后停止轮询、取消远程任务、释放并发名额且不回退到本地
+        """
+        self.local.depth = 5
+        self.stub_api.get_task_result.return_value = {"status": "running"}
+        remote = LiblibAIBackend(self.stub_api, poll_interval=10)
+        scheduler = OffloadScheduler(self.local, remote)
+        token = CancelToken()
+        threading.Timer(0.1, token.cancel).start()
+
+        with self.assertRaises(TaskCancelled):
+            scheduler.run(self.job, token)
+
+        self.stub_api.cancel_task.assert_called_once_with("task_1")
+        self.assertEqual(scheduler.stats["liblibai"].inflight, 0)
+        self.assertEqual(self.local.jobs, [])
+
+    def test_stats(self):
+        """
+        测试吞吐量与 p95 统计
+        """
+        scheduler = OffloadScheduler(LocalBackend(lambda job: {"ok": True}), self.remote)
+        for _ in range(3):
+            scheduler.run(self.job)
+
+        stats = scheduler.get_stats()
+
+        self.assertEqual(stats["local"]["succeeded"], 3)
+        self.assertGreater(stats["local"]["throughput_per_min"], 0)
+        self.assertIn("p95", stats["liblibai"])
+        self.assertIsNone(stats["remaining_budget"])
+
+    def test_percentile(self):
+        """
+        测试百分位数计算
+        """
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 50), 51)
+        self.assertEqual(percentile(values, 95), 95)
+        self.assertEqual(percentile([], 95), 0.0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,167 @@
+import os
+import sys
+import json
+import time
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+
+# 添加父目录到 sys.path，以便导入 settings 模块
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from scripts.lh_lib.settings import SettingsStore, update_nested_dict, get_config_path
+
+class TestSettingsStore(unittest.TestCase):
+    """
+    测试 SettingsStore 类
+    """
+
+    def setUp(self):
+        """
+        测试前的设置
+        """
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, "liblibai_helper.json")
+        self.defaults = {"proxy": "", "ui_defaults": {"width": 512, "height": 512}}
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    def _write_file(self, data):
+        with open(self.path, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+
+    def test_defaults_merged(self):
+        """
+        测试文件中缺少的项使用默认值
+        """
+        self._write_file({"ui_defaults": {"width": 768}})
+        store = SettingsStore(self.path, self.defaults)
+
+        self.assertEqual(store.load(), {"proxy": "", "ui_defaults": {"width": 768, "height": 512}})
+
+    def test_cached_until_file_changes(self):
+        """
+        测试文件未变化时不重新读取，变化后自动重新加载
+        """
+        self._write_file({"proxy": "a"})
+        store = SettingsStore(self.path, self.defaults)
+
+        first = store.load()
+        self.assertIs(store.load(), first)
+        self.assertEqual(store.reloads, 1)
+
+        self._write_file({"proxy": "http://127.0.0.1:7890"})
+        os.utime(self.path, ns=(time.time_ns() + 10 ** 9, time.time_ns() + 10 ** 9))
+
+        self.assertEqual(store.get("proxy"), "http://127.0.0.1:7890")
+        self.assertEqual(store.reloads, 2)
+
+    def test_debounced_writes_coalesce(self):
+        """
+        测试连续修改合并为一次写入
+        """
+        store = SettingsStore(self.path, self.defaults, debounce=60)
+
+        for width in range(512, 1024, 64):
+            store.update({"ui_defaults": {"width": width}})
+        self.assertFalse(os.path.exists(self.path))
+        self.assertEqual(store.get("ui_defaults")["width"], 960)
+
+        self.assertTrue(store.flush())
+        self.assertEqual(store.writes, 1)
+        with open(self.path, 'r', encoding='utf-8') as f:
+            self.assertEqual(json.load(f), {"ui_defaults": {"width": 960}})
+
+    def test_pending_changes_survive_external_edit(self):
+        """
+        测试有未写入的修改时不被外部修改覆盖
+        """
+        store = SettingsStore(self.path, self.defaults, debounce=60)
+        store.update({"proxy": "mine"})
+        self._write_file({"proxy": "external"})
+
+        self.assertEqual(store.get("proxy"), "mine")
+        store.flush()
+
+    def test_external_edit_during_debounce_kept(self):
+        """
+        测试等待写入期间文件中其他项的外部修改在写入后保留，默认值不写入文件
+        """
+        self._write_file({"proxy": "old"})
+        store = SettingsStore(self.path, self.defaults, debounce=60)
+        settings = store.load()
+        store.update({"ui_defaults": {"width": 768}})
+        self._write_file({"proxy": "external"})
+        os.utime(self.path, ns=(time.time_ns() + 10 ** 9, time.time_ns() + 10 ** 9))
+
+        self.assertTrue(store.flush())
+        with open(self.path, 'r', encoding='utf-8') as f:
+            self.assertEqual(json.load(f), {"proxy": "external", "ui_defaults": {"width": 768}})
+        self.assertEqual(settings["proxy"], "external")
+        self.assertEqual(store.get("ui_defaults"), {"width": 768, "height": 512})
+
+    def test_external_change_between_load_and_save(self):
+        """
+        测试读取后文件被外部修改，保存时不丢失对缓存对象的修改
+        """
+        self._write_file({"proxy": "old"})
+        store = SettingsStore(self.path, self.defaults, debounce=60)
+        settings = store.load()
+        self._write_file({"proxy": "external", "padding": "x" * 10})
+        settings["proxy"] = "mine"
+
+        self.assertTrue(store.save(True))
+        with open(self.path, 'r', encoding='utf-8') as f:
+            self.assertEqual(json.load(f)["proxy"], "mine")
+
+    def test_failed_write_keeps_old_file(self):
+        """
+        测试写入失败时原文件完好且没有残留临时文件
+        """
+        self._write_file({"proxy": "old"})
+        store = SettingsStore(self.path, self.defaults)
+
+        with patch('os.replace', side_effect=OSError("disk full")):
+            self.assertFalse(store.update({"proxy": "new"}, immediate=True))
+
+        with open(self.path, 'r', encoding='utf-8') as f:
+            self.assertEqual(json.load(f), {"proxy": "old"})
+        self.assertEqual(os.listdir(self.tmpdir), ["liblibai_helper.json"])
+
+    def test_corrupt_file_keeps_last_good(self):
+        """
+        测试文件损坏时保留上一次成功读取的设置
+        """
+        self._write_file({"proxy": "good"})
+        store = SettingsStore(self.path, self.defaults)
+        store.load()
+
+        with open(self.path, 'w', encoding='utf-8') as f:
+            f.write("{broken")
+        os.utime(self.path, ns=(time.time_ns() + 10 ** 9, time.time_ns() + 10 ** 9))
+
+        self.assertEqual(store.get("proxy"), "good")
+
+class TestHelpers(unittest.TestCase):
+    """
+    测试模块函数
+    """
+
+    def test_update_nested_dict(self):
+        """
+        测试递归更新嵌套字典
+        """
+        d = {"a": 1, "b": {"c": 2, "d": 3}}
+        update_nested_dict(d, {"b": {"c": 4}, "e": {"f": 5}})
+        self.assertEqual(d, {"a": 1, "b": {"c": 4, "d": 3}, "e": {"f": 5}})
+
+    def test_config_path(self):
+        """
+        测试配置文件位于插件根目录
+        """
+        root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+        self.assertEqual(get_config_path(), os.path.join(root, "liblibai_helper.json"))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,55 @@
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+# 添加父目录到 sys.path，以便导入 sqlite_util 模块
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from scripts.lh_lib.sqlite_util import connect
+
+class TestTransaction(unittest.TestCase):
+    """
+    测试 Transaction 连接上下文
+    """
+
+    def setUp(self):
+        """
+        测试前的设置
+        """
+        self.tmpdir = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.tmpdir, "test.db")
+        with connect(self.db_path) as conn:
+            conn.execute("CREATE TABLE items (name TEXT)")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    def _names(self):
+        with connect(self.db_path) as conn:
+            return [row["name"] for row in conn.execute("SELECT name FROM items")]
+
+    def test_commit_on_success(self):
+        """
+        测试正常退出时提交事务
+        """
+        with connect(self.db_path) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("INSERT INTO items VALUES ('a')")
+
+        self.assertEqual(self._names(), ["a"])
+
+    def test_rollback_on_error(self):
+        """
+        测试异常时回滚事务并照常抛出异常
+        """
+        with self.assertRaises(ValueError):
+            with connect(self.db_path) as conn:
+                conn.execute("BEGIN IMMEDIATE")
+                conn.execute("INSERT INTO items VALUES ('a')")
+                raise ValueError("boom")
+
+        self.assertEqual(self._names(), [])
+
+if __name__ == '__main__':
+    unittest.main()
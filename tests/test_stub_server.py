@@ -0,0 +1,88 @@
+import io
+import os
+import sys
+import unittest
+
+from PIL import Image
+
+# 添加父目录到 sys.path，以便导入 stub_server 模块
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from scripts.lh_lib.api import LiblibAIAPI, APIError
+from scripts.lh_lib.auth import LiblibAIAuth
+from benchmarks.stub_server import StubLiblibAIServer
+from scripts.lh_lib.tasks import poll_task, download_image
+
+class TestStubServer(unittest.TestCase):
+    """
+    测试本地模拟服务器与真实 API 客户端的整条链路
+    """
+
+    def setUp(self):
+        """
+        测试前的设置
+        """
+        self.server = StubLiblibAIServer(keys={"ak": "sk"}, task_duration=0.2, payload_size=4096).start()
+        self.api = self.make_api("ak", "sk")
+
+    def tearDown(self):
+        self.server.stop()
+
+    def make_api(self, access_key, secret_key):
+        api = LiblibAIAPI(LiblibAIAuth(access_key, secret_key))
+        api.base_url = self.server.base_url
+        return api
+
+    def test_submit_poll_download(self):
+        """
+        测试提交、轮询直到完成并下载图片，每个任务的图片内容不同
+        """
+        contents = []
+        for prompt in ("a cat", "a dog"):
+            task_id = self.api.text_to_image("stub-sd15", prompt)["task_id"]
+            progress = list(poll_task(self.api, task_id, interval=0.05, timeout=10))
+            self.assertEqual(progress[-1]["status"], "success")
+            contents.append(download_image(progress[-1]["image_url"]))
+
+        self.assertNotEqual(contents[0], contents[1])
+        with Image.open(io.BytesIO(contents[0])) as image:
+            image.load()
+            self.assertEqual(image.format, "PNG")
+        self.assertEqual(self.server.stats["rejected"], 0)
+        self.assertEqual(self.server.stats["submitted"], 2)
+        self.assertEqual([m["id"] for m in self.api.get_models("LoRA")["models"]], ["stub-lora"])
+
+    def test_signature_verified(self):
+        """
+        测试错误的密钥被拒绝
+        """
+        with self.assertRaises(APIError) as ctx:
+            self.make_api("ak", "wrong").get_models()
+        self.assertEqual(ctx.exception.status_code, 401)
+        self.assertEqual(self.server.stats["rejected"], 1)
+
+    def test_fault_injection(self):
+        """
+        测试按比例返回 429 和 500
+        """
+        self.server.rate_limit_rate = 1.0
+        with self.assertRaises(APIError) as ctx:
+            self.api.get_models()
+        self.assertEqual(ctx.exception.status_code, 429)
+
+        self.server.rate_limit_rate = 0.0
+        self.server.error_rate = 1.0
+        with self.assertRaises(APIError) as ctx:
+            self.api.text_to_image("stub-sd15", "a cat")
+        self.assertEqual(ctx.exception.status_code, 500)
+
+    def test_cancel_task(self):
+        """
+        测试取消后任务结果为失败
+        """
+        self.server.task_duration = 10
+        task_id = self.api.text_to_image("stub-sd15", "a cat")["task_id"]
+        self.api.cancel_task(task_id)
+        self.assertEqual(self.api.get_task_result(task_id)["status"], "failed")
+
+if __name__ == '__main__':
+    unittest.main()
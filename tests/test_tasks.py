@@ -0,0 +1,162 @@
+import os
+import sys
+import time
+import asyncio
+import unittest
+from unittest.mock import MagicMock, patch
+
+# 添加父目录到 sys.path，以便导入 tasks 模块
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from scripts.lh_lib.api import APIError
+from scripts.lh_lib.tasks import (
+    parse_progress, format_progress, poll_task, poll_task_async,
+    CancelToken, TaskCancelled, TaskTimeout, download_image
+)
+
+class TestTaskProgress(unittest.TestCase):
+    """
+    测试任务进度解析与轮询
+    """
+
+    def setUp(self):
+        """
+        测试前的设置
+        """
+        self.api = MagicMock()
+        self.api.get_task_result.side_effect = [
+            {"status": "pending", "queue_position": 3},
+            {"status": "running", "progress": 0.5, "result": {"preview_url": "https://example.com/preview.png"}},
+            {"status": "success", "result": {"image_url": "https://example.com/image.png"}}
+        ]
+
+    def test_parse_progress(self):
+        """
+        测试解析排队位置、进度百分比和预览图
+        """
+        progress = parse_progress("t1", {"status": "running", "progress": 0.25, "result": {"preview_url": "p.png"}})
+
+        self.assertEqual(progress["progress"], 25.0)
+        self.assertEqual(progress["preview"], "p.png")
+        self.assertEqual(parse_progress("t1", {"status": "running", "progress": 40})["progress"], 40.0)
+        self.assertIsNone(parse_progress("t1", {"status": "pending"})["progress"])
+        self.assertEqual(parse_progress("t1", {"status": "success"})["progress"], 100.0)
+
+    def test_format_progress(self):
+        """
+        测试进度文本
+        """
+        text = format_progress(parse_progress("t1", {"status": "pending", "queue_position": 2}), elapsed=5)
+
+        self.assertIn("任务 ID: t1", text)
+        self.assertIn("排队中", text)
+        self.assertIn("排队位置: 2", text)
+        self.assertIn("已等待: 5s", text)
+
+    def test_poll_task_yields_each_update(self):
+        """
+        测试同步轮询逐步产出进度直到完成
+        """
+        updates = list(poll_task(self.api, "t1", interval=0))
+
+        self.assertEqual([u["status"] for u in updates], ["pending", "running", "success"])
+        self.assertEqual(updates[1]["preview"], "https://example.com/preview.png")
+        self.assertEqual(updates[-1]["image_url"], "https://example.com/image.png")
+
+    def test_poll_task_async(self):
+        """
+        测试异步轮询产出相同的进度
+        """
+        async def collect():
+            return [u async for u in poll_task_async(self.api, "t1", interval=0)]
+
+        updates = asyncio.run(collect())
+
+        self.assertEqual([u["status"] for u in updates], ["pending", "running", "success"])
+
+    def test_poll_task_failed(self):
+        """
+        测试任务失败时抛出 APIError
+        """
+        self.api.get_task_result.side_effect = [{"status": "failed", "error": "NSFW"}]
+
+        with self.assertRaises(APIError) as context:
+            list(poll_task(self.api, "t1", interval=0))
+        self.assertIn("NSFW", str(context.exception))
+
+    def test_poll_task_timeout(self):
+        """
+        测试超时后抛出 APIError
+        """
+        self.api.get_task_result.side_effect = None
+        self.api.get_task_result.return_value = {"status": "running"}
+
+        with self.assertRaises(APIError):
+            list(poll_task(self.api, "t1", interval=0, timeout=-1))
+
+class TestCancelToken(unittest.TestCase):
+    """
+    测试 CancelToken 类
+    """
+
+    def setUp(self):
+        """
+        测试前的设置
+        """
+        self.api = MagicMock()
+        self.api.get_task_result.return_value = {"status": "running"}
+
+    def test_cancel_stops_async_poll_and_cancels_remote(self):
+        """
+        测试取消后异步轮询立即停止，并请求取消远程任务
+        """
+        token = CancelToken()
+
+        async def collect():
+            updates = []
+            with self.assertRaises(TaskCancelled):
+                async for update in poll_task_async(self.api, "t1", interval=30, token=token):
+                    updates.append(update)
+                    asyncio.get_running_loop().call_later(0.05, token.cancel)
+            return updates
+
+        started = time.time()
+        updates = asyncio.run(collect())
+
+        self.assertEqual(len(updates), 1)
+        self.assertLess(time.time() - started, 5)
+        self.api.cancel_task.assert_called_once_with("t1")
+
+    def test_deadline_propagates_to_poll(self):
+        """
+        测试令牌的截止时间早于轮询超时时生效
+        """
+        token = CancelToken(timeout=0.1)
+
+        with self.assertRaises(TaskTimeout):
+            list(poll_task(self.api, "t1", interval=30, timeout=600, token=token))
+        self.api.cancel_task.assert_called_once_with("t1")
+
+    def test_deadline_limits_api_request_timeout(self):
+        """
+        测试 API 调用在令牌的截止时间范围内执行
+        """
+        token = CancelToken(timeout=60)
+        api = MagicMock()
+        api.get_task_result.return_value = {"status": "success"}
+        list(poll_task(api, "t1", token=token))
+        api.deadline.assert_called_with(token.deadline)
+
+    def test_download_after_cancel(self):
+        """
+        测试取消后不再下载图片
+        """
+        token = CancelToken()
+        token.cancel()
+
+        with patch('requests.get') as mock_get:
+            with self.assertRaises(TaskCancelled):
+                download_image("https://example.com/image.png", token=token)
+            mock_get.assert_not_called()
+
+if __name__ == '__main__':
+    unittest.main()
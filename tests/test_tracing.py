@@ -0,0 +1,132 @@
+import os
+import sys
+import json
+import shutil
+import datetime
+import tempfile
+import unittest
+from unittest.mock import MagicMock, patch
+
+# 添加父目录到 sys.path，以便导入 tracing 模块
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from scripts.lh_lib.api import LiblibAIAPI
+from scripts.lh_lib.auth import LiblibAIAuth
+from scripts.lh_lib.tasks import CancelToken, call_with_token, poll_task, download_image
+from scripts.lh_lib.tracing import Tracer, JsonlExporter
+
+def make_response(data, status_code=200):
+    response = MagicMock()
+    response.headers = {}
+    response.status_code = status_code
+    response.elapsed = datetime.timedelta(milliseconds=5)
+    response.content = json.dumps(data).encode()
+    response.json.return_value = data
+    return response
+
+class TestTracer(unittest.TestCase):
+    """
+    测试 Tracer 类
+    """
+
+    def setUp(self):
+        """
+        测试前的设置
+        """
+        self.tracer = Tracer()
+        self.spans = []
+        self.tracer.add_hook(self.spans.append)
+
+    def test_disabled_without_hooks(self):
+        """
+        测试没有钩子时不创建区间
+        """
+        tracer = Tracer()
+        with tracer.span("request") as span:
+            self.assertIsNone(span)
+        self.assertFalse(tracer.enabled)
+
+    def test_nested_spans_share_trace(self):
+        """
+        测试嵌套区间记录父区间，并使用当前线程的追踪 ID
+        """
+        with self.tracer.trace("trace-1"):
+            with self.tracer.span("request", endpoint="models") as request:
+                with self.tracer.span("sign"):
+                    pass
+                self.tracer.record("ttfb", request.start, request.start + 0.01)
+        self.assertIsNone(self.tracer.current_trace_id())
+
+        sign, ttfb, request = self.spans
+        self.assertEqual({s.trace_id for s in self.spans}, {"trace-1"})
+        self.assertEqual(sign.parent_id, request.span_id)
+        self.assertEqual(ttfb.parent_id, request.span_id)
+        self.assertIsNone(request.parent_id)
+        self.assertAlmostEqual(ttfb.duration, 0.01)
+        self.assertEqual(request.attrs, {"endpoint": "models"})
+
+    def test_error_recorded(self):
+        """
+        测试区间内的异常记录在属性中并继续抛出，钩子出错不影响调用方
+        """
+        self.tracer.add_hook(lambda span: 1 / 0)
+        with self.assertRaises(ValueError):
+            with self.tracer.span("parse"):
+                raise ValueError("bad json")
+        self.assertEqual(self.spans[0].attrs["error"], "ValueError: bad json")
+
+class TestRequestTracing(unittest.TestCase):
+    """
+    测试提交、轮询、下载整个流程的追踪
+    """
+
+    def setUp(self):
+        """
+        测试前的设置
+        """
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, "traces", "spans.jsonl")
+        self.exporter = JsonlExporter(self.path)
+        self.api = LiblibAIAPI(LiblibAIAuth("test_access_key", "test_secret_key"))
+        self.api.add_trace_hook(self.exporter)
+
+    def tearDown(self):
+        self.exporter.close()
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    @patch('requests.get')
+    @patch('requests.Session.get')
+    @patch('requests.Session.post')
+    def test_job_spans_share_trace_id(self, mock_post, mock_get, mock_download):
+        """
+        测试同一个任务的各阶段区间写入 JSONL，且使用令牌的追踪 ID
+        """
+        mock_post.return_value = make_response({"task_id": "task_1"})
+        mock_get.side_effect = [
+            make_response({"status": "running"}),
+            make_response({"status": "success", "result": {"image_url": "https://example.com/a.png"}}),
+        ]
+        mock_download.return_value = MagicMock(content=b"png")
+        token = CancelToken(timeout=60)
+
+        call_with_token(self.api, token, self.api.text_to_image, "model", "a cat")
+        progress = list(poll_task(self.api, "task_1", interval=0, token=token))
+        download_image(progress[-1]["image_url"], token=token, tracer=self.api.tracer)
+        self.exporter.close()
+
+        with open(self.path, encoding="utf-8") as f:
+            spans = [json.loads(line) for line in f]
+        names = [s["name"] for s in spans]
+        self.assertEqual({s["trace_id"] for s in spans}, {token.trace_id})
+        for name in ("request", "sign", "send", "ttfb", "body", "parse", "download"):
+            self.assertIn(name, names)
+        polls = [s for s in spans if s["name"] == "poll"]
+        self.assertEqual([p["attrs"]["attempt"] for p in polls], [1, 2])
+        self.assertEqual(polls[-1]["attrs"]["status"], "success")
+        # 每次轮询的 request 区间都挂在对应的 poll 区间下
+        poll_ids = {p["span_id"] for p in polls}
+        poll_requests = [s for s in spans if s["name"] == "request" and s["parent_id"] in poll_ids]
+        self.assertEqual(len(poll_requests), 2)
+        self.assertEqual([s for s in spans if s["name"] == "download"][0]["attrs"]["bytes"], 3)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,109 @@
+import os
+import sys
+import unittest
+from unittest.mock import MagicMock
+
+# 添加父目录到 sys.path，以便导入 validation 模块
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from scripts.lh_lib.api import LiblibAIAPI, APIError
+from scripts.lh_lib.validation import (
+    RequestValidator, ValidationError, parse_presets, validate_payload, DEFAULT_CONSTRAINTS
+)
+
+class TestRequestValidator(unittest.TestCase):
+    """
+    测试 RequestValidator 类
+    """
+
+    def setUp(self):
+        """
+        测试前的设置
+        """
+        self.api = MagicMock()
+        self.api.get_model_presets.return_value = {
+            "data": {
+                "samplers": ["euler_a", "dpmpp_2m"],
+                "width": {"min": 512, "max": 1024},
+                "height": {"min": 512, "max": 1024},
+                "steps": [10, 50],
+                "max_pixels": 1024 * 1024
+            }
+        }
+        self.validator = RequestValidator(self.api)
+        self.payload = {"model_id": "m1", "prompt": "a cat", "width": 768, "height": 768, "steps": 20, "sampler": "euler_a"}
+
+    def test_parse_presets(self):
+        """
+        测试解析模型预设，缺少的项使用默认值
+        """
+        constraints = parse_presets(self.api.get_model_presets.return_value)
+
+        self.assertEqual(constraints["samplers"], ["euler_a", "dpmpp_2m"])
+        self.assertEqual(constraints["width"], [512, 1024])
+        self.assertEqual(constraints["steps"], [10, 50])
+        self.assertEqual(constraints["cfg_scale"], DEFAULT_CONSTRAINTS["cfg_scale"])
+
+    def test_valid_payload(self):
+        """
+        测试合法参数通过校验
+        """
+        self.assertEqual(self.validator.validate(self.payload), [])
+
+    def test_invalid_payload(self):
+        """
+        测试超出范围的尺寸、步数和不支持的采样器
+        """
+        self.payload.update({"width": 2048, "steps": 80, "sampler": "ddim"})
+
+        errors = self.validator.validate(self.payload)
+
+        self.assertEqual(len(errors), 4)
+        self.assertTrue(any("采样器" in e for e in errors))
+        self.assertTrue(any("最大像素数" in e for e in errors))
+
+    def test_size_multiple_and_resolutions(self):
+        """
+        测试尺寸倍数和固定分辨率列表
+        """
+        constraints = parse_presets({"resolutions": [{"width": 1024, "height": 1024}]})
+
+        self.assertTrue(validate_payload({"prompt": "a", "width": 1020, "height": 1024}, constraints))
+        self.assertEqual(validate_payload({"prompt": "a", "width": 1024, "height": 1024}, constraints), [])
+        self.assertTrue(validate_payload({"prompt": "a", "width": 768, "height": 768}, constraints))
+
+    def test_presets_cached(self):
+        """
+        测试模型预设只获取一次
+        """
+        for _ in range(3):
+            self.validator.validate(self.payload)
+
+        self.api.get_model_presets.assert_called_once_with("m1")
+
+    def test_presets_failure_uses_defaults(self):
+        """
+        测试获取预设失败时使用默认约束
+        """
+        self.api.get_model_presets.side_effect = APIError("boom")
+
+        self.assertEqual(self.validator.constraints("m2")["width"], DEFAULT_CONSTRAINTS["width"])
+        self.assertEqual(self.validator.validate(dict(self.payload, model_id="m2", width=2048)), [])
+
+    def test_api_rejects_before_sending(self):
+        """
+        测试参数不合法时 API 不发送请求
+        """
+        api = LiblibAIAPI(MagicMock())
+        api._submit = MagicMock()
+        api.get_model_presets = self.api.get_model_presets
+        api.set_validator(RequestValidator(api))
+
+        with self.assertRaises(ValidationError) as context:
+            api.text_to_image("m1", "a cat", width=4096, height=512)
+
+        api._submit.assert_not_called()
+        self.assertEqual(context.exception.status_code, 400)
+        self.assertEqual(api.validator.rejected, 1)
+
+if __name__ == '__main__':
+    unittest.main()